@@ -0,0 +1,219 @@
+"""
+Servidor MCP falso para benchmarks: fala o mesmo JSON-RPC por stdio que
+server/dt_mcp_server.lua, mas sobre um ``dt.database`` sintético em memória.
+
+É o atalho ``--server python`` do run_benchmarks.py: mede só o caminho do host
+(McpClient, decodificação, BatchProcessor), sem o custo do servidor Lua. O
+padrão roda o próprio dt_mcp_server.lua com o darktable falso de tests/lua.
+As respostas seguem o formato das ferramentas Lua (inclusive a codificação
+columnar negociada no initialize); escritas só alteram a memória e o export
+apenas espera ``--export-ms`` por imagem.
+
+    python benchmarks/fake_darktable.py --images 5000 --image-dir /tmp/bench-images
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from synthetic import COLORS, synthetic_catalog
+
+PROTOCOL_VERSION = "2024-11-05"
+METADATA_FIELDS = ["id", "path", "filename", "rating", "is_raw", "colorlabels"]
+DUMP_EXIF_FIELDS = ["exposure", "aperture", "iso", "focal_length", "crop"]
+
+
+class FakeDarktable:
+    def __init__(self, images: list[dict], export_ms: float = 0.0):
+        self.images = images
+        self.by_id = {img["id"]: img for img in images}
+        self.export_ms = export_ms
+        self.encoding = "json"
+
+    # -- helpers ------------------------------------------------------------
+
+    def _rows(self, images, include_exif):
+        fields = METADATA_FIELDS + (["exif"] if include_exif else [])
+        rows = [{f: img[f] for f in fields} for img in images]
+        if self.encoding != "columnar":
+            return rows
+        return {
+            "encoding": "columnar",
+            "count": len(rows),
+            "fields": fields,
+            "columns": {f: [row[f] for row in rows] for f in fields},
+        }
+
+    def _filtered(self, args):
+        min_rating = args.get("min_rating", -2)
+        only_raw = args.get("only_raw", False)
+        for img in self.images:
+            if img["rating"] >= min_rating and (not only_raw or img["is_raw"]):
+                yield img
+
+    @staticmethod
+    def _result(*content, is_error=False):
+        return {"content": list(content), "isError": is_error}
+
+    # -- ferramentas ----------------------------------------------------------
+
+    def list_collection(self, args):
+        path = args.get("collection_path")
+        images = [img for img in self._filtered(args) if not path or path in img["path"]]
+        return self._result({"type": "json", "json": self._rows(images, args.get("include_exif"))})
+
+    def list_by_path(self, args):
+        needle = args.get("path_contains") or ""
+        images = [img for img in self._filtered(args) if needle in img["path"] + "/" + img["filename"]]
+        return self._result({"type": "json", "json": self._rows(images, args.get("include_exif"))})
+
+    def list_by_tag(self, args):
+        tag = args.get("tag")
+        images = [img for img in self._filtered(args) if tag in img["tags"]]
+        return self._result({"type": "json", "json": self._rows(images, args.get("include_exif"))})
+
+    def list_changed_since(self, args):
+        since, after_id = args.get("since", 0), args.get("after_id")
+        images = [
+            img for img in self._filtered(args)
+            if img["changed_at"] > since or (img["changed_at"] == since and (after_id is None or img["id"] > after_id))
+        ]
+        rows = self._rows(images, args.get("include_exif"))
+        if isinstance(rows, list):
+            for row, img in zip(rows, images):
+                row["changed_at"] = img["changed_at"]
+        else:
+            rows["fields"].append("changed_at")
+            rows["columns"]["changed_at"] = [img["changed_at"] for img in images]
+        return self._result(
+            {"type": "json", "json": rows},
+            {"type": "json", "json": {"since": since, "watermark": int(time.time()), "count": len(images)}},
+        )
+
+    def catalog_dump(self, args):
+        offset = args.get("offset", 0)
+        limit = min(args.get("limit", 5000), 50000)
+        chunk = self.images[offset:offset + limit]
+        fields = ["id", "film_roll", "path", "filename", "rating", "is_raw"]
+        columns = {f: [img[f] for img in chunk] for f in fields}
+        # Como no Lua: colorlabels em máscara de bits (red=1 ... purple=16), exif em colunas exif_*
+        fields.append("colorlabels")
+        columns["colorlabels"] = [sum(1 << COLORS.index(c) for c in img["colorlabels"]) for img in chunk]
+        if args.get("include_tags", True):
+            fields.append("tags")
+            columns["tags"] = [sorted(img["tags"]) for img in chunk]
+        if args.get("include_exif", True):
+            for name in DUMP_EXIF_FIELDS:
+                fields.append(f"exif_{name}")
+                columns[f"exif_{name}"] = [img["exif"].get(name) for img in chunk]
+        payload = {"encoding": "columnar", "count": len(chunk), "fields": fields, "columns": columns,
+                   "offset": offset, "total": len(self.images)}
+        if offset + len(chunk) < len(self.images):
+            payload["next_offset"] = offset + len(chunk)
+        return self._result({"type": "json", "json": payload})
+
+    def apply_batch_edits(self, args):
+        updated = 0
+        for edit in args.get("edits", []):
+            img = self.by_id.get(edit.get("id"))
+            if img:
+                if edit.get("rating") is not None:
+                    img["rating"] = edit["rating"]
+                updated += 1
+        return self._result({"type": "text", "text": f"Applied rating edits to {updated} images"})
+
+    def apply_plan(self, args):
+        results = []
+        for op in args.get("ops", []):
+            img = self.by_id.get(op.get("id"))
+            if img is None:
+                results.append({"id": op.get("id"), "status": "not_found"})
+                continue
+            if "rating" in op:
+                img["rating"] = op["rating"]
+            if "color" in op:
+                img["colorlabels"] = [op["color"]] if args.get("overwrite_labels") else img["colorlabels"] + [op["color"]]
+            for tag in op.get("tags", []):
+                img["tags"].append(tag)
+            results.append({"id": op["id"], "status": "ok"})
+        ok = sum(1 for r in results if r["status"] == "ok")
+        return self._result(
+            {"type": "text", "text": f"Plano aplicado: {ok}/{len(results)} imagens"},
+            {"type": "json", "json": {"results": results}},
+        )
+
+    def tag_bulk(self, args):
+        attached, not_found = {}, set()
+        for tag, ids in (args.get("attach") or {}).items():
+            for image_id in ids:
+                img = self.by_id.get(image_id)
+                if img is None:
+                    not_found.add(image_id)
+                    continue
+                img["tags"].append(tag)
+                attached[tag] = attached.get(tag, 0) + 1
+        return self._result(
+            {"type": "text", "text": f"Tags aplicadas: {sum(attached.values())}"},
+            {"type": "json", "json": {"attached": attached, "detached": {}, "not_found": sorted(not_found)}},
+        )
+
+    def export_collection(self, args):
+        ids = args.get("ids") or [img["id"] for img in self.images]
+        for _ in ids:
+            # Um darktable-cli por imagem no servidor real
+            time.sleep(self.export_ms / 1000)
+        text = f"Exportadas {len(ids)} imagens para {args.get('target_dir')}"
+        return self._result({"type": "text", "text": text})
+
+    TOOLS = (
+        "list_collection", "list_by_path", "list_by_tag", "list_changed_since", "catalog_dump",
+        "apply_batch_edits", "apply_plan", "tag_bulk", "export_collection",
+    )
+
+    # -- JSON-RPC -----------------------------------------------------------------
+
+    def handle(self, req):
+        method, params = req.get("method"), req.get("params") or {}
+        if method == "initialize":
+            requested = ((params.get("capabilities") or {}).get("experimental") or {}).get("darktable", {}).get("encodings") or []
+            self.encoding = next((e for e in requested if e in ("json", "columnar")), "json")
+            return {
+                "protocolVersion": PROTOCOL_VERSION,
+                "serverInfo": {"name": "darktable-mcp-batch (fake)", "version": "0.2.0"},
+                "capabilities": {
+                    "tools": {"listChanged": False},
+                    "experimental": {"darktable": {"encoding": self.encoding, "encodings": ["json", "columnar"]}},
+                },
+            }
+        if method == "tools/list":
+            return {"tools": [{"name": name, "inputSchema": {"type": "object"}} for name in self.TOOLS]}
+        if method == "tools/call" and params.get("name") in self.TOOLS:
+            return getattr(self, params["name"])(params.get("arguments") or {})
+        raise LookupError(f"Unknown method/tool: {method} {params.get('name', '')}".strip())
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Servidor MCP falso (darktable sintético) para benchmarks")
+    p.add_argument("--images", type=int, default=1000)
+    p.add_argument("--image-dir", default="/tmp/dt-mcp-bench/images")
+    p.add_argument("--export-ms", type=float, default=0.0, help="Espera simulada por imagem exportada")
+    args = p.parse_args(argv)
+
+    server = FakeDarktable(synthetic_catalog(args.images, Path(args.image_dir)), export_ms=args.export_ms)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        req = json.loads(line)
+        try:
+            resp = {"jsonrpc": "2.0", "id": req.get("id"), "result": server.handle(req)}
+        except LookupError as e:
+            resp = {"jsonrpc": "2.0", "id": req.get("id"), "error": {"code": -32601, "message": str(e)}}
+        sys.stdout.write(json.dumps(resp, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
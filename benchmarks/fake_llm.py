@@ -0,0 +1,123 @@
+"""
+Endpoint HTTP falso de LLM para benchmarks (API do Ollama e compatível com OpenAI).
+
+Responde em ``/api/chat`` e ``/v1/chat/completions`` com um plano válido para
+os IDs citados nas mensagens, depois de esperar
+``latency_ms + per_image_ms * imagens``. O modo vem do JSON Schema enviado
+(``format``/``response_format``); sem schema, responde um plano de rating.
+
+    python benchmarks/fake_llm.py --port 11500 --latency-ms 800 --per-image-ms 50
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ID_PATTERN = re.compile(r'(?:ID[= ]|"id":\s*)(\d+)')
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content or "")
+
+
+def _count_images(messages: list[dict]) -> int:
+    count = 0
+    for message in messages:
+        count += len(message.get("images") or [])
+        content = message.get("content")
+        if isinstance(content, list):
+            count += sum(1 for part in content if isinstance(part, dict) and part.get("type") == "image_url")
+    return count
+
+
+def plan_for(messages: list[dict], schema) -> dict:
+    # O system prompt fica de fora: exemplos de JSON do prompt não são IDs da amostra
+    text = " ".join(_message_text(m) for m in messages if m.get("role") != "system")
+    ids = list(dict.fromkeys(int(i) for i in ID_PATTERN.findall(text)))
+    keys = set((schema or {}).get("properties", {}))
+    if "tags" in keys:
+        return {"tags": [{"tag": "job:benchmark", "ids": ids}], "observacoes": {}}
+    if "ids_para_exportar" in keys:
+        return {"ids_para_exportar": ids[::2], "notas": {}}
+    if "treatments" in keys:
+        return {"treatments": [{"id": i, "rating": 3, "color_label": "green", "exposure": 0.0} for i in ids]}
+    if "decisions" in keys:
+        return {"decisions": [{"id": i, "decision": "unsure"} for i in ids]}
+    return {"edits": [{"id": i, "rating": i % 6} for i in ids], "notas_gerais": ""}
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    latency_ms = 0.0
+    per_image_ms = 0.0
+
+    def log_message(self, format, *args):  # noqa: A002 - assinatura do http.server
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        payload = json.loads(body or b"{}")
+        messages = payload.get("messages") or []
+        images = _count_images(messages)
+        time.sleep((self.latency_ms + self.per_image_ms * images) / 1000)
+
+        if self.path.rstrip("/").endswith("/api/chat"):
+            schema = payload.get("format") if isinstance(payload.get("format"), dict) else None
+            content = json.dumps(plan_for(messages, schema))
+            data = {
+                "model": payload.get("model"),
+                "message": {"role": "assistant", "content": content},
+                "done": True,
+                "prompt_eval_count": len(body) // 4,
+                "eval_count": len(content) // 4,
+            }
+        elif self.path.rstrip("/").endswith("/chat/completions"):
+            schema = ((payload.get("response_format") or {}).get("json_schema") or {}).get("schema")
+            content = json.dumps(plan_for(messages, schema))
+            data = {
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": len(content) // 4},
+            }
+        else:
+            self.send_error(404)
+            return
+
+        raw = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+def start_fake_llm(port: int = 0, latency_ms: float = 0.0, per_image_ms: float = 0.0):
+    """Sobe o servidor numa thread; retorna (servidor, url_base). Encerre com server.shutdown()."""
+    handler = type("Handler", (FakeLLMHandler,), {"latency_ms": latency_ms, "per_image_ms": per_image_ms})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="LLM falso (Ollama/OpenAI) para benchmarks")
+    p.add_argument("--port", type=int, default=11500)
+    p.add_argument("--latency-ms", type=float, default=0.0)
+    p.add_argument("--per-image-ms", type=float, default=0.0)
+    args = p.parse_args(argv)
+    server, url = start_fake_llm(args.port, args.latency_ms, args.per_image_ms)
+    print(f"LLM falso em {url} (Ctrl+C encerra)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
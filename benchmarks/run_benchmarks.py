@@ -0,0 +1,315 @@
+"""
+Benchmarks do caminho host <-> servidor, sem darktable nem LLM reais.
+
+Sobe o server/dt_mcp_server.lua de verdade em host/lua-static, com o módulo
+darktable falso de tests/lua sobre um catálogo sintético (synthetic.py), como
+subprocesso do McpClient; o LLM falso (fake_llm.py) roda numa thread. Depois
+mede cada cenário ``--repeat`` vezes:
+
+- ``list``: fetch_images sobre o catálogo inteiro (varredura e encode_rows no
+  Lua, stdio, JSON e decode_rows);
+- ``dump``: dump_catalog paginado (catalog_dump, com tags e exif);
+- ``encode`` / ``encode_async``: prepare_vision_payloads(_async) das imagens;
+- ``infer_chunked``: run_mode_rating em dry-run com visão e --chunk-size;
+- ``apply``: apply_plan com rating + colorlabel (transação com snapshots);
+- ``tag``: tag_bulk anexando uma tag às mesmas imagens (cache de tags);
+- ``export``: export_collection com um darktable-cli falso que espera
+  ``--export-ms`` por imagem.
+
+``--server-profile`` liga o perfil do servidor e guarda o server_stats no
+resultado. ``--server python`` troca o Lua pelo fake_darktable.py, um atalho
+rápido que mede só o host e o transporte.
+
+O resultado vai para ``benchmarks/results/<data>-<commit>.json`` com o mesmo
+formato em todo commit; ``--compare`` mostra a variação das medianas.
+
+    python benchmarks/run_benchmarks.py --images 2000 --repeat 5
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/anterior.json
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT_DIR / "host"))
+
+import common  # noqa: E402
+from batch_processor import BatchProcessor  # noqa: E402
+from catalog import dump_catalog  # noqa: E402
+from common import (  # noqa: E402
+    McpClient, fetch_images, prepare_vision_payloads, prepare_vision_payloads_async, server_stats,
+)
+from fake_llm import start_fake_llm  # noqa: E402
+from llm_api import OllamaProvider, OpenAICompatProvider  # noqa: E402
+from synthetic import write_images, write_mock_catalog  # noqa: E402
+
+SCENARIOS = ("list", "dump", "encode", "encode_async", "infer_chunked", "apply", "tag", "export")
+RESULTS_DIR = BENCH_DIR / "results"
+RESULT_SCHEMA = 1
+LUA_STATIC = ROOT_DIR / "host" / "lua-static"
+SERVER_SCRIPT = ROOT_DIR / "server" / "dt_mcp_server.lua"
+MOCK_DARKTABLE_DIR = ROOT_DIR / "tests" / "lua"
+
+
+class _BenchProcessor(BatchProcessor):
+    # Métricas em logs/metrics.json ficam fora da medição (e do diretório do repo)
+    def _log_metric(self, mode, success, duration, extra=None):
+        pass
+
+
+def _git_commit() -> tuple[str, bool]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def _stats(runs: list[float], items: int) -> dict:
+    ordered = sorted(runs)
+    median = statistics.median(ordered)
+    return {
+        "runs_s": [round(r, 6) for r in runs],
+        "min_s": round(ordered[0], 6),
+        "median_s": round(median, 6),
+        "mean_s": round(statistics.fmean(ordered), 6),
+        "p95_s": round(ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))], 6),
+        "items": items,
+        "items_per_s": round(items / median, 2) if median > 0 else None,
+    }
+
+
+def _measure(fn, repeat: int, warmup: int = 1) -> list[float]:
+    for _ in range(warmup):
+        fn()
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+    return runs
+
+
+def _list_args(**overrides) -> SimpleNamespace:
+    values = dict(source="all", min_rating=-2, only_raw=False, limit=10**9, text_only=False,
+                  prompt_variant="basico", chunk_size=0, max_dimension=1024)
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def _infer(client, provider, opts) -> None:
+    # Os prints por imagem do modo rating só poluiriam a saída do benchmark
+    with contextlib.redirect_stdout(io.StringIO()):
+        _BenchProcessor(client, provider, dry_run=True).run_mode_rating(
+            _list_args(limit=opts.infer_images, chunk_size=opts.chunk_size)
+        )
+
+
+def lua_server(work_dir: Path, images: int, image_dir: Path, export_ms: float = 0.0,
+               lua: Optional[str] = None) -> tuple[list[str], dict]:
+    """Comando e ambiente do dt_mcp_server.lua sobre o darktable falso com ``images`` fotos."""
+    work_dir = Path(work_dir)
+    catalog = write_mock_catalog(work_dir / f"catalog-{images}.json", images, image_dir)
+    # Um darktable-cli por imagem exportada, como no servidor real
+    cli = work_dir / "fake-darktable-cli"
+    cli.write_text(f"#!/bin/sh\nsleep {export_ms / 1000:.3f}\n" if export_ms > 0 else "#!/bin/sh\nexit 0\n")
+    cli.chmod(0o755)
+    env = dict(os.environ)
+    env.update({
+        "LUA_PATH": f"{MOCK_DARKTABLE_DIR}/?.lua;;",
+        "DT_MOCK_CATALOG": str(catalog),
+        "DT_MCP_STATE_DIR": str(work_dir / "state"),
+        "DT_MCP_LD_REEXEC": "1",
+        "DARKTABLE_CLI_CMD": str(cli),
+    })
+    return [lua or str(LUA_STATIC), str(SERVER_SCRIPT)], env
+
+
+def run(opts) -> dict:
+    work_dir = Path(opts.work_dir or tempfile.mkdtemp(prefix="dt-mcp-bench-"))
+    image_dir = work_dir / "images"
+    # save_log do BatchProcessor grava no diretório temporário, não em logs/ do repo
+    common.LOG_DIR = work_dir / "logs"
+
+    encode_count = min(opts.images, opts.encode_images)
+    created = write_images(image_dir, max(encode_count, opts.infer_images), size=(opts.width, opts.height))
+    print(f"[bench] {created} imagem(ns) sintética(s) criada(s) em {image_dir}")
+
+    llm_server, llm_url = start_fake_llm(latency_ms=opts.llm_latency_ms, per_image_ms=opts.llm_per_image_ms)
+    if opts.provider == "ollama":
+        provider = OllamaProvider(llm_url, "bench-model", 120.0)
+    else:
+        provider = OpenAICompatProvider(llm_url, "bench-model", 120.0)
+
+    if opts.server == "python":
+        command = [sys.executable, str(BENCH_DIR / "fake_darktable.py"), "--images", str(opts.images),
+                   "--image-dir", str(image_dir), "--export-ms", str(opts.export_ms)]
+        env = None
+    else:
+        command, env = lua_server(work_dir, opts.images, image_dir, opts.export_ms, opts.lua)
+    encodings = None if opts.encoding == "columnar" else ()
+    client = McpClient(command, "2024-11-05", {"name": "mcp-bench", "version": "1"}, env=env,
+                       response_timeout=300.0, encodings=encodings, profiling=opts.server_profile,
+                       cwd=str(work_dir))
+    selected = [s for s in SCENARIOS if not opts.only or s in opts.only]
+    results: dict = {}
+    stats = None
+    try:
+        client.start()
+        client.initialize()
+        listed = fetch_images(client, _list_args())
+        encode_sample = listed[:encode_count]
+        apply_ids = [img["id"] for img in listed[:opts.apply_images]]
+
+        scenarios = {
+            "list": (lambda: fetch_images(client, _list_args()), len(listed)),
+            "dump": (lambda: dump_catalog(client, chunk_size=opts.dump_chunk), opts.images),
+            "encode": (lambda: prepare_vision_payloads(encode_sample, max_dimension=1024), len(encode_sample)),
+            "encode_async": (
+                lambda: prepare_vision_payloads_async(encode_sample, max_workers=opts.workers, max_dimension=1024),
+                len(encode_sample),
+            ),
+            "infer_chunked": (lambda: _infer(client, provider, opts), opts.infer_images),
+            "apply": (
+                lambda: client.call_tool("apply_plan", {
+                    "ops": [{"id": i, "rating": i % 6, "color": "green"} for i in apply_ids],
+                    "overwrite_labels": True,
+                }),
+                len(apply_ids),
+            ),
+            "tag": (
+                lambda: client.call_tool("tag_bulk", {"attach": {"bench|aplicada": apply_ids}}),
+                len(apply_ids),
+            ),
+            "export": (
+                # Relativo ao diretório de trabalho do servidor (work_dir)
+                lambda: client.call_tool("export_collection", {
+                    "target_dir": "export", "ids": apply_ids, "format": "jpg", "overwrite": True,
+                }),
+                len(apply_ids),
+            ),
+        }
+        for name in selected:
+            fn, items = scenarios[name]
+            runs = _measure(fn, opts.repeat)
+            results[name] = _stats(runs, items)
+            print(f"[bench] {name:<14} mediana {results[name]['median_s'] * 1000:9.1f} ms"
+                  f"  ({results[name]['items_per_s']} itens/s)")
+        if opts.server_profile and opts.server == "lua":
+            stats = server_stats(client)
+    finally:
+        client.close()
+        llm_server.shutdown()
+
+    commit, dirty = _git_commit()
+    return {
+        "schema": RESULT_SCHEMA,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pillow": common.HAS_PILLOW,
+        "config": {
+            "images": opts.images,
+            "encode_images": encode_count,
+            "infer_images": opts.infer_images,
+            "apply_images": len(apply_ids),
+            "image_size": [opts.width, opts.height],
+            "chunk_size": opts.chunk_size,
+            "workers": opts.workers,
+            "server": opts.server,
+            "provider": opts.provider,
+            "encoding": client.wire_encoding,
+            "llm_latency_ms": opts.llm_latency_ms,
+            "llm_per_image_ms": opts.llm_per_image_ms,
+            "export_ms": opts.export_ms,
+            "repeat": opts.repeat,
+        },
+        "scenarios": results,
+        "server_stats": stats,
+    }
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """Linhas com a variação da mediana de cada cenário em relação à base."""
+    lines = [f"Comparando {current.get('commit')} com {baseline.get('commit')}:"]
+    if current.get("config") != baseline.get("config"):
+        lines.append("  (atenção: configurações diferentes; compare com cautela)")
+    for name, stats in current.get("scenarios", {}).items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base or not base.get("median_s"):
+            lines.append(f"  {name:<14} sem base")
+            continue
+        delta = (stats["median_s"] - base["median_s"]) / base["median_s"] * 100
+        lines.append(f"  {name:<14} {base['median_s'] * 1000:9.1f} ms -> {stats['median_s'] * 1000:9.1f} ms ({delta:+.1f}%)")
+    return lines
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmarks do host MCP com darktable e LLM falsos")
+    p.add_argument("--images", type=int, default=2000, help="Tamanho do catálogo sintético")
+    p.add_argument("--encode-images", type=int, default=32, help="Imagens codificadas nos cenários encode*")
+    p.add_argument("--infer-images", type=int, default=32, help="Amostra do cenário infer_chunked")
+    p.add_argument("--apply-images", type=int, default=500, help="Imagens nos cenários apply/tag/export")
+    p.add_argument("--dump-chunk", type=int, default=5000, help="Imagens por chamada no cenário dump")
+    p.add_argument("--width", type=int, default=3000)
+    p.add_argument("--height", type=int, default=2000)
+    p.add_argument("--chunk-size", type=int, default=8)
+    p.add_argument("--workers", type=int, default=4, help="Threads do encode_async")
+    p.add_argument("--provider", choices=["ollama", "openai"], default="ollama")
+    p.add_argument("--encoding", choices=["columnar", "json"], default="columnar",
+                   help="Codificação das listas negociada com o servidor")
+    p.add_argument("--server", choices=["lua", "python"], default="lua",
+                   help="lua: dt_mcp_server.lua com o darktable falso; python: fake_darktable.py (só host)")
+    p.add_argument("--lua", help="Interpretador Lua do servidor (padrão: host/lua-static)")
+    p.add_argument("--server-profile", action="store_true",
+                   help="Liga o perfil do servidor Lua e guarda o server_stats no resultado")
+    p.add_argument("--llm-latency-ms", type=float, default=0.0, help="Latência fixa por chamada do LLM falso")
+    p.add_argument("--llm-per-image-ms", type=float, default=0.0, help="Latência extra por imagem enviada")
+    p.add_argument("--export-ms", type=float, default=0.0, help="Espera simulada por imagem exportada")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--only", nargs="+", choices=SCENARIOS, help="Roda só estes cenários")
+    p.add_argument("--work-dir", help="Diretório das imagens sintéticas (reaproveitado entre execuções)")
+    p.add_argument("--output", help="Arquivo de resultado (padrão: benchmarks/results/<data>-<commit>.json)")
+    p.add_argument("--compare", help="Resultado anterior para comparar as medianas")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    opts = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    result = run(opts)
+
+    output = Path(opts.output) if opts.output else RESULTS_DIR / (
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{result['commit']}{'-dirty' if result['dirty'] else ''}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[bench] Resultado: {output}")
+
+    if opts.compare:
+        baseline = json.loads(Path(opts.compare).read_text(encoding="utf-8"))
+        print("\n".join(compare(result, baseline)))
+
+
+if __name__ == "__main__":
+    main()
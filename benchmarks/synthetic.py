@@ -0,0 +1,111 @@
+"""
+Catálogo sintético para os benchmarks: N imagens com metadados determinísticos.
+
+O mesmo ``synthetic_catalog`` alimenta o dt_mcp_server.lua (via ``mock_catalog``
+e o módulo darktable falso de tests/lua) e o servidor Python fake_darktable.py;
+``write_images`` grava os arquivos correspondentes em disco, para que o
+cenário de codificação leia JPEGs reais.
+"""
+from __future__ import annotations
+
+import json
+import random
+from pathlib import Path
+
+try:
+    from PIL import Image
+    HAS_PILLOW = True
+except ImportError:
+    HAS_PILLOW = False
+
+IMAGES_PER_ROLL = 250
+COLORS = ("red", "yellow", "green", "blue", "purple")
+# 2026-01-01 00:00:00 UTC; cada imagem "muda" um segundo depois da anterior
+BASE_TIMESTAMP = 1767225600
+
+
+def roll_dir(image_dir: Path, image_id: int) -> Path:
+    return Path(image_dir) / f"roll{(image_id - 1) // IMAGES_PER_ROLL:03d}"
+
+
+def image_name(image_id: int) -> str:
+    return f"IMG_{image_id:05d}.jpg"
+
+
+def synthetic_catalog(count: int, image_dir: Path) -> list[dict]:
+    """Metadados no formato de image_to_metadata do servidor Lua (com exif e tags)."""
+    rows = []
+    for image_id in range(1, count + 1):
+        roll = (image_id - 1) // IMAGES_PER_ROLL
+        rows.append({
+            "id": image_id,
+            "film_roll": roll + 1,
+            "path": str(roll_dir(image_dir, image_id)),
+            "filename": image_name(image_id),
+            "rating": image_id % 7 - 1,
+            "is_raw": image_id % 3 == 0,
+            "colorlabels": [COLORS[image_id % 5]] if image_id % 4 == 0 else [],
+            "tags": [f"bench|roll{roll:03d}"] + (["bench|destaque"] if image_id % 10 == 0 else []),
+            "changed_at": BASE_TIMESTAMP + image_id,
+            "exif": {
+                "exposure": 1 / (60 + image_id % 500),
+                "aperture": 2.8,
+                "iso": 100 * (1 + image_id % 32),
+                "focal_length": 35,
+                "crop": 1.0,
+                "datetime_taken": f"2026:01:01 {8 + (image_id // 3600) % 12:02d}:{(image_id // 60) % 60:02d}:{image_id % 60:02d}",
+            },
+        })
+    return rows
+
+
+def mock_catalog(rows: list[dict]) -> list[dict]:
+    """Linhas de ``synthetic_catalog`` no formato de DT_MOCK_CATALOG (tests/lua/darktable.lua)."""
+    entries = []
+    for row in rows:
+        entry = {
+            "id": row["id"],
+            "film_roll": row["film_roll"],
+            "path": row["path"],
+            "filename": row["filename"],
+            "rating": row["rating"],
+            "is_raw": row["is_raw"],
+            "labels": [COLORS.index(color) for color in row["colorlabels"]],
+            "tags": list(row["tags"]),
+            "import_timestamp": BASE_TIMESTAMP,
+            "change_timestamp": row["changed_at"],
+        }
+        entry.update({f"exif_{key}": value for key, value in row["exif"].items()})
+        entries.append(entry)
+    return entries
+
+
+def write_mock_catalog(path: Path, count: int, image_dir: Path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(mock_catalog(synthetic_catalog(count, image_dir))), encoding="utf-8")
+    return path
+
+
+def write_images(image_dir: Path, count: int, size: tuple[int, int] = (3000, 2000), seed: int = 0) -> int:
+    """Grava ``count`` JPEGs (ruído + gradiente, que não comprime trivialmente). Retorna quantos criou."""
+    rng = random.Random(seed)
+    created = 0
+    # Poucos "moldes" reaproveitados: gerar 3000x2000 px por imagem tornaria o setup mais lento que o benchmark
+    templates = []
+    for image_id in range(1, count + 1):
+        path = roll_dir(image_dir, image_id) / image_name(image_id)
+        if path.exists():
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not HAS_PILLOW:
+            path.write_bytes(bytes(rng.getrandbits(8) for _ in range(256 * 1024)))
+            created += 1
+            continue
+        if len(templates) < 8:
+            noise = Image.effect_noise(size, 40 + 10 * len(templates)).convert("RGB")
+            gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+            templates.append(Image.blend(noise, gradient, 0.5))
+        templates[image_id % len(templates)].save(path, format="JPEG", quality=90)
+        created += 1
+    return created
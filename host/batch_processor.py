@@ -1,31 +1,55 @@
-class PromptValidationError(Exception):
-    """Erro de domínio para falhas de validação de prompt."""
-    pass
-
 from __future__ import annotations
 
+import copy
 import json
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 import logging
 
 from common import (
+    ContactSheet,
+    PromptValidationError,
     fetch_images,
+    parse_grid_spec,
+    prepare_contact_sheets,
     prepare_vision_payloads,
     prepare_vision_payloads_async,
     save_log,
     fallback_user_prompt,
     append_export_result_to_log,
-    extract_export_errors
+    extract_export_errors,
+    resolve_contact_sheet_ids,
 )
 from prompts import get_prompt
 from llm_api import LLMProvider
+from plan_schema import missing_ids, parse_plan, plan_schema
+from run_journal import STAGE_APPLY, STAGE_ENCODE, STAGE_INFER, STAGE_SAMPLE, RunJournal, last_evaluated
+from sampling import FIRST, LEAST_RECENT, sample_images
+from tracing import enabled as tracing_enabled, export_trace, span
+from watermarks import mark_order
+from triage import (
+    TriageResult,
+    TriageRules,
+    apply_model_decisions,
+    reject_edits,
+    triage_images,
+)
+
+# Evento de progresso com a decisão do modelo por imagem (não é etapa do diário)
+STAGE_DECISION = "decision"
+
+
+def _image_path(img: dict) -> str:
+    return str(Path(img.get("path", "")) / str(img.get("filename", "")))
+
 
 def build_messages(system_prompt: str, sample: list[dict], vision_images: list, provider_type: str = "ollama"):
     """
     Constrói mensagens para o LLM. 
     Se provider_type for 'ollama', usa formato específico (images lista base64).
     Se 'openai-compat', usa formato content array com image_url.
+    Ordem: system prompt, instruções fixas e, por último, as imagens do bloco.
     """
     if not vision_images:
         return [
@@ -33,50 +57,72 @@ def build_messages(system_prompt: str, sample: list[dict], vision_images: list,
             {"role": "user", "content": fallback_user_prompt(sample)},
         ]
 
-    messages = [{"role": "system", "content": system_prompt}]
-    
-    # Lógica unificada de loop nas imagens
-    # ...
-    # OBS: O formato de envio de imagem varia entre Ollama e OpenAI.
+    # Layout fixo para reaproveitar o cache de prefixo (KV) do servidor entre blocos:
+    # system prompt e instruções (iguais em todo bloco do mesmo modo) primeiro,
+    # mensagens de imagem (que mudam a cada bloco) por último.
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": closing_instructions(vision_images)},
+    ]
+
+    # O formato de envio de imagem varia entre Ollama e OpenAI:
     # Ollama (nativo): { role: user, content: txt, images: [b64] }
     # OpenAI: { role: user, content: [ {type:text...}, {type:image_url...} ] }
-    
-    # Para simplificar, vamos iterar e adaptar aqui, ou delegar ao Provider.
-    # Como a construção da mensagem depende do 'contract' do provider, 
-    # idealmente o Provider deveria formatar. Mas vamos fazer cheque simples aqui.
-    
     for item in vision_images:
-        meta = item.meta
-        colorlabels = ",".join(meta.get("colorlabels", []))
-        description = (
-            f"Image ID={meta.get('id')} Path={item.path} Rating={meta.get('rating')} "
-            f"Labels=[{colorlabels}]"
-        )
-        from typing import cast, Any
-        if provider_type == "ollama":
-            # 'images' deve ser lista de strings (API Ollama)
-            images_list = [item.b64] if isinstance(item.b64, str) else (item.b64 if isinstance(item.b64, list) else [])
-            messages.append({
-                "role": "user",
-                "content": description,
-                "images": cast(Any, images_list)
-            })
+        if isinstance(item, ContactSheet):
+            description = _contact_sheet_description(item, len(vision_images))
         else:
-            # OpenAI / LM Studio espera 'content' como lista de objetos
-            content_list = [
-                {"type": "text", "text": description},
-                {"type": "image_url", "image_url": {"url": item.data_url}}
-            ]
-            messages.append({
-                "role": "user",
-                "content": cast(Any, content_list)
-            })
+            meta = item.meta
+            colorlabels = ",".join(meta.get("colorlabels", []))
+            description = (
+                f"Image ID={meta.get('id')} Path={item.path} Rating={meta.get('rating')} "
+                f"Labels=[{colorlabels}]"
+            )
+        messages.append(_image_message(description, item, provider_type))
+    return messages
 
-    messages.append({
+
+def closing_instructions(vision_images: list) -> str:
+    """Instruções fixas enviadas antes das imagens (dependem só do tipo de envio)."""
+    text = "Retorne APENAS um JSON com o plano de ação seguindo o schema, considerando as imagens a seguir."
+    if any(isinstance(item, ContactSheet) for item in vision_images):
+        text += " Use sempre o ID estampado em cada célula das grades para identificar as imagens."
+    return text
+
+
+def _image_message(description: str, item, provider_type: str) -> dict:
+    from typing import cast, Any
+    if provider_type == "ollama":
+        # 'images' deve ser lista de strings (API Ollama)
+        images_list = [item.b64] if isinstance(item.b64, str) else (item.b64 if isinstance(item.b64, list) else [])
+        return {
+            "role": "user",
+            "content": description,
+            "images": cast(Any, images_list)
+        }
+    # OpenAI / LM Studio espera 'content' como lista de objetos
+    content_list = [
+        {"type": "text", "text": description},
+        {"type": "image_url", "image_url": {"url": item.data_url}}
+    ]
+    return {
         "role": "user",
-        "content": "Retorne APENAS um JSON com o plano de ação seguindo o schema."
-    })
-    return messages
+        "content": cast(Any, content_list)
+    }
+
+
+def _contact_sheet_description(sheet: ContactSheet, total: int) -> str:
+    cells = []
+    for pos, meta in enumerate(sheet.cells, 1):
+        colorlabels = ",".join(meta.get("colorlabels", []))
+        cells.append(
+            f"{pos}=ID {meta.get('id')} (rating={meta.get('rating')} labels=[{colorlabels}] file={meta.get('filename')})"
+        )
+    return (
+        f"Contact sheet {sheet.index}/{total}: grade {sheet.cols}x{sheet.rows} de miniaturas, "
+        "cada célula com o ID da imagem estampado no topo. "
+        "Células (linha a linha): " + "; ".join(cells)
+    )
 
 
 def extract_json_from_markdown(text: str) -> str:
@@ -97,34 +143,181 @@ def extract_json_from_markdown(text: str) -> str:
     return text.strip()
 
 
+def resolve_sheet_answer(answer: str, sheets: list[ContactSheet]) -> str:
+    """Reescreve a resposta de um bloco em contact sheets usando só IDs reais das grades."""
+    try:
+        parsed = json.loads(extract_json_from_markdown(answer))
+    except (json.JSONDecodeError, TypeError):
+        return answer
+    if not isinstance(parsed, dict):
+        return answer
+    for key in ("edits", "tags", "treatments"):
+        if isinstance(parsed.get(key), list):
+            parsed[key] = resolve_contact_sheet_ids(parsed[key], sheets)
+    known = {i for sheet in sheets for i in sheet.ids}
+    for key in ("ids_para_exportar", "ids"):
+        if isinstance(parsed.get(key), list):
+            parsed[key] = [i for i in parsed[key] if i in known]
+    return json.dumps(parsed, ensure_ascii=False)
+
+
+def merge_chunk_answers(answers: list[str]) -> str:
+    """Junta as respostas JSON de vários blocos concatenando as listas de mesma chave."""
+    merged: dict = {}
+    for answer in answers:
+        try:
+            parsed = json.loads(extract_json_from_markdown(answer or ""))
+        except json.JSONDecodeError as e:
+            logging.error({
+                "event": "chunk_answer_json_error",
+                "error": str(e),
+                "raw_answer": answer,
+            })
+            continue
+        if not isinstance(parsed, dict):
+            continue
+        for key, value in parsed.items():
+            if isinstance(value, list):
+                merged.setdefault(key, []).extend(value)
+            else:
+                merged.setdefault(key, value)
+    return json.dumps(merged, ensure_ascii=False)
+
+
 
 class BatchProcessor:
-    def __init__(self, client, provider: LLMProvider, dry_run: bool = False):
+    def __init__(
+        self,
+        client,
+        provider: LLMProvider,
+        dry_run: bool = False,
+        journal: Optional[RunJournal] = None,
+        progress: Optional[Callable[[dict], None]] = None,
+    ):
         self.client = client
         self.provider = provider
         self.dry_run = dry_run
+        # Diário de checkpoint (--resume); None desativa a retomada
+        self.journal = journal
         # provider_type ajuda a decidir formato de mensagem
         self.provider_type = "ollama" if "Ollama" in provider.__class__.__name__ else "openai"
+        # Amostra efetivamente enviada ao LLM e resultado da triagem (--cascade)
+        self._sample: list[dict] = []
+        self._triage: Optional[TriageResult] = None
+        # --incremental: até onde as imagens alteradas foram cobertas nesta execução
+        self.watermark: Optional[dict] = None
+        # Listagens (imagens, amostra) desta execução; a marca só é calculada se o modo concluir
+        self._feeds: list[tuple[list[dict], list[dict]]] = []
+        # IDs gravados (inclusive em execuções anteriores do mesmo diário) e com falha na escrita
+        self._written: set = set()
+        self._failed: set = set()
+        # Lista já consultada pelo chamador (--watch); substitui a primeira listagem
+        self._prefetched: Optional[list[dict]] = None
+        # Último log de lote gravado (batch-*.json ou .jsonl.gz); o trace da execução vai ao lado dele
+        self.log_file: Optional[Path] = None
+        # Eventos de progresso por imagem (GUI); uma exceção do callback interrompe a execução
+        self.progress = progress
+        self._positions: dict = {}
+        self._known: dict = {}
+
+    def run(self, mode: str, args, images: Optional[list[dict]] = None) -> bool:
+        """Roda o modo; True se ele concluiu (só então a marca d'água avança).
 
-    def run(self, mode: str, args):
+        ``images`` reaproveita uma listagem já feita pelo chamador em vez de consultar de novo.
+        """
         method_name = f"run_mode_{mode}"
         if hasattr(self, method_name):
-            return getattr(self, method_name)(args)
+            self._prefetched = images
+            try:
+                with span(f"mode:{mode}", cat="mode"):
+                    ok = getattr(self, method_name)(args)
+                if ok:
+                    self._advance_watermark(args)
+                return ok
+            finally:
+                self._export_trace(mode)
         else:
             logging.error(f"Modo desconhecido: {mode}")
             print(f"Modo desconhecido: {mode}")
+            return False
+
+    def _export_trace(self, mode: str) -> None:
+        if not tracing_enabled() or self.log_file is None:
+            return
+        metadata = {"mode": mode, "model": getattr(self.provider, "model", None)}
+        if self.journal is not None:
+            metadata["run_id"] = self.journal.run_id
+        try:
+            trace_file = export_trace(self.log_file, metadata)
+        except OSError as e:
+            logging.warning({"event": "trace_export_error", "error": str(e)})
+            return
+        if trace_file:
+            logging.info(f"[{mode}] Trace: {trace_file}")
+
+    def _emit(self, stage: str, mode: str, ids, decisions: Optional[dict] = None) -> None:
+        """Um evento por imagem: {stage, mode, index, total, id, path} (index é a posição na amostra)."""
+        if self.progress is None:
+            return
+        total = len(self._sample)
+        for img_id in ids:
+            img = self._known.get(img_id)
+            path = _image_path(img) if img else None
+            event = {
+                "stage": stage,
+                "mode": mode,
+                "index": self._positions.get(img_id),
+                "total": total,
+                "id": img_id,
+                "path": path,
+            }
+            if decisions is not None:
+                event["decision"] = decisions.get(img_id)
+            self.progress(event)
+
+    def _decided(self, mode: str, decisions: dict) -> None:
+        """Decisão do modelo por imagem em texto curto (``decision``), antes da escrita e também no dry-run."""
+        self._emit(STAGE_DECISION, mode, list(decisions), decisions)
 
     def _process_common(self, mode: str, args):
         # Log active configuration
         config_dict = {k: v for k, v in vars(args).items() if k not in ["func", "prompt_file"]}
         logging.info(f"[{mode}] Configuração ativa: {config_dict}")
         
-        images = fetch_images(self.client, args)
+        if self._prefetched is not None:
+            images, self._prefetched = self._prefetched, None
+        else:
+            images = fetch_images(self.client, args)
         logging.info(f"[{mode}] Imagens filtradas: {len(images)}")
         if not images:
+            self._feeds.append((images, []))
             return None, None
 
-        sample = images[: args.limit]
+        sampled = self._journal_sample(mode, images, args)
+        sample = sampled
+        self._triage = None
+        if getattr(args, "cascade", False):
+            sample = self._cascade_triage(mode, sample, args)
+        self._sample = sample
+        self._positions = {img.get("id"): pos for pos, img in enumerate(sample, 1)}
+        self._known = {img.get("id"): img for img in self._rated_pool()}
+        if self.progress is not None:
+            # A amostra inteira de uma vez: a GUI monta a grade antes das etapas por imagem
+            self.progress({
+                "stage": STAGE_SAMPLE,
+                "mode": mode,
+                "index": 0,
+                "total": len(sample),
+                "images": [{"id": img.get("id"), "path": _image_path(img)} for img in sample],
+            })
+        if not sample:
+            logging.info(f"[{mode}] Triagem resolveu todas as imagens; nada a enviar ao modelo de visão.")
+            print(f"[{mode}] Triagem resolveu todas as imagens; nada a enviar ao modelo de visão.")
+            log_file = save_log(mode, args.source, [], None, extra={"triage": self._triage_summary()},
+                                compact=getattr(args, "compact_log", False))
+            self.log_file = log_file
+            self._feeds.append((images, sampled))
+            return None, log_file
         # Modular: carrega prompt via utilitário, com validação YAML
         try:
             system_prompt = get_prompt(mode, args.prompt_variant)
@@ -136,15 +329,155 @@ class BatchProcessor:
                 "error": str(e),
             })
             raise PromptValidationError(f"Falha ao carregar prompt: {e}") from e
+
+        chunk_size = getattr(args, "chunk_size", 0) or len(sample)
+        chunks = [sample[i:i + chunk_size] for i in range(0, len(sample), chunk_size)]
+        answers = []
+        metas = []
+        for index, chunk in enumerate(chunks, 1):
+            label = f"[{mode}] Bloco {index}/{len(chunks)}" if len(chunks) > 1 else f"[{mode}]"
+            answer, meta = self._infer_chunk(mode, label, system_prompt, chunk, args)
+            answers.append(answer)
+            metas.append(meta)
+
+        answer = answers[0] if len(answers) == 1 else merge_chunk_answers(answers)
+        extra = {"llm": metas[0] if len(metas) == 1 else metas}
+        if self._triage is not None:
+            extra["triage"] = self._triage_summary()
+        if self.journal is not None:
+            extra["run_id"] = self.journal.run_id
+        log_file = save_log(mode, args.source, sample, answer, extra=extra, compact=getattr(args, "compact_log", False))
+        self.log_file = log_file
+        logging.info(f"[{mode}] Log: {log_file}")
+        self._feeds.append((images, sampled))
+
+        return answer, log_file
+
+    def _advance_watermark(self, args) -> None:
+        """Calcula a nova marca d'água de --incremental depois que o modo concluiu.
+
+        list_changed_since devolve as imagens em ordem de (changed_at, id). A marca
+        para na última imagem antes da primeira não coberta (fora da amostra/--limit
+        ou com falha na escrita), e o restante entra na próxima execução; com tudo
+        coberto, vai para a marca d'água do servidor. No completo cada etapa lista
+        de novo e vale a menor das marcas.
+        """
+        if getattr(args, "changed_since", None) is None or not self._feeds:
+            return
+        marks = [self._feed_mark(images, covered) for images, covered in self._feeds]
+        if any(mark is None for mark in marks):
+            return
+        mark = min(marks, key=mark_order)
+        skip = self._skip_written(args, mark)
+        if skip:
+            mark["skip"] = skip
+        self.watermark = mark
+
+    def _feed_mark(self, images: list[dict], covered: list[dict]) -> Optional[dict]:
+        covered_ids = {img.get("id") for img in covered} - self._failed
+        last = None
+        for img in images:
+            if img.get("id") not in covered_ids:
+                break
+            last = img
+        else:
+            server_mark = getattr(images, "watermark", None)
+            if server_mark is not None:
+                return {"since": server_mark, "after_id": None}
+        if last is not None and last.get("changed_at") is not None:
+            return {"since": last["changed_at"], "after_id": last.get("id")}
+        return None
+
+    def _skip_written(self, args, mark: dict) -> list:
+        """[id, changed_at] das imagens gravadas que a próxima listagem não deve trazer de volta.
+
+        Gravar rating, tags ou estilo atualiza o change_timestamp da imagem para
+        depois da marca; uma listagem logo após a escrita guarda o changed_at
+        resultante. Entradas herdadas que a nova marca já cobre são descartadas.
+        """
+        skip = {img_id: changed_at for img_id, changed_at in getattr(args, "changed_skip", None) or []}
+        if self._written and not self.dry_run:
+            after = copy.copy(args)
+            after.changed_since, after.changed_after_id = mark["since"], mark["after_id"]
+            after.changed_skip = None
+            for img in fetch_images(self.client, after):
+                if img.get("id") in self._written and img.get("changed_at") is not None:
+                    skip[img.get("id")] = img["changed_at"]
+        return [[img_id, changed_at] for img_id, changed_at in skip.items() if changed_at >= mark["since"]]
+
+    def _journal_sample(self, mode: str, images: list[dict], args) -> list[dict]:
+        """Amostra do modo; ao retomar, reusa exatamente os IDs gravados no diário."""
+        if self.journal is None:
+            return self._select_sample(mode, images, args)
+        saved = self.journal.sample_ids(mode)
+        if saved is None:
+            sample = self._select_sample(mode, images, args)
+            self.journal.record(STAGE_SAMPLE, mode, [img.get("id") for img in sample])
+            return sample
+        by_id = {img.get("id"): img for img in images}
+        missing = [i for i in saved if i not in by_id]
+        if missing:
+            logging.warning(f"[{mode}] {len(missing)} imagem(ns) do diário não estão mais no filtro: {missing[:10]}")
+        return [by_id[i] for i in saved if i in by_id]
+
+    def _select_sample(self, mode: str, images: list[dict], args) -> list[dict]:
+        """Aplica a estratégia de amostragem (--sampling) à lista filtrada."""
+        strategy = getattr(args, "sampling", None) or FIRST
+        if strategy != FIRST and getattr(args, "changed_since", None) is not None:
+            # --incremental/--watch avançam a marca d'água pela ordem do change feed
+            logging.warning(f"[{mode}] --sampling {strategy} ignorado em execução incremental; usando 'first'")
+            strategy = FIRST
+        history = last_evaluated(mode) if strategy == LEAST_RECENT else None
+        sample = sample_images(images, args.limit, strategy, seed=getattr(args, "seed", None), history=history)
+        if strategy != FIRST:
+            logging.info(f"[{mode}] Amostragem '{strategy}': {len(sample)} de {len(images)} imagem(ns)")
+        return sample
+
+    def _schema(self, mode: str, args) -> Optional[dict]:
+        """JSON Schema do plano do modo, salvo com --no-structured-output."""
+        if not getattr(args, "structured_output", True):
+            return None
+        return plan_schema(mode)
+
+    def _infer_chunk(self, mode: str, label: str, system_prompt: str, chunk: list[dict], args, repair: bool = True):
+        """Codifica e envia um bloco ao LLM, reaproveitando a resposta do diário ao retomar.
+
+        Resposta cortada ou inválida: aproveita os itens completos e pede de novo
+        (uma vez) só as imagens que ficaram de fora.
+        """
+        ids = [img.get("id") for img in chunk]
+        if self.journal is not None:
+            cached = self.journal.cached_answer(mode, ids)
+            if cached is not None:
+                logging.info(f"{label} Resposta reaproveitada da execução {self.journal.run_id}")
+                print(f"{label} Resposta reaproveitada da execução {self.journal.run_id}")
+                self._emit(STAGE_INFER, mode, ids)
+                return cached["answer"], cached["meta"]
+
         # progress_callback não definido, definir como None por padrão
-        vision_images, vision_errors = prepare_vision_payloads_async(
-            sample,
-            attach_images=not args.text_only,
-            progress_callback=None,
-            max_workers=4
-        )
+        sheets: list[ContactSheet] = []
+        with span("encode_chunk", cat="encode", images=len(chunk)) as trace_args:
+            if getattr(args, "contact_sheet", False) and not args.text_only:
+                cols, rows = parse_grid_spec(getattr(args, "sheet_grid", "4x4"))
+                vision_images, vision_errors = prepare_contact_sheets(
+                    chunk,
+                    cols=cols,
+                    rows=rows,
+                    tile_size=getattr(args, "sheet_tile_size", 256),
+                )
+                sheets = vision_images
+            else:
+                vision_images, vision_errors = prepare_vision_payloads_async(
+                    chunk,
+                    attach_images=not args.text_only,
+                    progress_callback=None,
+                    max_workers=4,
+                    max_dimension=getattr(args, "max_dimension", 1600),
+                )
+            trace_args["encoded"] = len(vision_images)
+            trace_args["errors"] = len(vision_errors)
         
-        if not vision_images and images and not args.text_only:
+        if not vision_images and chunk and not args.text_only:
             msg = "Nenhuma imagem encontrada no disco. Verifique se o drive está montado ou se o banco de dados do Darktable está atualizado."
             logging.error({
                 "event": "vision_image_not_found",
@@ -154,30 +487,140 @@ class BatchProcessor:
             raise RuntimeError(msg)
 
         if vision_errors:
-            logging.warning(f"[{mode}] Erros de imagem: {vision_errors}")
+            logging.warning(f"{label} Erros de imagem: {vision_errors}")
+        if self.journal is not None:
+            self.journal.record(STAGE_ENCODE, mode, ids, errors=len(vision_errors))
+        self._emit(STAGE_ENCODE, mode, ids)
 
-        messages = build_messages(system_prompt, sample, vision_images, self.provider_type)
+        messages = build_messages(system_prompt, chunk, vision_images, self.provider_type)
         
         # Calculate approximate payload size
         import json as json_module
-        payload_size_mb = len(json_module.dumps(messages)) / (1024 * 1024)
+        with span("serialize_messages", cat="encode") as trace_args:
+            payload_bytes = len(json_module.dumps(messages))
+            trace_args["bytes"] = payload_bytes
+        payload_size_mb = payload_bytes / (1024 * 1024)
         
         logging.info(
-            f"[{mode}] Enviando {len(vision_images)} imagem(ns) ao LLM ({self.provider.model}, payload: {payload_size_mb:.1f} MB)..."
+            f"{label} Enviando {len(vision_images)} imagem(ns) ao LLM ({self.provider.model}, payload: {payload_size_mb:.1f} MB)..."
         )
-        logging.debug(f"[{mode}] Prompt System: {system_prompt[:100]}...")
+        logging.debug(f"{label} Prompt System: {system_prompt[:100]}...")
         
-        answer, meta = self.provider.chat(messages)
+        with span("llm:chat", cat="llm", model=self.provider.model, images=len(vision_images)) as trace_args:
+            answer, meta = self.provider.chat(messages, schema=self._schema(mode, args))
+            trace_args["answer_bytes"] = len(answer or "")
         
         answer_size_kb = len(answer) / 1024 if answer else 0
         logging.info(
-            f"[{mode}] Resposta recebida ({meta.get('latency_ms', 0)}ms, {answer_size_kb:.1f} KB)"
+            f"{label} Resposta recebida ({meta.get('latency_ms', 0)}ms, {answer_size_kb:.1f} KB)"
         )
 
-        log_file = save_log(mode, args.source, sample, answer, extra={"llm": meta})
-        logging.info(f"[{mode}] Log: {log_file}")
-        
-        return answer, log_file
+        with span("parse_plan", cat="llm") as trace_args:
+            plan, complete = parse_plan(answer)
+            trace_args["complete"] = complete
+        if not complete and plan is not None:
+            # Itens completos de uma resposta cortada viram JSON válido
+            answer = json.dumps(plan, ensure_ascii=False)
+
+        # Resolve as grades para IDs reais antes de gravar: a resposta do diário
+        # precisa ser utilizável ao retomar sem recodificar as imagens
+        if sheets and answer:
+            answer = resolve_sheet_answer(answer, sheets)
+        if not complete and repair:
+            answer, meta = self._repair_chunk(mode, label, system_prompt, chunk, answer, meta, args)
+        if self.journal is not None:
+            self.journal.record(STAGE_INFER, mode, ids, answer=answer, meta=meta)
+        if repair:
+            self._emit(STAGE_INFER, mode, ids)
+        return answer, meta
+
+    def _repair_chunk(self, mode: str, label: str, system_prompt: str, chunk: list[dict], answer, meta, args):
+        """Segunda chamada só com as imagens que a resposta inválida/cortada deixou de fora."""
+        plan, _ = parse_plan(answer)
+        missing = set(missing_ids(plan, [img.get("id") for img in chunk]))
+        if not missing:
+            return answer, meta
+        logging.warning({
+            "event": "llm_answer_incomplete",
+            "mode": mode,
+            "salvaged": len(chunk) - len(missing),
+            "missing": len(missing),
+        })
+        print(f"{label} Resposta incompleta; pedindo de novo {len(missing)} imagem(ns).")
+        retry = [img for img in chunk if img.get("id") in missing]
+        try:
+            repaired, repair_meta = self._infer_chunk(mode, f"{label} [reparo]", system_prompt, retry, args, repair=False)
+        except Exception as e:
+            logging.error({"event": "llm_repair_error", "mode": mode, "error": str(e)})
+            return answer, meta
+        if plan is None:
+            return repaired, {**meta, "repair": repair_meta}
+        return merge_chunk_answers([answer, repaired]), {**meta, "repair": repair_meta}
+
+    def _cascade_triage(self, mode: str, sample: list[dict], args) -> list[dict]:
+        """Primeira passada barata: heurística de metadados e, opcionalmente, modelo pequeno.
+
+        Retorna a parte da amostra que ainda precisa do modelo de visão. No rating só
+        as ambíguas seguem; nos demais modos as rejeitadas saem e as mantidas seguem.
+        """
+        rules = TriageRules(keep_min_rating=getattr(args, "keep_min_rating", 4))
+        result = triage_images(sample, rules)
+        triage_model = getattr(args, "triage_model", None)
+        if triage_model and result.ambiguous and not args.text_only:
+            self._triage_with_model(mode, result, triage_model, args)
+        self._triage = result
+
+        summary = result.summary()
+        logging.info(
+            f"[{mode}] Triagem: {summary['keep']} manter, {summary['reject']} descartar, "
+            f"{summary['ambiguous']} ambíguas"
+        )
+        print(
+            f"[{mode}] Triagem: {summary['keep']} manter, {summary['reject']} descartar, "
+            f"{summary['ambiguous']} ambíguas"
+        )
+
+        if mode == "rating":
+            remaining = {id(img) for img in result.ambiguous}
+        else:
+            remaining = {id(img) for img in result.keep + result.ambiguous}
+        return [img for img in sample if id(img) in remaining]
+
+    def _triage_with_model(self, mode: str, result: TriageResult, model: str, args) -> None:
+        """Passa as ambíguas por um modelo pequeno com miniaturas. Falhas mantêm as imagens ambíguas."""
+        try:
+            system_prompt = get_prompt("triage", "basico")
+            thumbs, errors = prepare_vision_payloads(
+                result.ambiguous,
+                attach_images=True,
+                max_dimension=getattr(args, "triage_max_dimension", 256),
+            )
+            if errors:
+                logging.warning(f"[{mode}] Erros de imagem na triagem: {errors}")
+            if not thumbs:
+                return
+            messages = build_messages(system_prompt, result.ambiguous, thumbs, self.provider_type)
+            answer, meta = self.provider.with_model(model).chat(messages, schema=self._schema("triage", args))
+            parsed, _ = parse_plan(answer)
+            if parsed is None:
+                raise ValueError(f"resposta sem JSON: {answer[:200]!r}")
+            apply_model_decisions(result, parsed.get("decisions", []))
+            logging.info(f"[{mode}] Triagem com {model} em {meta.get('latency_ms', 0)}ms")
+        except Exception as e:
+            logging.warning({
+                "event": "triage_model_error",
+                "mode": mode,
+                "model": model,
+                "error": str(e),
+            })
+
+    def _triage_summary(self) -> Optional[dict]:
+        if self._triage is None:
+            return None
+        return {
+            **self._triage.summary(),
+            "reasons": self._triage.reasons,
+        }
 
     def run_mode_rating(self, args):
         import time
@@ -185,13 +628,17 @@ class BatchProcessor:
         success = False
         error_msg = None
         answer, _ = self._process_common("rating", args)
-        if not answer:
+        # Rejeições decididas na triagem entram como rating -1 sem passar pelo VLM
+        triage_edits = reject_edits(self._triage) if self._triage else []
+        if not answer and not triage_edits:
             self._log_metric("rating", success=False, duration=time.time()-t0, extra={"error": "no_answer"})
-            return
+            return True
         try:
-            json_str = extract_json_from_markdown(answer)
-            parsed = json.loads(json_str)
-            edits = parsed.get("edits", [])
+            edits = list(triage_edits)
+            if answer:
+                json_str = extract_json_from_markdown(answer)
+                parsed = json.loads(json_str)
+                edits += parsed.get("edits", [])
         except Exception as e:
             error_msg = str(e)
             logging.error({
@@ -201,17 +648,20 @@ class BatchProcessor:
             })
             self._log_metric("rating", success=False, duration=time.time()-t0, extra={"error": error_msg})
             raise RuntimeError(f"Erro ao processar resposta do LLM: {error_msg}") from e
+        pending = set(self._pending("rating", "rating", [e.get("id") for e in edits]))
+        edits = [e for e in edits if e.get("id") in pending]
         if not edits:
             logging.info("[rating] Nenhuma edição.")
             print("[rating] Nenhuma edição.")
             self._log_metric("rating", success=True, duration=time.time()-t0, extra={"edits": 0})
-            return
+            return True
+        self._decided("rating", {e.get("id"): f"rating {e.get('rating')}" for e in edits})
         logging.info(f"[rating] {len(edits)} edições propostas:")
         print(f"[rating] {len(edits)} edições propostas:")
         for edit in edits:
             img_id = edit.get("id")
             new_rating = edit.get("rating")
-            img_meta = next((img for img in sample if img.get("id") == img_id), None)
+            img_meta = next((img for img in self._rated_pool() if img.get("id") == img_id), None)
             if img_meta:
                 filename = img_meta.get("filename", f"ID {img_id}")
                 old_rating = img_meta.get("rating", "?")
@@ -227,6 +677,7 @@ class BatchProcessor:
                 res = self.client.call_tool("apply_batch_edits", {"edits": edits})
                 result_text = res["content"][0]["text"]
                 logging.info(f"[rating] {result_text}")
+                self._mark_applied("rating", "rating", [e.get("id") for e in edits])
             success = True
         except Exception as e:
             error_msg = str(e)
@@ -236,6 +687,99 @@ class BatchProcessor:
             })
             self._log_metric("rating", success=False, duration=time.time()-t0, extra={"edits": len(edits), "error": error_msg})
             raise RuntimeError(f"Erro ao aplicar edits: {error_msg}") from e
+        return success
+
+    def _rated_pool(self) -> list[dict]:
+        """Imagens conhecidas na última chamada (amostra + rejeições da triagem)."""
+        pool = list(self._sample)
+        if self._triage is not None:
+            pool += self._triage.reject
+        return pool
+
+    def _pending(self, mode: str, action: str, ids: list) -> list:
+        """IDs ainda não aplicados nesta execução; ao retomar, pula o que já foi gravado."""
+        if self.journal is None:
+            return list(ids)
+        pending = self.journal.pending(mode, action, ids)
+        skipped = len(ids) - len(pending)
+        self._written.update(set(ids) - set(pending))
+        if skipped:
+            logging.info(f"[{mode}] {skipped} item(ns) de '{action}' já aplicados na execução {self.journal.run_id}; pulando.")
+            print(f"[{mode}] {skipped} item(ns) de '{action}' já aplicados na execução {self.journal.run_id}; pulando.")
+        return pending
+
+    def _apply_plan(self, mode: str, ops: list[dict], overwrite_labels: bool = False) -> Optional[set]:
+        """Envia as operações por imagem em uma única chamada apply_plan.
+
+        Loga o status de cada operação e retorna os IDs aplicados com sucesso
+        (None se a chamada inteira falhou).
+        """
+        try:
+            res = self.client.call_tool("apply_plan", {"ops": ops, "overwrite_labels": overwrite_labels})
+        except Exception as e:
+            logging.error({
+                "event": "apply_plan_error",
+                "mode": mode,
+                "error": str(e),
+            })
+            print(f"[{mode}] Erro ao aplicar plano: {e}")
+            return None
+        content = res.get("content", [])
+        summary = content[0].get("text", "") if content else ""
+        payload = next((c.get("json") for c in content if c.get("type") == "json"), None) or {}
+        if res.get("isError"):
+            logging.error(f"[{mode}] {summary}")
+            print(f"[{mode}] Erro ao aplicar plano: {summary}")
+            return None
+        logging.info(f"[{mode}] {summary}")
+        print(f"[{mode}] {summary}")
+        ok_ids = set()
+        for entry in payload.get("results", []):
+            if entry.get("status") == "ok":
+                ok_ids.add(entry.get("id"))
+            else:
+                detail = entry.get("error") or entry.get("status")
+                logging.warning(f"[{mode}] ID {entry.get('id')}: {detail}")
+                print(f"  ! ID {entry.get('id')}: {detail}")
+        return ok_ids
+
+    def _tag_bulk(self, mode: str, attach: dict, detach: Optional[dict] = None) -> Optional[dict]:
+        """Anexa/remove várias tags numa única chamada tag_bulk.
+
+        Retorna o JSON do servidor ({attached, detached, not_found}) ou None em erro.
+        """
+        arguments = {"attach": attach}
+        if detach:
+            arguments["detach"] = detach
+        try:
+            res = self.client.call_tool("tag_bulk", arguments)
+        except Exception as e:
+            logging.error({
+                "event": "tag_bulk_error",
+                "mode": mode,
+                "error": str(e),
+            })
+            print(f"[{mode}] Erro ao aplicar tags: {e}")
+            return None
+        content = res.get("content", [])
+        summary = content[0].get("text", "") if content else ""
+        if res.get("isError"):
+            logging.error(f"[{mode}] {summary}")
+            print(f"[{mode}] Erro ao aplicar tags: {summary}")
+            return None
+        logging.info(f"[{mode}] {summary}")
+        print(f"[{mode}] {summary}")
+        payload = next((c.get("json") for c in content if c.get("type") == "json"), None) or {}
+        for img_id in payload.get("not_found") or []:
+            logging.warning(f"[{mode}] ID {img_id}: not_found")
+            print(f"  ! ID {img_id}: not_found")
+        return payload
+
+    def _mark_applied(self, mode: str, action: str, ids: list) -> None:
+        self._written.update(ids)
+        if self.journal is not None and ids:
+            self.journal.record(STAGE_APPLY, mode, ids, action=action)
+        self._emit(STAGE_APPLY, mode, ids)
 
     def _log_metric(self, mode, success, duration, extra=None):
         """Loga métrica simples em logs/metrics.json."""
@@ -267,16 +811,16 @@ class BatchProcessor:
             logging.warning(f"Falha ao gravar métricas: {e}")
 
     def run_mode_tagging(self, args):
-        # Modular: carrega prompt via utilitário, com validação YAML
-        from prompts import get_prompt
+        # Falha cedo se o prompt for inválido (o registro mantém o arquivo em cache)
         try:
             _ = get_prompt("tagging", getattr(args, "prompt_variant", "basico"))
         except Exception as e:
             logging.error(f"Erro ao carregar prompt de tagging: {e}")
             print(f"[erro] Falha ao carregar prompt de tagging: {e}")
-            return
+            return False
         answer, _ = self._process_common("tagging", args)
-        if not answer: return
+        if not answer:
+            return True
         try:
             json_str = extract_json_from_markdown(answer)
             parsed = json.loads(json_str)
@@ -284,67 +828,100 @@ class BatchProcessor:
         except Exception as e:
             logging.error(f"[tagging] Erro JSON: {e}")
             print(f"[tagging] Erro JSON: {e}")
-            return
+            return False
+        tagged: dict = {}
+        for entry in tags:
+            for img_id in entry.get("ids", []):
+                tagged.setdefault(img_id, []).append(str(entry.get("tag")))
+        self._decided("tagging", {img_id: ", ".join(names) for img_id, names in tagged.items()})
         if self.dry_run:
             logging.info(f"[tagging] DRY-RUN. Tags: {tags}")
             print("[tagging] DRY-RUN. Tags:", tags)
-            return
+            return True
+        # Todas as tags vão numa única chamada tag_bulk ({tag: [ids]})
+        attach = {}
         for entry in tags:
             tag = entry.get("tag")
-            ids = entry.get("ids", [])
+            ids = self._pending("tagging", f"tag:{tag}", entry.get("ids", []))
             if tag and ids:
-                self.client.call_tool("tag_batch", {"tag": tag, "ids": ids})
-                tagged_files = [img.get("filename", f"ID {img.get('id')}") 
-                               for img in sample if img.get("id") in ids]
-                logging.info(f"[tagging] Tag '{tag}' aplicada em {len(ids)} foto(s):")
-                print(f"[tagging] Tag '{tag}' aplicada em {len(ids)} foto(s):")
-                for filename in tagged_files[:10]:
-                    logging.info(f"  • {filename}")
-                    print(f"  • {filename}")
-                if len(tagged_files) > 10:
-                    logging.info(f"  ... e mais {len(tagged_files) - 10} foto(s)")
-                    print(f"  ... e mais {len(tagged_files) - 10} foto(s)")
+                tag_ids = attach.setdefault(tag, [])
+                tag_ids.extend(i for i in ids if i not in tag_ids)
+        if not attach:
+            return True
+        result = self._tag_bulk("tagging", attach)
+        if result is None:
+            return False
+        not_found = set(result.get("not_found") or [])
+        self._failed.update(not_found)
+        for tag, ids in attach.items():
+            ids = [i for i in ids if i not in not_found]
+            if not ids:
+                continue
+            self._mark_applied("tagging", f"tag:{tag}", ids)
+            tagged_files = [img.get("filename", f"ID {img.get('id')}") 
+                           for img in self._sample if img.get("id") in ids]
+            logging.info(f"[tagging] Tag '{tag}' aplicada em {len(ids)} foto(s):")
+            print(f"[tagging] Tag '{tag}' aplicada em {len(ids)} foto(s):")
+            for filename in tagged_files[:10]:
+                logging.info(f"  • {filename}")
+                print(f"  • {filename}")
+            if len(tagged_files) > 10:
+                logging.info(f"  ... e mais {len(tagged_files) - 10} foto(s)")
+                print(f"  ... e mais {len(tagged_files) - 10} foto(s)")
+        return True
 
     def run_mode_export(self, args):
-        # Modular: carrega prompt via utilitário, com validação YAML
-        from prompts import get_prompt
+        # Falha cedo se o prompt for inválido (o registro mantém o arquivo em cache)
         try:
             _ = get_prompt("export", getattr(args, "prompt_variant", "basico"))
         except Exception as e:
             logging.error(f"Erro ao carregar prompt de export: {e}")
             print(f"[erro] Falha ao carregar prompt de export: {e}")
-            return
+            return False
         if not args.target_dir:
             print("[export] --target-dir obrigatório.")
-            return
+            return False
         answer, log_file = self._process_common("export", args)
-        if not answer: return
+        if not answer:
+            return True
         try:
             json_str = extract_json_from_markdown(answer)
             parsed = json.loads(json_str)
             ids = parsed.get("ids_para_exportar") or parsed.get("ids") or []
         except:
-            return
+            return False
         print(f"[export] {len(ids)} imagens para exportar.")
+        self._decided("export", {img_id: "exportar" for img_id in ids})
         if self.dry_run:
-            return
+            return True
+        ids = self._pending("export", "export", ids)
+        if not ids:
+            return True
         params = {"target_dir": args.target_dir, "ids": ids, "format": "jpg", "overwrite": False}
         res = self.client.call_tool("export_collection", params)
         print("[export] Resultado:", res["content"][0]["text"])
         if log_file:
             append_export_result_to_log(log_file, res)
+        if res.get("isError"):
+            self._failed.update(ids)
+            return False
+        # Só as exportadas entram no diário: --resume e o modo incremental repetem as que falharam
+        failed = {err.get("id") for err in extract_export_errors(res)}
+        self._failed.update(img_id for img_id in ids if img_id in failed)
+        self._mark_applied("export", "export", [img_id for img_id in ids if img_id not in failed])
+        return True
 
     def run_mode_tratamento(self, args):
-        # Modular: carrega prompt via utilitário, com validação YAML
-        from prompts import get_prompt
+        # Falha cedo se o prompt for inválido (o registro mantém o arquivo em cache)
         try:
             _ = get_prompt("tratamento", getattr(args, "prompt_variant", "basico"))
         except Exception as e:
             logging.error(f"Erro ao carregar prompt de tratamento: {e}")
             print(f"[erro] Falha ao carregar prompt de tratamento: {e}")
-            return
+            return False
         answer, _ = self._process_common("tratamento", args)
-        if not answer: return
+        if not answer:
+            return True
         try:
             json_str = extract_json_from_markdown(answer)
             parsed = json.loads(json_str)
@@ -352,26 +929,30 @@ class BatchProcessor:
         except Exception as e:
             logging.error(f"[tratamento] Erro JSON: {e}")
             print(f"[tratamento] Erro JSON: {e}")
-            return
+            return False
         if not treatments:
             logging.info("[tratamento] Nenhuma sugestão recebida.")
             print("[tratamento] Nenhuma sugestão recebida.")
-            return
+            return True
         logging.info(f"[tratamento] Processando {len(treatments)} sugestões...")
         print(f"[tratamento] Processando {len(treatments)} sugestões...")
         
-        rating_edits = []
-        color_edits = []
+        # Um único apply_plan com rating, colorlabel e estilo de cada imagem
+        ops = []
+        pending = set(self._pending("tratamento", "plan", [t.get("id") for t in treatments]))
+        generate_styles = getattr(args, "generate_styles", True) # Default to True if missing
+        generator = None
+        decisions = {}
         
         for t in treatments:
             tid = t.get("id")
             if not tid: continue
             
-            # Prepare batch edits (Ratings / Color Labels)
+            op = {"id": tid}
             if "rating" in t:
-                rating_edits.append({"id": tid, "rating": t["rating"]})
+                op["rating"] = t["rating"]
             if "color_label" in t:
-                color_edits.append({"id": tid, "color": t["color_label"]})
+                op["color"] = t["color_label"]
             
             # Handle Style Generation (Exposure)
             style_params = {}
@@ -392,91 +973,52 @@ class BatchProcessor:
                     pass
             
             # Log suggestion
-            img_meta = next((img for img in (fetch_images(self.client, args) or []) if img.get("id") == tid), None)
+            img_meta = next((img for img in self._sample if img.get("id") == tid), None)
             name = img_meta.get("filename", f"ID {tid}") if img_meta else f"ID {tid}"
             notes = t.get("notes", "")
 
             logging.info(f"  • {name}: {', '.join(changes)}")
             print(f"  • {name}: {', '.join(changes)}")
+            if changes:
+                decisions[tid] = ", ".join(changes)
             if notes:
                 logging.info(f"    Sugestão: {notes}")
                 print(f"    Sugestão: {notes}")
             
-            # Generate and Apply Style if needed
-            generate_styles = getattr(args, "generate_styles", True) # Default to True if missing
-            if generate_styles and style_params and not self.dry_run:
+            # Generate style file; import + apply happen server-side in apply_plan
+            if generate_styles and style_params and not self.dry_run and tid in pending:
                 try:
                     from style_generator import DarktableStyleGenerator
-                    generator = DarktableStyleGenerator(Path.home() / ".config/darktable/styles/mcp_generated")
+                    if generator is None:
+                        generator = DarktableStyleGenerator(Path.home() / ".config/darktable/styles/mcp_generated")
                     
                     style_name = f"MCP Auto {tid} Exp{style_params['exposure']:+.1f}"
-                    style_path = generator.generate_style(style_name, style_params)
-                    
-                    # Import and Apply (Requires new tools support)
-                    # We send the path to the server to import
-                    # Then apply by name
-                    
-                    # Tool: import_style(path)
-                    res_imp = self.client.call_tool("import_style", {"style_path": str(style_path)})
-                    
-                    # Tool: apply_style(style_name, image_id)
-                    # Note: We can batch if many images get SAME style, but here it's per-image specific
-                    res_app = self.client.call_tool("apply_style", {"style_name": style_name, "image_ids": [tid]})
-                    
-                    logging.info(f"    [style] Estilo '{style_name}' criado e aplicado.")
-                    print(f"    [style] Estilo '{style_name}' criado e aplicado.")
+                    op["style_path"] = str(generator.generate_style(style_name, style_params))
+                    op["style"] = style_name
                 except Exception as e:
-                    logging.error(f"    [style] Erro ao aplicar estilo: {e}")
-                    print(f"    [style] Erro ao aplicar estilo: {e}")
+                    logging.error(f"    [style] Erro ao gerar estilo: {e}")
+                    print(f"    [style] Erro ao gerar estilo: {e}")
             elif style_params and self.dry_run:
                 logging.info(f"    [style] DRY-RUN: Estilo seria criado comparams {style_params}")
                 print(f"    [style] DRY-RUN: Estilo seria criado comparams {style_params}")
 
-        if self.dry_run:
-            logging.info("[tratamento] DRY-RUN. Nenhuma alteração aplicada.")
-            print("[tratamento] DRY-RUN. Nenhuma alteração aplicada.")
-            return
+            if len(op) > 1 and tid in pending:
+                ops.append(op)
 
-        # Apply Ratings and Colors
-        if rating_edits and not self.dry_run:
-            try:
-                self.client.call_tool("apply_batch_edits", {"edits": rating_edits})
-                logging.info(f"[tratamento] Ratings aplicados em {len(rating_edits)} imagens.")
-                print(f"[tratamento] Ratings aplicados em {len(rating_edits)} imagens.")
-            except Exception as e:
-                logging.error(f"[tratamento] Erro ao aplicar ratings: {e}")
-                print(f"[tratamento] Erro ao aplicar ratings: {e}")
-
-        if color_edits and not self.dry_run:
-            try:
-                self.client.call_tool("set_colorlabel_batch", {"edits": color_edits, "overwrite": True})
-                logging.info(f"[tratamento] Color labels aplicados em {len(color_edits)} imagens.")
-                print(f"[tratamento] Color labels aplicados em {len(color_edits)} imagens.")
-            except Exception as e:
-                logging.error(f"[tratamento] Erro ao aplicar color labels: {e}")
-                print(f"[tratamento] Erro ao aplicar color labels: {e}")
+        self._decided("tratamento", decisions)
         if self.dry_run:
             logging.info("[tratamento] DRY-RUN. Nenhuma alteração aplicada.")
             print("[tratamento] DRY-RUN. Nenhuma alteração aplicada.")
-            return
-
-        # Apply Ratings
-        if rating_edits:
-            try:
-                self.client.call_tool("apply_batch_edits", {"edits": rating_edits})
-                print(f"[tratamento] Ratings aplicados em {len(rating_edits)} imagens.")
-            except Exception as e:
-                print(f"[tratamento] Erro ao aplicar ratings: {e}")
+            return True
 
-        # Apply Color Labels
-        if color_edits:
-            try:
-                # Group by color because API might imply single color batch or loop handles it?
-                # tool_set_colorlabel_batch takes list of {id, color}.
-                self.client.call_tool("set_colorlabel_batch", {"edits": color_edits, "overwrite": True})
-                print(f"[tratamento] Color labels aplicados em {len(color_edits)} imagens.")
-            except Exception as e:
-                print(f"[tratamento] Erro ao aplicar color labels: {e}")
+        if not ops:
+            return True
+        ok_ids = self._apply_plan("tratamento", ops, overwrite_labels=True)
+        if ok_ids is None:
+            return False
+        self._failed.update(op["id"] for op in ops if op["id"] not in ok_ids)
+        self._mark_applied("tratamento", "plan", [op["id"] for op in ops if op["id"] in ok_ids])
+        return True
     
     def run_mode_completo(self, args):
         logging.info("="*60)
@@ -486,17 +1028,18 @@ class BatchProcessor:
         print("[completo] INICIANDO PIPELINE COMPLETE (Rating -> Tagging -> Tratamento -> Export)")
         print("="*60)
         
+        # Uma etapa que falha não interrompe as seguintes, mas segura a marca d'água
         print("\n--- ETAPA 1: RATING ---\n")
-        self.run_mode_rating(args)
+        ok = self.run_mode_rating(args)
         
         print("\n--- ETAPA 2: TAGGING ---\n")
-        self.run_mode_tagging(args)
+        ok = self.run_mode_tagging(args) and ok
         
         print("\n--- ETAPA 3: TRATAMENTO ---\n")
-        self.run_mode_tratamento(args)
+        ok = self.run_mode_tratamento(args) and ok
         
         print("\n--- ETAPA 4: EXPORT ---\n")
-        self.run_mode_export(args)
+        ok = self.run_mode_export(args) and ok
         
         logging.info("\n" + "="*60)
         logging.info("[completo] PIPELINE FINALIZADO")
@@ -504,3 +1047,4 @@ class BatchProcessor:
         print("\n" + "="*60)
         print("[completo] PIPELINE FINALIZADO")
         print("="*60)
+        return ok
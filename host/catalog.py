@@ -0,0 +1,245 @@
+"""
+Catálogo do darktable em colunas, para análise local no host.
+
+``dump_catalog`` pagina a ferramenta ``catalog_dump`` do servidor e monta um
+``CatalogTable``: colunas numéricas em arrays NumPy (ou ``array.array`` sem
+NumPy) e colunas de texto/tags em listas. Filtros devolvem máscaras booleanas
+que podem ser combinadas com ``&``/``|`` e aplicadas com ``take``; assim
+amostragem, estratificação e estatísticas rodam sem novas chamadas ``list_*``.
+"""
+from __future__ import annotations
+
+import logging
+import math
+from array import array
+from collections import Counter
+from typing import Iterable, Optional
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+COLOR_NAMES = ("red", "yellow", "green", "blue", "purple")
+EXIF_FIELDS = ("exposure", "aperture", "iso", "focal_length", "crop")
+
+# coluna -> (typecode de array.array, dtype NumPy, valor para nulo)
+NUMERIC_COLUMNS = {
+    "id": ("q", "int64", -1),
+    "film_roll": ("q", "int64", -1),
+    "rating": ("b", "int8", 0),
+    "is_raw": ("b", "bool", False),
+    "colorlabels": ("B", "uint8", 0),
+    **{f"exif_{name}": ("d", "float64", math.nan) for name in EXIF_FIELDS},
+}
+
+
+def _to_array(name: str, values: list):
+    typecode, dtype, null = NUMERIC_COLUMNS[name]
+    values = [null if v is None else v for v in values]
+    if HAS_NUMPY:
+        return np.asarray(values, dtype=dtype)
+    if typecode == "d":
+        return array(typecode, (float(v) for v in values))
+    return array(typecode, (int(v) for v in values))
+
+
+class Mask:
+    """Máscara booleana sem NumPy (com NumPy, as máscaras são ``ndarray`` de bool)."""
+
+    def __init__(self, values: Iterable[bool]):
+        self.values = [bool(v) for v in values]
+
+    def __and__(self, other):
+        return Mask(a and b for a, b in zip(self.values, _mask_values(other)))
+
+    def __or__(self, other):
+        return Mask(a or b for a, b in zip(self.values, _mask_values(other)))
+
+    def __invert__(self):
+        return Mask(not v for v in self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def sum(self) -> int:
+        return sum(self.values)
+
+
+def _mask_values(mask) -> list:
+    return mask.values if isinstance(mask, Mask) else list(mask)
+
+
+def _make_mask(values: Iterable[bool]):
+    if HAS_NUMPY:
+        return np.fromiter((bool(v) for v in values), dtype=bool)
+    return Mask(values)
+
+
+class CatalogTable:
+    def __init__(self, columns: dict):
+        self.columns = columns
+        self._size = len(columns["id"]) if "id" in columns else 0
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[dict]) -> "CatalogTable":
+        """Junta blocos colunares ({fields, columns}) do catalog_dump."""
+        raw: dict = {}
+        for chunk in chunks:
+            columns = chunk.get("columns") or {}
+            for field in chunk.get("fields") or list(columns):
+                raw.setdefault(field, []).extend(columns.get(field) or [])
+        columns = {
+            name: _to_array(name, values) if name in NUMERIC_COLUMNS else values
+            for name, values in raw.items()
+        }
+        return cls(columns)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def column(self, name: str):
+        return self.columns[name]
+
+    # --- filtros (retornam máscaras) -------------------------------------
+
+    def mask_all(self):
+        if HAS_NUMPY:
+            return np.ones(self._size, dtype=bool)
+        return Mask([True] * self._size)
+
+    def min_rating(self, rating: int):
+        col = self.columns["rating"]
+        if HAS_NUMPY:
+            return col >= rating
+        return Mask(v >= rating for v in col)
+
+    def only_raw(self):
+        col = self.columns["is_raw"]
+        if HAS_NUMPY:
+            return col.astype(bool)
+        return Mask(col)
+
+    def has_color(self, color: str):
+        bit = 1 << COLOR_NAMES.index(color)
+        col = self.columns["colorlabels"]
+        if HAS_NUMPY:
+            return (col & bit) != 0
+        return Mask(v & bit for v in col)
+
+    def in_film_roll(self, film_roll: int):
+        col = self.columns["film_roll"]
+        if HAS_NUMPY:
+            return col == film_roll
+        return Mask(v == film_roll for v in col)
+
+    def path_contains(self, text: str):
+        return _make_mask(text in (p or "") for p in self.columns["path"])
+
+    def has_tag(self, tag: str):
+        return _make_mask(tag in (tags or ()) for tags in self.columns.get("tags", [[]] * self._size))
+
+    # --- seleção ---------------------------------------------------------
+
+    def indexes(self, mask) -> list[int]:
+        if HAS_NUMPY and not isinstance(mask, Mask):
+            return np.flatnonzero(mask).tolist()
+        return [i for i, keep in enumerate(_mask_values(mask)) if keep]
+
+    def take(self, selection) -> "CatalogTable":
+        """Nova tabela só com as linhas da máscara (ou lista de índices)."""
+        idx = selection if isinstance(selection, list) else self.indexes(selection)
+        columns = {}
+        for name, col in self.columns.items():
+            if HAS_NUMPY and isinstance(col, np.ndarray):
+                columns[name] = col[np.asarray(idx, dtype=np.int64)]
+            elif isinstance(col, array):
+                columns[name] = array(col.typecode, (col[i] for i in idx))
+            else:
+                columns[name] = [col[i] for i in idx]
+        return CatalogTable(columns)
+
+    def row(self, i: int) -> dict:
+        """Linha no formato de list_collection (id, path, filename, rating, is_raw, colorlabels, exif)."""
+        cols = self.columns
+
+        def value(name):
+            v = cols[name][i]
+            return v.item() if hasattr(v, "item") else v
+
+        mask = int(value("colorlabels")) if "colorlabels" in cols else 0
+        meta = {
+            "id": int(value("id")),
+            "path": cols["path"][i] if "path" in cols else None,
+            "filename": cols["filename"][i] if "filename" in cols else None,
+            "rating": int(value("rating")) if "rating" in cols else 0,
+            "is_raw": bool(value("is_raw")) if "is_raw" in cols else False,
+            "colorlabels": [name for bit, name in enumerate(COLOR_NAMES) if mask & (1 << bit)],
+        }
+        if "film_roll" in cols and value("film_roll") != -1:
+            meta["film_roll"] = int(value("film_roll"))
+        if "tags" in cols:
+            meta["tags"] = list(cols["tags"][i] or [])
+        exif = {
+            name: value(f"exif_{name}") for name in EXIF_FIELDS
+            if f"exif_{name}" in cols and not math.isnan(value(f"exif_{name}"))
+        }
+        if exif:
+            meta["exif"] = exif
+        return meta
+
+    def rows(self, selection=None) -> list[dict]:
+        idx = range(self._size) if selection is None else (
+            selection if isinstance(selection, list) else self.indexes(selection)
+        )
+        return [self.row(i) for i in idx]
+
+    # --- estatísticas ----------------------------------------------------
+
+    def stats(self) -> dict:
+        ratings = Counter(int(v) for v in self.columns.get("rating", []))
+        film_rolls = Counter(int(v) for v in self.columns.get("film_roll", []))
+        raw = self.only_raw().sum() if "is_raw" in self.columns else 0
+        tags = Counter(tag for tags in self.columns.get("tags", []) for tag in (tags or ()))
+        return {
+            "images": self._size,
+            "raw": int(raw),
+            "by_rating": dict(sorted(ratings.items())),
+            "film_rolls": len(film_rolls),
+            "largest_film_rolls": film_rolls.most_common(5),
+            "top_tags": tags.most_common(10),
+        }
+
+
+def dump_catalog(
+    client,
+    *,
+    chunk_size: int = 5000,
+    include_tags: bool = True,
+    include_exif: bool = True,
+) -> CatalogTable:
+    """Lê o catálogo inteiro via catalog_dump, um bloco por chamada."""
+    chunks = []
+    offset: Optional[int] = 0
+    while offset is not None:
+        res = client.call_tool("catalog_dump", {
+            "offset": offset,
+            "limit": chunk_size,
+            "include_tags": include_tags,
+            "include_exif": include_exif,
+        })
+        if res.get("isError"):
+            text = (res.get("content") or [{}])[0].get("text", "")
+            raise RuntimeError(f"catalog_dump falhou: {text}")
+        payload = next((c.get("json") for c in res.get("content", []) if c.get("type") == "json"), None) or {}
+        chunks.append(payload)
+        logging.debug({
+            "event": "catalog_dump_chunk",
+            "offset": offset,
+            "count": payload.get("count"),
+            "total": payload.get("total"),
+        })
+        offset = payload.get("next_offset")
+    return CatalogTable.from_chunks(chunks)
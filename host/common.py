@@ -1,33 +1,9 @@
-class IMcpClient:
-    """
-    Interface para comunicação com o servidor MCP (Lua).
-    Permite mocks, testes e extensão futura.
-    """
-    def initialize(self):
-        raise NotImplementedError
-
-    def list_tools(self):
-        raise NotImplementedError
-
-    def call_tool(self, name: str, arguments: Optional[dict] = None):
-        raise NotImplementedError
-
-    def close(self):
-        raise NotImplementedError
-
-    # Métodos utilitários opcionais:
-    def start(self):
-        pass
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc, tb):
-        self.close()
-        return False
 from __future__ import annotations
 
+import atexit
 import base64
+import gzip
+import hashlib
 import json
 import mimetypes
 import os
@@ -47,8 +23,11 @@ from typing import Iterable, List, Optional, Callable
 
 import requests
 
+from sampling import NEEDS_EXIF
+from tracing import span
+
 try:
-    from PIL import Image
+    from PIL import Image, ImageDraw, ImageFont
     HAS_PILLOW = True
 except ImportError:
     HAS_PILLOW = False
@@ -57,6 +36,48 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 LOG_DIR = BASE_DIR / "logs"
 PROMPT_DIR = BASE_DIR / "config" / "prompts"
 DT_SERVER_CMD = ["lua", str(BASE_DIR / "server" / "dt_mcp_server.lua")]
+# Estado persistente compartilhado com o servidor Lua (cache de startup, último lote)
+STATE_DIR = Path(os.environ.get("DT_MCP_STATE_DIR") or Path.home() / ".cache" / "darktable")
+APPIMAGE_CACHE_FILE = STATE_DIR / "mcp_appimage_cache.json"
+
+class RequestCancelled(Exception):
+    """Requisição HTTP abandonada porque o evento de parada foi acionado."""
+    pass
+
+
+class PromptValidationError(Exception):
+    """Erro de domínio para falhas de validação de prompt."""
+    pass
+
+
+class IMcpClient:
+    """
+    Interface para comunicação com o servidor MCP (Lua).
+    Permite mocks, testes e extensão futura.
+    """
+    def initialize(self):
+        raise NotImplementedError
+
+    def list_tools(self):
+        raise NotImplementedError
+
+    def call_tool(self, name: str, arguments: Optional[dict] = None):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    # Métodos utilitários opcionais:
+    def start(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
 
 def setup_logging(verbose: bool = False, json_logging: bool = True):
     """Setup logging with optional JSON format for structured logs."""
@@ -115,6 +136,47 @@ class VisionImage:
     data_url: str
 
 
+@dataclass
+class ContactSheet:
+    """Grade de miniaturas enviada como UMA imagem ao modelo.
+
+    ``cells`` segue a ordem das células (linha a linha, começando em 1) e
+    guarda os metadados de cada imagem; o ID é estampado em cada miniatura.
+    """
+    index: int
+    cols: int
+    rows: int
+    cells: list[dict]
+    b64: str
+    data_url: str
+
+    @property
+    def ids(self) -> list:
+        return [cell.get("id") for cell in self.cells]
+
+
+# Codificações de lista que o host entende, em ordem de preferência (negociadas no initialize)
+WIRE_ENCODINGS = ("columnar",)
+
+
+def decode_rows(payload):
+    """Converte uma lista colunar do servidor em lista de dicts.
+
+    ``{"encoding": "columnar", "fields": [...], "columns": {...}}`` vira
+    ``[{campo: valor}, ...]`` (campos nulos são omitidos, como no formato por
+    objeto); listas comuns passam direto.
+    """
+    if not (isinstance(payload, dict) and payload.get("encoding") == "columnar"):
+        return payload
+    columns = payload.get("columns") or {}
+    fields = payload.get("fields") or list(columns)
+    values = [columns.get(field) or [] for field in fields]
+    return [
+        {field: value for field, value in zip(fields, row) if value is not None}
+        for row in zip(*values)
+    ]
+
+
 class McpClient:
         # Implementa IMcpClient para permitir polimorfismo e mocks
     def __init__(
@@ -126,13 +188,13 @@ class McpClient:
         env: Optional[dict] = None,
         response_timeout: float = 30.0,
         appimage_path: Optional[str] = None,
+        encodings: Optional[Iterable[str]] = None,
+        profiling: bool = False,
+        cwd: Optional[str] = None,
     ):
-        self.command = command
+        # Cópia: o ajuste do interpretador Lua (AppImage) não pode alterar DT_SERVER_CMD global
+        self.command = list(command) if isinstance(command, list) else command
         # Se command for AppImage, ajustamos env automaticamente
-    class PromptValidationError(Exception):
-        """Erro de domínio para falhas de validação de prompt."""
-        pass
-        self._appimage_proc: Optional[subprocess.Popen] = None
         self._appimage_mount: Optional[str] = None
         self._setup_appimage_env(env, appimage_path)
         
@@ -148,9 +210,21 @@ class McpClient:
         self.log_file = log_file
         self.response_timeout = response_timeout
         self._next_req_id = 1
+        self.encodings = list(WIRE_ENCODINGS if encodings is None else encodings)
+        # Codificação aceita pelo servidor; "json" até o initialize dizer outra coisa
+        self.wire_encoding = "json"
+        self._last_response_size = 0
+        # Pede ao servidor "_timing" em cada resultado de ferramenta (também via DT_MCP_PROFILE=1)
+        self.profiling = profiling
+        # Diretório de trabalho do servidor (export_collection só aceita target_dir relativo)
+        self.cwd = cwd
         
     def _setup_appimage_env(self, env: Optional[dict], appimage_path: Optional[str] = None):
-        """Se o comando for um AppImage ou appimage_path for fornecido, monta e configura LD_LIBRARY_PATH."""
+        """Se o comando for um AppImage ou appimage_path for fornecido, monta e configura LD_LIBRARY_PATH.
+
+        A montagem é compartilhada na sessão (get_appimage_mount) e o caminho da
+        libdarktable/Lua vem do cache por hash do AppImage (resolve_appimage_layout).
+        """
         if isinstance(self.command, list):
             exe = self.command[0]
         else:
@@ -166,110 +240,58 @@ class McpClient:
              self.env = env
              return
 
-        print(f"[AppImage] Detectado: {target_appimage}")
         try:
-            # Inicia montagem
-            self._appimage_proc = subprocess.Popen(
-                [target_appimage, "--appimage-mount"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            # Lê a primeira linha para pegar o mount point
-            if self._appimage_proc.stdout:
-                mount_point = self._appimage_proc.stdout.readline().strip()
-                if mount_point:
-                    self._appimage_mount = mount_point
-                    print(f"[AppImage] Montado em: {mount_point}")
-                    
-                    # Configura ambiente
-                    new_env = (env or os.environ).copy()
-                    current_ld = new_env.get("LD_LIBRARY_PATH", "")
-                    
-                    # Caminhos comuns dentro do AppImage do Darktable
-                    libs = [
-                        f"{mount_point}/usr/lib",
-                        f"{mount_point}/usr/lib/darktable",
-                        f"{mount_point}/usr/lib/x86_64-linux-gnu",
-                        f"{mount_point}/usr/lib/x86_64-linux-gnu/darktable",
-                        f"{mount_point}/usr/lib64",
-                        f"{mount_point}/usr/lib64/darktable",
-                    ]
-                    
-                    # Lua path também pode ser necessário
-                    current_lua_path = new_env.get("LUA_PATH", "")
-                    lua_paths = [
-                         f"{mount_point}/usr/share/darktable/lua/?.lua",
-                         f"{mount_point}/usr/share/darktable/lua/?/init.lua"
-                    ]
-                    
-                    extra_ld = ":".join(libs)
-                    
-                    new_env["LD_LIBRARY_PATH"] = f"{extra_ld}:{current_ld}"
-                    # new_env["LUA_PATH"] = f"{extra_lua};{current_lua_path}" # Opcional, geralmente lua acha seus libs
-                    
-                    # IMPORTANTE: Definir DARKTABLE_LIB_PATH para o script Lua saber onde procurar se ele usar lógica customizada
-                    # Verifica onde está o libdarktable.so
-                    lib_so = Path(mount_point) / "usr/lib/libdarktable.so"
-                    if not lib_so.exists():
-                         lib_so = Path(mount_point) / "usr/lib64/libdarktable.so"
-                    
-                    if not lib_so.exists():
-                         # Tenta busca profunda se não achar nos padroes
-                         print("[AppImage] Procurando libdarktable.so...")
-                         found_libs = list(Path(mount_point).rglob("libdarktable.so"))
-                         if found_libs:
-                             lib_so = found_libs[0]
-                    
-                    if lib_so.exists():
-                        new_env["DARKTABLE_LIB_PATH"] = str(lib_so)
-                        print(f"[AppImage] Lib path: {lib_so}")
-                    
-                    # Tenta achar o darktable-cli dentro do AppImage para usar como comando CLI
-                    # Mas cuidado: rodar binários de dentro do AppImage pode falhar sem o ambiente do AppImage
-                    # Geralmente melhor usar o próprio AppImage como comando
-                    new_env["DARKTABLE_CLI_CMD"] = target_appimage 
-
-                    # Prevent Lua script from trying to re-exec or check flatpak
-                    new_env["DT_MCP_LD_REEXEC"] = "1"
-
-                    # CHECK FOR BUNDLED LUA
-                    # Se o comando original chama "lua", vamos tentar usar o lua do AppImage
-                    # para evitar ABI mismatch (ex: sistema usa 5.3, DT usa 5.4).
-                    if isinstance(self.command, list) and self.command[0] == "lua":
-                         # Check for bundled first (rare for AppImage to expose it)
-                         bundled_lua = Path(mount_point) / "usr/bin/lua"
-                         if not bundled_lua.exists():
-                             bundled_lua = Path(mount_point) / "usr/bin/luajit"
-                         
-                         if bundled_lua.exists():
-                             print(f"[AppImage] Usando Lua embutido: {bundled_lua}")
-                             self.command[0] = str(bundled_lua)
-                         else:
-                             # Fallback: check for system lua5.4 which matches Darktable's requirements
-                             sys_lua54 = shutil.which("lua5.4")
-                             if sys_lua54:
-                                  print(f"[AppImage] Usando Lua do sistema ({sys_lua54}) para compatibilidade ABI.")
-                                  self.command[0] = sys_lua54
-                    
-                    self.env = new_env
-                    return
+            mount = get_appimage_mount(target_appimage)
+            mount_point = mount.mount()
+            if mount_point:
+                self._appimage_mount = mount_point
+                layout = resolve_appimage_layout(target_appimage, mount_point)
+
+                # Configura ambiente
+                new_env = (env or os.environ).copy()
+                current_ld = new_env.get("LD_LIBRARY_PATH", "")
+                
+                # Caminhos comuns dentro do AppImage do Darktable
+                libs = [
+                    f"{mount_point}/usr/lib",
+                    f"{mount_point}/usr/lib/darktable",
+                    f"{mount_point}/usr/lib/x86_64-linux-gnu",
+                    f"{mount_point}/usr/lib/x86_64-linux-gnu/darktable",
+                    f"{mount_point}/usr/lib64",
+                    f"{mount_point}/usr/lib64/darktable",
+                ]
+                extra_ld = ":".join(libs)
+                new_env["LD_LIBRARY_PATH"] = f"{extra_ld}:{current_ld}"
+                
+                # IMPORTANTE: Definir DARKTABLE_LIB_PATH para o script Lua saber onde procurar
+                if layout.get("lib"):
+                    new_env["DARKTABLE_LIB_PATH"] = layout["lib"]
+                    logging.info(f"[AppImage] Lib path: {layout['lib']}")
+                
+                # Rodar binários de dentro do AppImage pode falhar sem o ambiente do AppImage:
+                # melhor usar o próprio AppImage como comando CLI
+                new_env["DARKTABLE_CLI_CMD"] = target_appimage 
+
+                # Prevent Lua script from trying to re-exec or check flatpak
+                new_env["DT_MCP_LD_REEXEC"] = "1"
+
+                # Se o comando chama "lua", usa o Lua do AppImage (ou lua5.4 do sistema)
+                # para evitar ABI mismatch (ex: sistema usa 5.3, DT usa 5.4).
+                if isinstance(self.command, list) and self.command[0] == "lua" and layout.get("lua"):
+                    logging.info(f"[AppImage] Usando Lua: {layout['lua']}")
+                    self.command[0] = layout["lua"]
+                
+                self.env = new_env
+                return
         except Exception as e:
             print(f"[AppImage] Erro ao montar: {e}")
-            self._cleanup_appimage()
             
         self.env = env
 
     def _cleanup_appimage(self):
-        if self._appimage_proc:
-            print("[AppImage] Desmontando...")
-            self._appimage_proc.terminate()
-            try:
-                self._appimage_proc.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                self._appimage_proc.kill()
-            self._appimage_proc = None
+        # A montagem é da sessão (compartilhada entre clientes); só soltamos a referência.
+        # unmount_all_appimages desmonta na saída do processo.
+        self._appimage_mount = None
 
     def _next_id(self) -> str:
         self.msg_id += 1
@@ -285,7 +307,20 @@ class McpClient:
         }
         line = json.dumps(req)
         logging.debug(f"MCP TX: {line}")
-        
+        # Chamada de ferramenta aparece no trace com o nome da ferramenta
+        name = f"tool:{req['params'].get('name')}" if method == "tools/call" else f"mcp:{method}"
+        with span(name, cat="mcp", bytes_out=len(line)) as trace_args:
+            resp = self._roundtrip(line)
+            trace_args["bytes_in"] = self._last_response_size
+            timing = (resp.get("result") or {}).get("_timing") if isinstance(resp.get("result"), dict) else None
+            if timing:
+                # Tempos do lado do servidor (varredura/JSON/subprocessos) no mesmo span
+                trace_args["server"] = timing
+        if "error" in resp:
+            raise RuntimeError(resp["error"])
+        return resp["result"]
+
+    def _roundtrip(self, line: str) -> dict:
         assert self.proc.stdin is not None
         self.proc.stdin.write(line + "\n")
         self.proc.stdin.flush()
@@ -308,10 +343,8 @@ class McpClient:
             raise RuntimeError(f"Servidor MCP não respondeu (stdout vazio){extra}")
             
         logging.debug(f"MCP RX: {resp_line.strip()}")
-        resp = json.loads(resp_line)
-        if "error" in resp:
-            raise RuntimeError(resp["error"])
-        return resp["result"]
+        self._last_response_size = len(resp_line)
+        return json.loads(resp_line)
 
     def _drain_stderr(self) -> str:
         assert self.proc.stderr is not None
@@ -332,17 +365,19 @@ class McpClient:
 
     def start(self):
         """Inicia o subprocesso do servidor MCP."""
-        if self.proc:
+        if self.proc and self.proc.poll() is None:
             return
 
-        self.proc = subprocess.Popen(
-            self.command,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            env=self.env
-        )
+        with span("mcp:spawn", cat="mcp"):
+            self.proc = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                env=self.env,
+                cwd=self.cwd,
+            )
 
     def __enter__(self):
         self.start()
@@ -356,10 +391,19 @@ class McpClient:
     def initialize(self):
         params = {
             "protocolVersion": self.protocol_version,
-            "capabilities": {},
+            "capabilities": {
+                "experimental": {"darktable": {"encodings": self.encodings, "profiling": self.profiling}},
+            },
             "clientInfo": self.client_info,
         }
-        return self.request("initialize", params)
+        result = self.request("initialize", params)
+        negotiated = (
+            (result.get("capabilities") or {}).get("experimental", {}).get("darktable", {}).get("encoding")
+            if isinstance(result, dict) else None
+        )
+        self.wire_encoding = negotiated or "json"
+        logging.debug(f"MCP wire encoding: {self.wire_encoding}")
+        return result
 
     def list_tools(self):
         return self.request("tools/list", {})
@@ -396,14 +440,43 @@ class McpClient:
                     stream.close()
             except Exception:
                 pass
-        
-        self.proc = None
 
 
 def _ensure_paths() -> None:
     LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 
+# Intervalo com que uma requisição em curso confere o evento de parada
+STOP_POLL_S = 0.2
+
+
+def _post_body(url: str, body: bytes, timeout: float, stop: threading.Event | None, desc: str):
+    headers = {"Content-Type": "application/json"}
+    if stop is None:
+        return requests.post(url, data=body, headers=headers, timeout=timeout)
+
+    # A chamada roda numa thread auxiliar e a chamadora confere a parada a cada
+    # STOP_POLL_S. Ao parar, a thread é abandonada: termina sozinha quando o servidor
+    # responder ou o timeout vencer, e a resposta é descartada.
+    outcome: dict = {}
+
+    def worker():
+        try:
+            outcome["resp"] = requests.post(url, data=body, headers=headers, timeout=timeout)
+        except BaseException as exc:
+            outcome["error"] = exc
+
+    thread = threading.Thread(target=worker, name="http-post", daemon=True)
+    thread.start()
+    while thread.is_alive():
+        thread.join(STOP_POLL_S)
+        if thread.is_alive() and stop.is_set():
+            raise RequestCancelled(f"{desc} interrompido")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["resp"]
+
+
 def post_json_with_retries(
     url: str,
     payload: dict,
@@ -412,6 +485,7 @@ def post_json_with_retries(
     retries: int = 1,
     retry_delay: float = 1.0,
     description: str | None = None,
+    stop: threading.Event | None = None,
 ):
     """Faz POST JSON com retries curtos e logs de tentativa.
 
@@ -429,6 +503,9 @@ def post_json_with_retries(
         Intervalo entre tentativas, em segundos.
     description: str | None
         Texto amigável para logs. Se omitido, usa a própria URL.
+    stop: threading.Event | None
+        Quando acionado, abandona a espera (inclusive de uma resposta em curso)
+        com ``RequestCancelled`` em vez de aguardar o ``timeout``.
     """
 
     desc = description or f"POST {url}"
@@ -436,10 +513,20 @@ def post_json_with_retries(
     last_error: Exception | None = None
     last_timeout_msg: str | None = None
 
+    # Serializa uma vez só (as novas tentativas reenviam o mesmo corpo)
+    with span("serialize_payload", cat="http") as trace_args:
+        body = json.dumps(payload, allow_nan=False).encode("utf-8")
+        trace_args["bytes"] = len(body)
+
     for attempt in range(1, attempts + 1):
+        if stop is not None and stop.is_set():
+            raise RequestCancelled(f"{desc} interrompido")
         started = time.time()
         try:
-            resp = requests.post(url, json=payload, timeout=timeout)
+            with span("http:post", cat="http", desc=desc, attempt=attempt, bytes_out=len(body)) as trace_args:
+                resp = _post_body(url, body, timeout, stop, desc)
+                trace_args["status"] = resp.status_code
+                trace_args["bytes_in"] = len(resp.content or b"")
             elapsed_ms = int((time.time() - started) * 1000)
             if attempt > 1:
                 logging.info({
@@ -472,7 +559,10 @@ def post_json_with_retries(
             })
 
         if attempt < attempts:
-            time.sleep(retry_delay)
+            if stop is None:
+                time.sleep(retry_delay)
+            elif stop.wait(retry_delay):
+                raise RequestCancelled(f"{desc} interrompido")
 
     if last_timeout_msg:
         raise RuntimeError(last_timeout_msg)
@@ -504,8 +594,8 @@ def _flatpak_darktable_available() -> bool:
     return False
 
 
-def _find_appimage() -> str | None:
-    """Procura por um AppImage do Darktable em locais comuns."""
+def _scan_for_appimage() -> str | None:
+    """Procura por um AppImage do Darktable em locais comuns (varredura de disco)."""
     # Prioritize specific known paths to avoid slow recursion
     known_paths = [
         Path.home() / "Apps/Darktable/Darktable.AppImage",
@@ -555,6 +645,192 @@ def _find_appimage() -> str | None:
     return None
 
 
+# Resultado da última busca: (instante, caminho). Caminho achado vale enquanto existir;
+# ausência é revalidada após APPIMAGE_MISS_TTL segundos.
+_appimage_lookup: Optional[tuple[float, Optional[str]]] = None
+APPIMAGE_MISS_TTL = 60.0
+
+
+def _find_appimage() -> str | None:
+    """Localiza o AppImage do Darktable, reaproveitando a última busca (memória e disco)."""
+    global _appimage_lookup
+    if _appimage_lookup is not None:
+        found_at, cached = _appimage_lookup
+        if cached and Path(cached).exists():
+            return cached
+        if not cached and time.time() - found_at < APPIMAGE_MISS_TTL:
+            return None
+
+    last = _load_appimage_cache().get("last_found")
+    if last and Path(last).exists():
+        _appimage_lookup = (time.time(), last)
+        return last
+
+    found = _scan_for_appimage()
+    _appimage_lookup = (time.time(), found)
+    if found:
+        cache = _load_appimage_cache()
+        cache["last_found"] = found
+        _save_appimage_cache(cache)
+    return found
+
+
+def _load_appimage_cache() -> dict:
+    try:
+        data = json.loads(APPIMAGE_CACHE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_appimage_cache(data: dict) -> None:
+    try:
+        APPIMAGE_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        APPIMAGE_CACHE_FILE.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    except OSError as e:
+        logging.warning(f"[AppImage] Falha ao gravar cache: {e}")
+
+
+def appimage_digest(appimage_path: str, cache: Optional[dict] = None) -> str:
+    """SHA-256 do AppImage, recalculado só quando tamanho ou mtime mudam."""
+    path = Path(appimage_path).resolve()
+    stat = path.stat()
+    cache = cache if cache is not None else _load_appimage_cache()
+    files = cache.setdefault("files", {})
+    known = files.get(str(path))
+    if known and known.get("size") == stat.st_size and known.get("mtime_ns") == stat.st_mtime_ns:
+        return known["sha256"]
+
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    files[str(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+    return files[str(path)]["sha256"]
+
+
+def _discover_appimage_layout(mount_point: str) -> dict:
+    """Procura libdarktable.so e um Lua embutido dentro da montagem (caminhos relativos)."""
+    root = Path(mount_point)
+    lib_rel = None
+    for candidate in ("usr/lib/libdarktable.so", "usr/lib64/libdarktable.so"):
+        if (root / candidate).exists():
+            lib_rel = candidate
+            break
+    if lib_rel is None:
+        # Busca profunda só na primeira vez para cada AppImage; o resultado vai para o cache
+        print("[AppImage] Procurando libdarktable.so...")
+        found_libs = list(root.rglob("libdarktable.so"))
+        if found_libs:
+            lib_rel = str(found_libs[0].relative_to(root))
+
+    lua_rel = None
+    for candidate in ("usr/bin/lua", "usr/bin/luajit"):
+        if (root / candidate).exists():
+            lua_rel = candidate
+            break
+    return {"lib_rel": lib_rel, "lua_rel": lua_rel}
+
+
+def resolve_appimage_layout(appimage_path: str, mount_point: str) -> dict:
+    """Caminhos absolutos da libdarktable e do interpretador Lua para uma montagem.
+
+    O layout interno é cacheado em disco por hash do AppImage, evitando a
+    varredura recursiva da imagem a cada execução.
+    """
+    cache = _load_appimage_cache()
+    digest = appimage_digest(appimage_path, cache)
+    layouts = cache.setdefault("layouts", {})
+    layout = layouts.get(digest)
+    root = Path(mount_point)
+    if layout is None or (layout.get("lib_rel") and not (root / layout["lib_rel"]).exists()):
+        layout = _discover_appimage_layout(mount_point)
+        layouts[digest] = layout
+    _save_appimage_cache(cache)
+
+    lua = None
+    if layout.get("lua_rel"):
+        lua = str(root / layout["lua_rel"])
+    else:
+        # Fallback: lua5.4 do sistema, compatível com o que o Darktable exige
+        lua = shutil.which("lua5.4")
+    return {
+        "lib": str(root / layout["lib_rel"]) if layout.get("lib_rel") else None,
+        "lua": lua,
+    }
+
+
+class AppImageMount:
+    """Montagem ``--appimage-mount`` mantida viva durante a sessão (host, GUI ou daemon)."""
+
+    def __init__(self, appimage_path: str):
+        self.appimage_path = str(appimage_path)
+        self.proc: Optional[subprocess.Popen] = None
+        self.mount_point: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def is_alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None and bool(self.mount_point)
+
+    def mount(self) -> Optional[str]:
+        with self._lock:
+            if self.is_alive():
+                return self.mount_point
+            self.unmount()
+            print(f"[AppImage] Detectado: {self.appimage_path}")
+            self.proc = subprocess.Popen(
+                [self.appimage_path, "--appimage-mount"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+            # A primeira linha é o ponto de montagem
+            mount_point = self.proc.stdout.readline().strip() if self.proc.stdout else ""
+            if not mount_point:
+                self.unmount()
+                return None
+            self.mount_point = mount_point
+            print(f"[AppImage] Montado em: {mount_point}")
+            return mount_point
+
+    def unmount(self) -> None:
+        if self.proc:
+            if self.proc.poll() is None:
+                print("[AppImage] Desmontando...")
+                self.proc.terminate()
+                try:
+                    self.proc.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    self.proc.kill()
+            self.proc = None
+        self.mount_point = None
+
+
+_appimage_mounts: dict[str, AppImageMount] = {}
+_appimage_mounts_lock = threading.Lock()
+
+
+def get_appimage_mount(appimage_path: str) -> AppImageMount:
+    """Montagem compartilhada por caminho de AppImage (uma por processo)."""
+    key = str(Path(appimage_path).resolve())
+    with _appimage_mounts_lock:
+        mount = _appimage_mounts.get(key)
+        if mount is None:
+            mount = AppImageMount(appimage_path)
+            _appimage_mounts[key] = mount
+        return mount
+
+
+def unmount_all_appimages() -> None:
+    with _appimage_mounts_lock:
+        for mount in _appimage_mounts.values():
+            mount.unmount()
+        _appimage_mounts.clear()
+
+
+atexit.register(unmount_all_appimages)
+
+
 def _suggested_darktable_cli() -> str | None:
     override = os.environ.get("DARKTABLE_CLI_CMD")
     if override:
@@ -614,40 +890,18 @@ def check_dependencies(binaries: Iterable[str], *, exit_on_success: bool = True)
 def load_prompt(
     mode: str, prompt_file: Optional[str] = None, *, variant: str = "basico"
 ) -> str:
+    """Texto completo do prompt (com cabeçalho), via registro de prompts em cache."""
+    from prompts import REGISTRY
+
     if prompt_file:
         path = Path(prompt_file)
     else:
-        default_map = {
-            "rating": {
-                "basico": "rating_basico.md",
-                "avancado": "rating_avancado.md",
-            },
-            "tagging": {
-                "basico": "tagging_cliente.md",
-                "avancado": "tagging_avancado.md",
-            },
-            "export": {
-                "basico": "export_job.md",
-                "avancado": "export_avancado.md",
-            },
-            "tratamento": {
-                "basico": "tratamento_basico.md",
-                "avancado": "tratamento_avancado.md",
-            },
-            "completo": "completo.md",
-        }
-        mode_entry = default_map.get(mode)
-        if not mode_entry:
-            raise ValueError(f"Modo desconhecido para prompt: {mode}")
-
-        if isinstance(mode_entry, dict):
-            fname = mode_entry.get(variant) or mode_entry.get("basico")
-        else:
-            fname = mode_entry
-
-        if not fname:
+        prompt = REGISTRY.find(mode, variant)
+        if prompt is None and variant != "basico":
+            prompt = REGISTRY.find(mode, "basico")
+        if prompt is None:
             raise ValueError(f"Prompt não configurado para modo={mode} variante={variant}")
-        path = PROMPT_DIR / fname
+        return prompt.text
 
     if not path.exists():
             logging.error({
@@ -657,7 +911,7 @@ def load_prompt(
                 "path": str(path),
             })
             raise PromptValidationError(f"Prompt não encontrado: {path}")
-    return path.read_text(encoding="utf-8")
+    return REGISTRY.load_path(path).text
 
 
 def encode_image_to_base64(image_path: Path, max_dimension: int = 1600) -> tuple[str, str]:
@@ -666,6 +920,13 @@ def encode_image_to_base64(image_path: Path, max_dimension: int = 1600) -> tuple
     e retorna (b64_string, data_url).
     Converte para JPEG para reduzir tamanho de tráfego, a menos que falhe.
     """
+    with span("encode_image", cat="encode", file=image_path.name) as trace_args:
+        b64, data_url = _encode_image_to_base64(image_path, max_dimension)
+        trace_args["bytes_out"] = len(b64)
+    return b64, data_url
+
+
+def _encode_image_to_base64(image_path: Path, max_dimension: int) -> tuple[str, str]:
     mime, _ = mimetypes.guess_type(image_path.name)
     mime = mime or "image/jpeg"
 
@@ -707,7 +968,8 @@ def encode_image_to_base64(image_path: Path, max_dimension: int = 1600) -> tuple
 def prepare_vision_payloads(
     images: Iterable[dict], 
     attach_images: bool = True,
-    progress_callback: Optional[Callable[[int, int, str], None]] = None
+    progress_callback: Optional[Callable[[int, int, str], None]] = None,
+    max_dimension: int = 1600,
 ):
     payloads: list[VisionImage] = []
     errors: list[str] = []
@@ -734,7 +996,7 @@ def prepare_vision_payloads(
             original_size_mb = 0
         
         try:
-            b64, data_url = encode_image_to_base64(image_path)
+            b64, data_url = encode_image_to_base64(image_path, max_dimension)
             b64_size_kb = len(b64) / 1024
             total_b64_size += len(b64)
             
@@ -775,7 +1037,8 @@ def prepare_vision_payloads_async(
     images: Iterable[dict], 
     attach_images: bool = True,
     progress_callback: Optional[Callable[[int, int, str], None]] = None,
-    max_workers: int = 4
+    max_workers: int = 4,
+    max_dimension: int = 1600,
 ):
     """
     Asynchronous version of prepare_vision_payloads using ThreadPoolExecutor.
@@ -788,6 +1051,7 @@ def prepare_vision_payloads_async(
         attach_images: Whether to attach images or not
         progress_callback: Optional callback for progress updates (current, total, message)
         max_workers: Maximum number of worker threads (default: 4)
+        max_dimension: Maior lado (px) da imagem enviada ao modelo (default: 1600)
     
     Returns:
         Tuple of (payloads list, errors list)
@@ -823,7 +1087,7 @@ def prepare_vision_payloads_async(
             original_size_mb = 0
         
         try:
-            b64, data_url = encode_image_to_base64(image_path)
+            b64, data_url = encode_image_to_base64(image_path, max_dimension)
             b64_size_kb = len(b64) / 1024
             
             # Thread-safe updates
@@ -891,15 +1155,176 @@ def prepare_vision_payloads_async(
 
 
 
+def parse_grid_spec(spec: str) -> tuple[int, int]:
+    """Converte '4x4' (colunas x linhas) em (4, 4)."""
+    try:
+        cols_str, rows_str = spec.lower().split("x", 1)
+        cols, rows = int(cols_str), int(rows_str)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Grade inválida: {spec!r} (use o formato COLUNASxLINHAS, ex.: 4x4)")
+    if cols < 1 or rows < 1:
+        raise ValueError(f"Grade inválida: {spec!r} (colunas e linhas devem ser >= 1)")
+    return cols, rows
+
+
+def _load_label_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 não aceita tamanho na fonte padrão
+        return ImageFont.load_default()
+
+
+def _render_contact_tile(image_path: Path, label: str, tile_size: int, font, label_height: int):
+    tile = Image.new("RGB", (tile_size, tile_size), (24, 24, 24))
+    with Image.open(image_path) as img:
+        # draft() permite ao decoder JPEG reduzir a escala já na leitura
+        img.draft("RGB", (tile_size, tile_size))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((tile_size, tile_size - label_height))
+        offset_x = (tile_size - img.width) // 2
+        offset_y = label_height + (tile_size - label_height - img.height) // 2
+        tile.paste(img, (offset_x, offset_y))
+
+    draw = ImageDraw.Draw(tile)
+    draw.rectangle([(0, 0), (tile_size, label_height)], fill=(0, 0, 0))
+    draw.text((4, 1), label, fill=(255, 255, 0), font=font)
+    return tile
+
+
+def prepare_contact_sheets(
+    images: Iterable[dict],
+    *,
+    cols: int = 4,
+    rows: int = 4,
+    tile_size: int = 256,
+    progress_callback: Optional[Callable[[int, int, str], None]] = None,
+):
+    """Agrupa as imagens em grades (contact sheets) com o ID estampado em cada célula.
+
+    Modelos de visão locais gastam um orçamento fixo de tokens por imagem; juntar
+    ``cols * rows`` miniaturas numa única imagem reduz esse custo em passes
+    grosseiros (ex.: primeira triagem). Retorna (sheets, errors) como
+    ``prepare_vision_payloads``.
+    """
+    sheets: list[ContactSheet] = []
+    errors: list[str] = []
+
+    if not HAS_PILLOW:
+        errors.append("Pillow não instalado; contact sheets indisponíveis")
+        return sheets, errors
+
+    images_list = list(images)
+    per_sheet = cols * rows
+    label_height = max(14, tile_size // 8)
+    font = _load_label_font(label_height - 4)
+
+    tiles: list[tuple[dict, "Image.Image"]] = []
+    for idx, img in enumerate(images_list, 1):
+        image_path = Path(img.get("path", "")) / str(img.get("filename", ""))
+        try:
+            tile = _render_contact_tile(image_path, f"ID {img.get('id')}", tile_size, font, label_height)
+        except FileNotFoundError:
+            errors.append(f"Arquivo não encontrado: {image_path}")
+            continue
+        except OSError as exc:
+            errors.append(f"Falha ao ler {image_path}: {exc}")
+            continue
+        tiles.append((img, tile))
+        if progress_callback and (idx % 10 == 0 or idx == 1 or idx == len(images_list)):
+            progress_callback(idx, len(images_list), "Montando contact sheets")
+
+    for start in range(0, len(tiles), per_sheet):
+        chunk = tiles[start:start + per_sheet]
+        sheet_rows = min(rows, (len(chunk) + cols - 1) // cols)
+        canvas = Image.new("RGB", (cols * tile_size, sheet_rows * tile_size), (0, 0, 0))
+        for pos, (_, tile) in enumerate(chunk):
+            canvas.paste(tile, ((pos % cols) * tile_size, (pos // cols) * tile_size))
+
+        buffer = io.BytesIO()
+        canvas.save(buffer, format="JPEG", quality=85)
+        b64 = base64.b64encode(buffer.getvalue()).decode("ascii")
+        sheets.append(
+            ContactSheet(
+                index=len(sheets) + 1,
+                cols=cols,
+                rows=sheet_rows,
+                cells=[meta for meta, _ in chunk],
+                b64=b64,
+                data_url=f"data:image/jpeg;base64,{b64}",
+            )
+        )
+
+    if sheets:
+        logging.info(
+            f"{len(tiles)} imagem(ns) agrupada(s) em {len(sheets)} contact sheet(s) "
+            f"({cols}x{rows}, células de {tile_size}px)"
+        )
+
+    return sheets, errors
+
+
+def resolve_contact_sheet_ids(entries: list[dict], sheets: list[ContactSheet]) -> list[dict]:
+    """Mapeia a resposta do modelo de volta para os IDs presentes nas grades.
+
+    Aceita entradas com ``id`` (o ID estampado na célula), ``ids`` (lista) ou
+    a referência posicional ``sheet``/``cell`` (ambos a partir de 1). Entradas
+    que não correspondem a nenhuma célula são descartadas.
+    """
+    known = {cell_id for sheet in sheets for cell_id in sheet.ids}
+    by_position = {
+        (sheet.index, pos): cell_id
+        for sheet in sheets
+        for pos, cell_id in enumerate(sheet.ids, 1)
+    }
+
+    resolved: list[dict] = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        item = dict(entry)
+        if "id" not in item and "sheet" in item and "cell" in item:
+            try:
+                item["id"] = by_position.get((int(item["sheet"]), int(item["cell"])))
+            except (TypeError, ValueError):
+                item["id"] = None
+        if "ids" in item:
+            item["ids"] = [i for i in item.get("ids") or [] if i in known]
+            if item["ids"]:
+                resolved.append(item)
+            continue
+        if item.get("id") in known:
+            resolved.append(item)
+        else:
+            logging.warning(f"[contact-sheet] Resposta ignorada (ID fora das grades): {entry}")
+    return resolved
+
+
 def fallback_user_prompt(sample: list[dict]) -> str:
     return "Lista (amostra) de imagens do darktable:\n" + json.dumps(sample, ensure_ascii=False)
 
 
-def fetch_images(client: McpClient, args) -> list[dict]:
+class ChangeFeed(list):
+    """Imagens listadas; em list_changed_since, com a marca d'água do servidor.
+
+    ``watermark`` é o ``os.time()`` do darktable no início da varredura (None nas
+    outras listagens): a base de --incremental/--watch, nunca o relógio do host.
+    """
+
+    def __init__(self, images=(), watermark: Optional[float] = None):
+        super().__init__(images)
+        self.watermark = watermark
+
+
+def fetch_images(client: McpClient, args) -> ChangeFeed:
     params = {
         "min_rating": args.min_rating,
         "only_raw": bool(args.only_raw),
     }
+    if getattr(args, "cascade", False) or getattr(args, "sampling", None) in NEEDS_EXIF:
+        # Triagem em cascata (velocidade/focal) e as amostragens de sampling.NEEDS_EXIF usam EXIF
+        params["include_exif"] = True
 
     if args.source == "all":
         tool_name = "list_collection"
@@ -921,9 +1346,31 @@ def fetch_images(client: McpClient, args) -> list[dict]:
     else:
         raise ValueError(f"source inválido: {args.source}")
 
+    since = getattr(args, "changed_since", None)
+    if since is not None:
+        # --incremental: mesmos filtros, só o que mudou desde a marca d'água
+        tool_name = "list_changed_since"
+        params["since"] = since
+        if getattr(args, "changed_after_id", None) is not None:
+            params["after_id"] = args.changed_after_id
+
     result = client.call_tool(tool_name, params)
-    images = result["content"][0]["json"]
-    return images
+    content = result["content"]
+    with span("decode_rows", cat="mcp") as trace_args:
+        images = decode_rows(content[0]["json"])
+        trace_args["images"] = len(images)
+    if since is None:
+        return ChangeFeed(images)
+
+    feed_info = content[1].get("json") if len(content) > 1 else None
+    skip = {img_id: changed_at for img_id, changed_at in getattr(args, "changed_skip", None) or []}
+    if skip:
+        # Gravadas por uma execução anterior e sem mudança desde então (ver BatchProcessor._skip_written)
+        images = [
+            img for img in images
+            if img.get("id") not in skip or (img.get("changed_at") or 0) > skip[img.get("id")]
+        ]
+    return ChangeFeed(images, (feed_info or {}).get("watermark"))
 
 
 
@@ -932,6 +1379,42 @@ def list_available_collections(client) -> list[dict]:
     return res["content"][0]["json"]
 
 
+def server_stats(client, reset: bool = False) -> dict:
+    """Estatísticas acumuladas por ferramenta (server_stats do servidor Lua)."""
+    res = client.call_tool("server_stats", {"reset": True} if reset else {})
+    return next((c.get("json") for c in res.get("content", []) if c.get("type") == "json"), None) or {}
+
+
+def server_time(client) -> float:
+    """Relógio do servidor (darktable), base das marcas d'água.
+
+    Servidores sem ``server_time`` no server_stats recaem no relógio do host.
+    """
+    now = server_stats(client).get("server_time")
+    if now is None:
+        logging.warning({"event": "server_time_unavailable"})
+        return float(int(time.time()))
+    return now
+
+
+def format_server_stats(stats: dict) -> list[str]:
+    """Uma linha por ferramenta, da mais cara para a mais barata."""
+    lines = []
+    if stats.get("clock") and stats["clock"] != "socket.gettime":
+        # Sem luasocket: varredura/JSON em tempo de CPU, subprocessos e total em segundos inteiros
+        lines.append(f"relógio {stats['clock']}: tempos de subprocesso e total com resolução de 1 s")
+    tools = stats.get("tools") or {}
+    for name, entry in sorted(tools.items(), key=lambda item: -item[1].get("total_ms", 0)):
+        calls = entry.get("calls") or 1
+        counters = ", ".join(f"{k}={v}" for k, v in sorted((entry.get("counters") or {}).items()))
+        lines.append(
+            f"{name}: {entry.get('calls')} chamada(s), média {entry.get('total_ms', 0) / calls:.1f} ms "
+            f"(varredura {entry.get('scan_ms', 0):.0f} ms, JSON {entry.get('encode_ms', 0):.0f} ms, "
+            f"subprocessos {entry.get('subprocess_ms', 0):.0f} ms)" + (f" [{counters}]" if counters else "")
+        )
+    return lines
+
+
 def probe_darktable_state(
     protocol_version: str,
     client_info: dict,
@@ -954,9 +1437,9 @@ def probe_darktable_state(
         "missing_dependencies": missing,
     }
 
+    appimage_path = _find_appimage()
     if missing:
         # Se falta algo, antes de desistir, vemos se achamos um AppImage
-        appimage_path = _find_appimage()
         if appimage_path:
              print(f"[probe] AppImage encontrado: {appimage_path}")
              # Nesse caso, 'missing' pode conter 'darktable-cli', mas o AppImage supre isso.
@@ -966,7 +1449,6 @@ def probe_darktable_state(
 
     try:
         # Se achou appimage, passa ele
-        appimage_path = _find_appimage()
         client = McpClient(
             DT_SERVER_CMD, 
             protocol_version, 
@@ -1020,28 +1502,95 @@ def probe_darktable_state(
         client.close()
 
 
-def save_log(mode: str, source: str, images: list[dict], model_answer: str, extra=None):
+# Log compacto (--compact-log): eventos JSON-lines em gzip, um membro gzip por append
+COMPACT_LOG_SUFFIX = ".jsonl.gz"
+
+
+def is_compact_log(log_file: Path) -> bool:
+    return Path(log_file).name.endswith(COMPACT_LOG_SUFFIX)
+
+
+def sample_hash(images: list[dict]) -> str:
+    """SHA-256 da amostra canônica: identifica o que foi enviado sem gravar a amostra inteira."""
+    canonical = json.dumps(images, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def append_log_event(log_file: Path, event: dict) -> None:
+    """Acrescenta um evento ao log compacto sem reler nem reescrever o que já está no arquivo."""
+    event = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), **event}
+    with gzip.open(log_file, "at", encoding="utf-8") as f:
+        f.write(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+def save_log(mode: str, source: str, images: list[dict], model_answer: str, extra=None, compact: bool = False):
     _ensure_paths()
     ts = time.strftime("%Y%m%d-%H%M%S")
-    log_file = LOG_DIR / f"batch-{mode}-{ts}.json"
-
-    data = {
-        "timestamp": ts,
-        "mode": mode,
-        "source": source,
-        "images_sample": images,
-        "model_answer": model_answer,
-    }
-    if extra:
-        data["extra"] = extra
 
-    with log_file.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    if compact:
+        log_file = LOG_DIR / f"batch-{mode}-{ts}{COMPACT_LOG_SUFFIX}"
+        data = {
+            "timestamp": ts,
+            "mode": mode,
+            "source": source,
+            # Só os IDs: caminhos e metadados estão no catálogo; o hash confere a amostra
+            "image_ids": [img.get("id") for img in images],
+            "sample_hash": sample_hash(images),
+            "model_answer": model_answer,
+        }
+        if extra:
+            data["extra"] = extra
+        append_log_event(log_file, {"event": "run", **data})
+    else:
+        log_file = LOG_DIR / f"batch-{mode}-{ts}.json"
+        data = {
+            "timestamp": ts,
+            "mode": mode,
+            "source": source,
+            "images_sample": images,
+            "model_answer": model_answer,
+        }
+        if extra:
+            data["extra"] = extra
+
+        with log_file.open("w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
 
+    # Importado aqui: run_index depende de common (LOG_DIR)
+    from run_index import index_log
+    index_log(log_file, data)
     return log_file
 
 
+def read_log(log_file: Path) -> dict:
+    """Lê um log de lote nos dois formatos; no compacto, os eventos seguintes entram em ``extra``."""
+    log_file = Path(log_file)
+    if not is_compact_log(log_file):
+        return json.loads(log_file.read_text(encoding="utf-8"))
+    data: dict = {}
+    try:
+        with gzip.open(log_file, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                kind = event.pop("event", None)
+                if kind == "run":
+                    event.pop("ts", None)
+                    data.update(event)
+                elif kind:
+                    data.setdefault("extra", {})[kind] = event.get("result", event)
+    except (EOFError, gzip.BadGzipFile, json.JSONDecodeError) as e:
+        # Último membro truncado por queda do processo: fica o que foi lido até ali
+        logging.warning({"event": "compact_log_truncated", "log": str(log_file), "error": str(e)})
+    return data
+
+
 def append_export_result_to_log(log_file: Path, export_result: dict) -> Path:
+    if is_compact_log(log_file):
+        append_log_event(log_file, {"event": "export_result", "result": export_result})
+        return log_file
+
     try:
         existing = json.loads(log_file.read_text(encoding="utf-8"))
     except Exception:
@@ -1054,7 +1603,8 @@ def append_export_result_to_log(log_file: Path, export_result: dict) -> Path:
         log_file.write_text(json.dumps(existing, ensure_ascii=False, indent=2), encoding="utf-8")
         return log_file
 
-    fallback = LOG_DIR / f"{log_file.stem}-export-result{log_file.suffix}"
+    from run_index import export_result_path_for
+    fallback = LOG_DIR / export_result_path_for(log_file).name
     fallback.write_text(json.dumps(export_result, ensure_ascii=False, indent=2), encoding="utf-8")
     return fallback
 
@@ -1062,7 +1612,7 @@ def append_export_result_to_log(log_file: Path, export_result: dict) -> Path:
 def extract_export_errors(result_payload: dict):
     for part in result_payload.get("content", []):
         if isinstance(part, dict) and isinstance(part.get("json"), dict):
-            maybe_errors = part["json"].get("errors")
+            maybe_errors = decode_rows(part["json"].get("errors"))
             if maybe_errors:
                 return maybe_errors
     return []
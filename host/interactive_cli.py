@@ -43,12 +43,26 @@ class RunConfig:
     timeout: float = 600.0  # Default timeout
     download_model: Optional[str] = None
     generate_styles: bool = True
+    contact_sheet: bool = False
+    sheet_grid: str = "4x4"
+    sheet_tile_size: int = 256
+    cascade: bool = False
+    triage_model: Optional[str] = None
+    chunk_size: int = 0
+    resume: Optional[str] = None
+    incremental: bool = False
+    watch: bool = False
+    sampling: str = "first"
+    seed: Optional[int] = None
     extra_flags: List[str] = field(default_factory=list)
 
     def build_command(self) -> List[str]:
         script = BASE_DIR / "mcp_host_ollama.py"
+        return [sys.executable, str(script)] + self.build_args()
 
-        cmd: List[str] = [sys.executable, str(script), "--mode", self.mode, "--source", self.source]
+    def build_args(self) -> List[str]:
+        """Argumentos do host (sem interpretador/script): também usados pelo runner da GUI."""
+        cmd: List[str] = ["--mode", self.mode, "--source", self.source]
 
         if self.source == "path" and self.path_contains:
             cmd += ["--path-contains", self.path_contains]
@@ -77,6 +91,28 @@ class RunConfig:
             cmd += ["--target-dir", self.target_dir]
         if self.text_only:
             cmd.append("--text-only")
+        elif self.contact_sheet:
+            cmd += [
+                "--contact-sheet",
+                "--sheet-grid", self.sheet_grid,
+                "--sheet-tile-size", str(self.sheet_tile_size),
+            ]
+        if self.cascade:
+            cmd.append("--cascade")
+            if self.triage_model and not self.text_only:
+                cmd += ["--triage-model", self.triage_model]
+        if self.chunk_size > 0:
+            cmd += ["--chunk-size", str(self.chunk_size)]
+        if self.resume:
+            cmd += ["--resume", self.resume]
+        if self.incremental:
+            cmd.append("--incremental")
+        if self.watch:
+            cmd.append("--watch")
+        if self.sampling and self.sampling != "first":
+            cmd += ["--sampling", self.sampling]
+            if self.seed is not None:
+                cmd += ["--seed", str(self.seed)]
         
         # Timeout (not strictly a CLI arg for host script if host script uses env var? 
         # Actually host script uses --timeout arg in modern version?)
@@ -167,6 +203,18 @@ def gather_config() -> RunConfig:
     text_only = not _ask_yes_no(
         "Anexar as imagens ao modelo (multimodal)?", default=True
     )
+    contact_sheet = False
+    if not text_only:
+        contact_sheet = _ask_yes_no(
+            "Agrupar miniaturas em contact sheets (triagem rápida)?", default=False
+        )
+
+    cascade = _ask_yes_no(
+        "Triar por metadados/EXIF antes do modelo de visão (cascata)?", default=False
+    )
+    triage_model = None
+    if cascade and not text_only:
+        triage_model = _ask_optional_str("Modelo pequeno para as ambíguas (vazio = pular)")
 
     model_default = mcp_host_ollama.OLLAMA_MODEL
     model = _ask_optional_str(f"Modelo do LLM (default={model_default})")
@@ -207,6 +255,9 @@ def gather_config() -> RunConfig:
         prompt_file=prompt_file,
         prompt_variant=prompt_variant,
         text_only=text_only,
+        contact_sheet=contact_sheet,
+        cascade=cascade,
+        triage_model=triage_model,
         extra_flags=extra_flags,
     )
 
@@ -239,6 +290,10 @@ def main() -> None:
         print(f"Prompt personalizado: {config.prompt_file}")
     print(f"Nível de prompt: {config.prompt_variant}")
     print(f"Enviar imagens ao modelo: {'não (texto/metadados)' if config.text_only else 'sim (multimodal)'}")
+    if config.contact_sheet and not config.text_only:
+        print(f"Contact sheets: grade {config.sheet_grid}, células de {config.sheet_tile_size}px")
+    if config.cascade:
+        print(f"Triagem em cascata: sim (modelo pequeno: {config.triage_model or 'nenhum'})")
     if config.target_dir:
         print(f"Diretório de export: {config.target_dir}")
     if config.extra_flags:
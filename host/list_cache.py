@@ -0,0 +1,69 @@
+"""
+Listas da GUI (modelos por servidor LLM, coleções do darktable) salvas em disco.
+
+Semântica stale-while-revalidate: ao abrir, a GUI mostra na hora a última lista
+conhecida, mesmo velha, e a atualiza em segundo plano quando passou de
+``max_age`` segundos. Cada entrada é ``{"ts": epoch, "items": [...]}`` em
+``STATE_DIR/mcp_gui_lists.json``.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from common import STATE_DIR
+
+LIST_CACHE_FILE = STATE_DIR / "mcp_gui_lists.json"
+LIST_MAX_AGE_S = 300.0
+COLLECTIONS_KEY = "collections"
+
+
+def models_key(url: str) -> str:
+    return f"models|{url.rstrip('/')}"
+
+
+class ListCache:
+    def __init__(self, path: Optional[Path] = None, max_age: float = LIST_MAX_AGE_S):
+        self.path = path or LIST_CACHE_FILE
+        self.max_age = max_age
+        self._data: Optional[dict] = None
+        # Atualizações chegam de threads em segundo plano
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        if self._data is None:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                self._data = data if isinstance(data, dict) else {}
+            except FileNotFoundError:
+                self._data = {}
+            except (OSError, ValueError) as e:
+                logging.warning({"event": "list_cache_load_error", "path": str(self.path), "error": str(e)})
+                self._data = {}
+        return self._data
+
+    def get(self, key: str) -> Optional[tuple[list, bool]]:
+        """(itens, velho?) da última lista salva para a chave; None se nunca foi buscada."""
+        with self._lock:
+            entry = self._load().get(key)
+        if not isinstance(entry, dict) or not isinstance(entry.get("items"), list):
+            return None
+        stale = time.time() - float(entry.get("ts", 0)) >= self.max_age
+        return list(entry["items"]), stale
+
+    def put(self, key: str, items: list) -> None:
+        with self._lock:
+            data = self._load()
+            data[key] = {"ts": time.time(), "items": list(items)}
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logging.warning({"event": "list_cache_save_error", "path": str(self.path), "error": str(e)})
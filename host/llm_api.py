@@ -1,3 +1,13 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+import requests
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
 class LLMProviderError(Exception):
     """Erro de domínio para falhas em providers LLM."""
     pass
@@ -7,7 +17,7 @@ class ILLMProvider(ABC):
     Interface para providers LLM (Ollama, OpenAI, etc).
     Permite mocks, testes e extensão futura.
     """
-    def chat(self, messages: list[dict]) -> tuple[str, dict]:
+    def chat(self, messages: list[dict], schema: Optional[dict] = None) -> tuple[str, dict]:
         raise NotImplementedError
 
     def check_vision_support(self, text_only: bool = False) -> None:
@@ -16,26 +26,47 @@ class ILLMProvider(ABC):
     # Métodos utilitários opcionais:
     def download_model(self, model: str):
         pass
-from __future__ import annotations
 
-import json
-import time
-import requests
-from abc import ABC, abstractmethod
+
+def normalize_keep_alive(value):
+    """'-1'/'300' viram número (segundos; negativo = nunca descarregar); '30m'/'1h' seguem como texto."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    text = str(value).strip()
+    try:
+        return int(text)
+    except ValueError:
+        return text
 
 
 class LLMProviderBase(ABC):
         # Implementa ILLMProvider para polimorfismo e mocks
     """Interface base para providers LLM. Permite mocks e extensão futura."""
-    def __init__(self, url: str, model: str, timeout: float = 60.0):
+    def __init__(
+        self,
+        url: str,
+        model: str,
+        timeout: float = 60.0,
+        *,
+        keep_alive: str | int | None = None,
+        options: Optional[dict] = None,
+        stop: Optional[threading.Event] = None,
+    ):
         self.url = url.rstrip("/")
         self.model = model
         self.timeout = timeout
+        # Mantém o modelo carregado entre chamadas/execuções (ex.: "30m", "-1")
+        self.keep_alive = normalize_keep_alive(keep_alive)
+        # Opções do runtime (ex.: num_ctx, num_batch); None/ausente = padrão do servidor
+        self.options = {k: v for k, v in (options or {}).items() if v is not None}
+        # Evento de parada da GUI: interrompe a espera de uma resposta em curso
+        self.stop = stop
 
     @abstractmethod
-    def chat(self, messages: list[dict]) -> tuple[str, dict]:
+    def chat(self, messages: list[dict], schema: Optional[dict] = None) -> tuple[str, dict]:
         """
         Envia mensagens para o LLM.
+        Com ``schema`` (JSON Schema), pede saída estruturada que o siga.
         Retorna (conteúdo_da_resposta, metadados).
         """
         pass
@@ -43,7 +74,15 @@ class LLMProviderBase(ABC):
     @abstractmethod
     def check_vision_support(self, text_only: bool = False) -> None:
         pass
-from typing import Iterator, Optional
+
+    def with_model(self, model: str) -> "LLMProviderBase":
+        """Mesmo provider (URL/timeout/opções), outro modelo. Usado pela triagem em cascata."""
+        return type(self)(
+            self.url, model, self.timeout, keep_alive=self.keep_alive, options=self.options, stop=self.stop
+        )
+
+
+from typing import Iterator
 
 import logging
 from common import post_json_with_retries
@@ -54,18 +93,26 @@ LLMProvider = LLMProviderBase
 
 
 class OllamaProvider(LLMProviderBase):
-    def chat(self, messages: list[dict]) -> tuple[str, dict]:
+    def chat(self, messages: list[dict], schema: Optional[dict] = None) -> tuple[str, dict]:
         chat_url = f"{self.url}/api/chat"
         payload = {
             "model": self.model,
             "messages": messages,
             "stream": False,
         }
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        if self.options:
+            payload["options"] = dict(self.options)
+        if schema:
+            # Saída estruturada: o Ollama restringe a geração ao JSON Schema
+            payload["format"] = schema
         started = time.time()
         logging.info(f"[Ollama] Aguardando resposta do modelo {self.model}...")
         try:
             resp, elapsed_ms = post_json_with_retries(
-                chat_url, payload, timeout=self.timeout, retries=2, retry_delay=2.0, description="Ollama chat"
+                chat_url, payload, timeout=self.timeout, retries=2, retry_delay=2.0, description="Ollama chat",
+                stop=self.stop,
             )
             resp.raise_for_status()
             data = resp.json()
@@ -78,6 +125,9 @@ class OllamaProvider(LLMProviderBase):
                 "latency_ms": elapsed_ms,
                 "eval_count": data.get("eval_count"),
                 "eval_duration": data.get("eval_duration"),
+                # Tokens do prompt avaliados nesta chamada (cai quando o prefixo vem do cache)
+                "prompt_eval_count": data.get("prompt_eval_count"),
+                "load_duration": data.get("load_duration"),
             }
             logging.info(f"[Ollama] Status: {resp.status_code}, Time: {elapsed_ms}ms")
             return content, meta
@@ -128,9 +178,24 @@ class OllamaProvider(LLMProviderBase):
             })
             raise LLMProviderError(f"[Ollama] Erro ao baixar modelo: {e}") from e
 
+    def list_models(self) -> list[str]:
+        """Modelos instalados no servidor (GET /api/tags)."""
+        try:
+            resp = requests.get(f"{self.url}/api/tags", timeout=self.timeout)
+            resp.raise_for_status()
+            return [m["name"] for m in resp.json().get("models", []) if m.get("name")]
+        except Exception as e:
+            logging.error({
+                "event": "llm_list_models_error",
+                "provider": "ollama",
+                "url": self.url,
+                "error": str(e),
+            })
+            raise LLMProviderError(f"[Ollama] Erro ao listar modelos: {e}") from e
+
 
 class OpenAICompatProvider(LLMProviderBase):
-    def chat(self, messages: list[dict]) -> tuple[str, dict]:
+    def chat(self, messages: list[dict], schema: Optional[dict] = None) -> tuple[str, dict]:
         # Ajuste de URL para compatibilidade com /v1/chat/completions
         endpoint = self.url
         if not endpoint.endswith("/chat/completions"):
@@ -140,10 +205,16 @@ class OpenAICompatProvider(LLMProviderBase):
             "messages": messages,
             "stream": False,
         }
+        if schema:
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "plano", "schema": schema},
+            }
         started = time.time()
         try:
             resp, elapsed_ms = post_json_with_retries(
-                endpoint, payload, timeout=self.timeout, retries=2, retry_delay=2.0, description="OpenAICompat chat"
+                endpoint, payload, timeout=self.timeout, retries=2, retry_delay=2.0, description="OpenAICompat chat",
+                stop=self.stop,
             )
             resp.raise_for_status()
             data = resp.json()
@@ -170,3 +241,21 @@ class OpenAICompatProvider(LLMProviderBase):
 
     def check_vision_support(self, text_only: bool = False) -> None:
         pass
+
+    def list_models(self) -> list[str]:
+        """Modelos expostos pelo servidor (GET /v1/models)."""
+        # Mesma URL do chat (ex.: http://localhost:1234/v1/chat/completions) ou a base
+        base = self.url[: -len("/chat/completions")] if self.url.endswith("/chat/completions") else self.url
+        endpoint = f"{base}/models" if base.endswith("/v1") else f"{base}/v1/models"
+        try:
+            resp = requests.get(endpoint, timeout=self.timeout)
+            resp.raise_for_status()
+            return [m["id"] for m in resp.json().get("data", []) if m.get("id")]
+        except Exception as e:
+            logging.error({
+                "event": "llm_list_models_error",
+                "provider": "openai-compat",
+                "url": self.url,
+                "error": str(e),
+            })
+            raise LLMProviderError(f"[OpenAICompat] Erro ao listar modelos: {e}") from e
@@ -8,22 +8,29 @@ from __future__ import annotations
 
 from host.i18n import i18n
 
+import logging
+import os
 import re
-import subprocess
 import sys
 import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Callable, Optional
 
 import requests
 
-from PySide6.QtCore import Qt, Signal, Slot, QSize
-from PySide6.QtGui import QIcon, QPixmap, QResizeEvent, QShortcut, QKeySequence
+from PySide6.QtCore import Qt, Signal, Slot, QAbstractListModel, QModelIndex, QSize, QTimer
+from PySide6.QtGui import QColor, QIcon, QImage, QImageReader, QPainter, QPixmap, QShortcut, QKeySequence
 from PySide6.QtWidgets import (
+    QAbstractItemView,
     QApplication,
     QButtonGroup,
     QCheckBox,
     QComboBox,
+    QDialog,
+    QDialogButtonBox,
     QGridLayout,
     QFileDialog,
     QGroupBox,
@@ -31,6 +38,7 @@ from PySide6.QtWidgets import (
     QFormLayout,
     QLabel,
     QLineEdit,
+    QListView,
     QMainWindow,
     QMessageBox,
     QPushButton,
@@ -39,13 +47,16 @@ from PySide6.QtWidgets import (
     QSizePolicy,
     QStyle,
     QStatusBar,
-    QTextEdit,
+    QStyledItemDelegate,
+    QTableWidget,
+    QTableWidgetItem,
+    QPlainTextEdit,
     QVBoxLayout,
     QWidget,
     QSpinBox,
 )
 
-from common import probe_darktable_state
+from common import LOG_DIR, PromptValidationError, probe_darktable_state
 from interactive_cli import DEFAULT_LIMIT, DEFAULT_MIN_RATING, RunConfig
 from mcp_host_ollama import (
     APP_VERSION as HOST_APP_VERSION,
@@ -55,115 +66,460 @@ from mcp_host_ollama import (
     load_prompt as load_ollama_prompt,
 )
 from mcp_host_lmstudio import LMSTUDIO_MODEL, LMSTUDIO_URL
+from llm_api import LLMProviderError, OllamaProvider
+from list_cache import COLLECTIONS_KEY, LIST_MAX_AGE_S, ListCache, models_key
+import run_index
+from runner import InProcessRunner, RunCancelled
+from thumbnails import THUMB_SIZE, thumbnail_for
 
 GUI_CLIENT_INFO = {"name": "darktable-mcp-gui", "version": HOST_APP_VERSION}
+# Linhas mantidas no painel de log (as mais antigas saem); o log completo fica em logs/gui-<ts>.log
+LOG_MAX_LINES = int(os.environ.get("DT_MCP_GUI_LOG_LINES") or 5000)
+# Intervalo em que as linhas acumuladas são anexadas ao painel numa única operação
+LOG_FLUSH_INTERVAL_MS = 50
+# Atraso da revalidação das listas em cache ao abrir: a janela aparece antes do servidor MCP subir
+LIST_REFRESH_DELAY_MS = 1500
+
+
+class LogBuffer:
+    """
+    Linhas de log pendentes para o painel, alimentadas de qualquer thread.
+
+    ``push`` só acumula (e grava no arquivo completo); a thread da interface chama
+    ``drain`` a cada LOG_FLUSH_INTERVAL_MS e anexa o lote de uma vez. Se a fila
+    passar de ``max_lines`` antes do próximo drain, as linhas mais antigas são
+    descartadas da tela (o arquivo continua com tudo).
+    """
+
+    def __init__(self, max_lines: int = LOG_MAX_LINES, spill_path: Optional[Path] = None):
+        self.max_lines = max_lines
+        self.spill_path = spill_path
+        self.dropped = 0
+        self._pending: list[str] = []
+        self._lock = threading.Lock()
+        self._spill = None
+
+    def push(self, text: str) -> None:
+        with self._lock:
+            self._pending.append(text)
+            if len(self._pending) > self.max_lines:
+                excess = len(self._pending) - self.max_lines
+                del self._pending[:excess]
+                self.dropped += excess
+            if self.spill_path is not None:
+                if self._spill is None:
+                    self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+                    self._spill = self.spill_path.open("a", encoding="utf-8")
+                self._spill.write(text + "\n")
+
+    def drain(self) -> list[str]:
+        with self._lock:
+            lines, self._pending = self._pending, []
+            if self._spill is not None:
+                self._spill.flush()
+            return lines
+
+    def close(self) -> None:
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+
+
+class ThumbnailModel(QAbstractListModel):
+    """
+    Amostra da execução para a grade de miniaturas.
+
+    A view só pede ``DecorationRole`` das células visíveis; cada pedido vira uma
+    tarefa no pool (``thumbnail_for`` + QImageReader reduzindo na decodificação),
+    e o resultado volta pela fila de eventos do Qt. Os QPixmaps ficam num LRU de
+    ``max_cached`` itens: rolar 1000 imagens não decodifica arquivos inteiros nem
+    mantém todos na memória.
+    """
+
+    DecisionRole = Qt.ItemDataRole.UserRole + 1
+    AppliedRole = Qt.ItemDataRole.UserRole + 2
+    # (geração, id, imagem): resultados de uma amostra anterior são descartados
+    thumbnail_ready = Signal(int, object, QImage)
+
+    def __init__(self, parent=None, loader=thumbnail_for, size: int = THUMB_SIZE,
+                 max_workers: int = 4, max_cached: int = 600):
+        super().__init__(parent)
+        self._loader = loader
+        self._size = size
+        self._max_cached = max_cached
+        self._items: list[dict] = []
+        self._rows: dict = {}
+        self._pixmaps: OrderedDict = OrderedDict()
+        self._requested: set = set()
+        self._generation = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbs")
+        self.thumbnail_ready.connect(self._on_thumbnail_ready)
+
+    def rowCount(self, parent=QModelIndex()) -> int:  # noqa: B008
+        return 0 if parent.isValid() else len(self._items)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self._items[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return Path(item["path"]).name if item.get("path") else f"ID {item['id']}"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            lines = [item.get("path") or f"ID {item['id']}"]
+            lines += [f"{mode}: {text}" for mode, text in item["decisions"].items()]
+            return "\n".join(lines)
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self._pixmaps.get(item["id"])
+            if pixmap is not None:
+                self._pixmaps.move_to_end(item["id"])
+                return pixmap
+            self._request(item)
+            return None
+        if role == self.DecisionRole:
+            return " · ".join(item["decisions"].values())
+        if role == self.AppliedRole:
+            return item["applied"]
+        return None
+
+    def clear(self) -> None:
+        self.beginResetModel()
+        self._generation += 1
+        self._items, self._rows = [], {}
+        self._pixmaps.clear()
+        self._requested.clear()
+        self.endResetModel()
+
+    def row_of(self, image_id) -> Optional[int]:
+        return self._rows.get(image_id)
+
+    def extend(self, images: list[dict]) -> None:
+        """Acrescenta as imagens novas da amostra ({id, path}) numa única inserção."""
+        new, seen = [], set(self._rows)
+        for img in images:
+            if img.get("id") not in seen:
+                seen.add(img.get("id"))
+                new.append({"id": img.get("id"), "path": img.get("path"), "decisions": {}, "applied": False})
+        if not new:
+            return
+        first = len(self._items)
+        self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+        for row, item in enumerate(new, first):
+            self._items.append(item)
+            self._rows[item["id"]] = row
+        self.endInsertRows()
+
+    def upsert(self, image_id, path: Optional[str] = None, mode: Optional[str] = None,
+               decision: Optional[str] = None, applied: bool = False) -> int:
+        """Acrescenta a imagem (se nova) ou atualiza decisão/escrita; retorna a linha."""
+        row = self._rows.get(image_id)
+        if row is None:
+            row = len(self._items)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._items.append({"id": image_id, "path": path, "decisions": {}, "applied": False})
+            self._rows[image_id] = row
+            self.endInsertRows()
+            if not (decision or applied):
+                return row
+        item = self._items[row]
+        if path and not item["path"]:
+            item["path"] = path
+        if decision and mode:
+            item["decisions"][mode] = decision
+        item["applied"] = item["applied"] or applied
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [self.DecisionRole, self.AppliedRole, Qt.ItemDataRole.ToolTipRole])
+        return row
+
+    def _request(self, item: dict) -> None:
+        if item["id"] in self._requested or not item.get("path"):
+            return
+        self._requested.add(item["id"])
+        self._pool.submit(self._load, self._generation, item["id"], item["path"])
+
+    def _load(self, generation: int, image_id, path: str) -> None:
+        # Roda no pool: QImage (ao contrário de QPixmap) pode ser criada fora da thread da interface
+        try:
+            source = self._loader(Path(path), image_id, self._size)
+            if source is None:
+                return
+            reader = QImageReader(str(source))
+            reader.setAutoTransform(True)
+            full = reader.size()
+            if full.isValid() and (full.width() > self._size or full.height() > self._size):
+                reader.setScaledSize(full.scaled(self._size, self._size, Qt.AspectRatioMode.KeepAspectRatio))
+            image = reader.read()
+        except Exception as e:
+            logging.debug(f"[thumbs] {path}: {e}")
+            return
+        if not image.isNull():
+            self.thumbnail_ready.emit(generation, image_id, image)
+
+    @Slot(int, object, QImage)
+    def _on_thumbnail_ready(self, generation: int, image_id, image: QImage) -> None:
+        row = self._rows.get(image_id)
+        if generation != self._generation or row is None:
+            return
+        self._pixmaps[image_id] = QPixmap.fromImage(image)
+        while len(self._pixmaps) > self._max_cached:
+            evicted, _ = self._pixmaps.popitem(last=False)
+            # Volta a ser carregada (do cache em disco) se a célula reaparecer
+            self._requested.discard(evicted)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    def shutdown(self) -> None:
+        self._generation += 1
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """Célula da grade com a decisão do modelo sobreposta à miniatura."""
+
+    def paint(self, painter: QPainter, option, index) -> None:
+        super().paint(painter, option, index)
+        decision = index.data(ThumbnailModel.DecisionRole)
+        if not decision:
+            return
+        applied = index.data(ThumbnailModel.AppliedRole)
+        painter.save()
+        rect = option.rect.adjusted(4, 4, -4, 0)
+        rect.setHeight(option.fontMetrics.height() + 6)
+        # Verde: já escrito no darktable; azul: só decidido (ou dry-run)
+        painter.fillRect(rect, QColor(46, 125, 50, 220) if applied else QColor(33, 82, 140, 220))
+        painter.setPen(QColor("#ffffff"))
+        text = option.fontMetrics.elidedText(decision, Qt.TextElideMode.ElideRight, rect.width() - 8)
+        painter.drawText(rect.adjusted(4, 0, -4, 0), Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, text)
+        painter.restore()
+
+
+class RunHistoryDialog(QDialog):
+    """Histórico de execuções lido de logs/index.jsonl (sem reabrir os batch-*.json)."""
+
+    COLUMNS = ("Data", "Modo", "Modelo", "Imagens", "Latência (s)", "Status", "Log")
+    PERIODS = {"Tudo": None, "Últimas 24h": "24h", "Últimos 7 dias": "7d", "Últimos 30 dias": "30d"}
+
+    def __init__(self, parent: QWidget | None = None, index_file: Path | None = None) -> None:
+        super().__init__(parent)
+        self.setWindowTitle("Histórico de execuções")
+        self.resize(900, 520)
+        self.index_file = index_file or run_index.default_index()
+        self.entries: list[dict] = []
+
+        self.image_edit = QLineEdit()
+        self.image_edit.setPlaceholderText("ID da imagem")
+        self.mode_combo = QComboBox()
+        self.model_combo = QComboBox()
+        self.period_combo = QComboBox()
+        self.period_combo.addItems(list(self.PERIODS))
+
+        filters = QHBoxLayout()
+        for label, widget in (
+            ("Imagem:", self.image_edit),
+            ("Modo:", self.mode_combo),
+            ("Modelo:", self.model_combo),
+            ("Período:", self.period_combo),
+        ):
+            filters.addWidget(QLabel(label))
+            filters.addWidget(widget)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(list(self.COLUMNS))
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.summary_label = QLabel()
+        self.summary_label.setWordWrap(True)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        rebuild_button = buttons.addButton("Reconstruir índice", QDialogButtonBox.ButtonRole.ActionRole)
+        rebuild_button.clicked.connect(self._rebuild)
+        buttons.rejected.connect(self.reject)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(filters)
+        layout.addWidget(self.table)
+        layout.addWidget(self.summary_label)
+        layout.addWidget(buttons)
+
+        self.image_edit.textChanged.connect(self._apply_filters)
+        for combo in (self.mode_combo, self.model_combo, self.period_combo):
+            combo.currentIndexChanged.connect(self._apply_filters)
+        self._load()
+
+    def _load(self) -> None:
+        self.entries = run_index.load_entries(self.index_file)
+        for combo, key in ((self.mode_combo, "mode"), (self.model_combo, "model")):
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem("Todos")
+            combo.addItems(sorted({e.get(key) for e in self.entries if e.get(key)}))
+            combo.blockSignals(False)
+        self._apply_filters()
+
+    def _rebuild(self) -> None:
+        count = run_index.rebuild(self.index_file.parent)
+        self._load()
+        self.summary_label.setText(f"Índice recriado com {count} execução(ões).\n" + self.summary_label.text())
+
+    def filtered_entries(self) -> list[dict]:
+        text = self.image_edit.text().strip()
+        image_id = int(text) if text.isdigit() else None
+        mode = self.mode_combo.currentText() if self.mode_combo.currentIndex() > 0 else None
+        model = self.model_combo.currentText() if self.model_combo.currentIndex() > 0 else None
+        since = run_index.parse_since(self.PERIODS.get(self.period_combo.currentText()))
+        return run_index.query(self.entries, image_id=image_id, mode=mode, model=model, since=since)
+
+    def _apply_filters(self) -> None:
+        entries = list(reversed(self.filtered_entries()))
+        self.table.setRowCount(len(entries))
+        for row, entry in enumerate(entries):
+            values = (
+                entry.get("ts") or "",
+                entry.get("mode") or "",
+                entry.get("model") or "-",
+                str(entry.get("images", 0)),
+                f"{(entry.get('latency_ms') or 0) / 1000:.1f}",
+                "ok" if entry.get("ok") else "falhou",
+                entry.get("log") or "",
+            )
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+        if not self.entries:
+            self.summary_label.setText(
+                f"Nenhuma execução indexada em {self.index_file}. "
+                "Use \"Reconstruir índice\" para importar os logs existentes."
+            )
+            return
+        lines = []
+        for stats in run_index.summarize(entries):
+            avg = f"{stats['latency_ms_avg'] / 1000:.1f} s" if stats["latency_ms_avg"] is not None else "-"
+            lines.append(
+                f"{stats['model']}: {stats['runs']} execução(ões), {stats['images']} imagens, latência média {avg}"
+            )
+        self.summary_label.setText("\n".join(lines) or "Nenhuma execução com esses filtros.")
 
 
 class MCPGui(QMainWindow):
-            def _enhance_accessibility(self):
-                # Foco inicial no primeiro campo relevante
-                self.source_combo.setFocus()
-                # Tooltips reforçados para todos os campos principais
-                for widget, tip in [
-                    (self.mode_rating, "Atribuir notas às imagens (atalho: Alt+1)"),
-                    (self.mode_tagging, "Sugerir e aplicar tags (atalho: Alt+2)"),
-                    (self.mode_export, "Exportar imagens selecionadas (atalho: Alt+3)"),
-                    (self.mode_treatment, "Aplicar tratamento de imagem (atalho: Alt+4)"),
-                    (self.mode_completo, "Fluxo completo: Rating -> Tagging -> Tratamento -> Export (atalho: Alt+5)"),
-                    (self.source_combo, "Escolhe de onde as imagens serão obtidas (atalho: Alt+S)"),
-                    (self.min_rating_spin, "Nota mínima das imagens (atalho: Alt+R)"),
-                    (self.limit_spin, "Limite de imagens a processar (atalho: Alt+L)"),
-                    (self.timeout_spin, "Timeout do modelo LLM (atalho: Alt+T)"),
-                    (self.path_contains_edit, "Filtrar imagens por caminho (atalho: Alt+C)"),
-                    (self.tag_edit, "Filtrar imagens por tag (atalho: Alt+G)"),
-                    (self.collection_combo, "Selecionar coleção do Darktable (atalho: Alt+O)"),
-                    (self.prompt_edit, "Arquivo de prompt customizado (atalho: Alt+P)"),
-                    (self.target_edit, "Diretório de exportação (atalho: Alt+D)"),
-                    (self.model_combo, "Modelo LLM (atalho: Alt+M)"),
-                    (self.url_edit, "URL do servidor LLM (atalho: Alt+U)"),
-                ]:
-                    widget.setToolTip(tip)
-                # ARIA/nomeação para leitores de tela
-                for widget, name in [
-                    (self.mode_rating, "Modo rating"),
-                    (self.mode_tagging, "Modo tagging"),
-                    (self.mode_export, "Modo export"),
-                    (self.mode_treatment, "Modo tratamento"),
-                    (self.mode_completo, "Modo completo"),
-                    (self.source_combo, "Fonte das imagens"),
-                    (self.min_rating_spin, "Rating mínimo"),
-                    (self.limit_spin, "Limite de imagens"),
-                    (self.timeout_spin, "Timeout do modelo"),
-                    (self.path_contains_edit, "Filtro de caminho"),
-                    (self.tag_edit, "Tag do Darktable"),
-                    (self.collection_combo, "Coleção do Darktable"),
-                    (self.prompt_edit, "Arquivo de prompt personalizado"),
-                    (self.target_edit, "Diretório de exportação"),
-                    (self.model_combo, "Modelo LLM"),
-                    (self.url_edit, "URL do servidor LLM"),
-                ]:
-                    widget.setAccessibleName(name)
-                # Feedback visual para foco
-                for widget in [
-                    self.source_combo, self.min_rating_spin, self.limit_spin, self.timeout_spin,
-                    self.path_contains_edit, self.tag_edit, self.collection_combo, self.prompt_edit,
-                    self.target_edit, self.model_combo, self.url_edit
-                ]:
-                    widget.setStyleSheet(widget.styleSheet() + "\n:focus { border: 2px solid #77a0ff; }")
-                # Atalhos de teclado para modos e campos principais
-                from PySide6.QtGui import QShortcut, QKeySequence
-                for key, widget in [
-                    ("Alt+1", self.mode_rating),
-                    ("Alt+2", self.mode_tagging),
-                    ("Alt+3", self.mode_export),
-                    ("Alt+4", self.mode_treatment),
-                    ("Alt+5", self.mode_completo),
-                    ("Alt+S", self.source_combo),
-                    ("Alt+R", self.min_rating_spin),
-                    ("Alt+L", self.limit_spin),
-                    ("Alt+T", self.timeout_spin),
-                    ("Alt+C", self.path_contains_edit),
-                    ("Alt+G", self.tag_edit),
-                    ("Alt+O", self.collection_combo),
-                    ("Alt+P", self.prompt_edit),
-                    ("Alt+D", self.target_edit),
-                    ("Alt+M", self.model_combo),
-                    ("Alt+U", self.url_edit),
-                ]:
-                    shortcut = QShortcut(QKeySequence(key), self)
-                    shortcut.activated.connect(lambda w=widget: w.setFocus())
-
-        # ----------------------------- MÉTRICAS --------------------------------------------
-        def _init_metrics(self):
-            self._metrics = {
-                "exec_count": 0,
-                "exec_errors": 0,
-                "last_exec_duration": 0.0,
-                "last_exec_start": None,
-                "last_exec_end": None,
-                "llm_model_checks": 0,
-                "dt_collection_checks": 0,
-            }
-            import logging
-            self._metrics_logger = logging.getLogger("mcp_gui.metrics")
+    def _enhance_accessibility(self):
+        # Foco inicial no primeiro campo relevante
+        self.source_combo.setFocus()
+        # Tooltips reforçados para todos os campos principais
+        for widget, tip in [
+            (self.mode_rating, "Atribuir notas às imagens (atalho: Alt+1)"),
+            (self.mode_tagging, "Sugerir e aplicar tags (atalho: Alt+2)"),
+            (self.mode_export, "Exportar imagens selecionadas (atalho: Alt+3)"),
+            (self.mode_treatment, "Aplicar tratamento de imagem (atalho: Alt+4)"),
+            (self.mode_completo, "Fluxo completo: Rating -> Tagging -> Tratamento -> Export (atalho: Alt+5)"),
+            (self.source_combo, "Escolhe de onde as imagens serão obtidas (atalho: Alt+S)"),
+            (self.min_rating_spin, "Nota mínima das imagens (atalho: Alt+R)"),
+            (self.limit_spin, "Limite de imagens a processar (atalho: Alt+L)"),
+            (self.timeout_spin, "Timeout do modelo LLM (atalho: Alt+T)"),
+            (self.path_contains_edit, "Filtrar imagens por caminho (atalho: Alt+C)"),
+            (self.tag_edit, "Filtrar imagens por tag (atalho: Alt+G)"),
+            (self.collection_combo, "Selecionar coleção do Darktable (atalho: Alt+O)"),
+            (self.prompt_edit, "Arquivo de prompt customizado (atalho: Alt+P)"),
+            (self.target_edit, "Diretório de exportação (atalho: Alt+D)"),
+            (self.model_combo, "Modelo LLM (atalho: Alt+M)"),
+            (self.url_edit, "URL do servidor LLM (atalho: Alt+U)"),
+        ]:
+            widget.setToolTip(tip)
+        # ARIA/nomeação para leitores de tela
+        for widget, name in [
+            (self.mode_rating, "Modo rating"),
+            (self.mode_tagging, "Modo tagging"),
+            (self.mode_export, "Modo export"),
+            (self.mode_treatment, "Modo tratamento"),
+            (self.mode_completo, "Modo completo"),
+            (self.source_combo, "Fonte das imagens"),
+            (self.min_rating_spin, "Rating mínimo"),
+            (self.limit_spin, "Limite de imagens"),
+            (self.timeout_spin, "Timeout do modelo"),
+            (self.path_contains_edit, "Filtro de caminho"),
+            (self.tag_edit, "Tag do Darktable"),
+            (self.collection_combo, "Coleção do Darktable"),
+            (self.prompt_edit, "Arquivo de prompt personalizado"),
+            (self.target_edit, "Diretório de exportação"),
+            (self.model_combo, "Modelo LLM"),
+            (self.url_edit, "URL do servidor LLM"),
+        ]:
+            widget.setAccessibleName(name)
+        # Feedback visual para foco
+        for widget in [
+            self.source_combo, self.min_rating_spin, self.limit_spin, self.timeout_spin,
+            self.path_contains_edit, self.tag_edit, self.collection_combo, self.prompt_edit,
+            self.target_edit, self.model_combo, self.url_edit
+        ]:
+            widget.setStyleSheet(widget.styleSheet() + "\n:focus { border: 2px solid #77a0ff; }")
+        # Atalhos de teclado para modos e campos principais
+        from PySide6.QtGui import QShortcut, QKeySequence
+        for key, widget in [
+            ("Alt+1", self.mode_rating),
+            ("Alt+2", self.mode_tagging),
+            ("Alt+3", self.mode_export),
+            ("Alt+4", self.mode_treatment),
+            ("Alt+5", self.mode_completo),
+            ("Alt+S", self.source_combo),
+            ("Alt+R", self.min_rating_spin),
+            ("Alt+L", self.limit_spin),
+            ("Alt+T", self.timeout_spin),
+            ("Alt+C", self.path_contains_edit),
+            ("Alt+G", self.tag_edit),
+            ("Alt+O", self.collection_combo),
+            ("Alt+P", self.prompt_edit),
+            ("Alt+D", self.target_edit),
+            ("Alt+M", self.model_combo),
+            ("Alt+U", self.url_edit),
+        ]:
+            shortcut = QShortcut(QKeySequence(key), self)
+            shortcut.activated.connect(lambda w=widget: w.setFocus())
+
+    # ----------------------------- MÉTRICAS --------------------------------------------
+    def _init_metrics(self):
+        self._metrics = {
+            "exec_count": 0,
+            "exec_errors": 0,
+            "last_exec_duration": 0.0,
+            "last_exec_start": None,
+            "last_exec_end": None,
+            "llm_model_checks": 0,
+            "dt_collection_checks": 0,
+        }
+        import logging
+        self._metrics_logger = logging.getLogger("mcp_gui.metrics")
 
-    log_signal = Signal(str)
     status_signal = Signal(str)
     progress_signal = Signal(bool)
     error_signal = Signal(str)
     models_signal = Signal(list)
     collections_signal = Signal(list)
     progress_update_signal = Signal(int, int, str)  # (current, total, message)
+    run_progress_signal = Signal(dict)  # eventos do BatchProcessor: {stage, mode, index, total, id, path}
+    run_id_signal = Signal(str)  # run id anunciado pelo host (habilita "Retomar última execução")
+
+    STAGE_LABELS = {
+        "sample": "Amostra selecionada",
+        "encode": "Preparando imagens",
+        "infer": "Analisando com o modelo",
+        "apply": "Aplicando no darktable",
+        "decision": "Decisão do modelo",
+    }
 
     def __init__(
         self,
         mcp_client_factory=None,
         llm_provider_factory=None,
+        log_max_lines: int = LOG_MAX_LINES,
+        log_file: Optional[Path] = None,
+        list_cache: Optional[ListCache] = None,
     ):
         """
         Parâmetros opcionais para facilitar testes automatizados:
         - mcp_client_factory: função/fábrica que retorna um IMcpClient (mockável)
         - llm_provider_factory: função/fábrica que retorna um ILLMProvider (mockável)
+        - log_max_lines: linhas mantidas no painel de log
+        - log_file: arquivo com o log completo da sessão (padrão logs/gui-<ts>.log)
+        - list_cache: listas de modelos/coleções persistidas (padrão STATE_DIR/mcp_gui_lists.json)
         """
         super().__init__()
 
@@ -173,33 +529,47 @@ class MCPGui(QMainWindow):
         self._apply_window_icon()
         self._current_thread: Optional[threading.Thread] = None
         self._stop_requested = False
+        # Id da última execução (diário para --resume)
+        self._last_run_id: Optional[str] = None
+        self._run_id_pattern = re.compile(r"\[run\] id=(\S+)")
         self._current_image_path: Optional[Path] = None
-        self._current_pixmap: Optional[QPixmap] = None
-        self._image_path_pattern = re.compile(
-            r"([A-Za-z]:\\[^\n]+?\.(?:jpe?g|png|tiff?|bmp|webp)|/[^\n]+?\.(?:jpe?g|png|tiff?|bmp|webp))",
-            re.IGNORECASE,
-        )
+        self._collections_cache: Optional[tuple[float, list[str]]] = None
+        self._collections_cache_ttl = LIST_MAX_AGE_S
+        self._list_cache = list_cache or ListCache()
 
         # Fábricas para injeção de dependências (testes/mocks)
-        from common import McpClient, DT_SERVER_CMD
+        from common import McpClient, DT_SERVER_CMD, _find_appimage
         from mcp_host_ollama import OLLAMA_MODEL, OLLAMA_URL, PROTOCOL_VERSION as MCP_PROTOCOL_VERSION
         self._mcp_client_factory = mcp_client_factory or (
             lambda: McpClient(
                 DT_SERVER_CMD,
                 MCP_PROTOCOL_VERSION,
                 GUI_CLIENT_INFO,
+                # Busca memorizada e montagem compartilhada: sem remontar a cada ação
+                appimage_path=_find_appimage(),
             )
         )
-        # LLMProvider será injetado em patch posterior
-        self._llm_provider_factory = llm_provider_factory
+        self._llm_provider_factory = llm_provider_factory or (
+            lambda url, model, timeout: OllamaProvider(url, model, timeout)
+        )
+        # Execuções no próprio processo: o servidor MCP sobe uma vez e fica aberto entre execuções
+        self._runner = InProcessRunner(self._mcp_client_factory)
 
-        self.log_signal.connect(self._append_log_ui)
+        self._log_buffer = LogBuffer(
+            log_max_lines,
+            log_file or LOG_DIR / f"gui-{time.strftime('%Y%m%d-%H%M%S')}.log",
+        )
+        self._log_timer = QTimer(self)
+        self._log_timer.setInterval(LOG_FLUSH_INTERVAL_MS)
+        self._log_timer.timeout.connect(self._flush_log_ui)
         self.status_signal.connect(self._set_status_ui)
         self.progress_signal.connect(self._toggle_progress)
         self.error_signal.connect(self._show_error)
         self.models_signal.connect(self._update_model_options)
         self.collections_signal.connect(self._populate_collections)
         self.progress_update_signal.connect(self._update_progress)
+        self.run_progress_signal.connect(self._on_run_progress)
+        self.run_id_signal.connect(self._set_last_run_id)
 
         self._init_metrics()
         self._apply_global_style()
@@ -210,6 +580,12 @@ class MCPGui(QMainWindow):
         self._setup_keyboard_shortcuts()
         self._setup_tab_order()
         self._enhance_accessibility()
+        self._log_timer.start()
+        self._lists_refresh_timer = QTimer(self)
+        self._lists_refresh_timer.setSingleShot(True)
+        self._lists_refresh_timer.setInterval(LIST_REFRESH_DELAY_MS)
+        self._lists_refresh_timer.timeout.connect(self._revalidate_cached_lists)
+        self._show_cached_lists()
 
     # ----------------------------- UI --------------------------------------------
 
@@ -269,15 +645,28 @@ class MCPGui(QMainWindow):
         check_llm_action.triggered.connect(self._check_connection_and_fetch_models)
         tools_menu.addAction(check_llm_action)
         
+        self.resume_action = QAction("&Retomar última execução", self)
+        self.resume_action.setEnabled(False)
+        self.resume_action.triggered.connect(self._resume_last_run)
+        tools_menu.addAction(self.resume_action)
+
+        history_action = QAction("&Histórico de execuções...", self)
+        history_action.triggered.connect(lambda: RunHistoryDialog(self).exec())
+        tools_menu.addAction(history_action)
+
+        undo_batch_action = QAction("&Desfazer último lote", self)
+        undo_batch_action.triggered.connect(self._undo_last_batch)
+        tools_menu.addAction(undo_batch_action)
+
         tools_menu.addSeparator()
         
         clear_logs_action = QAction("Limpar &Logs", self)
         clear_logs_action.triggered.connect(lambda: self.log_text.clear())
-        self.prompt_label = QLabel(i18n.t("label.prompt"))
-        self.target_label = QLabel(i18n.t("label.target_dir"))
-        self.model_label = QLabel(i18n.t("label.model"))
-        self.collection_label = QLabel(i18n.t("label.collection"))
-        
+        tools_menu.addAction(clear_logs_action)
+
+        # Menu Ajuda
+        help_menu = menubar.addMenu("A&juda")
+
         docs_action = QAction("&Documentação", self)
         docs_action.setEnabled(False)  # Placeholder
         help_menu.addAction(docs_action)
@@ -365,7 +754,8 @@ class MCPGui(QMainWindow):
             QLineEdit,
             QComboBox,
             QSpinBox,
-            QTextEdit {
+            QTextEdit,
+            QPlainTextEdit {
                 padding: 4.5px 6px;
                 min-height: 30px;
                 border: 1px solid var(--color-border-light);
@@ -377,7 +767,8 @@ class MCPGui(QMainWindow):
             QLineEdit:focus,
             QComboBox:focus,
             QSpinBox:focus,
-            QTextEdit:focus {
+            QTextEdit:focus,
+            QPlainTextEdit:focus {
                 border-color: var(--color-border-focus);
             }
             QLineEdit:disabled,
@@ -387,7 +778,8 @@ class MCPGui(QMainWindow):
                 color: #888888;
                 border-color: #3a3a3a;
             }
-            QTextEdit {
+            QTextEdit,
+            QPlainTextEdit {
                 min-height: 150px;
                 font-family: var(--font-mono);
             }
@@ -466,7 +858,7 @@ class MCPGui(QMainWindow):
                 border-radius: 3px;
                 background-color: var(--color-progress);
             }
-            QLabel#imagePreview {
+            QListView#imagePreview {
                 background-color: var(--color-image-bg);
                 border: 2px solid var(--color-image-border);
                 border-radius: 10px;
@@ -775,6 +1167,16 @@ class MCPGui(QMainWindow):
             "Gerar arquivos de estilo XMP para Darktable"
         )
 
+        self.watch_check = QCheckBox("Contínuo (watch)")
+        self.watch_check.setAccessibleName("Modo contínuo")
+        self.watch_check.setAccessibleDescription(
+            "Manter o host rodando e processar imagens recém-importadas em micro-lotes"
+        )
+        self.watch_check.setToolTip(
+            "Mantém o host aguardando novas importações e roda o modo em lotes de até 'Limite' imagens. "
+            "Use Parar para encerrar."
+        )
+
         self.only_raw_check.setToolTip(
             "Processa somente arquivos RAW (ignora JPEGs e derivados)."
         )
@@ -792,6 +1194,7 @@ class MCPGui(QMainWindow):
         flags_layout.addWidget(self.dry_run_check)
         flags_layout.addWidget(self.attach_images_check)
         flags_layout.addWidget(self.generate_styles_check)
+        flags_layout.addWidget(self.watch_check)
         flags_layout.addStretch()
 
         config_form.addRow("Execução:", flags_widget)
@@ -881,9 +1284,11 @@ class MCPGui(QMainWindow):
         log_layout.setContentsMargins(18, 12, 18, 12)
         log_layout.setSpacing(12)
 
-        self.log_text = QTextEdit()
+        # QPlainTextEdit com limite de blocos: o painel é um buffer circular de linhas
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
-        self.log_text.setLineWrapMode(QTextEdit.LineWrapMode.WidgetWidth)
+        self.log_text.setLineWrapMode(QPlainTextEdit.LineWrapMode.WidgetWidth)
+        self.log_text.setMaximumBlockCount(self._log_buffer.max_lines)
         self.log_text.setMinimumHeight(110)
         self.log_text.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.log_text.setToolTip("Logs e progresso serão exibidos aqui...")
@@ -912,7 +1317,7 @@ class MCPGui(QMainWindow):
         self.run_button.setToolTip(i18n.t("button.run"))
         self.run_button.setAccessibleName(i18n.t("button.run"))
         self.run_button.setAccessibleDescription(i18n.t("button.run"))
-        self.run_button.clicked.connect(self.run_host)
+        self.run_button.clicked.connect(lambda: self.run_host())
 
         self.stop_button = QPushButton(i18n.t("button.stop"))
         self.stop_button.setObjectName("stopButton")
@@ -953,14 +1358,28 @@ class MCPGui(QMainWindow):
         layout.setContentsMargins(18, 12, 18, 12)
         layout.setSpacing(10)
 
-        self.image_preview = QLabel("Pré-visualização da imagem em execução")
-        self.image_preview.setObjectName("imagePreview")
-        self.image_preview.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.image_preview.setMinimumHeight(320)
-        self.image_preview.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        self.image_preview.setWordWrap(True)
-
-        layout.addWidget(self.image_preview)
+        # Grade virtualizada: só as células visíveis pedem miniatura, carregada fora da thread da interface
+        self.thumbnail_model = ThumbnailModel(self)
+        self.image_grid = QListView()
+        self.image_grid.setObjectName("imagePreview")
+        self.image_grid.setModel(self.thumbnail_model)
+        self.image_grid.setItemDelegate(ThumbnailDelegate(self.image_grid))
+        self.image_grid.setViewMode(QListView.ViewMode.IconMode)
+        self.image_grid.setResizeMode(QListView.ResizeMode.Adjust)
+        self.image_grid.setMovement(QListView.Movement.Static)
+        self.image_grid.setUniformItemSizes(True)
+        self.image_grid.setLayoutMode(QListView.LayoutMode.Batched)
+        self.image_grid.setBatchSize(200)
+        self.image_grid.setIconSize(QSize(160, 120))
+        self.image_grid.setGridSize(QSize(176, 152))
+        self.image_grid.setSpacing(4)
+        self.image_grid.setWordWrap(False)
+        self.image_grid.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.image_grid.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.image_grid.setMinimumHeight(320)
+        self.image_grid.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+
+        layout.addWidget(self.image_grid)
 
         meta_layout = QVBoxLayout()
         meta_layout.setSpacing(4)
@@ -1000,61 +1419,43 @@ class MCPGui(QMainWindow):
 
     def _reset_image_preview(self, message: str | None = None) -> None:
         self._current_image_path = None
-        self._current_pixmap = None
-        self.image_preview.setPixmap(QPixmap())
-        self.image_preview.setText(
-            message
-            or "Nenhuma imagem está em tratamento no momento. Aguardando execução..."
-        )
-        self.image_title_label.setText("Nenhuma imagem em tratamento")
+        self.thumbnail_model.clear()
+        self.image_title_label.setText(message or "Nenhuma imagem em tratamento")
         self.image_path_label.setText("Inicie a execução para visualizar a imagem atual.")
 
-    def _set_current_image_preview(self, path: Path) -> None:
+    def _set_current_image_preview(self, path: Path, image_id=None) -> None:
+        """Destaca a imagem na grade; a miniatura vem do pool, sem decodificar aqui."""
         expanded = path.expanduser()
         self._current_image_path = expanded
         self.image_title_label.setText(expanded.name)
         self.image_path_label.setText(str(expanded))
-
-        pixmap = QPixmap(str(expanded))
-        if pixmap.isNull():
-            self._current_pixmap = None
-            self.image_preview.setPixmap(QPixmap())
-            self.image_preview.setText("Pré-visualização indisponível para este arquivo.")
-            return
-
-        self._current_pixmap = pixmap
-        self.image_preview.setText("")
-        self._refresh_image_preview()
-
-    def _refresh_image_preview(self) -> None:
-        if not self._current_pixmap:
+        row = self.thumbnail_model.row_of(image_id)
+        if row is not None:
+            index = self.thumbnail_model.index(row)
+            self.image_grid.setCurrentIndex(index)
+            self.image_grid.scrollTo(index)
+
+    @Slot(dict)
+    def _on_run_progress(self, event: dict) -> None:
+        """Progresso exato vindo do BatchProcessor (sem raspar o log)."""
+        stage = event.get("stage")
+        label = f"[{event.get('mode')}] {self.STAGE_LABELS.get(stage, stage)}"
+        self._update_progress(event.get("index") or 0, event.get("total") or 0, label)
+
+        if event.get("images"):
+            self.thumbnail_model.extend(event["images"])
+        if event.get("id") is None:
             return
-
-        target_size = self.image_preview.size()
-        if target_size.width() <= 2 or target_size.height() <= 2:
-            return
-
-        scaled = self._current_pixmap.scaled(
-            target_size,
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation,
+        self.thumbnail_model.upsert(
+            event["id"],
+            event.get("path"),
+            mode=event.get("mode"),
+            decision=event.get("decision"),
+            applied=stage == "apply",
         )
-        self.image_preview.setPixmap(scaled)
-
-    def _maybe_update_image_preview(self, text: str) -> None:
-        if not text:
-            return
-
-        for line in text.splitlines():
-            match = self._image_path_pattern.search(line)
-            if not match:
-                continue
-
-            cleaned = match.group(0).strip(" ' \"")
-            candidate = Path(cleaned)
-            if candidate.exists():
-                self._set_current_image_preview(candidate)
-                return
+        path = event.get("path")
+        if path and Path(path) != self._current_image_path:
+            self._set_current_image_preview(Path(path), event["id"])
 
     def _standardize_button(self, button: QPushButton, *, width: int = 130) -> None:
         button.setMinimumWidth(width)
@@ -1385,17 +1786,24 @@ class MCPGui(QMainWindow):
             self._stop_requested = True
             self._append_log("[sistema] Interrupção solicitada. Aguardando conclusão da operação atual...")
             self.status_signal.emit("Interrupção solicitada...")
+            # O diário já está em disco a cada etapa; o runner abandona a chamada ao LLM em curso
+            self._runner.cancel()
 
     def _append_log(self, text: str) -> None:
-        self.log_signal.emit(text)
+        # Seguro em qualquer thread; o painel é atualizado em lote por _flush_log_ui
+        self._log_buffer.push(text)
 
-    @Slot(str)
-    def _append_log_ui(self, text: str) -> None:
-        self.log_text.append(text)
-        self.log_text.verticalScrollBar().setValue(
-            self.log_text.verticalScrollBar().maximum()
-        )
-        self._maybe_update_image_preview(text)
+    @Slot()
+    def _flush_log_ui(self) -> None:
+        lines = self._log_buffer.drain()
+        if not lines:
+            return
+        scrollbar = self.log_text.verticalScrollBar()
+        # Só acompanha o fim se o usuário não tiver rolado para cima para ler
+        follow = scrollbar.value() >= scrollbar.maximum() - 4
+        self.log_text.appendPlainText("\n".join(lines))
+        if follow:
+            scrollbar.setValue(scrollbar.maximum())
 
     @Slot(str)
     def _set_status_ui(self, text: str) -> None:
@@ -1462,9 +1870,16 @@ class MCPGui(QMainWindow):
             self.progress.setFormat(message)
 
 
-    def resizeEvent(self, event: QResizeEvent) -> None:  # type: ignore[override]
-        super().resizeEvent(event)
-        self._refresh_image_preview()
+    def closeEvent(self, event) -> None:  # type: ignore[override]
+        # Encerra o servidor MCP compartilhado pelas execuções
+        self._runner.cancel()
+        self._runner.close()
+        self.thumbnail_model.shutdown()
+        self._lists_refresh_timer.stop()
+        self._log_timer.stop()
+        self._flush_log_ui()
+        self._log_buffer.close()
+        super().closeEvent(event)
 
     @Slot(str)
     def _show_error(self, message: str) -> None:
@@ -1472,9 +1887,37 @@ class MCPGui(QMainWindow):
 
     # ----------------------------- Execução -------------------------------------------------
 
-    def run_host(self) -> None:
+    def _undo_last_batch(self) -> None:
+        confirm = QMessageBox.question(
+            self,
+            "Desfazer último lote",
+            "Restaurar rating, colorlabels e tags das imagens alteradas pelo último lote?",
+        )
+        if confirm != QMessageBox.StandardButton.Yes:
+            return
+
+        def task() -> None:
+            with self._runner.lock:
+                result = self._runner.client().call_tool("undo_last_batch", {})
+            for part in result.get("content", []):
+                if part.get("type") == "text":
+                    self._append_log(part["text"])
+
+        self._run_async("Desfazendo último lote...", task)
+
+    @Slot(str)
+    def _set_last_run_id(self, run_id: str) -> None:
+        self._last_run_id = run_id
+        self.resume_action.setEnabled(True)
+
+    def _resume_last_run(self) -> None:
+        if self._last_run_id:
+            self.run_host(resume=self._last_run_id)
+
+    def run_host(self, resume: Optional[str] = None) -> None:
         try:
             config = self._build_config()
+            config.resume = resume
         except ValueError as exc:
             self.error_signal.emit(f"Parâmetros inválidos: {exc}")
             return
@@ -1484,32 +1927,36 @@ class MCPGui(QMainWindow):
 
         self._reset_image_preview("Aguardando detecção da imagem em processamento...")
 
-        def task() -> None:
-            try:
-                cmd = config.build_command()
-                self._append_log("Executando: " + " ".join(cmd))
-
-                proc = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                )
-                assert proc.stdout is not None
+        # Roda na thread do runner: o QAction só é tocado pela thread da GUI, via sinal
+        run_ids: list[str] = []
 
-                for line in proc.stdout:
-                    self._append_log(line.rstrip())
+        def on_output(line: str) -> None:
+            match = self._run_id_pattern.search(line)
+            if match:
+                run_ids.append(match.group(1))
+                self.run_id_signal.emit(match.group(1))
+            self._append_log(line)
 
-                ret = proc.wait()
-                if ret != 0:
-                    raise RuntimeError(f"Processo retornou código de erro {ret}")
+        def task() -> None:
+            argv = config.build_args()
+            self._append_log("Executando: " + " ".join(argv))
+            try:
+                self._runner.run(argv, progress=self.run_progress_signal.emit, output=on_output)
+            except RunCancelled:
+                if run_ids:
+                    self._append_log(
+                        f"[sistema] Execução {run_ids[-1]} interrompida. "
+                        "Use Ferramentas > Retomar última execução para continuar."
+                    )
             except (PromptValidationError, LLMProviderError) as exc:
                 self.error_signal.emit(str(exc))
+            except SystemExit as exc:
+                # argparse do host rejeitou a combinação de opções
+                self.error_signal.emit(f"Argumentos inválidos para o host (código {exc.code}).")
             except Exception as exc:
                 self.error_signal.emit(f"Erro inesperado: {exc}")
-                self._append_log("Execução concluída com sucesso.")
             else:
-                self._append_log(f"Execução finalizada com código {ret}.")
+                self._append_log("Execução concluída.")
 
         self._run_async("Executando host...", task)
 
@@ -1563,7 +2010,6 @@ class MCPGui(QMainWindow):
         text_only = not bool(self.attach_images_check.isChecked())
 
         return RunConfig(
-            host=host,
             mode=mode,
             source=source,
             path_contains=path_contains,
@@ -1582,6 +2028,7 @@ class MCPGui(QMainWindow):
             prompt_variant=self.prompt_variant_combo.currentText().lower(),
             generate_styles=bool(self.generate_styles_check.isChecked()),
             text_only=text_only,
+            watch=bool(self.watch_check.isChecked()),
             extra_flags=[],
         )
 
@@ -1590,8 +2037,9 @@ class MCPGui(QMainWindow):
     def _check_connection_and_fetch_models(self) -> None:
         host = "ollama"
 
+        base_url = self.url_edit.text().strip() or OLLAMA_URL
+
         def task() -> None:
-            base_url = self.url_edit.text().strip() or OLLAMA_URL
             models = self._fetch_available_models(host, base_url)
 
             readable = "Ollama"
@@ -1688,16 +2136,16 @@ class MCPGui(QMainWindow):
             "url": url,
             "count": self._metrics["llm_model_checks"],
         })
-        if not self._llm_provider_factory:
-            raise RuntimeError("Fábrica de LLMProvider não configurada na GUI.")
         provider = self._llm_provider_factory(url=url, model="", timeout=10)
-        # Assume que provider tem método list_models()
         if hasattr(provider, "list_models"):
-            return provider.list_models()
+            models = provider.list_models()
         # Fallback: tenta método compatível
-        if hasattr(provider, "fetch_models"):
-            return provider.fetch_models()
-        raise NotImplementedError("O provider LLM não implementa list_models/fetch_models.")
+        elif hasattr(provider, "fetch_models"):
+            models = provider.fetch_models()
+        else:
+            raise NotImplementedError("O provider LLM não implementa list_models/fetch_models.")
+        self._list_cache.put(models_key(url), models)
+        return models
 
     @Slot(list)
     def _update_model_options(self, models: list[str]) -> None:
@@ -1721,10 +2169,7 @@ class MCPGui(QMainWindow):
             self._fetch_and_populate_collections()
 
     def _fetch_and_populate_collections(self, force_refresh: bool = False) -> None:
-        """Fetch collections from Darktable in a background thread, with caching."""
-        import time
-        
-        # Check cache if not forcing refresh
+        """Lista de coleções: memória, depois disco (revalidada em segundo plano), depois o darktable."""
         if not force_refresh and self._collections_cache is not None:
             cached_time, cached_collections = self._collections_cache
             age = time.time() - cached_time
@@ -1732,41 +2177,88 @@ class MCPGui(QMainWindow):
                 self._append_log(f"[cache] Usando coleções em cache ({age:.1f}s de idade)")
                 self.collections_signal.emit(cached_collections)
                 return
-        
-        def task() -> None:
-            import time
-            from common import list_available_collections, _find_appimage
-
-            self._metrics["dt_collection_checks"] += 1
-            self._metrics_logger.info({
-                "event": "dt_collection_check",
-                "count": self._metrics["dt_collection_checks"],
-            })
-            self._append_log("[dt] Buscando coleções do Darktable...")
 
-            def task():
-                try:
-                    appimage = _find_appimage()
-                    # Usa a fábrica injetada para criar o client (pode ser mock)
-                    with self._mcp_client_factory() as client:
-                        client.initialize()
-                        collections_data = list_available_collections(client)
+        if not force_refresh:
+            cached = self._list_cache.get(COLLECTIONS_KEY)
+            if cached is not None:
+                collections, stale = cached
+                self._append_log(f"[cache] {len(collections)} coleção(ões) da última consulta.")
+                self.collections_signal.emit(collections)
+                if stale:
+                    self._revalidate_in_background("coleções", lambda: self._fetch_collections(blocking=False))
+                return
 
-                    collections = [c.get("path", "") for c in collections_data if c.get("path")]
-                    self._append_log(f"[dt] {len(collections)} coleção(ões) encontrada(s).")
+        def task() -> None:
+            self._append_log("[dt] Buscando coleções do Darktable...")
+            try:
+                collections = self._fetch_collections()
+            except Exception as e:
+                self._append_log(f"[erro] Falha ao buscar coleções: {e}")
+                self.status_signal.emit("Erro ao buscar coleções.")
+                self.collections_signal.emit([])
+                return
+            self._append_log(f"[dt] {len(collections)} coleção(ões) encontrada(s).")
+            self.status_signal.emit(f"{len(collections)} coleção(ões) disponível(is).")
 
-                    # Update cache
-                    self._collections_cache = (time.time(), collections)
+        self._run_async("Buscando coleções...", task)
 
-                    self.status_signal.emit(f"{len(collections)} coleção(ões) disponível(is).")
-                    self.collections_signal.emit(collections)
+    def _fetch_collections(self, blocking: bool = True) -> list[str]:
+        """Consulta o darktable pelo servidor MCP compartilhado e atualiza os caches."""
+        from common import list_available_collections
 
-                except Exception as e:
-                    self._append_log(f"[erro] Falha ao buscar coleções: {e}")
-                    self.status_signal.emit("Erro ao buscar coleções.")
-                    self.collections_signal.emit([])
+        self._metrics["dt_collection_checks"] += 1
+        self._metrics_logger.info({
+            "event": "dt_collection_check",
+            "count": self._metrics["dt_collection_checks"],
+        })
+        # Em segundo plano não espera uma execução em andamento liberar o servidor
+        if not self._runner.lock.acquire(blocking=blocking):
+            raise RuntimeError("servidor MCP ocupado com uma execução")
+        try:
+            collections_data = list_available_collections(self._runner.client())
+        finally:
+            self._runner.lock.release()
+
+        collections = [c.get("path", "") for c in collections_data if c.get("path")]
+        self._collections_cache = (time.time(), collections)
+        self._list_cache.put(COLLECTIONS_KEY, collections)
+        self.collections_signal.emit(collections)
+        return collections
+
+    def _show_cached_lists(self) -> None:
+        """Ao abrir: últimas listas conhecidas na hora; as velhas são revalidadas logo depois."""
+        url = self.url_edit.text().strip() or OLLAMA_URL
+        cached_models = self._list_cache.get(models_key(url))
+        if cached_models is not None:
+            self._update_model_options(cached_models[0])
+        cached_collections = self._list_cache.get(COLLECTIONS_KEY)
+        if cached_collections is not None:
+            self._populate_collections(cached_collections[0])
+        # Listas nunca buscadas continuam sob demanda (Verificar modelos / fonte "collection")
+        if any(cached is not None and cached[1] for cached in (cached_models, cached_collections)):
+            self._lists_refresh_timer.start()
+
+    @Slot()
+    def _revalidate_cached_lists(self) -> None:
+        url = self.url_edit.text().strip() or OLLAMA_URL
+        cached_models = self._list_cache.get(models_key(url))
+        if cached_models is not None and cached_models[1]:
+            def refresh_models() -> None:
+                self.models_signal.emit(self._fetch_available_models("ollama", url))
+            self._revalidate_in_background("modelos", refresh_models)
+        cached_collections = self._list_cache.get(COLLECTIONS_KEY)
+        if cached_collections is not None and cached_collections[1]:
+            self._revalidate_in_background("coleções", lambda: self._fetch_collections(blocking=False))
+
+    def _revalidate_in_background(self, what: str, fetch: Callable[[], object]) -> None:
+        """Atualiza uma lista sem travar a interface nem ocupar _run_async; falhas só vão para o log."""
+        def task() -> None:
+            try:
+                fetch()
+            except Exception as e:
+                self._append_log(f"[cache] Não foi possível atualizar {what}: {e}")
 
-            self._run_async("Buscando coleções...", task)
+        threading.Thread(target=task, name=f"refresh-{what}", daemon=True).start()
 
     @Slot(list)
     def _populate_collections(self, collections: list[str]) -> None:
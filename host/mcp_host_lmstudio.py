@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import argparse
+import json
 import sys
 from pathlib import Path
 
@@ -18,7 +19,9 @@ from common import (
     setup_logging
 )
 from llm_api import OpenAICompatProvider
-from batch_processor import BatchProcessor
+from catalog import dump_catalog
+from runner import add_batch_arguments, run_batch
+import tracing
 
 PROTOCOL_VERSION = "2024-11-05"
 APP_VERSION = "0.3.0"
@@ -29,45 +32,24 @@ DEFAULT_LM_URL = "http://localhost:1234/v1/chat/completions"
 LMSTUDIO_URL = DEFAULT_LM_URL
 LMSTUDIO_MODEL = "local-model"
 
-def parse_args():
+def parse_args(argv=None):
     p = argparse.ArgumentParser(description="Host MCP darktable + LM Studio (Refactored)")
     p.add_argument("--version", action="version", version=f"v{APP_VERSION}")
-    p.add_argument("--mode", choices=["rating", "tagging", "export", "tratamento", "completo"], default="rating")
-    
-    # Filtros
-    p.add_argument("--source", choices=["all", "path", "tag", "collection"], default="all")
-    p.add_argument("--path-contains", help="Filtro path")
-    p.add_argument("--tag", help="Filtro tag")
-    p.add_argument("--collection", help="Filtro collection")
-    p.add_argument("--min-rating", type=int, default=-2)
-    p.add_argument("--only-raw", action="store_true")
-    
-    # Controle
-    p.add_argument("--dry-run", action="store_true")
-    p.add_argument("--limit", type=int, default=200)
-    p.add_argument("--target-dir", help="Para export")
-    
+
     # LLM
     p.add_argument("--model", help="Modelo LM Studio", default="local-model")
     p.add_argument("--lm-url", default=DEFAULT_LM_URL)
     p.add_argument("--timeout", type=float, default=60.0)
-    p.add_argument("--text-only", action="store_true")
-    p.add_argument("--prompt-file")
-    p.add_argument("--prompt-variant", default="basico")
-    
-    # Utils
-    p.add_argument("--check-deps", action="store_true")
-    p.add_argument("--check-darktable", action="store_true")
-    p.add_argument("--list-collections", action="store_true")
-    
-    # Logging
-    p.add_argument("--verbose", action="store_true", help="Ativa logs detalhados no console")
-    
-    return p.parse_args()
+
+    # Lote, filtros, utilitários e logging: os mesmos nos dois hosts (runner.run_batch)
+    add_batch_arguments(p)
+
+    return p.parse_args(argv)
 
 def main():
     args = parse_args()
     setup_logging(verbose=args.verbose)
+    tracing.enable(not args.no_trace)
     
     if args.check_deps:
         check_dependencies(DEPENDENCY_BINARIES)
@@ -87,7 +69,14 @@ def main():
     provider = OpenAICompatProvider(args.lm_url, args.model, args.timeout)
 
     try:
-        with McpClient(DT_SERVER_CMD, PROTOCOL_VERSION, CLIENT_INFO) as client:
+        from common import _find_appimage
+        appimage = _find_appimage()
+        if appimage:
+            print(f"[lmstudio-host] Usando AppImage: {appimage}")
+
+        with McpClient(
+            DT_SERVER_CMD, PROTOCOL_VERSION, CLIENT_INFO, appimage_path=appimage, profiling=args.server_profile
+        ) as client:
             client.initialize()
             
             if args.list_collections:
@@ -96,9 +85,18 @@ def main():
                     print(f"- {entry.get('path')} ({entry.get('image_count')})")
                 return
 
-            processor = BatchProcessor(client, provider, dry_run=args.dry_run)
-            processor.run(args.mode, args)
-            
+            if args.catalog_stats:
+                stats = dump_catalog(client).stats()
+                print(json.dumps(stats, ensure_ascii=False, indent=2))
+                return
+
+            if args.undo_last_batch:
+                res = client.call_tool("undo_last_batch", {})
+                print(res["content"][0]["text"])
+                return
+
+            run_batch(client, provider, args)
+
     except Exception as e:
         print(f"Erro fatal: {e}")
         sys.exit(1)
@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import argparse
+import json
 import sys
 from pathlib import Path
 
@@ -18,7 +19,9 @@ from common import (
     setup_logging
 )
 from llm_api import OllamaProvider
-from batch_processor import BatchProcessor
+from catalog import dump_catalog
+from runner import add_batch_arguments, run_batch
+import tracing
 
 PROTOCOL_VERSION = "2024-11-05"
 APP_VERSION = "0.3.0"
@@ -29,46 +32,37 @@ DEFAULT_OLLAMA_URL = "http://localhost:11434"
 OLLAMA_URL = DEFAULT_OLLAMA_URL
 OLLAMA_MODEL = "qwen2.5vl:7b"
 
-def parse_args():
+def parse_args(argv=None):
     p = argparse.ArgumentParser(description="Host MCP darktable + Ollama (Refactored)")
     p.add_argument("--version", action="version", version=f"v{APP_VERSION}")
-    p.add_argument("--mode", choices=["rating", "tagging", "export", "tratamento", "completo"], default="rating")
-    
-    # Filtros
-    p.add_argument("--source", choices=["all", "path", "tag", "collection"], default="all")
-    p.add_argument("--path-contains", help="Filtro path")
-    p.add_argument("--tag", help="Filtro tag")
-    p.add_argument("--collection", help="Filtro collection")
-    p.add_argument("--min-rating", type=int, default=-2)
-    p.add_argument("--only-raw", action="store_true")
-    
-    # Controle
-    p.add_argument("--dry-run", action="store_true")
-    p.add_argument("--limit", type=int, default=200)
-    p.add_argument("--target-dir", help="Para export")
-    
+
     # LLM
     p.add_argument("--model", help="Modelo Ollama")
     p.add_argument("--ollama-url", default=DEFAULT_OLLAMA_URL)
     p.add_argument("--timeout", type=float, default=600.0)
-    p.add_argument("--text-only", action="store_true")
-    p.add_argument("--prompt-file")
-    p.add_argument("--prompt-variant", default="basico")
-    
-    # Utils
-    p.add_argument("--check-deps", action="store_true")
-    p.add_argument("--check-darktable", action="store_true")
-    p.add_argument("--list-collections", action="store_true")
+    p.add_argument("--keep-alive", default="30m",
+                   help="Tempo que o Ollama mantém o modelo carregado após cada chamada (ex.: 30m, 1h, -1 = sempre)")
+    p.add_argument("--num-ctx", type=int, help="Janela de contexto do Ollama (options.num_ctx)")
+    p.add_argument("--num-batch", type=int, help="Tamanho do lote de avaliação do prompt (options.num_batch)")
     p.add_argument("--download-model")
-    
-    # Logging
-    p.add_argument("--verbose", action="store_true", help="Ativa logs detalhados no console")
-    
-    return p.parse_args()
+
+    # Lote, filtros, utilitários e logging: os mesmos nos dois hosts (runner.run_batch)
+    add_batch_arguments(p)
+
+    return p.parse_args(argv)
+
+def build_provider(args) -> OllamaProvider:
+    return OllamaProvider(
+        args.ollama_url, args.model or OLLAMA_MODEL, args.timeout,
+        keep_alive=args.keep_alive,
+        options={"num_ctx": args.num_ctx, "num_batch": args.num_batch},
+    )
+
 
 def main():
     args = parse_args()
     setup_logging(verbose=args.verbose)
+    tracing.enable(not args.no_trace)
     
     # 1. Dependencias
     if args.check_deps:
@@ -90,7 +84,7 @@ def main():
         return
 
     # 2. Setup Provider
-    provider = OllamaProvider(args.ollama_url, args.model or "qwen2.5vl:7b", args.timeout)
+    provider = build_provider(args)
     
     if args.download_model:
         print(f"Baixando {args.download_model}...")
@@ -105,7 +99,9 @@ def main():
         if appimage:
             print(f"[ollama-host] Usando AppImage: {appimage}")
 
-        with McpClient(DT_SERVER_CMD, PROTOCOL_VERSION, CLIENT_INFO, appimage_path=appimage) as client:
+        with McpClient(
+            DT_SERVER_CMD, PROTOCOL_VERSION, CLIENT_INFO, appimage_path=appimage, profiling=args.server_profile
+        ) as client:
             client.initialize()
             
             if args.list_collections:
@@ -114,8 +110,17 @@ def main():
                     print(f"- {entry.get('path')} ({entry.get('image_count')})")
                 return
 
-            processor = BatchProcessor(client, provider, dry_run=args.dry_run)
-            processor.run(args.mode, args)
+            if args.catalog_stats:
+                stats = dump_catalog(client).stats()
+                print(json.dumps(stats, ensure_ascii=False, indent=2))
+                return
+
+            if args.undo_last_batch:
+                res = client.call_tool("undo_last_batch", {})
+                print(res["content"][0]["text"])
+                return
+
+            run_batch(client, provider, args)
             
     except Exception as e:
         print(f"Erro fatal: {e}")
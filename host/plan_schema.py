@@ -0,0 +1,201 @@
+"""
+Schemas JSON dos planos de cada modo e leitura tolerante das respostas do LLM.
+
+Os schemas vão para o provider como saída estruturada (``format`` no Ollama,
+``response_format`` na API OpenAI), o que praticamente elimina JSON inválido.
+Quando a resposta ainda assim vem cortada (limite de tokens, timeout do
+stream), ``parse_plan`` aproveita todos os elementos completos das listas e
+``missing_ids`` diz quais imagens do bloco ficaram sem resposta, para que o
+host peça de novo só essas.
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import Optional
+
+_INT_LIST = {"type": "array", "items": {"type": "integer"}}
+_NOTES = {"type": "object", "additionalProperties": {"type": "string"}}
+
+PLAN_SCHEMAS = {
+    "rating": {
+        "type": "object",
+        "properties": {
+            "edits": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer"},
+                        "rating": {"type": "integer", "minimum": -1, "maximum": 5},
+                        "ajustes_sugeridos": {"type": "array", "items": {"type": "string"}},
+                    },
+                    "required": ["id", "rating"],
+                },
+            },
+            "notas_gerais": {"type": "string"},
+        },
+        "required": ["edits"],
+    },
+    "tagging": {
+        "type": "object",
+        "properties": {
+            "tags": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"tag": {"type": "string"}, "ids": _INT_LIST},
+                    "required": ["tag", "ids"],
+                },
+            },
+            "observacoes": _NOTES,
+        },
+        "required": ["tags"],
+    },
+    "export": {
+        "type": "object",
+        "properties": {"ids_para_exportar": _INT_LIST, "notas": _NOTES},
+        "required": ["ids_para_exportar"],
+    },
+    "tratamento": {
+        "type": "object",
+        "properties": {
+            "treatments": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer"},
+                        "rating": {"type": "integer", "minimum": -1, "maximum": 5},
+                        "color_label": {"type": "string", "enum": ["red", "yellow", "green", "blue", "purple"]},
+                        "exposure": {"type": "number"},
+                        "notes": {"type": "string"},
+                    },
+                    "required": ["id"],
+                },
+            },
+        },
+        "required": ["treatments"],
+    },
+    "triage": {
+        "type": "object",
+        "properties": {
+            "decisions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer"},
+                        "decision": {"type": "string", "enum": ["keep", "reject", "unsure"]},
+                    },
+                    "required": ["id", "decision"],
+                },
+            },
+        },
+        "required": ["decisions"],
+    },
+}
+
+
+def plan_schema(mode: str) -> Optional[dict]:
+    return PLAN_SCHEMAS.get(mode)
+
+
+def _strip_fence(text: str) -> str:
+    # Aceita bloco ```json sem o fechamento (resposta cortada no meio)
+    match = re.search(r"```(?:json)?\s*\n(.*?)(?:\n```|$)", text, re.DOTALL)
+    return (match.group(1) if match else text).strip()
+
+
+def _skip_ws(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+
+def _salvage_array(text: str, pos: int, decoder: json.JSONDecoder) -> list:
+    """Elementos completos de uma lista a partir de ``pos`` (logo após o '[')."""
+    items = []
+    while True:
+        pos = _skip_ws(text, pos)
+        if pos >= len(text) or text[pos] == "]":
+            return items
+        if text[pos] == ",":
+            pos += 1
+            continue
+        try:
+            value, end = decoder.raw_decode(text, pos)
+        except ValueError:
+            return items
+        after = _skip_ws(text, end)
+        # Sem ',' ou ']' depois, o último valor pode estar cortado (ex.: id 12 de 123)
+        if after >= len(text) or text[after] not in ",]":
+            return items
+        items.append(value)
+        pos = after
+
+
+def salvage_json(text: str) -> dict:
+    """Lê o que der de um objeto JSON truncado: chaves completas e itens completos das listas."""
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    if start < 0:
+        return {}
+    result: dict = {}
+    pos = start + 1
+    while True:
+        pos = _skip_ws(text, pos)
+        if pos >= len(text) or text[pos] == "}":
+            return result
+        if text[pos] == ",":
+            pos += 1
+            continue
+        try:
+            key, pos = decoder.raw_decode(text, pos)
+        except ValueError:
+            return result
+        pos = _skip_ws(text, pos)
+        if not isinstance(key, str) or text[pos:pos + 1] != ":":
+            return result
+        pos = _skip_ws(text, pos + 1)
+        try:
+            result[key], pos = decoder.raw_decode(text, pos)
+        except ValueError:
+            if text[pos:pos + 1] == "[":
+                result[key] = _salvage_array(text, pos + 1, decoder)
+            return result
+
+
+def parse_plan(answer: Optional[str]) -> tuple[Optional[dict], bool]:
+    """(plano, completo). Plano None quando nada pôde ser aproveitado."""
+    text = _strip_fence(answer or "")
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        salvaged = salvage_json(text)
+        return (salvaged or None), False
+    if not isinstance(parsed, dict):
+        return None, False
+    return parsed, True
+
+
+def mentioned_ids(plan: dict) -> set:
+    """IDs de imagem citados em qualquer formato de plano (edits, tags, ids_para_exportar...)."""
+    found = set()
+    for value in plan.values():
+        if not isinstance(value, list):
+            continue
+        for entry in value:
+            if isinstance(entry, dict):
+                if "id" in entry:
+                    found.add(entry["id"])
+                found.update(i for i in entry.get("ids") or [] if not isinstance(i, (dict, list)))
+            elif isinstance(entry, int) and not isinstance(entry, bool):
+                found.add(entry)
+    return found
+
+
+def missing_ids(plan: Optional[dict], ids: list) -> list:
+    """IDs do bloco que não aparecem no plano (na ordem do bloco)."""
+    seen = mentioned_ids(plan or {})
+    return [i for i in ids if i not in seen]
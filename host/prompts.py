@@ -1,41 +1,167 @@
 """
-Módulo utilitário para carregamento e validação de prompts YAML.
+Registro de prompts (config/prompts/*.md com cabeçalho YAML).
+
+Cada arquivo é lido, validado e compilado uma vez; leituras seguintes só
+conferem ``mtime``/tamanho e reaproveitam o ``Prompt`` em cache. O prompt é
+indexado pelo cabeçalho (``fluxo`` + ``variante``), então ``tagging`` +
+``basico`` encontra ``tagging_cliente.md`` via ``DEFAULT_VARIANTS``. O
+mesmo registro é usado pelo host, pela GUI e por ``scripts/validate_prompts.py``.
 """
-import os
-import yaml
+import hashlib
+import string
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Optional
+
+import yaml
 
 PROMPT_DIR = Path(__file__).parent.parent / 'config' / 'prompts'
 
-def list_prompts():
-    return list(PROMPT_DIR.glob('*.md'))
+REQUIRED_FIELDS = ('fluxo', 'variante', 'changelog')
 
-def load_prompt_file(filename):
-    path = PROMPT_DIR / filename
-    with open(path, encoding='utf-8') as f:
-        content = f.read()
+# Variante usada quando "basico" não existe para o fluxo
+DEFAULT_VARIANTS = {
+    'tagging': 'cliente',
+    'export': 'job',
+    'completo': 'default',
+}
+
+
+@dataclass(frozen=True)
+class Prompt:
+    path: Path
+    header: Optional[dict]
+    body: str
+    text: str
+    sha256: str
+    template: string.Template = field(repr=False, compare=False)
+
+    @property
+    def mode(self) -> Optional[str]:
+        return (self.header or {}).get('fluxo')
+
+    @property
+    def variant(self) -> Optional[str]:
+        return (self.header or {}).get('variante')
+
+    @property
+    def cache_key(self) -> str:
+        """Identifica o conteúdo do prompt (muda quando o texto muda)."""
+        return f"{self.mode}:{self.variant}:{self.sha256[:16]}"
+
+    def render(self, **variables) -> str:
+        """Substitui ``$variavel``/``${variavel}``; nomes desconhecidos ficam como estão."""
+        if not variables:
+            return self.body
+        return self.template.safe_substitute(variables)
+
+
+def parse_prompt(path, content):
     header, body = None, content
     if content.startswith('---'):
         parts = content.split('---', 2)
         if len(parts) >= 3:
             header = yaml.safe_load(parts[1])
             body = parts[2].lstrip('\n')
-    return header, body
+    return Prompt(
+        path=Path(path),
+        header=header,
+        body=body,
+        text=content,
+        sha256=hashlib.sha256(body.encode('utf-8')).hexdigest(),
+        template=string.Template(body),
+    )
+
 
 def validate_prompt_header(header):
-    required = ['fluxo', 'variante', 'changelog']
     if not header:
         return False, 'Sem cabeçalho YAML'
-    for field in required:
-        if field not in header:
-            return False, f'Campo obrigatório ausente: {field}'
+    if not isinstance(header, dict):
+        return False, 'Cabeçalho YAML deve ser um mapeamento'
+    for field_name in REQUIRED_FIELDS:
+        if field_name not in header:
+            return False, f'Campo obrigatório ausente: {field_name}'
     return True, ''
 
-def get_prompt(mode, variant='basico'):
-    """Carrega prompt pelo modo e variante, validando header."""
-    fname = f'{mode}_{variant}.md'
-    header, body = load_prompt_file(fname)
-    ok, msg = validate_prompt_header(header)
-    if not ok:
-        raise ValueError(f'Prompt inválido: {fname}: {msg}')
-    return body
\ No newline at end of file
+
+class PromptRegistry:
+    def __init__(self, prompt_dir=None):
+        self.prompt_dir = Path(prompt_dir or PROMPT_DIR)
+        # caminho -> ((mtime_ns, tamanho), Prompt)
+        self._cache = {}
+
+    def load_path(self, path):
+        """Prompt de um arquivo qualquer (ex.: --prompt-file), relido só se mudou."""
+        path = Path(path)
+        st = path.stat()
+        signature = (st.st_mtime_ns, st.st_size)
+        cached = self._cache.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        prompt = parse_prompt(path, path.read_text(encoding='utf-8'))
+        self._cache[path] = (signature, prompt)
+        return prompt
+
+    def all(self):
+        """Todos os prompts do diretório (cabeçalho inválido levanta yaml.YAMLError)."""
+        return [self.load_path(p) for p in sorted(self.prompt_dir.glob('*.md'))]
+
+    def validate_all(self):
+        """[(caminho, ok, mensagem, prompt|None)] para cada arquivo do diretório."""
+        results = []
+        for path in sorted(self.prompt_dir.glob('*.md')):
+            try:
+                prompt = self.load_path(path)
+            except yaml.YAMLError as e:
+                results.append((path, False, f'YAML inválido: {e}', None))
+                continue
+            ok, msg = validate_prompt_header(prompt.header)
+            results.append((path, ok, msg, prompt))
+        return results
+
+    def find(self, mode, variant='basico'):
+        """Prompt validado do fluxo/variante, ou None se não houver arquivo."""
+        candidates = [variant]
+        if variant == 'basico' and mode in DEFAULT_VARIANTS:
+            candidates.append(DEFAULT_VARIANTS[mode])
+        # Caminho rápido: convenção <fluxo>_<variante>.md
+        for name in candidates:
+            path = self.prompt_dir / f'{mode}_{name}.md'
+            if path.is_file():
+                return self._validated(self.load_path(path))
+        # Senão, procura pelo cabeçalho (arquivos com nome fora da convenção)
+        for name in candidates:
+            for prompt in self.all():
+                if prompt.mode == mode and prompt.variant == name:
+                    return self._validated(prompt)
+        return None
+
+    def get(self, mode, variant='basico'):
+        prompt = self.find(mode, variant)
+        if prompt is None:
+            raise ValueError(f'Prompt não encontrado: fluxo={mode} variante={variant} em {self.prompt_dir}')
+        return prompt
+
+    @staticmethod
+    def _validated(prompt):
+        ok, msg = validate_prompt_header(prompt.header)
+        if not ok:
+            raise ValueError(f'Prompt inválido: {prompt.path.name}: {msg}')
+        return prompt
+
+
+REGISTRY = PromptRegistry()
+
+
+def list_prompts():
+    return list(PROMPT_DIR.glob('*.md'))
+
+
+def load_prompt_file(filename):
+    prompt = REGISTRY.load_path(PROMPT_DIR / filename)
+    return prompt.header, prompt.body
+
+
+def get_prompt(mode, variant='basico', **variables):
+    """Carrega prompt pelo modo e variante, validando header (em cache por mtime)."""
+    return REGISTRY.get(mode, variant).render(**variables)
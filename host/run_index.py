@@ -0,0 +1,330 @@
+"""
+Índice das execuções gravadas em ``logs/``.
+
+Cada ``save_log`` acrescenta uma linha a ``logs/index.jsonl`` com o resumo do
+lote (modo, fonte, modelo, IDs enviados, latência e tokens), então perguntas
+como "quais execuções tocaram a imagem 1234" ou "latência média por modelo na
+última semana" leem só o índice, sem abrir cada ``batch-*.json``. ``rebuild``
+gera o índice a partir dos logs existentes (uma vez, em pastas antigas) e
+``prune`` aplica a retenção: apaga os logs antigos e reescreve o índice só com
+o que sobrou.
+
+    python host/run_index.py query --image 1234
+    python host/run_index.py stats --since 7d --by model
+    python host/run_index.py prune --keep-days 30
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import re
+import statistics
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Optional
+
+from tracing import trace_path_for
+
+INDEX_NAME = "index.jsonl"
+INDEX_VERSION = 1
+# batch-<modo>-<ts>.json ou .jsonl.gz (--compact-log), sem os .trace.json e os -export-result.json ao lado
+LOG_PATTERN = re.compile(r"^batch-(?P<mode>[a-z_]+)-\d{8}-\d{6}\.(json|jsonl\.gz)$")
+
+
+def default_index() -> Path:
+    # Importado aqui: common.save_log chama este módulo, e os benchmarks trocam LOG_DIR em tempo de execução
+    import common
+    return common.LOG_DIR / INDEX_NAME
+
+
+def _iso(timestamp: Optional[str]) -> Optional[str]:
+    """20251208-120945 -> 2025-12-08T12:09:45 (mesmo formato dos diários)."""
+    try:
+        return datetime.strptime(timestamp, "%Y%m%d-%H%M%S").strftime("%Y-%m-%dT%H:%M:%S")
+    except (TypeError, ValueError):
+        return timestamp
+
+
+def _llm_calls(llm) -> list[dict]:
+    calls = llm if isinstance(llm, list) else [llm] if isinstance(llm, dict) else []
+    # O reparo de respostas truncadas é uma chamada a mais dentro do mesmo bloco
+    return calls + [c["repair"] for c in calls if isinstance(c.get("repair"), dict)]
+
+
+def entry_from_log(log_file: Path, data: dict) -> dict:
+    """Resumo de um log de lote (o dict gravado por save_log, completo ou compacto)."""
+    extra = data.get("extra") or {}
+    calls = _llm_calls(extra.get("llm"))
+    prompt_tokens = completion_tokens = 0
+    for call in calls:
+        usage = call.get("usage") or {}
+        prompt_tokens += usage.get("prompt_tokens") or call.get("prompt_eval_count") or 0
+        completion_tokens += usage.get("completion_tokens") or call.get("eval_count") or 0
+    if "image_ids" in data:
+        ids = list(data.get("image_ids") or [])
+    else:
+        ids = [img.get("id") for img in data.get("images_sample") or [] if isinstance(img, dict)]
+    return {
+        "v": INDEX_VERSION,
+        "log": Path(log_file).name,
+        "ts": _iso(data.get("timestamp")),
+        "mode": data.get("mode"),
+        "source": data.get("source"),
+        "run_id": extra.get("run_id"),
+        "provider": next((c.get("provider") for c in calls if c.get("provider")), None),
+        "model": next((c.get("model") for c in calls if c.get("model")), None),
+        "ids": ids,
+        "images": len(ids),
+        "llm_calls": len(calls),
+        "latency_ms": sum(c.get("latency_ms") or 0 for c in calls),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "ok": data.get("model_answer") is not None or "triage" in extra,
+    }
+
+
+def append_entry(entry: dict, index_file: Optional[Path] = None) -> None:
+    index_file = index_file or default_index()
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    with index_file.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def index_log(log_file: Path, data: dict) -> None:
+    """Chamado por save_log: o índice fica na mesma pasta do log."""
+    try:
+        append_entry(entry_from_log(log_file, data), Path(log_file).parent / INDEX_NAME)
+    except Exception as e:
+        # O índice é reconstruível (rebuild); não derruba o lote por causa dele
+        logging.warning({"event": "run_index_error", "log": str(log_file), "error": str(e)})
+
+
+def export_result_path_for(log_file: Path) -> Path:
+    """Arquivo que append_export_result_to_log grava quando não consegue reescrever o log."""
+    log_file = Path(log_file)
+    return log_file.with_name(f"{log_file.stem}-export-result{log_file.suffix}")
+
+
+def load_entries(index_file: Optional[Path] = None) -> list[dict]:
+    index_file = index_file or default_index()
+    entries = []
+    try:
+        with index_file.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Linha truncada por queda do processo no meio do append
+                    continue
+    except FileNotFoundError:
+        return []
+    return entries
+
+
+def _write_entries(index_file: Path, entries: Iterable[dict]) -> None:
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = index_file.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(tmp, index_file)
+
+
+def rebuild(log_dir: Optional[Path] = None) -> int:
+    """Reescreve o índice lendo todos os logs de lote da pasta. Retorna quantos entraram."""
+    from common import read_log
+
+    log_dir = Path(log_dir) if log_dir else default_index().parent
+    entries = []
+    for path in sorted(log_dir.glob("batch-*")):
+        if not LOG_PATTERN.match(path.name):
+            continue
+        try:
+            data = read_log(path)
+        except (OSError, ValueError) as e:
+            logging.warning({"event": "run_index_bad_log", "log": str(path), "error": str(e)})
+            continue
+        if isinstance(data, dict):
+            entries.append(entry_from_log(path, data))
+    entries.sort(key=lambda e: e.get("ts") or "")
+    _write_entries(log_dir / INDEX_NAME, entries)
+    return len(entries)
+
+
+def parse_since(value: Optional[str]) -> Optional[str]:
+    """'7d', '12h', '30m' ou uma data ISO -> timestamp ISO comparável com ``ts``."""
+    if not value:
+        return None
+    match = re.fullmatch(r"(\d+)([dhm])", value.strip())
+    if match:
+        amount, unit = int(match.group(1)), match.group(2)
+        delta = {"d": timedelta(days=amount), "h": timedelta(hours=amount), "m": timedelta(minutes=amount)}[unit]
+        return (datetime.now() - delta).strftime("%Y-%m-%dT%H:%M:%S")
+    try:
+        return datetime.fromisoformat(value.strip()).strftime("%Y-%m-%dT%H:%M:%S")
+    except ValueError as e:
+        raise ValueError(f"Período inválido: {value!r} (use 7d, 12h, 30m ou AAAA-MM-DD)") from e
+
+
+def query(
+    entries: Iterable[dict],
+    image_id=None,
+    mode: Optional[str] = None,
+    model: Optional[str] = None,
+    since: Optional[str] = None,
+) -> list[dict]:
+    """Filtra as entradas; ``since`` já no formato de ``parse_since``."""
+    result = []
+    for entry in entries:
+        if image_id is not None and image_id not in (entry.get("ids") or []):
+            continue
+        if mode and entry.get("mode") != mode:
+            continue
+        if model and entry.get("model") != model:
+            continue
+        if since and (entry.get("ts") or "") < since:
+            continue
+        result.append(entry)
+    return result
+
+
+def summarize(entries: Iterable[dict], by: str = "model") -> list[dict]:
+    """Agrega execuções por ``model``, ``mode`` ou ``provider`` (latência só das que chamaram o LLM)."""
+    groups: dict = {}
+    for entry in entries:
+        groups.setdefault(entry.get(by) or "-", []).append(entry)
+    rows = []
+    for key, group in groups.items():
+        latencies = [e["latency_ms"] for e in group if e.get("llm_calls")]
+        images = sum(e.get("images") or 0 for e in group)
+        rows.append({
+            by: key,
+            "runs": len(group),
+            "failed": sum(1 for e in group if not e.get("ok")),
+            "images": images,
+            "latency_ms_avg": round(statistics.fmean(latencies)) if latencies else None,
+            "latency_ms_max": max(latencies) if latencies else None,
+            "ms_per_image": round(sum(latencies) / images, 1) if latencies and images else None,
+            "prompt_tokens": sum(e.get("prompt_tokens") or 0 for e in group),
+            "completion_tokens": sum(e.get("completion_tokens") or 0 for e in group),
+        })
+    return sorted(rows, key=lambda r: -r["runs"])
+
+
+def prune(
+    index_file: Optional[Path] = None,
+    keep_days: Optional[int] = None,
+    keep_runs: Optional[int] = None,
+    dry_run: bool = False,
+) -> list[dict]:
+    """Retenção: remove logs (com traces e -export-result) fora da janela e compacta o índice.
+
+    Fica o que estiver nos ``keep_runs`` mais recentes OU dentro de ``keep_days``
+    (sem nenhum dos dois, só descarta entradas cujo log já não existe). Retorna
+    as entradas removidas.
+    """
+    index_file = index_file or default_index()
+    log_dir = index_file.parent
+    entries = sorted(load_entries(index_file), key=lambda e: e.get("ts") or "", reverse=True)
+    cutoff = (datetime.now() - timedelta(days=keep_days)).strftime("%Y-%m-%dT%H:%M:%S") if keep_days else None
+    kept, removed = [], []
+    for position, entry in enumerate(entries):
+        recent = keep_runs is not None and position < keep_runs
+        fresh = cutoff is not None and (entry.get("ts") or "") >= cutoff
+        limited = keep_runs is not None or cutoff is not None
+        exists = (log_dir / entry.get("log", "")).is_file()
+        if exists and (not limited or recent or fresh):
+            kept.append(entry)
+        else:
+            removed.append(entry)
+    if dry_run:
+        return removed
+    for entry in removed:
+        log_file = log_dir / entry.get("log", "")
+        for path in (log_file, trace_path_for(log_file), export_result_path_for(log_file)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning({"event": "run_index_prune_error", "path": str(path), "error": str(e)})
+    _write_entries(index_file, reversed(kept))
+    return removed
+
+
+def format_entry(entry: dict) -> str:
+    model = entry.get("model") or "-"
+    status = "ok" if entry.get("ok") else "falhou"
+    return (
+        f"{entry.get('ts')}  {entry.get('mode') or '-':<11} {model:<22} {entry.get('images', 0):>4} img  "
+        f"{(entry.get('latency_ms') or 0) / 1000:7.1f} s  {status:<6} {entry.get('log')}"
+    )
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Consulta o índice de execuções em logs/index.jsonl")
+    p.add_argument("--index", type=Path, help="Arquivo de índice (padrão: logs/index.jsonl)")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    q = sub.add_parser("query", help="Lista as execuções que batem com os filtros")
+    q.add_argument("--image", type=int, help="Só execuções que enviaram este ID de imagem")
+    q.add_argument("--mode")
+    q.add_argument("--model")
+    q.add_argument("--since", help="7d, 12h, 30m ou AAAA-MM-DD")
+    q.add_argument("--json", action="store_true", help="Uma entrada JSON por linha")
+
+    s = sub.add_parser("stats", help="Agrega latência, imagens e tokens")
+    s.add_argument("--by", choices=["model", "mode", "provider"], default="model")
+    s.add_argument("--mode")
+    s.add_argument("--since", help="7d, 12h, 30m ou AAAA-MM-DD")
+
+    sub.add_parser("rebuild", help="Recria o índice a partir dos logs de lote existentes")
+
+    r = sub.add_parser("prune", help="Apaga logs antigos e compacta o índice")
+    r.add_argument("--keep-days", type=int)
+    r.add_argument("--keep-runs", type=int)
+    r.add_argument("--dry-run", action="store_true", help="Só mostra o que seria removido")
+
+    args = p.parse_args(argv)
+    index_file = args.index or default_index()
+
+    if args.command == "rebuild":
+        count = rebuild(index_file.parent)
+        print(f"Índice recriado com {count} execução(ões): {index_file}")
+        return 0
+    if args.command == "prune":
+        removed = prune(index_file, args.keep_days, args.keep_runs, dry_run=args.dry_run)
+        verb = "Seriam removidas" if args.dry_run else "Removidas"
+        print(f"{verb} {len(removed)} execução(ões).")
+        return 0
+
+    try:
+        since = parse_since(args.since)
+    except ValueError as e:
+        print(f"[erro] {e}")
+        return 2
+    entries = load_entries(index_file)
+    if not entries and not index_file.exists():
+        print(f"Índice não encontrado em {index_file}; rode 'rebuild' para gerá-lo a partir dos logs.")
+        return 1
+    if args.command == "query":
+        for entry in query(entries, image_id=args.image, mode=args.mode, model=args.model, since=since):
+            print(json.dumps(entry, ensure_ascii=False) if args.json else format_entry(entry))
+        return 0
+    for row in summarize(query(entries, mode=args.mode, since=since), by=args.by):
+        avg = f"{row['latency_ms_avg'] / 1000:.1f} s" if row["latency_ms_avg"] is not None else "-"
+        per_image = f"{row['ms_per_image']:.0f} ms/img" if row["ms_per_image"] is not None else "-"
+        print(
+            f"{row[args.by]}: {row['runs']} execução(ões), {row['failed']} falha(s), {row['images']} imagens, "
+            f"latência média {avg} ({per_image}), tokens {row['prompt_tokens']}+{row['completion_tokens']}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
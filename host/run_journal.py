@@ -0,0 +1,184 @@
+"""
+Diário de execução (checkpoint) para retomar lotes interrompidos.
+
+Cada execução grava ``logs/runs/<run_id>.jsonl`` com uma linha por evento:
+amostra escolhida, imagens codificadas (``encode``), respostas do modelo por
+bloco (``infer``) e ações aplicadas no darktable (``apply``). Com
+``--resume <run_id>`` o host relê o diário, reaproveita as respostas já
+recebidas e não reaplica o que já foi gravado no catálogo. As opções que
+definem a amostra, os blocos e o que é aplicado (``RESUME_ARGS``) voltam às
+gravadas no início da execução, qualquer que seja a linha de comando da retomada.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import secrets
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from common import LOG_DIR
+
+RUNS_DIR = LOG_DIR / "runs"
+
+STAGE_SAMPLE = "sample"
+STAGE_ENCODE = "encode"
+STAGE_INFER = "infer"
+STAGE_APPLY = "apply"
+
+# Opções restauradas do evento ``start`` no --resume. Ficam de fora as de runtime
+# (servidor/modelo, timeout, logs, --dry-run): trocar o modelo para terminar o
+# lote é legítimo e não invalida as respostas já recebidas.
+RESUME_ARGS = (
+    "mode", "source", "path_contains", "tag", "collection", "min_rating", "only_raw",
+    "limit", "target_dir", "text_only", "prompt_file", "prompt_variant", "generate_styles",
+    "structured_output", "contact_sheet", "sheet_grid", "sheet_tile_size", "max_dimension",
+    "cascade", "triage_model", "triage_max_dimension", "keep_min_rating", "sampling", "seed",
+    "chunk_size", "incremental",
+)
+
+
+class RunJournalError(Exception):
+    """Erro de domínio para diários de execução inexistentes ou ilegíveis."""
+    pass
+
+
+def new_run_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+
+
+class RunJournal:
+    def __init__(self, run_id: str, path: Path, events: Optional[list[dict]] = None):
+        self.run_id = run_id
+        self.path = path
+        self.events: list[dict] = events or []
+
+    @classmethod
+    def create(cls, args=None, runs_dir: Optional[Path] = None) -> "RunJournal":
+        runs_dir = runs_dir or RUNS_DIR
+        runs_dir.mkdir(parents=True, exist_ok=True)
+        run_id = new_run_id()
+        journal = cls(run_id, runs_dir / f"{run_id}.jsonl")
+        config = {}
+        if args is not None:
+            config = {
+                k: v for k, v in vars(args).items()
+                if k not in ("func", "resume") and isinstance(v, (str, int, float, bool, type(None)))
+            }
+        journal._write({"stage": "start", "run_id": run_id, "args": config})
+        return journal
+
+    @classmethod
+    def resume(cls, run_id: str, runs_dir: Optional[Path] = None) -> "RunJournal":
+        path = (runs_dir or RUNS_DIR) / f"{run_id}.jsonl"
+        if not path.is_file():
+            raise RunJournalError(f"Execução '{run_id}' não encontrada em {path.parent}")
+        events = []
+        with path.open("r", encoding="utf-8") as f:
+            for lineno, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Última linha truncada por queda do processo: ignora e segue
+                    logging.warning({
+                        "event": "run_journal_bad_line",
+                        "run_id": run_id,
+                        "line": lineno,
+                    })
+        journal = cls(run_id, path, events)
+        journal._write({"stage": "resume", "run_id": run_id})
+        return journal
+
+    def _write(self, event: dict) -> None:
+        event = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), **event}
+        self.events.append(event)
+        # Append + fsync a cada evento: o diário precisa sobreviver a kill/queda de energia
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start_args(self) -> dict:
+        """Argumentos gravados no evento ``start`` (vazio em diários criados sem args)."""
+        for event in self.events:
+            if event.get("stage") == "start":
+                return event.get("args") or {}
+        return {}
+
+    def restore_args(self, args) -> dict:
+        """Repõe em ``args`` as ``RESUME_ARGS`` do diário.
+
+        Retorna ``{opção: (valor pedido, valor do diário)}`` das que divergiam.
+        """
+        saved = self.start_args()
+        changed = {}
+        for key in RESUME_ARGS:
+            if key not in saved:
+                continue
+            current = getattr(args, key, None)
+            if current != saved[key]:
+                changed[key] = (current, saved[key])
+                setattr(args, key, saved[key])
+        return changed
+
+    def record(self, stage: str, mode: str, ids: Iterable, **data) -> None:
+        self._write({"stage": stage, "mode": mode, "ids": list(ids), **data})
+
+    def _events(self, stage: str, mode: str):
+        return (e for e in self.events if e.get("stage") == stage and e.get("mode") == mode)
+
+    def sample_ids(self, mode: str) -> Optional[list]:
+        """IDs da amostra gravada na primeira passada deste modo (None se ainda não houve)."""
+        for event in self._events(STAGE_SAMPLE, mode):
+            return event.get("ids", [])
+        return None
+
+    def cached_answer(self, mode: str, ids: Iterable) -> Optional[dict]:
+        """Resposta já recebida para exatamente este bloco de IDs, se houver."""
+        key = sorted(ids, key=str)
+        for event in self._events(STAGE_INFER, mode):
+            if sorted(event.get("ids", []), key=str) == key:
+                return {"answer": event.get("answer"), "meta": event.get("meta") or {}}
+        return None
+
+    def applied_ids(self, mode: str, action: str) -> set:
+        done = set()
+        for event in self._events(STAGE_APPLY, mode):
+            if event.get("action") == action:
+                done.update(event.get("ids", []))
+        return done
+
+    def pending(self, mode: str, action: str, ids: Iterable) -> list:
+        """Filtra os IDs cuja ação ainda não foi aplicada nesta execução."""
+        done = self.applied_ids(mode, action)
+        return [i for i in ids if i not in done]
+
+
+def last_evaluated(mode: Optional[str] = None, runs_dir: Optional[Path] = None) -> dict:
+    """ID -> timestamp da última inferência registrada nos diários (todas as execuções).
+
+    Usado pela amostragem ``least-recent``; com ``mode`` considera só aquele modo.
+    """
+    history: dict = {}
+    for path in sorted((runs_dir or RUNS_DIR).glob("*.jsonl")):
+        try:
+            lines = path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if event.get("stage") != STAGE_INFER or (mode and event.get("mode") != mode):
+                continue
+            ts = event.get("ts", "")
+            for img_id in event.get("ids", []):
+                if ts > history.get(img_id, ""):
+                    history[img_id] = ts
+    return history
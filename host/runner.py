@@ -0,0 +1,301 @@
+"""
+Execução do host dentro do processo da GUI.
+
+Em vez de abrir ``mcp_host_ollama.py`` como subprocesso a cada clique (reimportar
+requests/Pillow, subir outro servidor MCP e raspar o stdout atrás do progresso),
+a GUI mantém um ``InProcessRunner``: um McpClient de vida longa, iniciado na
+primeira execução e reaproveitado nas seguintes, e providers reaproveitados por
+URL/modelo. Cada execução interpreta os mesmos argumentos do CLI
+(``RunConfig.build_args``) e roda ``run_batch`` na thread chamadora,
+repassando os eventos de progresso do BatchProcessor. O que essa thread
+imprime vai para o log da GUI; as demais threads continuam no stdout original.
+O botão Parar aciona um evento que os providers conferem durante a espera da
+resposta do LLM, sem aguardar o ``--timeout``.
+
+``run_batch`` é também a execução principal dos dois hosts de linha de comando
+(Ollama e LM Studio), que só diferem no provider.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import sys
+import threading
+from typing import Callable, Optional
+
+from batch_processor import BatchProcessor
+from common import format_server_stats, server_stats
+from run_journal import RunJournal
+from sampling import STRATEGIES
+from watch import DEFAULT_INTERVAL, DEFAULT_MAX_LATENCY, run_watch
+from watermarks import WatermarkStore, source_key
+import tracing
+
+
+class RunCancelled(Exception):
+    """Execução interrompida pelo usuário (o diário permite retomar com --resume)."""
+    pass
+
+
+class _LineWriter(io.TextIOBase):
+    """stdout do lote linha a linha para um callback (o log da GUI)."""
+
+    def __init__(self, emit: Callable[[str], None]):
+        self._emit = emit
+        self._buffer = ""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self._buffer += text
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            self._emit(line)
+        return len(text)
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._emit(self._buffer)
+            self._buffer = ""
+
+
+class _ThreadRoutedStdout:
+    """sys.stdout que desvia para ``writer`` só o que a thread ``thread_id`` imprime."""
+
+    def __init__(self, original, thread_id: int, writer):
+        self._original = original
+        self._thread_id = thread_id
+        self._writer = writer
+
+    def write(self, text: str) -> int:
+        target = self._writer if threading.get_ident() == self._thread_id else self._original
+        return target.write(text)
+
+    def flush(self) -> None:
+        self._original.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._original, name)
+
+
+@contextlib.contextmanager
+def _route_thread_stdout(writer):
+    """Prints da thread atual vão para ``writer``; os das outras threads seguem intactos."""
+    original = sys.stdout
+    routed = _ThreadRoutedStdout(original, threading.get_ident(), writer)
+    sys.stdout = routed
+    try:
+        yield
+    finally:
+        if sys.stdout is routed:
+            sys.stdout = original
+
+
+def add_batch_arguments(p: argparse.ArgumentParser) -> None:
+    """Opções de lote comuns aos dois hosts de linha de comando.
+
+    Todas são lidas por ``run_batch`` (ou pelo ``main`` dos hosts); cada host
+    acrescenta só as do seu provider (URL, modelo, timeout).
+    """
+    p.add_argument("--mode", choices=["rating", "tagging", "export", "tratamento", "completo"], default="rating")
+
+    # Filtros
+    p.add_argument("--source", choices=["all", "path", "tag", "collection"], default="all")
+    p.add_argument("--path-contains", help="Filtro path")
+    p.add_argument("--tag", help="Filtro tag")
+    p.add_argument("--collection", help="Filtro collection")
+    p.add_argument("--min-rating", type=int, default=-2)
+    p.add_argument("--only-raw", action="store_true")
+
+    # Controle
+    p.add_argument("--dry-run", action="store_true")
+    p.add_argument("--limit", type=int, default=200)
+    p.add_argument("--target-dir", help="Para export")
+
+    # Prompt, amostra e execução
+    p.add_argument("--text-only", action="store_true")
+    p.add_argument("--prompt-file")
+    p.add_argument("--prompt-variant", default="basico")
+    p.add_argument("--no-style-generation", dest="generate_styles", action="store_false",
+                   help="No modo tratamento, não gera estilos .dtstyle a partir do plano")
+    p.add_argument("--no-structured-output", dest="structured_output", action="store_false",
+                   help="Não envia o JSON Schema do plano ao modelo (servidores sem saída estruturada)")
+    p.add_argument("--contact-sheet", action="store_true",
+                   help="Agrupa miniaturas em grades rotuladas por ID (uma imagem por grade)")
+    p.add_argument("--sheet-grid", default="4x4", help="Grade do contact sheet (COLUNASxLINHAS)")
+    p.add_argument("--sheet-tile-size", type=int, default=256, help="Tamanho de cada célula em px")
+    p.add_argument("--max-dimension", type=int, default=1600,
+                   help="Maior lado (px) das imagens enviadas ao modelo de visão")
+    p.add_argument("--cascade", action="store_true",
+                   help="Triagem barata por metadados/EXIF antes do modelo de visão")
+    p.add_argument("--triage-model", help="Modelo pequeno opcional para decidir as imagens ambíguas da triagem")
+    p.add_argument("--triage-max-dimension", type=int, default=256,
+                   help="Maior lado (px) das miniaturas enviadas ao modelo de triagem")
+    p.add_argument("--keep-min-rating", type=int, default=4,
+                   help="Rating a partir do qual a triagem mantém a imagem sem consultar o modelo")
+    p.add_argument("--sampling", choices=STRATEGIES, default="first",
+                   help="Como escolher as --limit imagens enviadas ao modelo (padrão: as primeiras)")
+    p.add_argument("--seed", type=int, help="Semente da amostragem random (reprodutível)")
+    p.add_argument("--chunk-size", type=int, default=0,
+                   help="Envia a amostra ao LLM em blocos de N imagens (0 = tudo em uma chamada)")
+    p.add_argument("--resume", metavar="RUN_ID",
+                   help="Retoma uma execução interrompida a partir do diário em logs/runs/")
+    p.add_argument("--incremental", action="store_true",
+                   help="Processa só imagens importadas/alteradas desde a última execução incremental deste modo e filtro")
+    p.add_argument("--watch", action="store_true",
+                   help="Modo contínuo: processa imagens recém-importadas em micro-lotes de --limit imagens")
+    p.add_argument("--watch-interval", type=float, default=DEFAULT_INTERVAL,
+                   help="Segundos entre consultas ao darktable no --watch")
+    p.add_argument("--watch-max-latency", type=float, default=DEFAULT_MAX_LATENCY,
+                   help="Espera máxima (s) antes de processar um lote incompleto no --watch")
+
+    # Utils
+    p.add_argument("--check-deps", action="store_true")
+    p.add_argument("--check-darktable", action="store_true")
+    p.add_argument("--list-collections", action="store_true")
+    p.add_argument("--catalog-stats", action="store_true",
+                   help="Lê o catálogo inteiro via catalog_dump e imprime estatísticas")
+    p.add_argument("--undo-last-batch", action="store_true",
+                   help="Desfaz o último lote de escrita (rating, colorlabels e tags) e sai")
+
+    # Logging
+    p.add_argument("--verbose", action="store_true", help="Ativa logs detalhados no console")
+    p.add_argument("--no-trace", action="store_true",
+                   help="Não grava o trace por etapa (logs/batch-*.trace.json)")
+    p.add_argument("--compact-log", action="store_true",
+                   help="Log do lote só com IDs + hash da amostra, em JSON-lines gzip (logs/batch-*.jsonl.gz)")
+    p.add_argument("--server-profile", action="store_true",
+                   help="Pede tempos do servidor (_timing) em cada ferramenta e imprime server_stats ao final")
+
+
+
+def run_batch(client, provider, args, progress=None, stop=None) -> Optional[str]:
+    """Execução principal sobre um cliente já inicializado (hosts e runner da GUI). Retorna o run id."""
+    if args.watch:
+        run_watch(client, provider, args, progress=progress, stop=stop)
+        return None
+
+    journal = RunJournal.resume(args.resume) if args.resume else RunJournal.create(args)
+    print(f"[run] id={journal.run_id} (retome com --resume {journal.run_id})")
+    if args.resume:
+        for key, (asked, saved) in journal.restore_args(args).items():
+            print(f"[resume] --{key.replace('_', '-')}={saved!r} do diário (ignorando {asked!r})")
+    watermarks = WatermarkStore() if args.incremental else None
+    if watermarks is not None:
+        key = source_key(args.mode, args)
+        mark = watermarks.get(key)
+        args.changed_since, args.changed_after_id = mark["since"], mark["after_id"]
+        args.changed_skip = mark.get("skip")
+        print(f"[incremental] {key}: desde {mark['since']:.0f}")
+    processor = BatchProcessor(client, provider, dry_run=args.dry_run, journal=journal, progress=progress)
+    completed = processor.run(args.mode, args)
+    if args.server_profile:
+        for line in format_server_stats(server_stats(client)):
+            print(f"[server] {line}")
+    if watermarks is not None and processor.watermark and not args.dry_run:
+        watermarks.set(key, processor.watermark)
+        print(f"[incremental] marca d'água avançada para {processor.watermark['since']:.0f}")
+    elif watermarks is not None and not completed:
+        print("[incremental] Execução não concluída; a marca d'água não avançou")
+    return journal.run_id
+
+
+def _alive(client) -> bool:
+    proc = getattr(client, "proc", None)
+    # Clientes sem subprocesso (mocks/testes) são considerados sempre ativos
+    return not hasattr(client, "proc") or (proc is not None and proc.poll() is None)
+
+
+class InProcessRunner:
+    def __init__(self, client_factory: Callable[[], object]):
+        self._client_factory = client_factory
+        self._client = None
+        self._providers: dict = {}
+        self._stop = threading.Event()
+        # Uma chamada por vez no stdio do servidor: execução e consultas da GUI compartilham o cliente
+        self.lock = threading.RLock()
+
+    def client(self):
+        """McpClient compartilhado; sobe (ou ressobe, se caiu) o servidor na primeira chamada."""
+        with self.lock:
+            if self._client is None or not _alive(self._client):
+                if self._client is not None:
+                    self._client.close()
+                client = self._client_factory()
+                client.start()
+                client.initialize()
+                self._client = client
+            return self._client
+
+    def provider(self, args):
+        # Importado aqui: os hosts importam run_batch deste módulo
+        import mcp_host_ollama
+
+        key = (args.ollama_url, args.model, args.timeout, args.keep_alive, args.num_ctx, args.num_batch)
+        if key not in self._providers:
+            provider = mcp_host_ollama.build_provider(args)
+            provider.stop = self._stop
+            self._providers[key] = provider
+        return self._providers[key]
+
+    def cancel(self) -> None:
+        """Interrompe a execução atual: a chamada ao LLM em curso, o próximo evento de progresso ou o ciclo do --watch."""
+        self._stop.set()
+
+    def run(
+        self,
+        argv: list[str],
+        progress: Optional[Callable[[dict], None]] = None,
+        output: Optional[Callable[[str], None]] = None,
+    ) -> Optional[str]:
+        """Roda o host com os argumentos do CLI; retorna o run id (None no --watch)."""
+        import mcp_host_ollama
+
+        args = mcp_host_ollama.parse_args(argv)
+        tracing.enable(not args.no_trace)
+        self._stop.clear()
+
+        def on_progress(event: dict) -> None:
+            if self._stop.is_set():
+                raise RunCancelled("Execução interrompida pelo usuário")
+            if progress is not None:
+                progress(event)
+
+        writer = _LineWriter(output) if output is not None else None
+        redirect = _route_thread_stdout(writer) if writer is not None else contextlib.nullcontext()
+        with self.lock, redirect:
+            try:
+                provider = self.provider(args)
+                if args.download_model:
+                    for status in provider.download_model(args.download_model):
+                        print(status)
+                    return None
+                return run_batch(
+                    self.client(), provider, args, progress=on_progress, stop=self._stop
+                )
+            except RunCancelled:
+                raise
+            except Exception as e:
+                # Os modos embrulham erros da etapa de escrita em RuntimeError; a causa foi a parada
+                if self._stop.is_set():
+                    raise RunCancelled("Execução interrompida pelo usuário") from e
+                raise
+            finally:
+                if writer is not None:
+                    writer.flush()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Encerra o servidor compartilhado; ao fechar a GUI não espera além de ``timeout`` pela execução atual."""
+        acquired = self.lock.acquire(timeout=timeout)
+        try:
+            if self._client is not None:
+                self._client.close()
+                cleanup = getattr(self._client, "_cleanup_appimage", None)
+                if cleanup:
+                    cleanup()
+                self._client = None
+        finally:
+            if acquired:
+                self.lock.release()
@@ -0,0 +1,120 @@
+"""
+Estratégias de amostragem: quais imagens da lista filtrada vão ao modelo.
+
+Com ``--limit`` menor que a lista, pegar sempre as N primeiras faz execuções
+seguidas reavaliarem as mesmas fotos. As estratégias abaixo rodam sobre a lista
+já buscada (sem chamadas extras ao servidor) e devolvem no máximo ``limit``
+imagens, na ordem em que devem ser enviadas:
+
+- ``first``: as N primeiras (comportamento original);
+- ``unrated-first``: sem rating (0) antes das demais;
+- ``stratified``: rodízio entre film rolls (pastas), para cobrir todos;
+- ``random``: aleatória, reprodutível com ``--seed``;
+- ``least-recent``: nunca avaliadas primeiro, depois as avaliadas há mais tempo
+  (histórico dos diários em ``logs/runs/``);
+- ``time-buckets``: rodízio entre faixas de horário de captura (EXIF) do ensaio.
+"""
+from __future__ import annotations
+
+import random
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+FIRST = "first"
+UNRATED_FIRST = "unrated-first"
+STRATIFIED = "stratified"
+RANDOM = "random"
+LEAST_RECENT = "least-recent"
+TIME_BUCKETS = "time-buckets"
+
+STRATEGIES = (FIRST, UNRATED_FIRST, STRATIFIED, RANDOM, LEAST_RECENT, TIME_BUCKETS)
+
+# Estratégias que precisam de EXIF na listagem (fetch_images pede include_exif)
+NEEDS_EXIF = {TIME_BUCKETS}
+
+
+def round_robin(groups: Iterable[list[dict]], limit: int) -> list[dict]:
+    """Uma imagem de cada grupo por vez, até ``limit``."""
+    queues = [list(g) for g in groups if g]
+    picked: list[dict] = []
+    index = 0
+    while queues and len(picked) < limit:
+        queue = queues[index % len(queues)]
+        picked.append(queue.pop(0))
+        if not queue:
+            queues.remove(queue)
+        else:
+            index += 1
+    return picked
+
+
+def _group_by(images: list[dict], key: Callable[[dict], object]) -> list[list[dict]]:
+    groups: OrderedDict = OrderedDict()
+    for img in images:
+        groups.setdefault(key(img), []).append(img)
+    return list(groups.values())
+
+
+def film_roll_key(img: dict):
+    # No darktable o film roll é a pasta; catalog_dump traz também o id do rolo
+    return img.get("film_roll", img.get("path") or "")
+
+
+def capture_time(img: dict) -> Optional[float]:
+    """Horário de captura (EXIF) em segundos, ou None se ausente/ilegível."""
+    raw = (img.get("exif") or {}).get("datetime_taken")
+    if not raw:
+        return None
+    for fmt in ("%Y:%m:%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(str(raw)[:19], fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def time_buckets(images: list[dict], buckets: int) -> list[list[dict]]:
+    """Divide o intervalo de captura em ``buckets`` faixas de mesma duração."""
+    timed = [(capture_time(img), img) for img in images]
+    known = sorted(((t, img) for t, img in timed if t is not None), key=lambda pair: pair[0])
+    unknown = [img for t, img in timed if t is None]
+    if not known:
+        return [unknown]
+    start, end = known[0][0], known[-1][0]
+    width = (end - start) / max(1, buckets) or 1.0
+    groups: list[list[dict]] = [[] for _ in range(max(1, buckets))]
+    for t, img in known:
+        groups[min(int((t - start) / width), len(groups) - 1)].append(img)
+    # Sem horário vão por último, depois de cobrir o ensaio
+    return [g for g in groups if g] + ([unknown] if unknown else [])
+
+
+def sample_images(
+    images: list[dict],
+    limit: int,
+    strategy: str = FIRST,
+    *,
+    seed: Optional[int] = None,
+    history: Optional[dict] = None,
+) -> list[dict]:
+    """Escolhe até ``limit`` imagens segundo a estratégia."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Estratégia de amostragem inválida: {strategy} (use {', '.join(STRATEGIES)})")
+    limit = max(0, int(limit))
+    if strategy == FIRST:
+        return images[:limit]
+    if strategy == UNRATED_FIRST:
+        unrated = [img for img in images if (img.get("rating") or 0) == 0]
+        rated = [img for img in images if (img.get("rating") or 0) != 0]
+        return (unrated + rated)[:limit]
+    if strategy == STRATIFIED:
+        return round_robin(_group_by(images, film_roll_key), limit)
+    if strategy == RANDOM:
+        return random.Random(seed).sample(images, min(limit, len(images)))
+    if strategy == LEAST_RECENT:
+        history = history or {}
+        # sorted é estável: entre as nunca avaliadas vale a ordem original
+        ordered = sorted(images, key=lambda img: (img.get("id") in history, history.get(img.get("id"), "")))
+        return ordered[:limit]
+    return round_robin(time_buckets(images, limit), limit)
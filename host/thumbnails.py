@@ -0,0 +1,128 @@
+"""
+Miniaturas em cache para a grade de pré-visualização da GUI.
+
+Para cada imagem, ``thumbnail_for`` tenta, nesta ordem:
+
+1. o cache de miniaturas do host (``STATE_DIR/mcp_thumbs/``), com chave por
+   caminho, mtime, tamanho do arquivo e lado pedido;
+2. para JPEG/PNG/TIFF, a geração a partir do próprio arquivo com Pillow em modo
+   draft (o JPEG é decodificado já reduzido, sem abrir a resolução cheia),
+   gravada no cache;
+3. para RAWs (que o Pillow não lê) ou arquivos fora do disco, as mipmaps que o
+   darktable grava para a biblioteca que o servidor abre
+   (``~/.cache/darktable/mipmaps-<sha1 do caminho da biblioteca>.d/<nível>/<id>.jpg``).
+   Os ids só são únicos dentro de uma biblioteca, então as pastas de outras
+   bibliotecas nunca são consultadas.
+
+Sem Pillow, devolve o próprio arquivo quando é um formato que o Qt abre (o leitor
+da GUI reduz na decodificação), a mipmap para RAWs e None para o resto.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from common import HAS_PILLOW, STATE_DIR
+
+if HAS_PILLOW:
+    from PIL import Image
+
+THUMB_DIR = STATE_DIR / "mcp_thumbs"
+THUMB_SIZE = 256
+# Níveis de mipmap do darktable por preferência: mip1 (~360px) cobre o lado padrão,
+# mip2 é maior e mip0 (~180px) fica por último
+MIPMAP_LEVELS = (1, 2, 0, 3)
+# Formatos que o Qt/Pillow decodificam direto (RAWs dependem das mipmaps)
+DIRECT_SUFFIXES = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".webp", ".bmp"}
+
+
+def _home() -> str:
+    return os.environ.get("HOME") or str(Path.home())
+
+
+def darktable_library() -> str:
+    """Biblioteca que o dt_mcp_server.lua abre (``--library $HOME/.config/darktable/library.db``)."""
+    # O darktable normaliza o caminho (g_file_get_path) antes de calcular o hash das mipmaps
+    return os.path.normpath(_home() + "/.config/darktable/library.db")
+
+
+def darktable_cache_dir() -> Path:
+    """``--cachedir`` do servidor; independente de DT_MCP_STATE_DIR."""
+    return Path(_home()) / ".cache" / "darktable"
+
+
+def mipmap_dir(library: Optional[str] = None, cache_dir: Optional[Path] = None) -> Path:
+    """Pasta de mipmaps do darktable para uma biblioteca: ``mipmaps-<sha1 do caminho>.d``."""
+    library = library or darktable_library()
+    digest = hashlib.sha1(library.encode("utf-8")).hexdigest()
+    return Path(cache_dir or darktable_cache_dir()) / f"mipmaps-{digest}.d"
+
+
+def cache_key(path: Path, size: int) -> Optional[str]:
+    """Chave estável enquanto o arquivo não muda; None se ele não existir."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    raw = f"{path.resolve()}|{st.st_mtime_ns}|{st.st_size}|{size}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def darktable_mipmap(image_id, mipmaps: Optional[Path] = None) -> Optional[Path]:
+    """Mipmap em disco do darktable para o id na biblioteca do servidor, ou None."""
+    if image_id is None:
+        return None
+    mipmaps = mipmaps or mipmap_dir()
+    for level in MIPMAP_LEVELS:
+        candidate = mipmaps / str(level) / f"{image_id}.jpg"
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _render(source: Path, target: Path, size: int) -> bool:
+    try:
+        with Image.open(source) as img:
+            # draft: o decodificador JPEG reduz por 1/2, 1/4, 1/8 antes de montar os pixels
+            img.draft("RGB", (size, size))
+            img = img.convert("RGB")
+            img.thumbnail((size, size))
+            tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+            img.save(tmp, format="JPEG", quality=85)
+        tmp.replace(target)
+        return True
+    except Exception as e:
+        logging.debug(f"[thumbs] Falha ao gerar miniatura de {source.name}: {e}")
+        return False
+
+
+def thumbnail_for(
+    path: Path,
+    image_id=None,
+    size: int = THUMB_SIZE,
+    cache_dir: Path = THUMB_DIR,
+    mipmaps: Optional[Path] = None,
+) -> Optional[Path]:
+    """Arquivo pequeno para exibir no lugar de ``path`` (ver ordem no docstring do módulo)."""
+    path = Path(path).expanduser()
+    key = cache_key(path, size)
+    direct = path.suffix.lower() in DIRECT_SUFFIXES
+    if key is not None:
+        cached = cache_dir / f"{key}.jpg"
+        if cached.exists():
+            return cached
+        if direct and not HAS_PILLOW:
+            return path
+        if direct:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            if _render(path, cached, size):
+                return cached
+
+    mipmap = darktable_mipmap(image_id, mipmaps)
+    if mipmap is not None:
+        return mipmap
+    # Arquivo que o Pillow não conseguiu abrir: o leitor do Qt ainda tenta
+    return path if direct and key is not None else None
@@ -0,0 +1,121 @@
+"""
+Spans por etapa da execução, exportados como trace do Chrome/Perfetto.
+
+Cada etapa (spawn/initialize do servidor MCP, cada chamada de ferramenta,
+codificação de cada imagem, serialização do payload, POST ao LLM, leitura do
+JSON, chamadas de escrita) vira um evento "X" com duração, thread e
+argumentos (contagem de imagens, bytes). Ao fim do modo, o BatchProcessor grava
+``logs/batch-<modo>-<ts>.trace.json`` ao lado do log do lote; abra em
+``chrome://tracing`` ou https://ui.perfetto.dev.
+
+Desligado por padrão (``span`` não faz nada); os hosts chamam ``enable()``.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Limite de eventos em memória (uma execução --watch longa não cresce sem fim)
+MAX_EVENTS = 200_000
+
+
+class Tracer:
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self.enabled = False
+        self.max_events = max_events
+        self.dropped = 0
+        self._events: list[dict] = []
+        self._threads: dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def _us(self, t: float) -> int:
+        return int((t - self._origin) * 1_000_000)
+
+    @contextmanager
+    def span(self, name: str, cat: str = "host", **args) -> Iterator[dict]:
+        """Mede o bloco; o dict devolvido aceita argumentos conhecidos só no fim (ex.: bytes)."""
+        if not self.enabled:
+            yield {}
+            return
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            ended = time.perf_counter()
+            thread = threading.current_thread()
+            event = {
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": self._us(started),
+                "dur": max(0, self._us(ended) - self._us(started)),
+                "pid": os.getpid(),
+                "tid": thread.ident,
+                "args": args,
+            }
+            with self._lock:
+                if len(self._events) >= self.max_events:
+                    self.dropped += 1
+                else:
+                    self._events.append(event)
+                    self._threads.setdefault(thread.ident, thread.name)
+
+    def drain(self) -> tuple[list[dict], dict[int, str], int]:
+        """Eventos acumulados desde o último drain, nomes das threads e eventos descartados."""
+        with self._lock:
+            events, threads, dropped = self._events, dict(self._threads), self.dropped
+            # O processo da GUI vive por muitas execuções: cada trace conta só os seus descartes
+            self._events = []
+            self.dropped = 0
+            return events, threads, dropped
+
+    def export(self, path: Path, metadata: Optional[dict] = None) -> Optional[Path]:
+        """Grava os eventos pendentes no formato JSON do Chrome trace; None se não houver nada."""
+        events, threads, dropped = self.drain()
+        if not events:
+            return None
+        pid = os.getpid()
+        names = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        trace = {
+            "traceEvents": names + sorted(events, key=lambda e: e["ts"]),
+            "displayTimeUnit": "ms",
+            "otherData": {**(metadata or {}), "dropped_events": dropped},
+        }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(trace, ensure_ascii=False), encoding="utf-8")
+        return path
+
+
+TRACER = Tracer()
+
+
+def enable(on: bool = True) -> None:
+    TRACER.enabled = on
+
+
+def enabled() -> bool:
+    return TRACER.enabled
+
+
+def span(name: str, cat: str = "host", **args):
+    return TRACER.span(name, cat, **args)
+
+
+def trace_path_for(log_file: Path) -> Path:
+    """logs/batch-rating-<ts>.json (ou .jsonl.gz) -> logs/batch-rating-<ts>.trace.json"""
+    log_file = Path(log_file)
+    return log_file.with_name(f"{log_file.name.split('.', 1)[0]}.trace.json")
+
+
+def export_trace(log_file: Path, metadata: Optional[dict] = None) -> Optional[Path]:
+    return TRACER.export(trace_path_for(log_file), metadata)
@@ -0,0 +1,133 @@
+"""
+Triagem barata (metadados/EXIF) antes da inferência com o modelo de visão.
+
+Classifica cada imagem em ``keep`` (manter), ``reject`` (descartar) ou
+``ambiguous`` (precisa do VLM). Só o restante ambíguo segue para o modelo
+caro em resolução cheia; as decisões óbvias saem daqui sem custo de inferência.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+KEEP = "keep"
+REJECT = "reject"
+AMBIGUOUS = "ambiguous"
+
+# Convenções de colorlabel usadas na triagem (ajustáveis via TriageRules)
+DEFAULT_KEEP_LABELS = ("green",)
+DEFAULT_REJECT_LABELS = ("red",)
+
+
+@dataclass
+class TriageRules:
+    keep_min_rating: int = 4
+    keep_labels: tuple[str, ...] = DEFAULT_KEEP_LABELS
+    reject_labels: tuple[str, ...] = DEFAULT_REJECT_LABELS
+    # Regra 1/focal: exposições N vezes mais longas que 1/(focal*crop) indicam tremido
+    blur_reject_factor: float = 4.0
+    # Abaixo desta velocidade (s) nem avaliamos tremido: flash/tripé são comuns
+    blur_min_exposure: float = 1 / 15
+
+
+@dataclass
+class TriageResult:
+    keep: list[dict] = field(default_factory=list)
+    reject: list[dict] = field(default_factory=list)
+    ambiguous: list[dict] = field(default_factory=list)
+    reasons: dict = field(default_factory=dict)
+
+    def add(self, decision: str, img: dict, reason: str) -> None:
+        getattr(self, decision).append(img)
+        self.reasons[img.get("id")] = {"decision": decision, "reason": reason}
+
+    def summary(self) -> dict:
+        return {
+            "keep": len(self.keep),
+            "reject": len(self.reject),
+            "ambiguous": len(self.ambiguous),
+        }
+
+
+def blur_risk(exif: Optional[dict]) -> Optional[float]:
+    """Razão entre a exposição e o limite 1/(focal*crop); >1 sugere tremido.
+
+    Retorna None quando o EXIF não traz velocidade ou focal.
+    """
+    if not exif:
+        return None
+    exposure = exif.get("exposure")
+    focal = exif.get("focal_length")
+    if not exposure or not focal or exposure <= 0 or focal <= 0:
+        return None
+    crop = exif.get("crop") or 1.0
+    if crop <= 0:
+        crop = 1.0
+    return exposure / (1.0 / (focal * crop))
+
+
+def classify_image(img: dict, rules: TriageRules) -> tuple[str, str]:
+    """Decide uma imagem por heurística. Retorna (decisão, motivo)."""
+    rating = img.get("rating")
+    labels = set(img.get("colorlabels") or [])
+
+    if rating is not None and rating < 0:
+        return REJECT, "já rejeitada no catálogo"
+    if labels & set(rules.reject_labels):
+        return REJECT, f"colorlabel de descarte ({', '.join(sorted(labels & set(rules.reject_labels)))})"
+    if labels & set(rules.keep_labels):
+        return KEEP, f"colorlabel de seleção ({', '.join(sorted(labels & set(rules.keep_labels)))})"
+    if rating is not None and rating >= rules.keep_min_rating:
+        return KEEP, f"rating atual {rating} >= {rules.keep_min_rating}"
+
+    exif = img.get("exif") or {}
+    risk = blur_risk(exif)
+    if (
+        risk is not None
+        and risk >= rules.blur_reject_factor
+        and exif.get("exposure", 0) >= rules.blur_min_exposure
+    ):
+        return REJECT, f"risco de tremido ({exif.get('exposure'):.3f}s a {exif.get('focal_length')}mm)"
+
+    return AMBIGUOUS, "sem sinal claro nos metadados"
+
+
+def triage_images(images: Iterable[dict], rules: Optional[TriageRules] = None) -> TriageResult:
+    rules = rules or TriageRules()
+    result = TriageResult()
+    for img in images:
+        decision, reason = classify_image(img, rules)
+        result.add(decision, img, reason)
+    return result
+
+
+def apply_model_decisions(result: TriageResult, decisions: Iterable[dict]) -> TriageResult:
+    """Move imagens ambíguas para keep/reject conforme a resposta do modelo pequeno.
+
+    Espera entradas ``{"id": <id>, "decision": "keep"|"reject"|"unsure"}``;
+    qualquer outra coisa mantém a imagem como ambígua.
+    """
+    verdicts = {}
+    for entry in decisions:
+        if isinstance(entry, dict) and entry.get("decision") in (KEEP, REJECT):
+            verdicts[entry.get("id")] = entry["decision"]
+
+    still_ambiguous = []
+    for img in result.ambiguous:
+        decision = verdicts.get(img.get("id"))
+        if decision:
+            getattr(result, decision).append(img)
+            result.reasons[img.get("id")] = {"decision": decision, "reason": "modelo de triagem"}
+        else:
+            still_ambiguous.append(img)
+    result.ambiguous = still_ambiguous
+    return result
+
+
+def reject_edits(result: TriageResult) -> list[dict]:
+    """Edições de rating (-1) para as rejeições da triagem que ainda não estão rejeitadas."""
+    return [
+        {"id": img.get("id"), "rating": -1}
+        for img in result.reject
+        if img.get("rating") is None or img.get("rating") >= 0
+    ]
@@ -0,0 +1,179 @@
+"""
+Modo contínuo (--watch): processa imagens recém-importadas em micro-lotes.
+
+A cada ``interval`` segundos o host consulta ``list_changed_since`` a partir
+da marca d'água atual. As imagens novas se acumulam até formar um lote de
+``--limit`` imagens ou até a mais antiga esperar ``max_latency`` segundos; aí o
+modo selecionado roda só sobre a lista já consultada e a marca avança (ver
+``watermarks.py``). As imagens que o lote gravou entram no ``skip`` da marca,
+então a escrita do próprio lote não as traz de volta no ciclo seguinte.
+Cada micro-lote tem seu próprio diário em ``logs/runs/``.
+"""
+from __future__ import annotations
+
+import copy
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from batch_processor import BatchProcessor
+from common import fetch_images, server_time
+from run_journal import RunJournal
+from watermarks import WatermarkStore, source_key
+
+DEFAULT_INTERVAL = 30.0
+DEFAULT_MAX_LATENCY = 120.0
+
+
+class WatchLoop:
+    def __init__(
+        self,
+        client,
+        args,
+        run_batch: Callable[[object, list], Optional[dict]],
+        *,
+        mark: dict,
+        interval: float = DEFAULT_INTERVAL,
+        max_latency: float = DEFAULT_MAX_LATENCY,
+        on_mark: Optional[Callable[[dict], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        stop: Optional[threading.Event] = None,
+    ):
+        self.client = client
+        self.args = args
+        self.run_batch = run_batch
+        self.mark = dict(mark)
+        self.interval = interval
+        self.max_latency = max_latency
+        self.batch_size = max(1, int(getattr(args, "limit", 0) or 1))
+        self.on_mark = on_mark
+        self.clock = clock
+        self.sleep = sleep
+        # Parada pedida de fora (GUI): encerra entre ciclos em vez de esperar o intervalo inteiro
+        self.stop = stop
+        # Momento em que a imagem pendente mais antiga foi vista
+        self._pending_since: Optional[float] = None
+        # Última consulta do change feed; o micro-lote roda sobre ela
+        self._polled: list = []
+
+    def _batch_args(self):
+        batch_args = copy.copy(self.args)
+        batch_args.changed_since = self.mark["since"]
+        batch_args.changed_after_id = self.mark.get("after_id")
+        batch_args.changed_skip = self.mark.get("skip")
+        batch_args.limit = self.batch_size
+        return batch_args
+
+    def poll(self) -> int:
+        """Quantas imagens novas/alteradas aguardam desde a marca atual."""
+        self._polled = fetch_images(self.client, self._batch_args())
+        pending = len(self._polled)
+        if pending and self._pending_since is None:
+            self._pending_since = self.clock()
+        elif not pending:
+            self._pending_since = None
+        return pending
+
+    def should_flush(self, pending: int) -> bool:
+        if not pending:
+            return False
+        if pending >= self.batch_size:
+            return True
+        if self._pending_since is None:
+            return False
+        return self.clock() - self._pending_since >= self.max_latency
+
+    def step(self) -> bool:
+        """Um ciclo: consulta e, se for a hora, processa um micro-lote. True se processou."""
+        pending = self.poll()
+        if not self.should_flush(pending):
+            return False
+        logging.info(f"[watch] Micro-lote com {min(pending, self.batch_size)} de {pending} imagem(ns) pendente(s)")
+        print(f"[watch] Micro-lote com {min(pending, self.batch_size)} de {pending} imagem(ns) pendente(s)")
+        new_mark = self.run_batch(self._batch_args(), self._polled)
+        if not new_mark:
+            logging.warning("[watch] Lote sem marca d'água nova; tentando de novo no próximo ciclo")
+            return False
+        self.mark = dict(new_mark)
+        # O que sobrou do lote volta a contar latência a partir de agora
+        self._pending_since = self.clock() if pending > self.batch_size else None
+        if self.on_mark:
+            self.on_mark(self.mark)
+        return True
+
+    def run(self, max_cycles: Optional[int] = None) -> None:
+        cycles = 0
+        while (max_cycles is None or cycles < max_cycles) and not self._stopped():
+            cycles += 1
+            processed = self.step()
+            # Backlog maior que um lote: segue direto sem esperar o intervalo
+            if not (processed and self._pending_since is not None) and not self._stopped():
+                if self.stop is not None:
+                    self.stop.wait(self.interval)
+                else:
+                    self.sleep(self.interval)
+
+    def _stopped(self) -> bool:
+        return self.stop is not None and self.stop.is_set()
+
+
+def batch_runner(
+    client,
+    provider,
+    args,
+    progress: Optional[Callable[[dict], None]] = None,
+    stop: Optional[threading.Event] = None,
+) -> Callable[[object, list], Optional[dict]]:
+    """Processa um micro-lote sobre a lista já consultada; retorna a nova marca (None se falhou)."""
+
+    def run_batch(batch_args, images: list) -> Optional[dict]:
+        journal = RunJournal.create(batch_args)
+        print(f"[run] id={journal.run_id} (retome com --resume {journal.run_id})")
+        processor = BatchProcessor(client, provider, dry_run=args.dry_run, journal=journal, progress=progress)
+        try:
+            processor.run(args.mode, batch_args, images=images)
+        except Exception as e:
+            if stop is not None and stop.is_set():
+                raise
+            # Daemon: uma falha (LLM fora do ar, timeout) não derruba o laço; o lote volta no próximo ciclo
+            logging.error({"event": "watch_batch_error", "run_id": journal.run_id, "error": str(e)})
+            print(f"[watch] Falha no lote {journal.run_id}: {e}")
+            return None
+        return processor.watermark
+
+    return run_batch
+
+
+def run_watch(
+    client,
+    provider,
+    args,
+    progress: Optional[Callable[[dict], None]] = None,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """Laço do --watch usado pelos hosts CLI (encerra com Ctrl+C) e pela GUI (``stop``)."""
+    store = WatermarkStore() if getattr(args, "incremental", False) else None
+    key = source_key(args.mode, args)
+    # Sem --incremental começa de agora (no relógio do darktable): só o que for importado daqui em diante
+    mark = store.get(key) if store else {"since": server_time(client), "after_id": None}
+
+    def on_mark(new_mark: dict) -> None:
+        if store is not None and not args.dry_run:
+            store.set(key, new_mark)
+
+    loop = WatchLoop(
+        client, args, batch_runner(client, provider, args, progress=progress, stop=stop),
+        mark=mark,
+        interval=args.watch_interval,
+        max_latency=args.watch_max_latency,
+        on_mark=on_mark,
+        stop=stop,
+    )
+    print(f"[watch] Aguardando imagens novas ({key}); intervalo {args.watch_interval:.0f}s, "
+          f"lote {loop.batch_size}, latência máx. {args.watch_max_latency:.0f}s. Ctrl+C encerra.")
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        print("[watch] Encerrado.")
@@ -0,0 +1,79 @@
+"""
+Marcas d'água (watermarks) para execuções incrementais (--incremental).
+
+Cada combinação de modo + filtro de origem guarda até onde as imagens já foram
+processadas: ``{"since": timestamp, "after_id": id}``, na mesma ordem
+(changed_at, id) usada por ``list_changed_since``. Na execução seguinte o host
+só recebe o que foi importado ou alterado depois. ``skip`` (opcional) lista
+``[id, changed_at]`` das imagens que a própria execução gravou: a escrita
+atualiza o change_timestamp delas para depois da marca, e elas só voltam se
+mudarem de novo. O arquivo fica em ``STATE_DIR/mcp_watermarks.json``.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from common import STATE_DIR
+
+WATERMARK_FILE = STATE_DIR / "mcp_watermarks.json"
+
+
+def source_key(mode: str, args) -> str:
+    """Chave estável do filtro: modos e filtros diferentes avançam independentes."""
+    target = {
+        "collection": getattr(args, "collection", None),
+        "path": getattr(args, "path_contains", None),
+        "tag": getattr(args, "tag", None),
+    }.get(args.source) or ""
+    return "|".join([
+        mode,
+        args.source,
+        target,
+        f"min_rating={getattr(args, 'min_rating', -2)}",
+        f"only_raw={bool(getattr(args, 'only_raw', False))}",
+    ])
+
+
+def mark_order(mark: dict) -> tuple:
+    after_id = mark.get("after_id")
+    # Sem after_id o segundo 'since' volta inteiro (>=): a marca vem antes de qualquer id
+    return (float(mark.get("since", 0)), float("-inf") if after_id is None else after_id)
+
+
+class WatermarkStore:
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or WATERMARK_FILE
+        self._data: Optional[dict] = None
+
+    def _load(self) -> dict:
+        if self._data is None:
+            try:
+                self._data = json.loads(self.path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                self._data = {}
+            except (OSError, ValueError) as e:
+                logging.warning({"event": "watermark_load_error", "path": str(self.path), "error": str(e)})
+                self._data = {}
+        return self._data
+
+    def get(self, key: str) -> dict:
+        """Marca salva para a chave; ``since=0`` (tudo) na primeira execução."""
+        return dict(self._load().get(key) or {"since": 0, "after_id": None})
+
+    def set(self, key: str, mark: dict) -> None:
+        data = self._load()
+        current = data.get(key)
+        # Nunca volta no tempo: uma execução parcial não pode reabrir o que já foi feito
+        if current and mark_order(current) >= mark_order(mark):
+            return
+        data[key] = {"since": mark.get("since", 0), "after_id": mark.get("after_id")}
+        if mark.get("skip"):
+            data[key]["skip"] = mark["skip"]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
@@ -1,35 +1,23 @@
-import os
-import yaml
+import sys
 from pathlib import Path
 
-def validate_prompt_header(prompt_path):
-    with open(prompt_path, encoding='utf-8') as f:
-        lines = f.readlines()
-    if not lines or not lines[0].startswith('---'):
-        return False, 'Sem cabeçalho YAML'
-    header = []
-    for line in lines[1:]:
-        if line.startswith('---'):
-            break
-        header.append(line)
-    try:
-        meta = yaml.safe_load(''.join(header))
-    except Exception as e:
-        return False, f'YAML inválido: {e}'
-    required = ['fluxo', 'variante', 'changelog']
-    for field in required:
-        if field not in meta:
-            return False, f'Campo obrigatório ausente: {field}'
-    return True, ''
+# Usa o mesmo registro de prompts do host (host/prompts.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'host'))
+
+from prompts import PromptRegistry
+
 
 def main():
-    base = Path(__file__).parent.parent / 'config' / 'prompts'
-    for file in base.glob('*.md'):
-        ok, msg = validate_prompt_header(file)
+    registry = PromptRegistry()
+    failed = False
+    for path, ok, msg, prompt in registry.validate_all():
         if not ok:
-            print(f'ERRO: {file.name}: {msg}')
+            failed = True
+            print(f'ERRO: {path.name}: {msg}')
         else:
-            print(f'OK: {file.name}')
+            print(f'OK: {path.name} ({prompt.mode}/{prompt.variant}, sha256 {prompt.sha256[:12]})')
+    return 1 if failed else 0
+
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -2,13 +2,14 @@
 
 --------------------------------------------------
 -- Servidor MCP para darktable (v2)
--- - list_collection
+-- - list_collection / catalog_dump
 -- - list_by_path
--- - list_by_tag
+-- - list_by_tag / list_changed_since
 -- - apply_batch_edits (rating)
 -- - set_colorlabel_batch
--- - tag_batch
+-- - tag_batch / tag_bulk
 -- - export_collection (com suporte a ids)
+-- - apply_plan / undo_last_batch (escritas transacionais)
 --------------------------------------------------
 
 local function get_script_dir()
@@ -24,16 +25,59 @@ package.path = package.path .. ";" .. script_dir .. "?.lua"
 
 local json   = require "dkjson"
 local package = require "package"
+-- Com lpeg disponível, o dkjson usa o scanner/escape em C; sem ele segue puro Lua
+if pcall(require, "lpeg") then
+  json.use_lpeg()
+end
 
-local function command_exists(cmd)
-  local check_cmd = string.format("command -v %s >/dev/null 2>&1", cmd)
-  local result = os.execute(check_cmd)
-  if type(result) == "number" then
-    return result == 0
+--------------------------------------------------
+-- 0. Flags de startup, debug e cache de caminhos
+--------------------------------------------------
+-- DT_MCP_DEBUG=1 (ou --debug) libera as mensagens de diagnóstico no stderr;
+-- --print-startup-timings (ou DT_MCP_STARTUP_TIMINGS=1) imprime o tempo de cada etapa.
+local DEBUG = os.getenv("DT_MCP_DEBUG") == "1"
+local PRINT_TIMINGS = os.getenv("DT_MCP_STARTUP_TIMINGS") == "1"
+if arg then
+  for i = 1, #arg do
+    if arg[i] == "--print-startup-timings" then
+      PRINT_TIMINGS = true
+    elseif arg[i] == "--debug" then
+      DEBUG = true
+    end
+  end
+end
+
+local function debug_log(fmt, ...)
+  if DEBUG then
+    io.stderr:write(string.format(fmt, ...) .. "\n")
+  end
+end
+
+-- Com luasocket, socket.gettime serve para tudo. Sem ele, "clock" fica em
+-- os.clock (tempo de CPU, bom para varredura e JSON, mas parado enquanto o
+-- processo espera um subprocesso) e "wall_clock" em os.time (relógio de
+-- parede em segundos inteiros) mede subprocessos, total e uptime.
+local clock, wall_clock = os.clock, os.time
+local CLOCK_IS_WALL = false
+local CLOCK_SOURCE = "os.clock+os.time"
+do
+  local ok, socket = pcall(require, "socket")
+  if ok and type(socket) == "table" and socket.gettime then
+    clock, wall_clock = socket.gettime, socket.gettime
+    CLOCK_IS_WALL = true
+    CLOCK_SOURCE = "socket.gettime"
   end
-  return result == true
 end
 
+local startup_t0 = clock()
+local startup_timings = {}
+
+local function mark_timing(name, started)
+  table.insert(startup_timings, string.format("%s=%.1fms", name, (clock() - started) * 1000))
+end
+
+local STATE_DIR = os.getenv("DT_MCP_STATE_DIR") or ((os.getenv("HOME") or ".") .. "/.cache/darktable")
+
 local function file_exists(path)
   local f = io.open(path, "r")
   if f then
@@ -43,16 +87,50 @@ local function file_exists(path)
   return false
 end
 
+-- Busca no PATH sem fork de `command -v`
+local command_cache = {}
+local function command_path(cmd)
+  if command_cache[cmd] == nil then
+    command_cache[cmd] = false
+    for dir in (os.getenv("PATH") or ""):gmatch("[^:]+") do
+      if file_exists(dir .. "/" .. cmd) then
+        command_cache[cmd] = dir .. "/" .. cmd
+        break
+      end
+    end
+  end
+  return command_cache[cmd] or nil
+end
+
+local function command_exists(cmd)
+  return command_path(cmd) ~= nil
+end
+
+-- "<dir>/." só abre quando o caminho é um diretório; evita fork de `test -d`
+local dir_cache = {}
 local function dir_exists(path)
-  -- Use shell test for more robust check
-  local cmd = "test -d " .. string.format("%q", path)
-  local ok, reason, code = os.execute(cmd)
-  local result = false
-  if type(ok) == "number" then result = (ok == 0)
-  elseif ok == true then result = true
+  if dir_cache[path] == nil then
+    local f = io.open(path .. "/.", "r")
+    if f then
+      f:close()
+    end
+    dir_cache[path] = f ~= nil
+    debug_log("[debug] dir_exists('%s') -> %s", path, tostring(dir_cache[path]))
+  end
+  return dir_cache[path]
+end
+
+-- Cria STATE_DIR antes da primeira gravação (DT_MCP_STATE_DIR pode apontar
+-- para um diretório que ainda não existe)
+local state_dir_checked = false
+local function ensure_state_dir()
+  if state_dir_checked then
+    return
+  end
+  state_dir_checked = true
+  if not dir_exists(STATE_DIR) then
+    os.execute("mkdir -p '" .. STATE_DIR:gsub("'", "'\\''") .. "'")
   end
-  io.stderr:write(string.format("[debug] dir_exists('%s') -> %s (ok=%s code=%s)\n", path, tostring(result), tostring(ok), tostring(code)))
-  return result
 end
 
 local function detect_darktable_paths()
@@ -180,8 +258,6 @@ local function detect_darktable_paths()
   }
 end
 
-local dt_paths = detect_darktable_paths()
-
 local function get_flatpak_runtime_libs()
   local handle = io.popen("flatpak info org.darktable.Darktable")
   if not handle then return {} end
@@ -223,11 +299,160 @@ local function get_flatpak_runtime_libs()
   return found_paths
 end
 
+-- Cache de startup: prefixo, cpaths, libs do runtime flatpak e comando CLI,
+-- invalidado quando mudam as variáveis de ambiente relevantes ou os binários.
+local STARTUP_CACHE_FILE = STATE_DIR .. "/mcp_startup_cache.json"
+local STARTUP_CACHE_ENV = {
+  "HOME", "PATH", "DARKTABLE_LIB_PATH", "DARKTABLE_CLI_CMD", "DARKTABLE_FLATPAK_PREFIX",
+}
+
+local lfs_ok, lfs = pcall(require, "lfs")
+if not lfs_ok then
+  lfs = nil
+end
+
+-- Assinatura barata de arquivo: tamanho (+ mtime com luafilesystem), sem fork
+local function file_signature(path)
+  if not path then
+    return ""
+  end
+  local f = io.open(path, "rb")
+  if not f then
+    return "missing"
+  end
+  local size = f:seek("end")
+  f:close()
+  local sig = tostring(size)
+  if lfs then
+    local attr = lfs.attributes(path)
+    if attr then
+      sig = sig .. ":" .. tostring(attr.modification)
+    end
+  end
+  return sig
+end
+
+local function startup_cache_key()
+  local parts = { "v1", script_dir }
+  for _, name in ipairs(STARTUP_CACHE_ENV) do
+    table.insert(parts, name .. "=" .. (os.getenv(name) or ""))
+  end
+  return table.concat(parts, "\n")
+end
+
+-- Resultado "não encontrado" não vai para o cache: instalar o darktable-cli
+-- ou a lib depois não muda chave nem assinaturas, e o cache nunca expiraria
+local function startup_cache_complete(cache)
+  return cache.cli_source ~= "missing" and cache.lib_signature ~= "missing"
+end
+
+local function load_startup_cache()
+  local f = io.open(STARTUP_CACHE_FILE, "r")
+  if not f then
+    return nil
+  end
+  local content = f:read("*a")
+  f:close()
+  local cache = json.decode(content)
+  if type(cache) ~= "table" or cache.key ~= startup_cache_key() or type(cache.dt_paths) ~= "table" then
+    return nil
+  end
+  if not startup_cache_complete(cache)
+    or file_signature(cache.dt_paths.lib_path) ~= cache.lib_signature
+    or file_signature(cache.cli_path) ~= cache.cli_signature then
+    return nil
+  end
+  return cache
+end
+
+local function save_startup_cache(cache)
+  cache.key = startup_cache_key()
+  cache.lib_signature = file_signature(cache.dt_paths.lib_path)
+  cache.cli_signature = file_signature(cache.cli_path)
+  if not startup_cache_complete(cache) then
+    debug_log("[init] cache de startup não gravado: darktable-cli ou libdarktable não encontrados")
+    return
+  end
+  ensure_state_dir()
+  local f = io.open(STARTUP_CACHE_FILE, "w")
+  if f then
+    f:write(json.encode(cache))
+    f:close()
+  else
+    debug_log("[init] não foi possível gravar %s", STARTUP_CACHE_FILE)
+  end
+end
+
+local function select_darktable_cli(dt_paths)
+  local override = os.getenv("DARKTABLE_CLI_CMD")
+  if override and override ~= "" then
+    return override, "env:DARKTABLE_CLI_CMD", nil
+  end
+
+  if command_exists("darktable-cli") then
+    return "darktable-cli", "PATH", command_path("darktable-cli")
+  end
+
+  if dt_paths.is_flatpak and command_exists("flatpak") then
+    return "flatpak run --command=darktable-cli org.darktable.Darktable", "flatpak", command_path("flatpak")
+  end
+
+  return nil, "missing", nil
+end
+
+local cache_started = clock()
+local startup_cache = load_startup_cache()
+mark_timing("cache_load", cache_started)
+local dt_paths
+local flatpak_runtime_libs
+local DARKTABLE_CLI_CMD, DARKTABLE_CLI_SOURCE
+
+if startup_cache then
+  dt_paths = startup_cache.dt_paths
+  flatpak_runtime_libs = startup_cache.flatpak_runtime_libs or {}
+  DARKTABLE_CLI_CMD = startup_cache.cli_cmd
+  DARKTABLE_CLI_SOURCE = startup_cache.cli_source
+else
+  local t = clock()
+  dt_paths = detect_darktable_paths()
+  mark_timing("detect_paths", t)
+
+  -- `flatpak info` só faz sentido quando o darktable veio do flatpak
+  t = clock()
+  flatpak_runtime_libs = dt_paths.is_flatpak and get_flatpak_runtime_libs() or {}
+  mark_timing("flatpak_libs", t)
+
+  t = clock()
+  local cli_path
+  DARKTABLE_CLI_CMD, DARKTABLE_CLI_SOURCE, cli_path = select_darktable_cli(dt_paths)
+  mark_timing("select_cli", t)
+
+  save_startup_cache({
+    dt_paths             = dt_paths,
+    flatpak_runtime_libs = flatpak_runtime_libs,
+    cli_cmd              = DARKTABLE_CLI_CMD,
+    cli_source           = DARKTABLE_CLI_SOURCE,
+    cli_path             = cli_path,
+  })
+end
+
+local function print_startup_timings(stage)
+  if PRINT_TIMINGS then
+    io.stderr:write(string.format(
+      "[startup] %s cache=%s %s total=%.1fms\n",
+      stage,
+      startup_cache and "hit" or "miss",
+      table.concat(startup_timings, " "),
+      (clock() - startup_t0) * 1000
+    ))
+  end
+end
+
 local function ensure_ld_library_path()
   -- Se o Python injetou DARKTABLE_LIB_PATH (ex: AppImage mount), usamos ele com prioridade
   local env_lib = os.getenv("DARKTABLE_LIB_PATH")
   if env_lib and file_exists(env_lib) then
-      io.stderr:write("[init] using env DARKTABLE_LIB_PATH: " .. env_lib .. "\n")
+      debug_log("[init] using env DARKTABLE_LIB_PATH: %s", env_lib)
       -- Tentamos carregar direto. Se falhar, segue o fluxo.
       -- Nota: package.loadlib é mais baixo nível, o require "darktable" usa package.cpath.
       -- Vamos adicionar o diretório do lib ao cpath.
@@ -246,7 +471,7 @@ local function ensure_ld_library_path()
   end
 
   if os.getenv("DT_MCP_LD_REEXEC") == "1" then
-    io.stderr:write("[init] LD_LIBRARY_PATH already injected\n")
+    debug_log("[init] LD_LIBRARY_PATH already injected")
     return
   end
 
@@ -260,15 +485,15 @@ local function ensure_ld_library_path()
   end
 
   -- Injeta bibliotecas do Runtime Flatpak (ex: libxml2)
-  for _, dir in ipairs(get_flatpak_runtime_libs()) do
+  for _, dir in ipairs(flatpak_runtime_libs) do
     if dir_exists(dir) and not ld_library_path:find(dir, 1, true) then
        table.insert(extra_paths, dir)
     end
   end
 
   if #extra_paths == 0 then
-    -- Mesmo sem libs extras, se temos um lua estático, podemos querer usá-lo 
-    -- mas a lógica original só dava return. Vamos continuar se tivermos o binário static.
+    -- Nada a injetar: o re-exec só custaria outro processo e outra inicialização
+    return
   end
 
   local new_ld_path = table.concat(extra_paths, ":")
@@ -306,10 +531,8 @@ local function ensure_ld_library_path()
     table.concat(extra_args, " ")
   )
 
-  io.stderr:write(string.format(
-    "[init] re-exec with LD_LIBRARY_PATH=%s (flatpak)\n",
-    new_ld_path
-  ))
+  debug_log("[init] re-exec with LD_LIBRARY_PATH=%s (flatpak)", new_ld_path)
+  print_startup_timings("re-exec")
 
   local exec_status = os.execute(cmd)
   local exit_code = 1
@@ -323,18 +546,20 @@ local function ensure_ld_library_path()
   os.exit(exit_code)
 end
 
+local ld_started = clock()
 ensure_ld_library_path()
+mark_timing("ld_setup", ld_started)
 
 for _, p in ipairs(dt_paths.cpaths) do
   package.cpath = package.cpath .. ";" .. p
 end
 
-io.stderr:write(string.format(
-  "[init] darktable prefix=%s source=%s lib=%s\n",
+debug_log(
+  "[init] darktable prefix=%s source=%s lib=%s",
   tostring(dt_paths.prefix),
   tostring(dt_paths.source),
   tostring(dt_paths.lib_path)
-))
+)
 
 local function mcp_error(message, code, field, extra)
   local json_error = {
@@ -367,6 +592,8 @@ local PROTOCOL_VERSION = "2024-11-05"
 -- Ajuste esse caminho conforme sua distro:
 -- Ex: /usr/lib/darktable/libdarktable.so
 
+local dt_started = clock()
+-- host/thumbnails.py calcula a pasta de mipmaps a partir desta biblioteca e deste cachedir
 local dt = require("darktable")(
   "--library",   os.getenv("HOME") .. "/.config/darktable/library.db",
   "--datadir",   dt_paths.datadir,
@@ -374,31 +601,14 @@ local dt = require("darktable")(
   "--configdir", os.getenv("HOME") .. "/.config/darktable",
   "--cachedir",  os.getenv("HOME") .. "/.cache/darktable"
 )
+mark_timing("darktable_init", dt_started)
 
-local function select_darktable_cli()
-  local override = os.getenv("DARKTABLE_CLI_CMD")
-  if override and override ~= "" then
-    return override, "env:DARKTABLE_CLI_CMD"
-  end
-
-  if command_exists("darktable-cli") then
-    return "darktable-cli", "PATH"
-  end
-
-  if dt_paths.is_flatpak and command_exists("flatpak") then
-    return "flatpak run --command=darktable-cli org.darktable.Darktable", "flatpak"
-  end
-
-  return nil, "missing"
-end
-
-local DARKTABLE_CLI_CMD, DARKTABLE_CLI_SOURCE = select_darktable_cli()
-
-io.stderr:write(string.format(
-  "[init] darktable-cli source=%s cmd=%s\n",
+debug_log(
+  "[init] darktable-cli source=%s cmd=%s",
   tostring(DARKTABLE_CLI_SOURCE),
   tostring(DARKTABLE_CLI_CMD)
-))
+)
+print_startup_timings("ready")
 
 --------------------------------------------------
 -- 2. Helpers JSON-RPC / MCP
@@ -421,6 +631,76 @@ local function send_error(id, code, message)
   }
 end
 
+--------------------------------------------------
+-- 2b. Perfil das ferramentas
+--------------------------------------------------
+-- Toda chamada tools/call acumula estatísticas por ferramenta (server_stats).
+-- Com DT_MCP_PROFILE=1, ou experimental.darktable.profiling=true no initialize,
+-- cada resultado leva também "_timing": tempo de varredura (handler sem
+-- subprocessos), de codificação JSON e de subprocessos, mais contadores da
+-- chamada (imagens varridas, get_tags, buscas de tag, subprocessos) e o
+-- relógio usado (CLOCK_SOURCE).
+
+local profiling = os.getenv("DT_MCP_PROFILE") == "1"
+local server_started = wall_clock()
+-- Limites (ms) das faixas do histograma; a última faixa é "acima do último limite"
+local HISTOGRAM_BOUNDS_MS = { 1, 5, 10, 50, 100, 500, 1000, 5000, 30000 }
+local tool_stats = {}
+local current_profile = nil
+
+local function json_object(t)
+  return setmetatable(t or {}, { __jsontype = "object" })
+end
+
+local function prof_count(name, n)
+  if current_profile then
+    current_profile.counters[name] = (current_profile.counters[name] or 0) + (n or 1)
+  end
+end
+
+local function prof_subprocess(seconds)
+  if current_profile then
+    current_profile.subprocess = current_profile.subprocess + seconds
+    prof_count("subprocesses")
+  end
+end
+
+local function record_tool_stats(name, is_error, timing)
+  local stats = tool_stats[name]
+  if not stats then
+    stats = {
+      calls = 0, errors = 0,
+      total_ms = 0, max_ms = 0, scan_ms = 0, encode_ms = 0, subprocess_ms = 0,
+      histogram = {},
+      counters = json_object(),
+    }
+    for i = 1, #HISTOGRAM_BOUNDS_MS + 1 do
+      stats.histogram[i] = 0
+    end
+    tool_stats[name] = stats
+  end
+  stats.calls = stats.calls + 1
+  if is_error then
+    stats.errors = stats.errors + 1
+  end
+  stats.total_ms = stats.total_ms + timing.total_ms
+  stats.max_ms = math.max(stats.max_ms, timing.total_ms)
+  stats.scan_ms = stats.scan_ms + timing.scan_ms
+  stats.encode_ms = stats.encode_ms + timing.encode_ms
+  stats.subprocess_ms = stats.subprocess_ms + timing.subprocess_ms
+  local bucket = #HISTOGRAM_BOUNDS_MS + 1
+  for i, bound in ipairs(HISTOGRAM_BOUNDS_MS) do
+    if timing.total_ms <= bound then
+      bucket = i
+      break
+    end
+  end
+  stats.histogram[bucket] = stats.histogram[bucket] + 1
+  for counter, value in pairs(timing.counters) do
+    stats.counters[counter] = (stats.counters[counter] or 0) + value
+  end
+end
+
 --------------------------------------------------
 -- 3. Helpers de imagens / metadata
 --------------------------------------------------
@@ -441,8 +721,24 @@ local function safe_colorlabels(img)
   return out
 end
 
-local function image_to_metadata(img)
-  return {
+local function safe_exif(img)
+  -- campos EXIF usados pela triagem (risco de tremido) e pela amostragem por horário
+  local ok, exif = pcall(function()
+    return {
+      exposure     = img.exif_exposure,
+      aperture     = img.exif_aperture,
+      iso          = img.exif_iso,
+      focal_length = img.exif_focal_length,
+      crop         = img.exif_crop,
+      datetime_taken = img.exif_datetime_taken,
+    }
+  end)
+  if not ok then return nil end
+  return exif
+end
+
+local function image_to_metadata(img, include_exif)
+  local meta = {
     id         = img.id,
     path       = img.path,
     filename   = img.filename,
@@ -450,6 +746,27 @@ local function image_to_metadata(img)
     is_raw     = img.is_raw,
     colorlabels = safe_colorlabels(img),
   }
+  if include_exif then
+    meta.exif = safe_exif(img)
+  end
+  return meta
+end
+
+-- Tags da imagem (dt.tags.get_tags), ou nil se a consulta falhar
+local function image_tags(img)
+  prof_count("get_tags")
+  local ok, tags = pcall(dt.tags.get_tags, img)
+  if ok then
+    return tags
+  end
+  return nil
+end
+
+local function validate_include_exif(args)
+  if args.include_exif ~= nil and type(args.include_exif) ~= "boolean" then
+    return mcp_error("include_exif deve ser booleano", "invalid_include_exif", "include_exif")
+  end
+  return nil
 end
 
 local function shell_escape(s)
@@ -459,6 +776,7 @@ local function shell_escape(s)
 end
 
 local function run_command_capture(cmd)
+  local started = wall_clock()
   local handle = io.popen(cmd .. " 2>&1")
   if not handle then
     return false, -1, "io.popen failed", "popen"
@@ -466,6 +784,7 @@ local function run_command_capture(cmd)
 
   local output = handle:read("*a") or ""
   local ok, reason, status = handle:close()
+  prof_subprocess(wall_clock() - started)
 
   local success = (type(ok) == "number" and ok == 0) or ok == true
   local exit_code = status
@@ -482,6 +801,296 @@ local function run_command_capture(cmd)
   return success, exit_code, output, reason
 end
 
+--------------------------------------------------
+-- 3.0 Codificação compacta de listas (negociada no initialize)
+--------------------------------------------------
+-- Com "columnar", listas de objetos vão como
+--   { encoding = "columnar", count = n, fields = {...}, columns = { id = {...}, ... } }
+-- Os nomes dos campos aparecem uma vez só e o dkjson serializa arrays de
+-- escalares, bem mais baratos que milhares de objetos. Sem negociação, "json".
+
+local SUPPORTED_ENCODINGS = { json = true, columnar = true }
+local wire_encoding = "json"
+
+local function to_columns(rows, fields)
+  local columns = {}
+  for _, field in ipairs(fields) do
+    local col = {}
+    for i, row in ipairs(rows) do
+      local value = row[field]
+      if value == nil then
+        value = json.null
+      end
+      col[i] = value
+    end
+    columns[field] = col
+  end
+  return { encoding = "columnar", count = #rows, fields = fields, columns = columns }
+end
+
+local function encode_rows(rows, fields)
+  if wire_encoding == "columnar" then
+    return to_columns(rows, fields)
+  end
+  return rows
+end
+
+local METADATA_FIELDS = { "id", "path", "filename", "rating", "is_raw", "colorlabels" }
+local METADATA_FIELDS_EXIF = { "id", "path", "filename", "rating", "is_raw", "colorlabels", "exif" }
+
+local function metadata_fields(include_exif)
+  return include_exif and METADATA_FIELDS_EXIF or METADATA_FIELDS
+end
+
+--------------------------------------------------
+-- 3.0b Cache de tags
+--------------------------------------------------
+-- Objetos de tag ficam em cache por nome enquanto o servidor estiver vivo, para
+-- que chamadas seguidas (tag_bulk, apply_plan, rollback) não repitam
+-- dt.tags.create/find para a mesma tag. Caminhos hierárquicos usam '|', como
+-- no darktable ("lugar|brasil|rio").
+
+local tag_cache = {}
+
+-- Normaliza "a / b / c" (com separator="/") ou "a|b|c" para "a|b|c",
+-- removendo espaços nas pontas de cada nível e níveis vazios.
+local function normalize_tag_path(name, separator)
+  if separator and separator ~= "|" then
+    name = name:gsub(separator:gsub("%p", "%%%0"), "|")
+  end
+  local parts = {}
+  for part in (name .. "|"):gmatch("([^|]*)|") do
+    part = part:match("^%s*(.-)%s*$")
+    if part ~= "" then
+      table.insert(parts, part)
+    end
+  end
+  return table.concat(parts, "|")
+end
+
+-- Tag pelo nome, criando se não existir
+local function get_tag(name)
+  local tag = tag_cache[name]
+  if tag == nil then
+    prof_count("tag_lookups")
+    tag = dt.tags.create(name)
+    tag_cache[name] = tag
+  end
+  return tag
+end
+
+-- Tag pelo nome sem criar (nil se não existir no catálogo)
+local function find_tag(name)
+  local tag = tag_cache[name]
+  if tag == nil then
+    prof_count("tag_lookups")
+    tag = dt.tags.find(name)
+    if tag then
+      tag_cache[name] = tag
+    end
+  end
+  return tag
+end
+
+--------------------------------------------------
+-- 3.1 Transações de escrita (snapshot / rollback / undo)
+--------------------------------------------------
+-- Antes de um lote de escrita guardamos rating, colorlabels e tags das imagens
+-- afetadas. Se o lote lançar erro no meio, o estado anterior é restaurado; se
+-- concluir, o snapshot fica disponível para undo_last_batch (também gravado em
+-- disco, já que cada execução do host sobe um servidor novo).
+
+local LAST_BATCH_FILE = STATE_DIR .. "/mcp_last_batch.json"
+
+local last_batch = nil
+
+local function image_tag_names(img)
+  local names = {}
+  local tags = image_tags(img)
+  if tags then
+    for _, tag in ipairs(tags) do
+      -- tags internas do darktable (darktable|format|...) não são tocadas
+      if not tag.name:find("^darktable|") then
+        table.insert(names, tag.name)
+      end
+    end
+  end
+  table.sort(names)
+  return names
+end
+
+local function snapshot_image(img)
+  local labels = {}
+  for i = 0, 4 do
+    labels[i + 1] = img.colorlabels[i] and true or false
+  end
+  return {
+    id          = img.id,
+    rating      = img.rating,
+    colorlabels = labels,
+    tags        = image_tag_names(img),
+  }
+end
+
+local function snapshot_equals(a, b)
+  if a.rating ~= b.rating or #a.tags ~= #b.tags then
+    return false
+  end
+  for i = 1, 5 do
+    if a.colorlabels[i] ~= b.colorlabels[i] then
+      return false
+    end
+  end
+  for i, name in ipairs(a.tags) do
+    if b.tags[i] ~= name then
+      return false
+    end
+  end
+  return true
+end
+
+local function restore_snapshot(img, snap)
+  img.rating = snap.rating
+  for i = 0, 4 do
+    img.colorlabels[i] = snap.colorlabels[i + 1]
+  end
+  local wanted = {}
+  for _, name in ipairs(snap.tags) do
+    wanted[name] = true
+  end
+  local current = {}
+  for _, name in ipairs(image_tag_names(img)) do
+    current[name] = true
+    if not wanted[name] then
+      dt.tags.detach(find_tag(name), img)
+    end
+  end
+  for name in pairs(wanted) do
+    if not current[name] then
+      dt.tags.attach(get_tag(name), img)
+    end
+  end
+end
+
+-- Restaura as imagens que divergem do snapshot; retorna os ids alterados
+local function rollback_snapshots(snapshots)
+  local changed = {}
+  for _, snap in ipairs(snapshots) do
+    local img = dt.database[snap.id]
+    if img and not snapshot_equals(snapshot_image(img), snap) then
+      restore_snapshot(img, snap)
+      table.insert(changed, snap.id)
+    end
+  end
+  return changed
+end
+
+local function save_last_batch(batch)
+  last_batch = batch
+  ensure_state_dir()
+  local f = io.open(LAST_BATCH_FILE, "w")
+  if f then
+    f:write(json.encode(batch))
+    f:close()
+  else
+    io.stderr:write("[transaction] não foi possível gravar " .. LAST_BATCH_FILE .. "\n")
+  end
+end
+
+local function load_last_batch()
+  if last_batch then
+    return last_batch
+  end
+  local f = io.open(LAST_BATCH_FILE, "r")
+  if not f then
+    return nil
+  end
+  local content = f:read("*a")
+  f:close()
+  local batch = json.decode(content)
+  if type(batch) ~= "table" or type(batch.snapshots) ~= "table" then
+    return nil
+  end
+  return batch
+end
+
+-- ferramenta de escrita -> campo com os ids afetados
+local WRITE_TOOL_IDS = {
+  apply_batch_edits    = function(args) return args.edits end,
+  set_colorlabel_batch = function(args) return args.edits end,
+  apply_plan           = function(args) return args.ops end,
+  tag_batch            = function(args) return args.ids end,
+  tag_bulk             = function(args)
+    local ids = {}
+    for _, mapping in ipairs({ args.attach, args.detach }) do
+      if type(mapping) == "table" then
+        for _, tag_ids in pairs(mapping) do
+          if type(tag_ids) == "table" then
+            for _, id in ipairs(tag_ids) do
+              table.insert(ids, id)
+            end
+          end
+        end
+      end
+    end
+    return ids
+  end,
+}
+
+local function affected_ids(name, args)
+  local ids, seen = {}, {}
+  local entries = WRITE_TOOL_IDS[name](args)
+  if type(entries) ~= "table" then
+    return ids
+  end
+  for _, entry in ipairs(entries) do
+    local id = type(entry) == "table" and entry.id or entry
+    if type(id) == "number" and not seen[id] then
+      seen[id] = true
+      table.insert(ids, id)
+    end
+  end
+  return ids
+end
+
+-- Executa uma ferramenta de escrita como transação (args.transactional=false desliga)
+local function run_write_transaction(name, tool_fn, args)
+  if args.transactional ~= nil and type(args.transactional) ~= "boolean" then
+    return mcp_error("transactional deve ser booleano", "invalid_arguments", "transactional")
+  end
+  if args.transactional == false then
+    return tool_fn(args)
+  end
+
+  local snapshots = {}
+  for _, id in ipairs(affected_ids(name, args)) do
+    local img = dt.database[id]
+    if img then
+      table.insert(snapshots, snapshot_image(img))
+    end
+  end
+
+  local ok, result = pcall(tool_fn, args)
+  if ok then
+    if not result.isError and #snapshots > 0 then
+      save_last_batch({ tool = name, ts = os.time(), snapshots = snapshots })
+    end
+    return result
+  end
+
+  local restored_ok, changed = pcall(rollback_snapshots, snapshots)
+  if not restored_ok then
+    return mcp_error(
+      "Falha no lote e no rollback: " .. tostring(result) .. " / " .. tostring(changed),
+      "rollback_failed", nil, { tool = name }
+    )
+  end
+  return mcp_error(
+    "Falha no lote; estado anterior restaurado: " .. tostring(result),
+    "batch_rolled_back", nil, { tool = name, changed_ids = changed }
+  )
+end
+
 --------------------------------------------------
 -- 4. Ferramentas MCP (lado darktable)
 --------------------------------------------------
@@ -504,12 +1113,17 @@ local function tool_list_collection(args)
     return mcp_error("only_raw deve ser booleano", "invalid_only_raw", "only_raw")
   end
 
+  local exif_err = validate_include_exif(args)
+  if exif_err then return exif_err end
+
   local min_rating      = args.min_rating or -2
   local only_raw        = args.only_raw or false
   local collection_path = args.collection_path
+  local include_exif    = args.include_exif or false
 
   local result = {}
 
+  prof_count("images_scanned", #dt.database)
   for _, img in ipairs(dt.database) do
     local path_ok = true
     if collection_path and img.path then
@@ -517,13 +1131,13 @@ local function tool_list_collection(args)
     end
 
     if path_ok and (not only_raw or img.is_raw) and (img.rating or 0) >= min_rating then
-      table.insert(result, image_to_metadata(img))
+      table.insert(result, image_to_metadata(img, include_exif))
     end
   end
 
   return {
     content = {
-      { type = "json", json = result }
+      { type = "json", json = encode_rows(result, metadata_fields(include_exif)) }
     },
     isError = false
   }
@@ -536,35 +1150,275 @@ end
 local function tool_list_available_collections(args)
   local groups = {}
 
+  prof_count("images_scanned", #dt.database)
   for _, img in ipairs(dt.database) do
     local path = img.path or ""
     -- "roll_name" pode nao existir em algumas versoes, usamos o path do film
     local film = img.film and (pcall(function() return img.film.roll_name end) and img.film.roll_name or tostring(img.film)) or nil
 
-    if path ~= "" then
-      if not groups[path] then
-        groups[path] = { count = 0, film = film }
-      end
-      groups[path].count = groups[path].count + 1
+    if path ~= "" then
+      if not groups[path] then
+        groups[path] = { count = 0, film = film }
+      end
+      groups[path].count = groups[path].count + 1
+    end
+  end
+
+  local result = {}
+  for path, meta in pairs(groups) do
+    table.insert(result, {
+      path = path,
+      film_roll = meta.film,
+      image_count = meta.count
+    })
+  end
+
+  table.sort(result, function(a, b)
+    return a.path < b.path
+  end)
+
+  return {
+    content = {
+      { type = "json", json = result }
+    },
+    isError = false
+  }
+end
+
+--------------------------------------------------
+-- 4.1c catalog_dump
+-- args: { offset?: number, limit?: number, include_tags?: boolean, include_exif?: boolean }
+-- Catálogo inteiro em colunas, paginado em blocos (offset/limit). Enquanto
+-- houver mais imagens a resposta traz next_offset; o host pede o bloco seguinte.
+--------------------------------------------------
+local CATALOG_DUMP_DEFAULT_LIMIT = 5000
+local CATALOG_DUMP_MAX_LIMIT = 50000
+
+local function colorlabel_mask(img)
+  local ok, labels = pcall(function() return img.colorlabels end)
+  if not ok or not labels then
+    return 0
+  end
+  local mask, bit = 0, 1
+  for i = 0, 4 do
+    if labels[i] then
+      mask = mask + bit
+    end
+    bit = bit * 2
+  end
+  return mask
+end
+
+local function film_roll_id(img)
+  local ok, id = pcall(function() return img.film and img.film.id end)
+  if ok and id ~= nil then
+    return id
+  end
+  return json.null
+end
+
+local function tool_catalog_dump(args)
+  args = args or {}
+  for _, field in ipairs({ "offset", "limit" }) do
+    if args[field] ~= nil and (type(args[field]) ~= "number" or args[field] < 0) then
+      return mcp_error(field .. " deve ser número >= 0", "invalid_arguments", field)
+    end
+  end
+  for _, field in ipairs({ "include_tags", "include_exif" }) do
+    if args[field] ~= nil and type(args[field]) ~= "boolean" then
+      return mcp_error(field .. " deve ser booleano", "invalid_arguments", field)
+    end
+  end
+
+  local offset = math.floor(args.offset or 0)
+  local limit = math.floor(args.limit or CATALOG_DUMP_DEFAULT_LIMIT)
+  if limit == 0 or limit > CATALOG_DUMP_MAX_LIMIT then
+    limit = CATALOG_DUMP_MAX_LIMIT
+  end
+  local include_tags = args.include_tags ~= false
+  local include_exif = args.include_exif ~= false
+
+  local fields = { "id", "film_roll", "path", "filename", "rating", "is_raw", "colorlabels" }
+  if include_tags then
+    table.insert(fields, "tags")
+  end
+  local exif_fields = { "exposure", "aperture", "iso", "focal_length", "crop" }
+  if include_exif then
+    for _, name in ipairs(exif_fields) do
+      table.insert(fields, "exif_" .. name)
+    end
+  end
+  local columns = {}
+  for _, field in ipairs(fields) do
+    columns[field] = {}
+  end
+
+  local total = #dt.database
+  local last = math.min(total, offset + limit)
+  prof_count("images_scanned", math.max(0, last - offset))
+  local n = 0
+  for i = offset + 1, last do
+    local img = dt.database[i]
+    if img then
+      n = n + 1
+      columns.id[n]          = img.id
+      columns.film_roll[n]   = film_roll_id(img)
+      columns.path[n]        = img.path or json.null
+      columns.filename[n]    = img.filename or json.null
+      columns.rating[n]      = img.rating or 0
+      columns.is_raw[n]      = img.is_raw and true or false
+      columns.colorlabels[n] = colorlabel_mask(img)
+      if include_tags then
+        columns.tags[n] = image_tag_names(img)
+      end
+      if include_exif then
+        local exif = safe_exif(img) or {}
+        for _, name in ipairs(exif_fields) do
+          local value = exif[name]
+          if value == nil then
+            value = json.null
+          end
+          columns["exif_" .. name][n] = value
+        end
+      end
+    end
+  end
+
+  local result = {
+    encoding = "columnar",
+    count    = n,
+    fields   = fields,
+    columns  = columns,
+    offset   = offset,
+    total    = total,
+  }
+  if last < total then
+    result.next_offset = last
+  end
+
+  return {
+    content = {
+      { type = "text", text = string.format("Catálogo: imagens %d-%d de %d", offset + 1, last, total) },
+      { type = "json", json = result }
+    },
+    isError = false
+  }
+end
+
+--------------------------------------------------
+-- 4.1d list_changed_since
+-- args: {
+--   since: number,                 -- unix timestamp (segundos)
+--   after_id?: number,             -- desempate: no segundo 'since', só ids maiores
+--   collection_path?: string, path_contains?: string, tag?: string,
+--   min_rating?: number, only_raw?: boolean, include_exif?: boolean
+-- }
+-- Imagens importadas ou alteradas desde 'since' (import_timestamp /
+-- change_timestamp do darktable), em ordem crescente de alteração, com o
+-- campo changed_at. O segundo bloco JSON traz o relógio do servidor
+-- (watermark) para a próxima consulta.
+--------------------------------------------------
+-- darktable 4.x expõe GTimeSpan (µs desde 0001-01-01); versões antigas, unix
+local GTIMESPAN_UNIX_OFFSET = 62135596800
+
+local function to_unix_seconds(value)
+  value = tonumber(value)
+  if not value or value <= 0 then
+    return nil
+  end
+  if value > 1e12 then
+    return math.floor(value / 1e6 - GTIMESPAN_UNIX_OFFSET)
+  end
+  return value
+end
+
+local function image_changed_at(img)
+  local latest = nil
+  for _, field in ipairs({ "import_timestamp", "change_timestamp" }) do
+    local ok, value = pcall(function() return img[field] end)
+    local ts = ok and to_unix_seconds(value) or nil
+    if ts and (not latest or ts > latest) then
+      latest = ts
+    end
+  end
+  return latest
+end
+
+local function image_has_tag(img, tag_name)
+  local tags = image_tags(img)
+  if tags then
+    for _, t in ipairs(tags) do
+      if t.name == tag_name then
+        return true
+      end
+    end
+  end
+  return false
+end
+
+local function tool_list_changed_since(args)
+  args = args or {}
+  if type(args.since) ~= "number" then
+    return mcp_error("since (unix timestamp) é obrigatório", "invalid_since", "since")
+  end
+  if args.after_id ~= nil and type(args.after_id) ~= "number" then
+    return mcp_error("after_id deve ser numérico", "invalid_arguments", "after_id")
+  end
+  for _, field in ipairs({ "collection_path", "path_contains", "tag" }) do
+    if args[field] ~= nil and type(args[field]) ~= "string" then
+      return mcp_error(field .. " deve ser string", "invalid_arguments", field)
     end
   end
+  if args.min_rating ~= nil and type(args.min_rating) ~= "number" then
+    return mcp_error("min_rating deve ser numérico", "invalid_min_rating", "min_rating")
+  end
+  if args.only_raw ~= nil and type(args.only_raw) ~= "boolean" then
+    return mcp_error("only_raw deve ser booleano", "invalid_only_raw", "only_raw")
+  end
+  local exif_err = validate_include_exif(args)
+  if exif_err then return exif_err end
+
+  local watermark    = os.time()
+  local since        = args.since
+  local after_id     = args.after_id
+  local path_filter  = args.collection_path or args.path_contains
+  local min_rating   = args.min_rating or -2
+  local only_raw     = args.only_raw or false
+  local include_exif = args.include_exif or false
 
   local result = {}
-  for path, meta in pairs(groups) do
-    table.insert(result, {
-      path = path,
-      film_roll = meta.film,
-      image_count = meta.count
-    })
+  prof_count("images_scanned", #dt.database)
+  for _, img in ipairs(dt.database) do
+    local changed_at = image_changed_at(img)
+    local is_new = changed_at and (changed_at > since
+      or (changed_at == since and (not after_id or img.id > after_id)))
+    if is_new
+        and (not only_raw or img.is_raw) and (img.rating or 0) >= min_rating
+        and (not path_filter or (img.path or ""):find(path_filter, 1, true))
+        and (not args.tag or image_has_tag(img, args.tag)) then
+      local meta = image_to_metadata(img, include_exif)
+      meta.changed_at = changed_at
+      table.insert(result, meta)
+    end
   end
 
   table.sort(result, function(a, b)
-    return a.path < b.path
+    if a.changed_at == b.changed_at then
+      return a.id < b.id
+    end
+    return a.changed_at < b.changed_at
   end)
 
+  local fields = {}
+  for _, field in ipairs(metadata_fields(include_exif)) do
+    table.insert(fields, field)
+  end
+  table.insert(fields, "changed_at")
+
   return {
     content = {
-      { type = "json", json = result }
+      { type = "json", json = encode_rows(result, fields) },
+      { type = "json", json = { since = since, watermark = watermark, count = #result } }
     },
     isError = false
   }
@@ -588,24 +1442,29 @@ local function tool_list_by_path(args)
     return mcp_error("only_raw deve ser booleano", "invalid_only_raw", "only_raw")
   end
 
+  local exif_err = validate_include_exif(args)
+  if exif_err then return exif_err end
+
   local path_contains = args.path_contains or ""
   local min_rating    = args.min_rating or -2
   local only_raw      = args.only_raw or false
+  local include_exif  = args.include_exif or false
 
   local result = {}
 
+  prof_count("images_scanned", #dt.database)
   for _, img in ipairs(dt.database) do
     local p = img.path or ""
     if p:find(path_contains, 1, true) then
       if (not only_raw or img.is_raw) and (img.rating or 0) >= min_rating then
-        table.insert(result, image_to_metadata(img))
+        table.insert(result, image_to_metadata(img, include_exif))
       end
     end
   end
 
   return {
     content = {
-      { type = "json", json = result }
+      { type = "json", json = encode_rows(result, metadata_fields(include_exif)) }
     },
     isError = false
   }
@@ -629,19 +1488,25 @@ local function tool_list_by_tag(args)
     return mcp_error("only_raw deve ser booleano", "invalid_only_raw", "only_raw")
   end
 
-  local tag_name   = args.tag
-  local min_rating = args.min_rating or -2
-  local only_raw   = args.only_raw or false
+  local exif_err = validate_include_exif(args)
+  if exif_err then return exif_err end
+
+  local tag_name     = args.tag
+  local min_rating   = args.min_rating or -2
+  local only_raw     = args.only_raw or false
+  local include_exif = args.include_exif or false
+  local result       = {}
 
   -- Fix: dt.tags.get_images não existe. Iterar database.
+  prof_count("images_scanned", #dt.database)
   for _, img in ipairs(dt.database) do
     if (not only_raw or img.is_raw) and (img.rating or 0) >= min_rating then
       -- Verifica se a imagem possui a tag
-      local img_tags = dt.tags.get_tags(img)
+      local img_tags = image_tags(img) or {}
       for _, t in ipairs(img_tags) do
         -- Comparação exata de string (nome da tag)
         if t.name == tag_name then
-          table.insert(result, image_to_metadata(img))
+          table.insert(result, image_to_metadata(img, include_exif))
           break
         end
       end
@@ -650,7 +1515,7 @@ local function tool_list_by_tag(args)
 
   return {
     content = {
-      { type = "json", json = result }
+      { type = "json", json = encode_rows(result, metadata_fields(include_exif)) }
     },
     isError = false
   }
@@ -794,6 +1659,17 @@ local function tool_import_style(args)
   end
 end
 
+local function find_style(style_name)
+  if dt.styles then
+    for _, s in ipairs(dt.styles) do
+      if s.name == style_name then
+        return s
+      end
+    end
+  end
+  return nil
+end
+
 --------------------------------------------------
 -- 4.9 apply_style
 -- args: { style_name: string, image_ids: [number] }
@@ -804,17 +1680,7 @@ local function tool_apply_style(args)
   end
 
   local style_name = args.style_name
-  local style = nil
-
-  -- Find style by name
-  if dt.styles then
-    for _, s in ipairs(dt.styles) do
-      if s.name == style_name then
-        style = s
-        break
-      end
-    end
-  end
+  local style = find_style(style_name)
 
   if not style then
     -- Try forcing a reload? No API for that
@@ -854,7 +1720,7 @@ local function tool_tag_batch(args)
     end
   end
 
-  local tag = dt.tags.create(args.tag)
+  local tag = get_tag(args.tag)
   local count = 0
 
   for _, id in ipairs(args.ids) do
@@ -873,6 +1739,298 @@ local function tool_tag_batch(args)
   }
 end
 
+--------------------------------------------------
+-- 4.6b tag_bulk
+-- args: {
+--   attach?: { [tag: string]: [ number ] },
+--   detach?: { [tag: string]: [ number ] },
+--   separator?: string
+-- }
+-- Várias tags numa única chamada. Nomes hierárquicos usam '|' (ou o separator
+-- informado, ex.: "/"). Remoções são aplicadas antes das inclusões.
+--------------------------------------------------
+local function validate_tag_mapping(mapping, field, separator)
+  if mapping == nil then
+    return {}, nil
+  end
+  if type(mapping) ~= "table" then
+    return nil, mcp_error(field .. " deve ser um objeto {tag: [ids]}", "invalid_arguments", field)
+  end
+  local normalized = {}
+  for tag, ids in pairs(mapping) do
+    if type(tag) ~= "string" then
+      return nil, mcp_error(field .. " deve ser um objeto {tag: [ids]}", "invalid_arguments", field)
+    end
+    local name = normalize_tag_path(tag, separator)
+    if name == "" then
+      return nil, mcp_error("Nome de tag vazio", "invalid_tag", field, { tag = tag })
+    end
+    if type(ids) ~= "table" then
+      return nil, mcp_error("ids da tag deve ser array", "invalid_id", field, { tag = tag })
+    end
+    for idx, id in ipairs(ids) do
+      if type(id) ~= "number" then
+        return nil, mcp_error("ids deve conter apenas números", "invalid_id", field, { tag = tag, index = idx })
+      end
+    end
+    -- "a/b" e "a|b" podem colidir após normalizar: junta as listas
+    normalized[name] = normalized[name] or {}
+    for _, id in ipairs(ids) do
+      table.insert(normalized[name], id)
+    end
+  end
+  return normalized, nil
+end
+
+local function sorted_keys(t)
+  local keys = {}
+  for k in pairs(t) do
+    table.insert(keys, k)
+  end
+  table.sort(keys)
+  return keys
+end
+
+local function tool_tag_bulk(args)
+  args = args or {}
+  if args.attach == nil and args.detach == nil then
+    return mcp_error("Informe attach e/ou detach ({tag: [ids]})", "invalid_arguments", "attach")
+  end
+  if args.separator ~= nil and (type(args.separator) ~= "string" or #args.separator ~= 1) then
+    return mcp_error("separator deve ser um único caractere", "invalid_arguments", "separator")
+  end
+
+  local attach, err = validate_tag_mapping(args.attach, "attach", args.separator)
+  if err then return err end
+  local detach
+  detach, err = validate_tag_mapping(args.detach, "detach", args.separator)
+  if err then return err end
+
+  local images, not_found, missing_seen = {}, {}, {}
+  local function get_image(id)
+    if images[id] == nil then
+      images[id] = dt.database[id] or false
+      if not images[id] and not missing_seen[id] then
+        missing_seen[id] = true
+        table.insert(not_found, id)
+      end
+    end
+    return images[id]
+  end
+
+  local function object()
+    return setmetatable({}, { __jsontype = "object" })
+  end
+  local detached, attached = object(), object()
+  local total_detached, total_attached = 0, 0
+
+  for _, name in ipairs(sorted_keys(detach)) do
+    local tag = find_tag(name)
+    local count = 0
+    for _, id in ipairs(detach[name]) do
+      local img = get_image(id)
+      if img and tag then
+        dt.tags.detach(tag, img)
+        count = count + 1
+      end
+    end
+    detached[name] = count
+    total_detached = total_detached + count
+  end
+
+  for _, name in ipairs(sorted_keys(attach)) do
+    local tag = get_tag(name)
+    local count = 0
+    for _, id in ipairs(attach[name]) do
+      local img = get_image(id)
+      if img then
+        dt.tags.attach(tag, img)
+        count = count + 1
+      end
+    end
+    attached[name] = count
+    total_attached = total_attached + count
+  end
+
+  return {
+    content = {
+      { type = "text", text = string.format(
+          "Tags em lote: %d anexações em %d tags, %d remoções em %d tags, %d IDs não encontrados",
+          total_attached, #sorted_keys(attach), total_detached, #sorted_keys(detach), #not_found) },
+      { type = "json", json = { attached = attached, detached = detached, not_found = not_found } }
+    },
+    isError = false
+  }
+end
+
+--------------------------------------------------
+-- 4.10 apply_plan
+-- args: {
+--   ops: [ { id: number, rating?: number, color?: string, tags?: [ string ],
+--            style?: string, style_path?: string } ],
+--   overwrite_labels?: boolean
+-- }
+-- Aplica todas as mudanças de cada imagem numa única chamada. Tags e estilos
+-- são resolvidos uma vez por nome (dt.tags.create / dt.styles) e reaproveitados.
+--------------------------------------------------
+local function validate_plan_op(op, idx)
+  if type(op) ~= "table" or type(op.id) ~= "number" then
+    return mcp_error("Cada operação precisa de 'id' numérico", "invalid_op", "ops", { index = idx })
+  end
+  if op.rating ~= nil and (type(op.rating) ~= "number" or op.rating < -1 or op.rating > 5) then
+    return mcp_error("rating deve ser numérico entre -1 e 5", "invalid_rating", "ops", { index = idx })
+  end
+  if op.color ~= nil and color_map[op.color] == nil then
+    return mcp_error("color deve ser red, yellow, green, blue ou purple", "invalid_color", "ops", { index = idx })
+  end
+  if op.tags ~= nil then
+    if type(op.tags) ~= "table" then
+      return mcp_error("tags deve ser uma lista de strings", "invalid_tags", "ops", { index = idx })
+    end
+    for _, tag in ipairs(op.tags) do
+      if type(tag) ~= "string" or tag == "" then
+        return mcp_error("tags deve conter apenas strings não vazias", "invalid_tags", "ops", { index = idx })
+      end
+    end
+  end
+  if op.style ~= nil and (type(op.style) ~= "string" or op.style == "") then
+    return mcp_error("style deve ser string", "invalid_style", "ops", { index = idx })
+  end
+  if op.style_path ~= nil and type(op.style_path) ~= "string" then
+    return mcp_error("style_path deve ser string", "invalid_style", "ops", { index = idx })
+  end
+  return nil
+end
+
+local function tool_apply_plan(args)
+  if not args or type(args.ops) ~= "table" then
+    return mcp_error("Parâmetro 'ops' (array) é obrigatório", "invalid_arguments", "ops")
+  end
+  if args.overwrite_labels ~= nil and type(args.overwrite_labels) ~= "boolean" then
+    return mcp_error("overwrite_labels deve ser booleano", "invalid_arguments", "overwrite_labels")
+  end
+
+  for idx, op in ipairs(args.ops) do
+    local err = validate_plan_op(op, idx)
+    if err then return err end
+  end
+
+  -- Agrupa: cada arquivo de estilo é importado uma vez; cada tag/estilo é resolvido uma vez
+  local style_errors = {}
+  local imported = {}
+  for _, op in ipairs(args.ops) do
+    if op.style_path and not imported[op.style_path] then
+      imported[op.style_path] = true
+      if not (dt.styles and dt.styles.import) then
+        style_errors[op.style_path] = "API dt.styles.import não disponível nesta versão do Darktable"
+      else
+        local ok, err = pcall(dt.styles.import, op.style_path)
+        if not ok then
+          style_errors[op.style_path] = "Erro ao importar estilo: " .. tostring(err)
+        end
+      end
+    end
+  end
+
+  local style_cache = {}
+  local function get_style(name)
+    if style_cache[name] == nil then
+      style_cache[name] = find_style(name) or false
+    end
+    return style_cache[name]
+  end
+
+  local results = {}
+  local counts = { ok = 0, error = 0, not_found = 0 }
+  for idx, op in ipairs(args.ops) do
+    local entry = { index = idx, id = op.id, applied = {} }
+    local img = dt.database[op.id]
+    if not img then
+      entry.status = "not_found"
+    else
+      -- cada operação é atômica: em erro, a imagem volta ao estado anterior
+      local before = snapshot_image(img)
+      local ok, err = pcall(function()
+        if op.rating ~= nil then
+          img.rating = op.rating
+          table.insert(entry.applied, "rating")
+        end
+        if op.color ~= nil then
+          if args.overwrite_labels then
+            for i = 0, 4 do
+              img.colorlabels[i] = false
+            end
+          end
+          img.colorlabels[color_map[op.color]] = true
+          table.insert(entry.applied, "color")
+        end
+        for _, tag in ipairs(op.tags or {}) do
+          dt.tags.attach(get_tag(tag), img)
+        end
+        if op.tags and #op.tags > 0 then
+          table.insert(entry.applied, "tags")
+        end
+        if op.style then
+          if op.style_path and style_errors[op.style_path] then
+            error(style_errors[op.style_path])
+          end
+          local style = get_style(op.style)
+          if not style then
+            error("Estilo não encontrado: " .. op.style)
+          end
+          dt.styles.apply(style, img)
+          table.insert(entry.applied, "style")
+        end
+      end)
+      if ok then
+        entry.status = "ok"
+      else
+        entry.status = "error"
+        entry.error = tostring(err)
+        entry.rolled_back = pcall(restore_snapshot, img, before)
+        entry.applied = {}
+      end
+    end
+    counts[entry.status] = counts[entry.status] + 1
+    table.insert(results, entry)
+  end
+
+  return {
+    content = {
+      { type = "text", text = string.format(
+          "Plano aplicado: %d ok, %d com erro, %d não encontradas",
+          counts.ok, counts.error, counts.not_found) },
+      { type = "json", json = { results = results, summary = counts } }
+    },
+    isError = false
+  }
+end
+
+--------------------------------------------------
+-- 4.11 undo_last_batch
+-- args: {}
+-- Restaura rating, colorlabels e tags gravados antes do último lote transacional.
+--------------------------------------------------
+local function tool_undo_last_batch(args)
+  local batch = load_last_batch()
+  if not batch then
+    return mcp_error("Nenhum lote para desfazer", "nothing_to_undo")
+  end
+
+  local restored = rollback_snapshots(batch.snapshots)
+  last_batch = nil
+  os.remove(LAST_BATCH_FILE)
+
+  return {
+    content = {
+      { type = "text", text = string.format(
+          "Lote '%s' desfeito: %d imagens restauradas", tostring(batch.tool), #restored) },
+      { type = "json", json = { tool = batch.tool, ts = batch.ts, restored_ids = restored } }
+    },
+    isError = false
+  }
+end
+
 --------------------------------------------------
 -- 4.7 export_collection
 -- args: {
@@ -889,6 +2047,8 @@ for _, fmt in ipairs(ALLOWED_EXPORT_FORMATS) do
   ALLOWED_EXPORT_FORMATS_SET[fmt] = true
 end
 
+local EXPORT_ERROR_FIELDS = { "id", "input", "output", "command", "exit", "exit_reason", "stderr" }
+
 local function tool_export_collection(args)
   args = args or {}
   local target_dir = args.target_dir
@@ -989,6 +2149,7 @@ local function tool_export_collection(args)
     end
   else
     -- se não passar ids, exporta toda a coleção
+    prof_count("images_scanned", #dt.database)
     for _, img in ipairs(dt.database) do
       table.insert(to_export, img)
     end
@@ -1050,7 +2211,7 @@ local function tool_export_collection(args)
     { type = "text", text = summary }
   }
   if #errors > 0 then
-    table.insert(content, { type = "json", json = { errors = errors } })
+    table.insert(content, { type = "json", json = { errors = encode_rows(errors, EXPORT_ERROR_FIELDS) } })
   end
 
   return {
@@ -1059,6 +2220,44 @@ local function tool_export_collection(args)
   }
 end
 
+--------------------------------------------------
+-- 4.12 server_stats
+-- args: { reset?: boolean }
+--------------------------------------------------
+local function tool_server_stats(args)
+  args = args or {}
+  if args.reset ~= nil and type(args.reset) ~= "boolean" then
+    return mcp_error("reset deve ser booleano", "invalid_reset", "reset")
+  end
+
+  local tools = json_object()
+  local calls, tool_count = 0, 0
+  for name, stats in pairs(tool_stats) do
+    tools[name] = stats
+    calls = calls + stats.calls
+    tool_count = tool_count + 1
+  end
+  local payload = {
+    server_time         = os.time(),
+    uptime_s            = wall_clock() - server_started,
+    clock               = CLOCK_SOURCE,
+    profiling           = profiling,
+    histogram_bounds_ms = HISTOGRAM_BOUNDS_MS,
+    tools               = tools,
+  }
+  if args.reset then
+    tool_stats = {}
+  end
+
+  return {
+    content = {
+      { type = "text", text = string.format("%d chamada(s) em %d ferramenta(s)", calls, tool_count) },
+      { type = "json", json = payload }
+    },
+    isError = false
+  }
+end
+
 --------------------------------------------------
 -- 5. Despacho MCP
 --------------------------------------------------
@@ -1072,6 +2271,24 @@ local function handle_initialize(req)
     return
   end
 
+  -- O cliente lista as codificações que entende, em ordem de preferência
+  wire_encoding = "json"
+  local experimental = type(params.capabilities) == "table" and params.capabilities.experimental
+  local requested = type(experimental) == "table" and type(experimental.darktable) == "table"
+    and experimental.darktable.encodings
+  if type(requested) == "table" then
+    for _, encoding in ipairs(requested) do
+      if SUPPORTED_ENCODINGS[encoding] then
+        wire_encoding = encoding
+        break
+      end
+    end
+  end
+  if type(experimental) == "table" and type(experimental.darktable) == "table"
+    and experimental.darktable.profiling == true then
+    profiling = true
+  end
+
   send_response{
     jsonrpc = "2.0",
     id = req.id,
@@ -1084,6 +2301,13 @@ local function handle_initialize(req)
       capabilities = {
         tools = {
           listChanged = false
+        },
+        experimental = {
+          darktable = {
+            encoding  = wire_encoding,
+            encodings = { "json", "columnar" },
+            profiling = profiling
+          }
         }
       }
     }
@@ -1107,6 +2331,10 @@ local function handle_tools_list(req)
             type        = "boolean",
             description = "Se true, retorna apenas arquivos RAW."
           },
+          include_exif = {
+            type        = "boolean",
+            description = "Se true, inclui campos EXIF (exposure, aperture, iso, focal_length, crop)."
+          },
           collection_path = {
             type        = "string",
             description = "Filtra por um caminho de coleção (match direto em img.path)."
@@ -1135,6 +2363,10 @@ local function handle_tools_list(req)
             type        = "string",
             description = "Trecho do caminho (ex.: '2024-viagem-mg')."
           },
+          include_exif = {
+            type        = "boolean",
+            description = "Se true, inclui campos EXIF (exposure, aperture, iso, focal_length, crop)."
+          },
           min_rating = {
             type        = "number",
             description = "Rating mínimo."
@@ -1158,6 +2390,10 @@ local function handle_tools_list(req)
             type        = "string",
             description = "Nome da tag (ex.: 'job:cliente-x')."
           },
+          include_exif = {
+            type        = "boolean",
+            description = "Se true, inclui campos EXIF (exposure, aperture, iso, focal_length, crop)."
+          },
           min_rating = {
             type        = "number",
             description = "Rating mínimo."
@@ -1177,6 +2413,10 @@ local function handle_tools_list(req)
         type       = "object",
         required   = { "edits" },
         properties = {
+          transactional = {
+            type        = "boolean",
+            description = "Se true (padrão), guarda o estado anterior, reverte em caso de falha e habilita undo_last_batch."
+          },
           edits = {
             type = "array",
             items = {
@@ -1199,6 +2439,10 @@ local function handle_tools_list(req)
         type       = "object",
         required   = { "edits" },
         properties = {
+          transactional = {
+            type        = "boolean",
+            description = "Se true (padrão), guarda o estado anterior, reverte em caso de falha e habilita undo_last_batch."
+          },
           overwrite = {
             type        = "boolean",
             description = "Se true, limpa colorlabels anteriores antes de aplicar a nova cor. Padrão: false"
@@ -1228,6 +2472,10 @@ local function handle_tools_list(req)
         type       = "object",
         required   = { "tag", "ids" },
         properties = {
+          transactional = {
+            type        = "boolean",
+            description = "Se true (padrão), guarda o estado anterior, reverte em caso de falha e habilita undo_last_batch."
+          },
           tag = {
             type        = "string",
             description = "Nome da tag (ex.: 'job:cliente-x')."
@@ -1242,6 +2490,124 @@ local function handle_tools_list(req)
         }
       }
     },
+    {
+      name        = "list_changed_since",
+      title       = "Listar imagens alteradas",
+      description = "Lista imagens importadas ou alteradas desde um timestamp (unix), em ordem de alteração, com os mesmos filtros de list_collection/list_by_path/list_by_tag.",
+      inputSchema = {
+        type       = "object",
+        required   = { "since" },
+        properties = {
+          since           = { type = "number", description = "Unix timestamp (segundos); 0 lista tudo." },
+          after_id        = { type = "number", description = "Desempate: no segundo exato de 'since', só IDs maiores que este." },
+          collection_path = { type = "string", description = "Filtra por trecho do caminho da coleção." },
+          path_contains   = { type = "string", description = "Filtra por trecho do caminho." },
+          tag             = { type = "string", description = "Só imagens com esta tag." },
+          min_rating      = { type = "number", description = "Rating mínimo (-1 a 5). Padrão: -2" },
+          only_raw        = { type = "boolean", description = "Se true, apenas arquivos RAW." },
+          include_exif    = { type = "boolean", description = "Inclui campos EXIF em cada imagem." }
+        }
+      }
+    },
+    {
+      name        = "catalog_dump",
+      title       = "Exportar catálogo em colunas",
+      description = "Retorna id, film roll, caminho, arquivo, rating, raw, colorlabels (bitmask), tags e EXIF de todo o catálogo em colunas, paginado por offset/limit (next_offset indica o próximo bloco).",
+      inputSchema = {
+        type       = "object",
+        properties = {
+          offset       = { type = "number", description = "Posição inicial (0 = começo do catálogo)." },
+          limit        = { type = "number", description = "Imagens por bloco. Padrão: 5000, máximo: 50000." },
+          include_tags = { type = "boolean", description = "Inclui a coluna tags (padrão: true)." },
+          include_exif = { type = "boolean", description = "Inclui as colunas exif_* (padrão: true)." }
+        }
+      }
+    },
+    {
+      name        = "tag_bulk",
+      title       = "Aplicar várias tags em lote",
+      description = "Anexa e/ou remove várias tags numa única chamada a partir de um mapa {tag: [ids]}. Aceita tags hierárquicas ('a|b|c'). Retorna a contagem por tag.",
+      inputSchema = {
+        type       = "object",
+        properties = {
+          transactional = {
+            type        = "boolean",
+            description = "Se true (padrão), guarda o estado anterior, reverte em caso de falha e habilita undo_last_batch."
+          },
+          attach = {
+            type                 = "object",
+            description          = "Mapa tag -> IDs das imagens que recebem a tag.",
+            additionalProperties = { type = "array", items = { type = "number" } }
+          },
+          detach = {
+            type                 = "object",
+            description          = "Mapa tag -> IDs das imagens das quais a tag é removida (aplicado antes de attach).",
+            additionalProperties = { type = "array", items = { type = "number" } }
+          },
+          separator = {
+            type        = "string",
+            description = "Separador de níveis usado nos nomes (ex.: '/'); convertido para '|'. Padrão: '|'"
+          }
+        }
+      }
+    },
+    {
+      name        = "server_stats",
+      title       = "Estatísticas do servidor",
+      description = "Histograma de latência, tempos de varredura/codificação/subprocessos e contadores acumulados por ferramenta.",
+      inputSchema = {
+        type       = "object",
+        properties = {
+          reset = {
+            type        = "boolean",
+            description = "Se true, zera as estatísticas depois de retorná-las."
+          }
+        }
+      }
+    },
+    {
+      name        = "undo_last_batch",
+      title       = "Desfazer último lote",
+      description = "Restaura rating, colorlabels e tags das imagens alteradas pelo último lote de escrita transacional.",
+      inputSchema = {
+        type       = "object",
+        properties = {}
+      }
+    },
+    {
+      name        = "apply_plan",
+      title       = "Aplicar plano por imagem",
+      description = "Aplica rating, colorlabel, tags e estilo de várias imagens numa única chamada. Retorna o status de cada operação.",
+      inputSchema = {
+        type       = "object",
+        required   = { "ops" },
+        properties = {
+          transactional = {
+            type        = "boolean",
+            description = "Se true (padrão), guarda o estado anterior, reverte em caso de falha e habilita undo_last_batch."
+          },
+          overwrite_labels = {
+            type        = "boolean",
+            description = "Se true, limpa colorlabels anteriores antes de aplicar 'color'. Padrão: false"
+          },
+          ops = {
+            type  = "array",
+            items = {
+              type       = "object",
+              required   = { "id" },
+              properties = {
+                id         = { type = "number", description = "ID da imagem no banco" },
+                rating     = { type = "number", description = "Novo rating (-1 a 5)" },
+                color      = { type = "string", description = "Uma das: red, yellow, green, blue, purple" },
+                tags       = { type = "array", items = { type = "string" }, description = "Tags a anexar" },
+                style      = { type = "string", description = "Nome do estilo a aplicar" },
+                style_path = { type = "string", description = "Arquivo .dtstyle a importar antes de aplicar (importado uma vez por caminho)" }
+              }
+            }
+          }
+        }
+      }
+    },
     {
       name        = "export_collection",
       title       = "Exportar coleção",
@@ -1290,37 +2656,81 @@ local function handle_tools_call(req)
   local args   = params.arguments or {}
 
   local result
+  local started = clock()
+  local wall_started = wall_clock()
+  current_profile = { subprocess = 0, counters = json_object() }
 
   if name == "list_collection" then
     result = tool_list_collection(args)
   elseif name == "list_available_collections" then
     result = tool_list_available_collections(args)
+  elseif name == "list_changed_since" then
+    result = tool_list_changed_since(args)
+  elseif name == "catalog_dump" then
+    result = tool_catalog_dump(args)
   elseif name == "list_by_path" then
     result = tool_list_by_path(args)
   elseif name == "list_by_tag" then
     result = tool_list_by_tag(args)
   elseif name == "apply_batch_edits" then
-    result = tool_apply_batch_edits(args)
+    result = run_write_transaction(name, tool_apply_batch_edits, args)
   elseif name == "set_colorlabel_batch" then
-    result = tool_set_colorlabel_batch(args)
+    result = run_write_transaction(name, tool_set_colorlabel_batch, args)
   elseif name == "tag_batch" then
-    result = tool_tag_batch(args)
+    result = run_write_transaction(name, tool_tag_batch, args)
+  elseif name == "tag_bulk" then
+    result = run_write_transaction(name, tool_tag_bulk, args)
   elseif name == "export_collection" then
     result = tool_export_collection(args)
   elseif name == "import_style" then
     result = tool_import_style(args)
   elseif name == "apply_style" then
     result = tool_apply_style(args)
+  elseif name == "apply_plan" then
+    result = run_write_transaction(name, tool_apply_plan, args)
+  elseif name == "undo_last_batch" then
+    result = tool_undo_last_batch(args)
+  elseif name == "server_stats" then
+    result = tool_server_stats(args)
   else
+    current_profile = nil
     send_error(req.id, -32601, "Unknown tool: " .. tostring(name))
     return
   end
 
-  send_response{
-    jsonrpc = "2.0",
-    id      = req.id,
-    result  = result
+  local handler_s = clock() - started
+  local profile = current_profile
+  current_profile = nil
+
+  local encode_started = clock()
+  local body = json.encode(result, { indent = false })
+  local encode_s = clock() - encode_started
+
+  -- Em tempo de CPU a espera por subprocessos já fica fora do handler; o total
+  -- soma essa espera (medida no relógio de parede) e nunca fica abaixo do
+  -- tempo de parede da chamada inteira
+  local scan_s = handler_s
+  if CLOCK_IS_WALL then
+    scan_s = math.max(0, handler_s - profile.subprocess)
+  end
+  local total_s = math.max(scan_s + encode_s + profile.subprocess, wall_clock() - wall_started)
+
+  local timing = {
+    total_ms      = total_s * 1000,
+    scan_ms       = scan_s * 1000,
+    encode_ms     = encode_s * 1000,
+    subprocess_ms = profile.subprocess * 1000,
+    counters      = profile.counters,
+    clock         = CLOCK_SOURCE,
   }
+  record_tool_stats(name, type(result) == "table" and result.isError, timing)
+
+  -- O resultado já codificado ganha "_timing" no fim, sem codificar tudo de novo
+  if profiling and body:sub(-1) == "}" and body ~= "{}" then
+    body = body:sub(1, -2) .. ',"_timing":' .. json.encode(timing, { indent = false }) .. "}"
+  end
+  io.stdout:write('{"jsonrpc":"2.0","id":', json.encode(req.id), ',"result":', body, "}\n")
+  io.stdout:flush()
 end
 
 local function dispatch(req)
@@ -3,12 +3,16 @@ Test fixtures for image testing.
 Provides utility functions and mock images for test suite.
 """
 import io
+import os
 import base64
 from pathlib import Path
 from PIL import Image
 import tempfile
 import pytest
 
+# Testes da GUI rodam sem display (CI/headless)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
 
 @pytest.fixture
 def temp_image_path(tmp_path):
@@ -0,0 +1,159 @@
+--------------------------------------------------
+-- Módulo "darktable" falso para rodar server/dt_mcp_server.lua fora do
+-- darktable (host/lua-static + este diretório no LUA_PATH).
+--
+-- O catálogo vem de DT_MOCK_CATALOG: arquivo JSON com a lista de imagens
+-- { id, film_roll, path, filename, rating, is_raw, labels = [0..4],
+--   tags = [nomes], import_timestamp, change_timestamp, exif_* }. Os ids são
+-- 1..N, na ordem da lista (a posição em dt.database). Os benchmarks geram
+-- esse arquivo com benchmarks/synthetic.py (mock_catalog). Escrever rating, colorlabels, tags ou
+-- estilo atualiza change_timestamp, como no darktable. Anexar a tag
+-- "mock|falha" lança erro: simula uma falha no meio de um lote.
+--------------------------------------------------
+
+local json = require "dkjson"
+
+-- host/lua-static é compilado sem io.popen; o darktable real tem. Emula com
+-- os.execute + arquivo temporário para o servidor poder rodar subprocessos.
+local has_popen, probe = pcall(io.popen, "true")
+if has_popen then
+  probe:close()
+else
+  function io.popen(cmd)
+    local out = os.tmpname()
+    local ok, reason, code = os.execute("{ " .. cmd .. "\n} > '" .. out .. "'")
+    local f = io.open(out, "r")
+    local data = f and f:read("a") or ""
+    if f then
+      f:close()
+    end
+    os.remove(out)
+    return {
+      read = function() return data end,
+      close = function() return ok, reason, code end,
+    }
+  end
+end
+
+local FAIL_TAG = "mock|falha"
+
+local data_of = setmetatable({}, { __mode = "k" })
+local tag_names_of = setmetatable({}, { __mode = "k" })
+local tags_by_name = {}
+
+local function touch(img)
+  data_of[img].change_timestamp = os.time()
+end
+
+local function new_tag(name)
+  tags_by_name[name] = tags_by_name[name] or { name = name }
+  return tags_by_name[name]
+end
+
+local function new_image(entry)
+  local data = {}
+  for key, value in pairs(entry) do
+    data[key] = value
+  end
+  data.labels, data.tags, data.film_roll = nil, nil, nil
+  data.is_raw = entry.is_raw or false
+  if entry.film_roll then
+    data.film = { id = entry.film_roll, path = entry.path, roll_name = entry.path }
+  end
+
+  local img = {}
+  local labels = {}
+  for _, index in ipairs(entry.labels or {}) do
+    labels[index] = true
+  end
+  data.colorlabels = setmetatable({}, {
+    __index = labels,
+    __newindex = function(_, index, value)
+      labels[index] = value or nil
+      touch(img)
+    end,
+  })
+
+  data_of[img] = data
+  tag_names_of[img] = {}
+  for _, name in ipairs(entry.tags or {}) do
+    tag_names_of[img][new_tag(name).name] = true
+  end
+  return setmetatable(img, {
+    __index = data,
+    __newindex = function(_, key, value)
+      data[key] = value
+      touch(img)
+    end,
+  })
+end
+
+local function load_catalog()
+  local path = os.getenv("DT_MOCK_CATALOG")
+  if not path then
+    return {}
+  end
+  local f = assert(io.open(path, "r"))
+  local entries = assert(json.decode(f:read("*a")))
+  f:close()
+  local database = {}
+  for i, entry in ipairs(entries) do
+    entry.id = entry.id or i
+    database[i] = new_image(entry)
+  end
+  return database
+end
+
+local dt = {
+  database = load_catalog(),
+  styles = {},
+  tags = {},
+}
+
+function dt.tags.create(name)
+  return new_tag(name)
+end
+
+function dt.tags.find(name)
+  return tags_by_name[name]
+end
+
+function dt.tags.attach(tag, img)
+  if tag.name == FAIL_TAG then
+    error("falha simulada ao anexar " .. FAIL_TAG)
+  end
+  tag_names_of[img][tag.name] = true
+  touch(img)
+end
+
+function dt.tags.detach(tag, img)
+  tag_names_of[img][tag.name] = nil
+  touch(img)
+end
+
+function dt.tags.get_tags(img)
+  local names = {}
+  for name in pairs(tag_names_of[img]) do
+    table.insert(names, name)
+  end
+  table.sort(names)
+  local out = {}
+  for i, name in ipairs(names) do
+    out[i] = tags_by_name[name]
+  end
+  return out
+end
+
+function dt.styles.import(path)
+  local name = path:match("([^/]+)%.dtstyle$") or path
+  table.insert(dt.styles, { name = name })
+end
+
+function dt.styles.apply(style, img)
+  touch(img)
+end
+
+-- require("darktable")(argumentos da linha de comando do darktable)
+return function(...)
+  return dt
+end
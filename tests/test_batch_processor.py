@@ -48,6 +48,42 @@ class TestBuildMessages:
         assert len(messages) >= 1
         assert messages[0]["role"] == "system"
     
+    def test_build_messages_with_contact_sheet(self):
+        """Test that a contact sheet becomes a single image message listing its cells."""
+        from common import ContactSheet
+
+        sheet = ContactSheet(
+            index=1,
+            cols=2,
+            rows=1,
+            cells=[{"id": 7, "rating": 1}, {"id": 8, "rating": 2}],
+            b64="fakebase64",
+            data_url="data:image/jpeg;base64,fakebase64",
+        )
+
+        messages = build_messages("System", [], [sheet], "openai")
+
+        assert len(messages) == 3
+        assert "ID estampado" in messages[1]["content"]
+        content = messages[2]["content"]
+        assert content[1]["image_url"]["url"] == sheet.data_url
+        assert "ID 7" in content[0]["text"] and "ID 8" in content[0]["text"]
+
+    def test_static_prefix_is_identical_across_chunks(self):
+        """System prompt and instructions come first so chunks share the cached prefix."""
+        from common import VisionImage
+
+        def chunk(image_id):
+            meta = {"id": image_id, "rating": 0, "colorlabels": []}
+            return [VisionImage(meta=meta, path=Path(f"/x/{image_id}.jpg"), b64="b64", data_url="data:,")]
+
+        first = build_messages("System", [], chunk(1), "ollama")
+        second = build_messages("System", [], chunk(2), "ollama")
+
+        assert first[:2] == second[:2]
+        assert first[2] != second[2]
+        assert all("images" in msg for msg in first[2:])
+
     def test_build_messages_system_prompt(self):
         """Test that system prompt is included."""
         system_prompt = "Custom system prompt"
@@ -217,3 +253,492 @@ class TestMessageFormatting:
         for msg in messages:
             assert "role" in msg
             assert "content" in msg
+
+
+class TestCascadeTriage:
+    """Tests for the --cascade first pass in BatchProcessor."""
+
+    def _args(self, **overrides):
+        from types import SimpleNamespace
+        values = dict(
+            source="all", limit=10, text_only=True, prompt_variant="basico",
+            cascade=True, triage_model=None, keep_min_rating=4,
+        )
+        values.update(overrides)
+        return SimpleNamespace(**values)
+
+    @patch('batch_processor.save_log')
+    @patch('batch_processor.fetch_images')
+    def test_rating_sends_only_ambiguous_and_applies_rejects(self, mock_fetch, mock_save):
+        mock_fetch.return_value = [
+            {"id": 1, "rating": 5},
+            {"id": 2, "rating": 1, "colorlabels": ["red"]},
+            {"id": 3, "rating": 1},
+        ]
+        mock_save.return_value = Path("/tmp/log.json")
+        mock_provider = Mock()
+        mock_provider.__class__.__name__ = "OllamaProvider"
+        mock_provider.chat.return_value = ('{"edits": [{"id": 3, "rating": 2}]}', {})
+        mock_client = Mock()
+        mock_client.call_tool.return_value = {"content": [{"text": "ok"}]}
+
+        processor = BatchProcessor(client=mock_client, provider=mock_provider)
+        processor.run_mode_rating(self._args())
+
+        assert [img["id"] for img in processor._sample] == [3]
+        mock_client.call_tool.assert_called_once_with(
+            "apply_batch_edits",
+            {"edits": [{"id": 2, "rating": -1}, {"id": 3, "rating": 2}]},
+        )
+        assert mock_save.call_args.kwargs["extra"]["triage"]["reject"] == 1
+
+    @patch('batch_processor.save_log')
+    @patch('batch_processor.fetch_images')
+    def test_rating_skips_model_when_triage_resolves_everything(self, mock_fetch, mock_save):
+        mock_fetch.return_value = [{"id": 1, "rating": 5}, {"id": 2, "rating": 0, "colorlabels": ["red"]}]
+        mock_save.return_value = Path("/tmp/log.json")
+        mock_provider = Mock()
+        mock_provider.__class__.__name__ = "OllamaProvider"
+        mock_client = Mock()
+        mock_client.call_tool.return_value = {"content": [{"text": "ok"}]}
+
+        processor = BatchProcessor(client=mock_client, provider=mock_provider)
+        processor.run_mode_rating(self._args())
+
+        mock_provider.chat.assert_not_called()
+        mock_client.call_tool.assert_called_once_with(
+            "apply_batch_edits", {"edits": [{"id": 2, "rating": -1}]}
+        )
+
+
+class TestResumableRuns:
+    """Tests for chunked inference and --resume through the run journal."""
+
+    def _args(self, **overrides):
+        from types import SimpleNamespace
+        values = dict(source="all", limit=10, text_only=True, prompt_variant="basico", chunk_size=2)
+        values.update(overrides)
+        return SimpleNamespace(**values)
+
+    def _provider(self):
+        provider = Mock()
+        provider.__class__.__name__ = "OllamaProvider"
+        return provider
+
+    @patch.object(BatchProcessor, '_log_metric')
+    @patch('batch_processor.save_log')
+    @patch('batch_processor.fetch_images')
+    def test_resume_reuses_answers_and_skips_applied_edits(self, mock_fetch, mock_save, _metric, tmp_path):
+        from run_journal import RunJournal
+
+        mock_fetch.return_value = [{"id": i, "rating": 0} for i in (1, 2, 3)]
+        mock_save.return_value = tmp_path / "log.json"
+        client = Mock()
+        client.call_tool.side_effect = RuntimeError("conexão perdida")
+        provider = self._provider()
+        provider.chat.side_effect = [
+            ('{"edits": [{"id": 1, "rating": 3}, {"id": 2, "rating": 2}]}', {}),
+            ('{"edits": [{"id": 3, "rating": 4}]}', {}),
+        ]
+        journal = RunJournal.create(runs_dir=tmp_path)
+
+        with pytest.raises(RuntimeError):
+            BatchProcessor(client, provider, journal=journal).run_mode_rating(self._args())
+        assert provider.chat.call_count == 2
+
+        # Segunda tentativa: nada é reenviado ao LLM e as edições são aplicadas
+        client.call_tool.side_effect = None
+        client.call_tool.return_value = {"content": [{"text": "ok"}]}
+        resumed = RunJournal.resume(journal.run_id, runs_dir=tmp_path)
+        BatchProcessor(client, provider, journal=resumed).run_mode_rating(self._args())
+
+        assert provider.chat.call_count == 2
+        client.call_tool.assert_called_with("apply_batch_edits", {"edits": [
+            {"id": 1, "rating": 3}, {"id": 2, "rating": 2}, {"id": 3, "rating": 4},
+        ]})
+
+        # Terceira: tudo já aplicado, nenhuma chamada nova ao darktable
+        client.call_tool.reset_mock()
+        again = RunJournal.resume(journal.run_id, runs_dir=tmp_path)
+        BatchProcessor(client, provider, journal=again).run_mode_rating(self._args())
+        client.call_tool.assert_not_called()
+
+
+class TestMergeChunkAnswers:
+    """Tests for merging per-chunk JSON answers."""
+
+    def test_merge_concatenates_lists_and_skips_invalid(self):
+        from batch_processor import merge_chunk_answers
+        import json
+
+        merged = json.loads(merge_chunk_answers([
+            '```json\n{"edits": [{"id": 1}], "summary": "a"}\n```',
+            "não é json",
+            '{"edits": [{"id": 2}], "summary": "b"}',
+        ]))
+
+        assert merged == {"edits": [{"id": 1}, {"id": 2}], "summary": "a"}
+
+
+class TestApplyPlan:
+    """Tests for grouping tratamento writes into a single apply_plan call."""
+
+    def _processor(self, answer, results):
+        provider = Mock()
+        provider.__class__.__name__ = "OllamaProvider"
+        provider.chat.return_value = (answer, {})
+        client = Mock()
+        client.call_tool.return_value = {
+            "content": [
+                {"type": "text", "text": "Plano aplicado"},
+                {"type": "json", "json": {"results": results}},
+            ],
+            "isError": False,
+        }
+        return BatchProcessor(client=client, provider=provider), client
+
+    def _args(self):
+        from types import SimpleNamespace
+        return SimpleNamespace(source="all", limit=10, text_only=True, prompt_variant="basico",
+                               generate_styles=False)
+
+    @patch('batch_processor.save_log')
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('prompts.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_tratamento_sends_one_plan(self, mock_fetch, _p1, _p2, mock_save):
+        mock_fetch.return_value = [{"id": 1}, {"id": 2}]
+        mock_save.return_value = Path("/tmp/log.json")
+        answer = ('{"treatments": [{"id": 1, "rating": 4, "color_label": "green"},'
+                  ' {"id": 2, "rating": 1}]}')
+        processor, client = self._processor(answer, [
+            {"id": 1, "status": "ok"}, {"id": 2, "status": "error", "error": "falhou"},
+        ])
+
+        processor.run_mode_tratamento(self._args())
+
+        client.call_tool.assert_called_once_with("apply_plan", {
+            "ops": [{"id": 1, "rating": 4, "color": "green"}, {"id": 2, "rating": 1}],
+            "overwrite_labels": True,
+        })
+
+
+class TestExport:
+    """Tests for journaling only the images export_collection actually exported."""
+
+    @patch('batch_processor.append_export_result_to_log')
+    @patch('batch_processor.save_log')
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('prompts.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_failed_exports_stay_pending(self, mock_fetch, _p1, _p2, mock_save, _append, tmp_path):
+        from types import SimpleNamespace
+        from run_journal import RunJournal
+        mock_fetch.return_value = [{"id": 1}, {"id": 2}, {"id": 3}]
+        mock_save.return_value = tmp_path / "log.json"
+        provider = Mock()
+        provider.__class__.__name__ = "OllamaProvider"
+        provider.chat.return_value = ('{"ids_para_exportar": [1, 2, 3]}', {})
+        client = Mock()
+        client.call_tool.return_value = {
+            "content": [
+                {"type": "text", "text": "Exportadas 2 imagens para out (1 falharam)"},
+                {"type": "json", "json": {"errors": [{"id": 2, "exit": 1, "stderr": "falhou"}]}},
+            ],
+            "isError": False,
+        }
+        journal = RunJournal.create(runs_dir=tmp_path)
+        processor = BatchProcessor(client=client, provider=provider, journal=journal)
+
+        processor.run_mode_export(SimpleNamespace(source="all", limit=10, text_only=True,
+                                                  prompt_variant="basico", target_dir="out"))
+
+        assert journal.applied_ids("export", "export") == {1, 3}
+        assert journal.pending("export", "export", [1, 2, 3]) == [2]
+        assert processor._written == {1, 3}
+        assert 2 in processor._failed
+
+
+class TestTagBulk:
+    """Tests for sending every tag of a tagging run in a single tag_bulk call."""
+
+    def _processor(self, answer, payload, journal=None):
+        provider = Mock()
+        provider.__class__.__name__ = "OllamaProvider"
+        provider.chat.return_value = (answer, {})
+        client = Mock()
+        client.call_tool.return_value = {
+            "content": [
+                {"type": "text", "text": "Tags em lote"},
+                {"type": "json", "json": payload},
+            ],
+            "isError": False,
+        }
+        return BatchProcessor(client=client, provider=provider, journal=journal), client
+
+    def _args(self):
+        from types import SimpleNamespace
+        return SimpleNamespace(source="all", limit=10, text_only=True, prompt_variant="basico")
+
+    @patch('batch_processor.save_log')
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('prompts.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_tagging_sends_one_call(self, mock_fetch, _p1, _p2, mock_save):
+        mock_fetch.return_value = [{"id": 1}, {"id": 2}]
+        mock_save.return_value = Path("/tmp/log.json")
+        answer = ('{"tags": [{"tag": "praia", "ids": [1, 2]}, {"tag": "por-do-sol", "ids": [2]},'
+                  ' {"tag": "praia", "ids": [2]}]}')
+        processor, client = self._processor(answer, {"attached": {"praia": 2, "por-do-sol": 1}})
+
+        processor.run_mode_tagging(self._args())
+
+        client.call_tool.assert_called_once_with("tag_bulk", {
+            "attach": {"praia": [1, 2], "por-do-sol": [2]},
+        })
+
+    @patch('batch_processor.save_log')
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('prompts.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_not_found_ids_are_not_journaled(self, mock_fetch, _p1, _p2, mock_save, tmp_path):
+        from run_journal import RunJournal
+        mock_fetch.return_value = [{"id": 1}, {"id": 2}]
+        mock_save.return_value = Path("/tmp/log.json")
+        journal = RunJournal.create(runs_dir=tmp_path)
+        answer = '{"tags": [{"tag": "praia", "ids": [1, 2]}]}'
+        processor, _ = self._processor(answer, {"attached": {"praia": 1}, "not_found": [2]}, journal)
+
+        processor.run_mode_tagging(self._args())
+
+        assert journal.applied_ids("tagging", "tag:praia") == {1}
+
+
+class TestIncrementalWatermark:
+    """Tests for advancing the --incremental watermark over list_changed_since results."""
+
+    def _processor(self, answer='{"edits": []}', client=None, dry_run=True):
+        provider = Mock()
+        provider.__class__.__name__ = "OllamaProvider"
+        provider.chat.return_value = (answer, {})
+        return BatchProcessor(client=client or Mock(), provider=provider, dry_run=dry_run)
+
+    def _args(self, limit, **overrides):
+        from types import SimpleNamespace
+        args = SimpleNamespace(source="all", limit=limit, text_only=True, prompt_variant="basico",
+                               generate_styles=False, changed_since=50, changed_after_id=None)
+        vars(args).update(overrides)
+        return args
+
+    @patch.object(BatchProcessor, '_log_metric')
+    @patch('batch_processor.save_log', return_value=Path("/tmp/log.json"))
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_truncated_sample_stops_at_last_covered(self, mock_fetch, _prompt, _save, _metric):
+        from common import ChangeFeed
+        mock_fetch.return_value = ChangeFeed([
+            {"id": 5, "changed_at": 100}, {"id": 9, "changed_at": 100}, {"id": 2, "changed_at": 130},
+        ], watermark=200)
+        processor = self._processor()
+        assert processor.run("rating", self._args(limit=2)) is True
+        assert processor.watermark == {"since": 100, "after_id": 9}
+
+    @patch.object(BatchProcessor, '_log_metric')
+    @patch('batch_processor.save_log', return_value=Path("/tmp/log.json"))
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_full_coverage_uses_server_watermark(self, mock_fetch, _prompt, _save, _metric):
+        from common import ChangeFeed
+        mock_fetch.return_value = ChangeFeed([{"id": 5, "changed_at": 100}], watermark=1234)
+        processor = self._processor()
+        processor.run("rating", self._args(limit=10))
+        assert processor.watermark == {"since": 1234, "after_id": None}
+
+    @patch.object(BatchProcessor, '_log_metric')
+    @patch('batch_processor.fetch_images', return_value=[])
+    def test_not_incremental_leaves_watermark_unset(self, _fetch, _metric):
+        from types import SimpleNamespace
+        processor = self._processor()
+        processor.run("rating", SimpleNamespace(source="all", limit=10, text_only=True, prompt_variant="basico"))
+        assert processor.watermark is None
+
+    @patch('batch_processor.save_log', return_value=Path("/tmp/log.json"))
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('prompts.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_failed_apply_keeps_watermark(self, mock_fetch, _p1, _p2, _save):
+        from common import ChangeFeed
+        mock_fetch.return_value = ChangeFeed([{"id": 5, "changed_at": 100}], watermark=1234)
+        client = Mock()
+        client.call_tool.side_effect = RuntimeError("servidor caiu")
+        processor = self._processor('{"tags": [{"tag": "praia", "ids": [5]}]}', client, dry_run=False)
+
+        assert processor.run("tagging", self._args(limit=10)) is False
+        assert processor.watermark is None
+
+    @patch('batch_processor.save_log', return_value=Path("/tmp/log.json"))
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('prompts.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_invalid_answer_keeps_watermark(self, mock_fetch, _p1, _p2, _save):
+        from common import ChangeFeed
+        mock_fetch.return_value = ChangeFeed([{"id": 5, "changed_at": 100}], watermark=1234)
+        processor = self._processor("sem json", dry_run=False)
+
+        assert processor.run("tratamento", self._args(limit=10)) is False
+        assert processor.watermark is None
+
+    @patch('batch_processor.save_log', return_value=Path("/tmp/log.json"))
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('prompts.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_written_images_are_skipped_and_failures_hold_the_mark(self, mock_fetch, _p1, _p2, _save):
+        from common import ChangeFeed
+        feed = ChangeFeed([
+            {"id": 5, "changed_at": 100}, {"id": 6, "changed_at": 110}, {"id": 7, "changed_at": 120},
+        ], watermark=1234)
+        # Depois do apply_plan: 5 e 7 gravados têm changed_at novo
+        after = ChangeFeed([{"id": 5, "changed_at": 1240}, {"id": 7, "changed_at": 1240}], watermark=1250)
+        mock_fetch.side_effect = [feed, after]
+        client = Mock()
+        client.call_tool.return_value = {"content": [
+            {"type": "text", "text": "3 operações"},
+            {"type": "json", "json": {"results": [
+                {"id": 5, "status": "ok"}, {"id": 6, "status": "error", "error": "falhou"},
+                {"id": 7, "status": "ok"},
+            ]}},
+        ]}
+        answer = '{"treatments": [{"id": 5, "rating": 3}, {"id": 6, "rating": 2}, {"id": 7, "rating": 4}]}'
+        processor = self._processor(answer, client, dry_run=False)
+
+        assert processor.run("tratamento", self._args(limit=10, changed_skip=[[1, 90], [2, 105]])) is True
+
+        # 6 falhou: a marca para em 5; 7 (já gravada) não volta enquanto não mudar de novo
+        assert processor.watermark == {
+            "since": 100, "after_id": 5, "skip": [[2, 105], [5, 1240], [7, 1240]],
+        }
+        relisted = mock_fetch.call_args_list[1].args[1]
+        assert (relisted.changed_since, relisted.changed_after_id) == (100, 5)
+
+
+class TestStructuredOutput:
+    """Tests for schema-constrained answers and the repair pass for truncated ones."""
+
+    def _args(self, **overrides):
+        from types import SimpleNamespace
+        values = dict(source="all", limit=10, text_only=True, prompt_variant="basico")
+        values.update(overrides)
+        return SimpleNamespace(**values)
+
+    def _provider(self, *answers):
+        provider = Mock()
+        provider.__class__.__name__ = "OllamaProvider"
+        provider.chat.side_effect = [(answer, {}) for answer in answers]
+        return provider
+
+    @patch.object(BatchProcessor, '_log_metric')
+    @patch('batch_processor.save_log', return_value=Path("/tmp/log.json"))
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_schema_is_sent_to_provider(self, mock_fetch, _prompt, _save, _metric):
+        mock_fetch.return_value = [{"id": 1}]
+        provider = self._provider('{"edits": []}')
+
+        BatchProcessor(Mock(), provider, dry_run=True).run_mode_rating(self._args())
+
+        assert provider.chat.call_args.kwargs["schema"]["required"] == ["edits"]
+
+    @patch.object(BatchProcessor, '_log_metric')
+    @patch('batch_processor.save_log', return_value=Path("/tmp/log.json"))
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_no_structured_output_sends_no_schema(self, mock_fetch, _prompt, _save, _metric):
+        mock_fetch.return_value = [{"id": 1}]
+        provider = self._provider('{"edits": []}')
+
+        BatchProcessor(Mock(), provider, dry_run=True).run_mode_rating(self._args(structured_output=False))
+
+        assert provider.chat.call_args.kwargs["schema"] is None
+
+    @patch.object(BatchProcessor, '_log_metric')
+    @patch('batch_processor.save_log', return_value=Path("/tmp/log.json"))
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_truncated_answer_is_salvaged_and_repaired(self, mock_fetch, _prompt, _save, _metric):
+        mock_fetch.return_value = [{"id": 1}, {"id": 2}, {"id": 3}]
+        provider = self._provider(
+            '{"edits": [{"id": 1, "rating": 3}, {"id": 2, "rating": 2}, {"id": 3, "rat',
+            '{"edits": [{"id": 3, "rating": 5}]}',
+        )
+        client = Mock()
+        client.call_tool.return_value = {"content": [{"text": "ok"}]}
+
+        BatchProcessor(client, provider).run_mode_rating(self._args())
+
+        assert provider.chat.call_count == 2
+        repair_prompt = provider.chat.call_args_list[1].args[0][-1]["content"]
+        assert '"id": 3' in repair_prompt and '"id": 1' not in repair_prompt
+        client.call_tool.assert_called_once_with("apply_batch_edits", {"edits": [
+            {"id": 1, "rating": 3}, {"id": 2, "rating": 2}, {"id": 3, "rating": 5},
+        ]})
+
+
+class TestProgressEvents:
+    """Tests for the structured per-image progress callback."""
+
+    def _args(self, **overrides):
+        from types import SimpleNamespace
+        values = dict(source="all", limit=10, text_only=True, prompt_variant="basico", chunk_size=1)
+        values.update(overrides)
+        return SimpleNamespace(**values)
+
+    @patch.object(BatchProcessor, '_log_metric')
+    @patch('batch_processor.save_log', return_value=Path("/tmp/log.json"))
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_events_cover_each_stage_in_order(self, mock_fetch, _prompt, _save, _metric):
+        mock_fetch.return_value = [{"id": 1, "path": "/fotos", "filename": "a.raw"}, {"id": 2}]
+        provider = Mock()
+        provider.__class__.__name__ = "OllamaProvider"
+        provider.chat.side_effect = [
+            ('{"edits": [{"id": 1, "rating": 4}]}', {}),
+            ('{"edits": [{"id": 2, "rating": 1}]}', {}),
+        ]
+        client = Mock()
+        client.call_tool.return_value = {"content": [{"text": "ok"}]}
+        events = []
+
+        BatchProcessor(client, provider, progress=events.append).run_mode_rating(self._args())
+
+        assert [(e["stage"], e.get("id")) for e in events] == [
+            ("sample", None), ("encode", 1), ("infer", 1), ("encode", 2), ("infer", 2),
+            ("decision", 1), ("decision", 2), ("apply", 1), ("apply", 2),
+        ]
+        assert [e["decision"] for e in events if e["stage"] == "decision"] == ["rating 4", "rating 1"]
+        assert events[1] == {"stage": "encode", "mode": "rating", "index": 1, "total": 2, "id": 1,
+                             "path": str(Path("/fotos") / "a.raw")}
+
+    @patch.object(BatchProcessor, '_log_metric')
+    @patch('batch_processor.save_log', return_value=Path("/tmp/log.json"))
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images')
+    def test_callback_exception_stops_the_run(self, mock_fetch, _prompt, _save, _metric):
+        mock_fetch.return_value = [{"id": 1}, {"id": 2}]
+        provider = Mock()
+        provider.__class__.__name__ = "OllamaProvider"
+        provider.chat.return_value = ('{"edits": []}', {})
+
+        def stop_after_first_answer(event):
+            if event["stage"] == "infer":
+                raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            BatchProcessor(Mock(), provider, progress=stop_after_first_answer).run_mode_rating(self._args())
+        assert provider.chat.call_count == 1
+
+
+def test_prompt_error_is_the_common_exception():
+    """The GUI catches common.PromptValidationError; the processor must raise that same class."""
+    import batch_processor
+    import common
+    assert batch_processor.PromptValidationError is common.PromptValidationError
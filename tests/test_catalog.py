@@ -0,0 +1,96 @@
+"""
+Testes do catálogo colunar (catalog_dump -> CatalogTable).
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+from unittest.mock import Mock
+
+import pytest
+from catalog import CatalogTable, dump_catalog
+
+
+def _chunk(ids, next_offset=None):
+    n = len(ids)
+    payload = {
+        "encoding": "columnar",
+        "count": n,
+        "fields": ["id", "film_roll", "path", "filename", "rating", "is_raw", "colorlabels",
+                   "tags", "exif_exposure", "exif_iso"],
+        "columns": {
+            "id": ids,
+            "film_roll": [1 if i % 2 else 2 for i in ids],
+            "path": [f"/fotos/rolo{1 if i % 2 else 2}" for i in ids],
+            "filename": [f"img{i}.cr2" for i in ids],
+            "rating": [i % 6 - 1 for i in ids],
+            "is_raw": [i % 3 != 0 for i in ids],
+            "colorlabels": [0b00101 if i == 1 else 0 for i in ids],
+            "tags": [["praia"] if i < 3 else [] for i in ids],
+            "exif_exposure": [0.01 if i == 1 else None for i in ids],
+            "exif_iso": [100] * n,
+        },
+    }
+    if next_offset is not None:
+        payload["next_offset"] = next_offset
+    return payload
+
+
+@pytest.fixture
+def table():
+    return CatalogTable.from_chunks([_chunk([1, 2, 3]), _chunk([4, 5, 6])])
+
+
+class TestCatalogTable:
+    def test_from_chunks_concatenates(self, table):
+        assert len(table) == 6
+        assert list(table.column("id")) == [1, 2, 3, 4, 5, 6]
+
+    def test_filters_combine(self, table):
+        mask = table.min_rating(2) & table.only_raw()
+        assert table.indexes(mask) == [3, 4]
+        assert table.indexes(table.in_film_roll(1) | table.has_tag("praia")) == [0, 1, 2, 4]
+
+    def test_colorlabel_bitmask(self, table):
+        assert table.indexes(table.has_color("red")) == [0]
+        assert table.indexes(table.has_color("green")) == [0]
+        assert table.indexes(table.has_color("yellow")) == []
+
+    def test_row_matches_list_collection_shape(self, table):
+        row = table.row(0)
+        assert row["id"] == 1
+        assert row["colorlabels"] == ["red", "green"]
+        assert row["film_roll"] == 1
+        assert row["tags"] == ["praia"]
+        assert row["exif"]["exposure"] == 0.01
+        assert "exposure" not in table.row(1)["exif"]
+
+    def test_take_keeps_columns_aligned(self, table):
+        sub = table.take(table.path_contains("rolo2"))
+        assert [r["filename"] for r in sub.rows()] == ["img2.cr2", "img4.cr2", "img6.cr2"]
+
+    def test_stats(self, table):
+        stats = table.stats()
+        assert stats["images"] == 6
+        assert stats["raw"] == 4
+        assert stats["film_rolls"] == 2
+        assert stats["top_tags"] == [("praia", 2)]
+
+
+class TestDumpCatalog:
+    def test_follows_next_offset(self):
+        client = Mock()
+        client.call_tool.side_effect = [
+            {"content": [{"type": "json", "json": _chunk([1, 2], next_offset=2)}], "isError": False},
+            {"content": [{"type": "json", "json": _chunk([3])}], "isError": False},
+        ]
+        table = dump_catalog(client, chunk_size=2)
+        assert len(table) == 3
+        assert client.call_tool.call_args_list[1][0][1]["offset"] == 2
+
+    def test_error_raises(self):
+        client = Mock()
+        client.call_tool.return_value = {"content": [{"type": "text", "text": "falhou"}], "isError": True}
+        with pytest.raises(RuntimeError):
+            dump_catalog(client)
@@ -16,7 +16,11 @@ from common import (
     prepare_vision_payloads,
     prepare_vision_payloads_async,
     setup_logging,
-    VisionImage
+    VisionImage,
+    ContactSheet,
+    parse_grid_spec,
+    prepare_contact_sheets,
+    resolve_contact_sheet_ids,
 )
 
 
@@ -312,3 +316,322 @@ class TestVisionImageDataclass:
         assert "path" in field_names
         assert "b64" in field_names
         assert "data_url" in field_names
+
+
+class TestContactSheets:
+    """Tests for contact-sheet tiling (prepare_contact_sheets)."""
+
+    def test_parse_grid_spec(self):
+        """Test COLSxROWS parsing and validation."""
+        assert parse_grid_spec("4x3") == (4, 3)
+        assert parse_grid_spec("2X2") == (2, 2)
+        with pytest.raises(ValueError):
+            parse_grid_spec("4")
+        with pytest.raises(ValueError):
+            parse_grid_spec("0x3")
+
+    def test_sheets_pack_images_by_grid(self, mock_image_list):
+        """Test that N images become ceil(N / cells) sheets with ordered ids."""
+        sheets, errors = prepare_contact_sheets(mock_image_list, cols=2, rows=2, tile_size=64)
+
+        assert errors == []
+        assert len(sheets) == 2
+        assert all(isinstance(sheet, ContactSheet) for sheet in sheets)
+        assert sheets[0].ids == [100, 101, 102, 103]
+        assert sheets[1].ids == [104]
+        assert sheets[1].rows == 1
+        assert sheets[0].data_url.startswith("data:image/jpeg;base64,")
+
+    def test_sheet_dimensions(self, mock_image_list):
+        """Test canvas size follows grid and tile size."""
+        import base64
+        import io
+        from PIL import Image
+
+        sheets, _ = prepare_contact_sheets(mock_image_list[:3], cols=3, rows=3, tile_size=80)
+        with Image.open(io.BytesIO(base64.b64decode(sheets[0].b64))) as img:
+            assert img.size == (240, 80)
+
+    def test_missing_file_reported(self, mock_image_list, tmp_path):
+        """Test that missing files are skipped and reported."""
+        images = mock_image_list[:2] + [
+            {"id": 999, "filename": "missing.jpg", "path": str(tmp_path)}
+        ]
+        sheets, errors = prepare_contact_sheets(images, cols=4, rows=4, tile_size=32)
+
+        assert len(sheets) == 1
+        assert 999 not in sheets[0].ids
+        assert len(errors) == 1
+
+    def test_resolve_ids(self, mock_image_list):
+        """Test that answers map back by stamped id or sheet/cell position."""
+        sheets, _ = prepare_contact_sheets(mock_image_list, cols=2, rows=2, tile_size=32)
+        entries = [
+            {"id": 101, "rating": 4},
+            {"sheet": 2, "cell": 1, "rating": -1},
+            {"id": 555, "rating": 5},
+            {"tag": "job:x", "ids": [100, 555, 104]},
+        ]
+
+        resolved = resolve_contact_sheet_ids(entries, sheets)
+
+        assert {"id": 101, "rating": 4} in resolved
+        assert any(e.get("id") == 104 and e.get("rating") == -1 for e in resolved)
+        assert not any(e.get("id") == 555 for e in resolved)
+        assert {"tag": "job:x", "ids": [100, 104]} in resolved
+
+
+class TestAppImageCache:
+    """Tests for the shared AppImage mount and the per-hash layout cache."""
+
+    @pytest.fixture
+    def cache_file(self, tmp_path, monkeypatch):
+        import common
+        path = tmp_path / "appimage_cache.json"
+        monkeypatch.setattr(common, "APPIMAGE_CACHE_FILE", path)
+        return path
+
+    def _fake_appimage(self, tmp_path, mount_point):
+        script = tmp_path / "Darktable.AppImage"
+        script.write_text(f"#!/bin/sh\necho {mount_point}\nexec sleep 30\n")
+        script.chmod(0o755)
+        return script
+
+    def test_layout_is_cached_by_digest(self, tmp_path, cache_file):
+        import common
+        mount = tmp_path / "mnt"
+        (mount / "opt/dt/lib").mkdir(parents=True)
+        (mount / "opt/dt/lib/libdarktable.so").write_text("")
+        appimage = self._fake_appimage(tmp_path, mount)
+
+        first = common.resolve_appimage_layout(str(appimage), str(mount))
+        assert first["lib"] == str(mount / "opt/dt/lib/libdarktable.so")
+
+        with patch.object(common, "_discover_appimage_layout") as discover:
+            second = common.resolve_appimage_layout(str(appimage), str(mount))
+        discover.assert_not_called()
+        assert second == first
+
+    def test_digest_reused_while_file_unchanged(self, tmp_path, cache_file):
+        import common
+        appimage = self._fake_appimage(tmp_path, tmp_path)
+        cache = {}
+        digest = common.appimage_digest(str(appimage), cache)
+
+        with patch("hashlib.sha256") as sha:
+            assert common.appimage_digest(str(appimage), cache) == digest
+        sha.assert_not_called()
+
+    def test_mount_is_shared_and_unmounted(self, tmp_path):
+        import common
+        appimage = self._fake_appimage(tmp_path, tmp_path / "mnt")
+
+        mount = common.get_appimage_mount(str(appimage))
+        try:
+            assert mount.mount() == str(tmp_path / "mnt")
+            proc = mount.proc
+            assert common.get_appimage_mount(str(appimage)) is mount
+            assert mount.mount() == str(tmp_path / "mnt")
+            assert mount.proc is proc
+        finally:
+            common.unmount_all_appimages()
+        assert not mount.is_alive()
+
+
+class TestWireEncoding:
+    """Tests for the columnar list encoding negotiated at initialize."""
+
+    def test_decode_rows_columnar(self):
+        from common import decode_rows
+        payload = {
+            "encoding": "columnar",
+            "count": 2,
+            "fields": ["id", "path", "rating"],
+            "columns": {"id": [1, 2], "path": ["/a", None], "rating": [3, 0]},
+        }
+        assert decode_rows(payload) == [
+            {"id": 1, "path": "/a", "rating": 3},
+            {"id": 2, "rating": 0},
+        ]
+
+    def test_decode_rows_passes_lists_through(self):
+        from common import decode_rows
+        rows = [{"id": 1}]
+        assert decode_rows(rows) is rows
+        assert decode_rows(None) is None
+
+    def test_initialize_negotiates_encoding(self):
+        from common import McpClient
+        client = McpClient(["lua", "server.lua"], "2024-11-05", {"name": "test"})
+        with patch.object(client, "request", return_value={
+            "capabilities": {"experimental": {"darktable": {"encoding": "columnar"}}},
+        }) as mock_request:
+            client.initialize()
+        params = mock_request.call_args[0][1]
+        assert params["capabilities"]["experimental"]["darktable"]["encodings"] == ["columnar"]
+        assert client.wire_encoding == "columnar"
+
+    def test_initialize_falls_back_to_json(self):
+        from common import McpClient
+        client = McpClient(["lua", "server.lua"], "2024-11-05", {"name": "test"})
+        with patch.object(client, "request", return_value={"capabilities": {"tools": {}}}):
+            client.initialize()
+        assert client.wire_encoding == "json"
+
+    def test_fetch_images_decodes_columnar(self):
+        from types import SimpleNamespace
+        from common import fetch_images
+        client = Mock()
+        client.call_tool.return_value = {"content": [{"type": "json", "json": {
+            "encoding": "columnar",
+            "fields": ["id", "filename"],
+            "columns": {"id": [7], "filename": ["a.raw"]},
+        }}]}
+        args = SimpleNamespace(source="all", min_rating=-2, only_raw=False)
+        assert fetch_images(client, args) == [{"id": 7, "filename": "a.raw"}]
+
+    def test_fetch_images_incremental_uses_change_feed(self):
+        from types import SimpleNamespace
+        from common import fetch_images
+        client = Mock()
+        client.call_tool.return_value = {"content": [{"type": "json", "json": []}]}
+        args = SimpleNamespace(source="path", path_contains="2024", min_rating=-2, only_raw=False,
+                               changed_since=100, changed_after_id=7)
+        fetch_images(client, args)
+        client.call_tool.assert_called_once_with("list_changed_since", {
+            "min_rating": -2, "only_raw": False, "path_contains": "2024", "since": 100, "after_id": 7,
+        })
+
+    def test_fetch_images_returns_server_watermark_and_skips_written(self):
+        from types import SimpleNamespace
+        from common import fetch_images
+        client = Mock()
+        client.call_tool.return_value = {"content": [
+            {"type": "json", "json": [
+                {"id": 1, "changed_at": 150}, {"id": 2, "changed_at": 160}, {"id": 3, "changed_at": 170},
+            ]},
+            {"type": "json", "json": {"since": 100, "watermark": 180, "count": 3}},
+        ]}
+        # 1 não mudou desde que foi gravada; 2 foi editada de novo depois disso
+        args = SimpleNamespace(source="all", min_rating=-2, only_raw=False, changed_since=100,
+                               changed_after_id=None, changed_skip=[[1, 150], [2, 155]])
+        images = fetch_images(client, args)
+        assert [img["id"] for img in images] == [2, 3]
+        assert images.watermark == 180
+
+    def test_fetch_images_asks_exif_only_for_sampling_that_needs_it(self):
+        from types import SimpleNamespace
+        from common import fetch_images
+        from sampling import NEEDS_EXIF, STRATEGIES
+        client = Mock()
+        client.call_tool.return_value = {"content": [{"type": "json", "json": []}]}
+        for strategy in STRATEGIES:
+            client.call_tool.reset_mock()
+            fetch_images(client, SimpleNamespace(source="all", min_rating=-2, only_raw=False, sampling=strategy))
+            params = client.call_tool.call_args.args[1]
+            assert params.get("include_exif", False) == (strategy in NEEDS_EXIF), strategy
+
+
+class TestServerProfiling:
+    """Tests for the opt-in server timings (_timing / server_stats)."""
+
+    def test_initialize_requests_profiling(self):
+        from common import McpClient
+        client = McpClient(["lua", "server.lua"], "2024-11-05", {"name": "test"}, profiling=True)
+        with patch.object(client, "request", return_value={"capabilities": {}}) as mock_request:
+            client.initialize()
+        params = mock_request.call_args[0][1]
+        assert params["capabilities"]["experimental"]["darktable"]["profiling"] is True
+
+    def test_request_attaches_server_timing_to_span(self):
+        import tracing
+        from common import McpClient
+        client = McpClient(["lua", "server.lua"], "2024-11-05", {"name": "test"})
+        timing = {"total_ms": 12.5, "scan_ms": 10.0, "counters": {"images_scanned": 3}}
+        tracing.enable(True)
+        try:
+            tracing.TRACER.drain()
+            with patch.object(client, "_roundtrip", return_value={"result": {"content": [], "_timing": timing}}):
+                client.call_tool("list_collection", {})
+            events, _, _ = tracing.TRACER.drain()
+        finally:
+            tracing.enable(False)
+        assert events[-1]["name"] == "tool:list_collection"
+        assert events[-1]["args"]["server"] == timing
+
+    def test_server_stats_reads_json_block(self):
+        from common import server_stats
+        client = Mock()
+        client.call_tool.return_value = {"content": [
+            {"type": "text", "text": "2 ferramenta(s)"},
+            {"type": "json", "json": {"uptime_s": 5, "tools": {}}},
+        ]}
+        assert server_stats(client, reset=True) == {"uptime_s": 5, "tools": {}}
+        client.call_tool.assert_called_once_with("server_stats", {"reset": True})
+
+    def test_server_time_reads_the_server_clock(self):
+        from common import server_time
+        client = Mock()
+        client.call_tool.return_value = {"content": [{"type": "json", "json": {"server_time": 1700000000}}]}
+        assert server_time(client) == 1700000000
+
+    def test_format_server_stats_orders_by_total_time(self):
+        from common import format_server_stats
+        lines = format_server_stats({"tools": {
+            "list_collection": {"calls": 2, "total_ms": 40.0, "scan_ms": 30.0, "encode_ms": 8.0,
+                                "subprocess_ms": 0, "counters": {"images_scanned": 1000}},
+            "apply_plan": {"calls": 1, "total_ms": 100.0, "scan_ms": 0, "encode_ms": 1.0, "subprocess_ms": 0},
+        }})
+        assert lines[0].startswith("apply_plan: 1 chamada(s), média 100.0 ms")
+        assert lines[1].startswith("list_collection: 2 chamada(s), média 20.0 ms")
+        assert lines[1].endswith("[images_scanned=1000]")
+
+    def test_format_server_stats_flags_the_coarse_clock(self):
+        from common import format_server_stats
+        lines = format_server_stats({"clock": "os.clock+os.time", "tools": {
+            "export_collection": {"calls": 1, "total_ms": 2000.0, "subprocess_ms": 2000.0},
+        }})
+        assert lines[0].startswith("relógio os.clock+os.time")
+        assert lines[1].startswith("export_collection: 1 chamada(s)")
+        assert format_server_stats({"clock": "socket.gettime", "tools": {}}) == []
+
+
+class TestCompactLog:
+    """Tests for the compact (ids + hash, gzip JSON-lines) batch log."""
+
+    def test_save_log_compact_stores_ids_and_hash(self, tmp_path):
+        import common
+        images = [{"id": 1, "path": "/a", "filename": "1.raw"}, {"id": 2, "path": "/a", "filename": "2.raw"}]
+        with patch.object(common, "LOG_DIR", tmp_path):
+            log_file = common.save_log("rating", "all", images, '{"edits": []}', extra={"run_id": "r"}, compact=True)
+        assert log_file.name.endswith(".jsonl.gz")
+        data = common.read_log(log_file)
+        assert data["image_ids"] == [1, 2]
+        assert data["sample_hash"] == common.sample_hash(images)
+        assert data["model_answer"] == '{"edits": []}'
+        assert "images_sample" not in data
+        assert (tmp_path / "index.jsonl").exists()
+
+    def test_export_result_is_appended_not_rewritten(self, tmp_path):
+        import common
+        with patch.object(common, "LOG_DIR", tmp_path):
+            log_file = common.save_log("export", "all", [{"id": 1}], "{}", compact=True)
+        before = log_file.read_bytes()
+        assert common.append_export_result_to_log(log_file, {"content": [{"type": "text", "text": "ok"}]}) == log_file
+        after = log_file.read_bytes()
+        assert after.startswith(before)
+        assert common.read_log(log_file)["extra"]["export_result"]["content"][0]["text"] == "ok"
+
+    def test_read_log_tolerates_truncated_tail(self, tmp_path):
+        import common
+        with patch.object(common, "LOG_DIR", tmp_path):
+            log_file = common.save_log("rating", "all", [{"id": 1}], "{}", compact=True)
+        common.append_log_event(log_file, {"event": "export_result", "result": {"x": 1}})
+        log_file.write_bytes(log_file.read_bytes()[:-6])
+        assert common.read_log(log_file)["image_ids"] == [1]
+
+    def test_read_log_reads_full_format(self, tmp_path):
+        import common
+        with patch.object(common, "LOG_DIR", tmp_path):
+            log_file = common.save_log("rating", "all", [{"id": 5}], "{}")
+        assert common.read_log(log_file)["images_sample"] == [{"id": 5}]
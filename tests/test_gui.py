@@ -198,3 +198,213 @@ def test_gui_accessible_names_count():
         pytest.skip("Qt not available")
     except Exception as e:
         pytest.skip(f"Cannot test GUI: {e}")
+
+
+def test_run_history_dialog_filters_index(tmp_path):
+    """The history panel reads only logs/index.jsonl and filters in memory."""
+    try:
+        from mcp_gui import RunHistoryDialog
+        from PySide6.QtWidgets import QApplication
+    except ImportError:
+        pytest.skip("Qt not available")
+    import json
+    app = QApplication.instance() or QApplication([])
+    index_file = tmp_path / "index.jsonl"
+    index_file.write_text("\n".join(json.dumps(e) for e in [
+        {"ts": "2025-12-01T10:00:00", "mode": "rating", "model": "a", "ids": [1], "images": 1,
+         "llm_calls": 1, "latency_ms": 1000, "ok": True, "log": "batch-rating-1.json"},
+        {"ts": "2025-12-02T10:00:00", "mode": "tagging", "model": "b", "ids": [2], "images": 1,
+         "llm_calls": 1, "latency_ms": 2000, "ok": True, "log": "batch-tagging-2.json"},
+    ]) + "\n", encoding="utf-8")
+
+    dialog = RunHistoryDialog(index_file=index_file)
+    assert dialog.table.rowCount() == 2
+    dialog.image_edit.setText("2")
+    assert dialog.table.rowCount() == 1
+    assert dialog.table.item(0, 6).text() == "batch-tagging-2.json"
+    dialog.close()
+    app.processEvents()
+
+
+def test_log_buffer_bounds_pending_lines_and_spills_everything(tmp_path):
+    """Lines beyond max_lines are dropped from the view but kept in the full log file."""
+    try:
+        from mcp_gui import LogBuffer
+    except ImportError:
+        pytest.skip("Qt not available")
+    spill = tmp_path / "gui.log"
+    buffer = LogBuffer(max_lines=3, spill_path=spill)
+    for i in range(5):
+        buffer.push(f"linha {i}")
+
+    assert buffer.drain() == ["linha 2", "linha 3", "linha 4"]
+    assert buffer.dropped == 2
+    assert buffer.drain() == []
+    buffer.close()
+    assert spill.read_text(encoding="utf-8").splitlines() == [f"linha {i}" for i in range(5)]
+
+
+def test_gui_log_is_appended_in_batches(tmp_path):
+    """_append_log only queues; one flush appends the batch and trims to the ring size."""
+    try:
+        from mcp_gui import MCPGui
+        from PySide6.QtWidgets import QApplication
+    except ImportError:
+        pytest.skip("Qt not available")
+    app = QApplication.instance() or QApplication([])
+    gui = MCPGui(log_max_lines=100, log_file=tmp_path / "gui.log")
+    gui._log_timer.stop()
+
+    for i in range(1000):
+        gui._append_log(f"linha {i}")
+    assert gui.log_text.blockCount() <= 1
+
+    gui._flush_log_ui()
+    assert gui.log_text.blockCount() == 100
+    assert gui.log_text.toPlainText().splitlines()[-1] == "linha 999"
+    gui.close()
+    assert len((tmp_path / "gui.log").read_text(encoding="utf-8").splitlines()) == 1000
+    app.processEvents()
+
+
+def test_thumbnail_model_loads_only_requested_cells(tmp_path):
+    """Only cells the view asks for are decoded, off the UI thread, and decisions are overlaid."""
+    try:
+        from mcp_gui import ThumbnailModel
+        from PySide6.QtCore import Qt
+        from PySide6.QtGui import QImage
+        from PySide6.QtWidgets import QApplication
+    except ImportError:
+        pytest.skip("Qt not available")
+    import threading
+    import time
+    app = QApplication.instance() or QApplication([])
+    image = QImage(400, 300, QImage.Format.Format_RGB32)
+    image.fill(0)
+    thumb = tmp_path / "thumb.png"
+    image.save(str(thumb))
+    loads = []
+
+    def loader(path, image_id, size):
+        loads.append((image_id, threading.current_thread().name))
+        return thumb
+
+    model = ThumbnailModel(loader=loader, size=64, max_cached=2)
+    model.extend([{"id": i, "path": f"/fotos/{i}.jpg"} for i in range(1000)])
+    model.extend([{"id": 0, "path": "/fotos/0.jpg"}])
+    assert model.rowCount() == 1000
+
+    for row in (0, 1, 2):
+        assert model.data(model.index(row), Qt.ItemDataRole.DecorationRole) is None
+    deadline = time.monotonic() + 5
+    while len(model._pixmaps) < 2 and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+
+    assert sorted(i for i, _ in loads) == [0, 1, 2]
+    assert all(name.startswith("thumbs") for _, name in loads)
+    assert len(model._pixmaps) == 2
+    pixmap = next(iter(model._pixmaps.values()))
+    assert max(pixmap.width(), pixmap.height()) <= 64
+
+    model.upsert(5, mode="rating", decision="rating 4")
+    model.upsert(5, mode="tagging", decision="praia", applied=True)
+    assert model.data(model.index(5), ThumbnailModel.DecisionRole) == "rating 4 · praia"
+    assert model.data(model.index(5), ThumbnailModel.AppliedRole) is True
+    model.shutdown()
+
+
+def test_run_progress_fills_grid_and_overlays_decisions(tmp_path):
+    """Sample events build the grid; decision/apply events update the overlay of that cell."""
+    try:
+        from mcp_gui import MCPGui, ThumbnailModel
+        from PySide6.QtWidgets import QApplication
+    except ImportError:
+        pytest.skip("Qt not available")
+    app = QApplication.instance() or QApplication([])
+    gui = MCPGui(log_file=tmp_path / "gui.log")
+    model = gui.thumbnail_model
+
+    gui._on_run_progress({"stage": "sample", "mode": "rating", "index": 0, "total": 2,
+                          "images": [{"id": 1, "path": "/fotos/a.jpg"}, {"id": 2, "path": "/fotos/b.jpg"}]})
+    gui._on_run_progress({"stage": "decision", "mode": "rating", "index": 2, "total": 2,
+                          "id": 2, "path": "/fotos/b.jpg", "decision": "rating 5"})
+    gui._on_run_progress({"stage": "apply", "mode": "rating", "index": 2, "total": 2,
+                          "id": 2, "path": "/fotos/b.jpg"})
+
+    assert model.rowCount() == 2
+    assert model.data(model.index(1), ThumbnailModel.DecisionRole) == "rating 5"
+    assert model.data(model.index(1), ThumbnailModel.AppliedRole) is True
+    assert gui.image_grid.currentIndex().row() == 1
+    assert gui.image_title_label.text() == "b.jpg"
+    gui.close()
+    app.processEvents()
+
+
+def test_gui_shows_cached_lists_and_revalidates_stale_ones(tmp_path):
+    """Startup shows the persisted lists without MCP; stale ones refresh over the shared client."""
+    try:
+        from mcp_gui import MCPGui
+        from list_cache import COLLECTIONS_KEY, ListCache, models_key
+        from mcp_host_ollama import OLLAMA_URL
+        from PySide6.QtCore import Qt
+        from PySide6.QtWidgets import QApplication
+    except ImportError:
+        pytest.skip("Qt not available")
+    import json
+    import time
+    app = QApplication.instance() or QApplication([])
+    path = tmp_path / "lists.json"
+    path.write_text(json.dumps({
+        models_key(OLLAMA_URL): {"ts": time.time(), "items": ["llava:7b"]},
+        COLLECTIONS_KEY: {"ts": time.time() - 3600, "items": ["/fotos/antigas"]},
+    }), encoding="utf-8")
+    client = Mock()
+    client.call_tool.return_value = {"content": [{"json": [{"path": "/fotos/novas"}]}]}
+    factory = Mock(return_value=client)
+    provider_factory = Mock()
+
+    gui = MCPGui(mcp_client_factory=factory, llm_provider_factory=provider_factory,
+                 log_file=tmp_path / "gui.log", list_cache=ListCache(path))
+
+    assert factory.call_count == 0
+    assert [gui.model_combo.itemText(i) for i in range(gui.model_combo.count())][-1] == "llava:7b"
+    assert gui.collection_combo.itemData(0, Qt.ItemDataRole.UserRole) == "/fotos/antigas"
+    assert gui._lists_refresh_timer.isActive()
+
+    gui._lists_refresh_timer.stop()
+    gui._revalidate_cached_lists()
+    deadline = time.monotonic() + 5
+    while gui.collection_combo.itemData(0, Qt.ItemDataRole.UserRole) != "/fotos/novas" and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+
+    assert gui.collection_combo.itemData(0, Qt.ItemDataRole.UserRole) == "/fotos/novas"
+    assert ListCache(path).get(COLLECTIONS_KEY) == (["/fotos/novas"], False)
+    provider_factory.assert_not_called()  # a lista de modelos ainda estava fresca
+    gui.close()
+    app.processEvents()
+
+
+def test_run_id_from_the_runner_thread_is_applied_on_the_gui_thread(tmp_path):
+    """The runner's output callback only emits; the QAction changes in the GUI thread."""
+    try:
+        from mcp_gui import MCPGui
+        from PySide6.QtWidgets import QApplication
+    except ImportError:
+        pytest.skip("Qt not available")
+    import threading
+    app = QApplication.instance() or QApplication([])
+    gui = MCPGui(log_file=tmp_path / "gui.log")
+    gui._log_timer.stop()
+
+    worker = threading.Thread(target=gui.run_id_signal.emit, args=("20261018-120000-abc",))
+    worker.start()
+    worker.join()
+    assert not gui.resume_action.isEnabled()
+
+    app.processEvents()
+    assert gui.resume_action.isEnabled()
+    assert gui._last_run_id == "20261018-120000-abc"
+    gui.close()
+    app.processEvents()
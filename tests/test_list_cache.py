@@ -0,0 +1,40 @@
+"""
+Tests for list_cache.py module.
+Tests the persisted stale-while-revalidate lists used by the GUI.
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+from list_cache import COLLECTIONS_KEY, ListCache, models_key
+
+
+class TestListCache:
+    """Tests for ListCache."""
+
+    def test_put_persists_and_reloads(self, tmp_path):
+        path = tmp_path / "lists.json"
+        ListCache(path).put(models_key("http://localhost:11434/"), ["llava", "qwen"])
+
+        items, stale = ListCache(path).get(models_key("http://localhost:11434"))
+        assert items == ["llava", "qwen"]
+        assert stale is False
+
+    def test_old_entry_is_returned_but_stale(self, tmp_path):
+        path = tmp_path / "lists.json"
+        path.write_text(json.dumps({COLLECTIONS_KEY: {"ts": time.time() - 3600, "items": ["/fotos/2024"]}}),
+                        encoding="utf-8")
+
+        assert ListCache(path, max_age=300).get(COLLECTIONS_KEY) == (["/fotos/2024"], True)
+
+    def test_missing_or_corrupt_file_has_no_entries(self, tmp_path):
+        assert ListCache(tmp_path / "missing.json").get(COLLECTIONS_KEY) is None
+        corrupt = tmp_path / "lists.json"
+        corrupt.write_text("{", encoding="utf-8")
+        cache = ListCache(corrupt)
+        assert cache.get(COLLECTIONS_KEY) is None
+        cache.put(COLLECTIONS_KEY, ["/a"])
+        assert json.loads(corrupt.read_text(encoding="utf-8"))[COLLECTIONS_KEY]["items"] == ["/a"]
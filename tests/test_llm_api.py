@@ -0,0 +1,113 @@
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+from llm_api import OllamaProvider, OpenAICompatProvider, normalize_keep_alive
+
+
+def _response(data):
+    resp = MagicMock(status_code=200)
+    resp.json.return_value = data
+    return resp
+
+
+class TestOllamaOptions:
+    @patch("llm_api.post_json_with_retries")
+    def test_keep_alive_and_options_in_payload(self, mock_post):
+        mock_post.return_value = (_response({"message": {"content": "{}"}}), 5)
+        provider = OllamaProvider("http://x", "m", keep_alive="30m", options={"num_ctx": 8192, "num_batch": None})
+
+        provider.chat([{"role": "user", "content": "oi"}])
+
+        payload = mock_post.call_args.args[1]
+        assert payload["keep_alive"] == "30m"
+        assert payload["options"] == {"num_ctx": 8192}
+
+    @patch("llm_api.post_json_with_retries")
+    def test_defaults_leave_payload_unchanged(self, mock_post):
+        mock_post.return_value = (_response({"message": {"content": "{}"}}), 5)
+
+        OllamaProvider("http://x", "m").chat([])
+
+        payload = mock_post.call_args.args[1]
+        assert "keep_alive" not in payload and "options" not in payload
+
+    def test_with_model_keeps_options(self):
+        provider = OllamaProvider("http://x", "big", 10, keep_alive="-1", options={"num_ctx": 4096})
+
+        small = provider.with_model("small")
+
+        assert small.model == "small" and small.timeout == 10
+        assert small.keep_alive == -1
+        assert small.options == {"num_ctx": 4096}
+
+    def test_normalize_keep_alive(self):
+        assert normalize_keep_alive("300") == 300
+        assert normalize_keep_alive("1h") == "1h"
+        assert normalize_keep_alive(None) is None
+
+
+class TestOpenAICompat:
+    @patch("llm_api.post_json_with_retries")
+    def test_ollama_options_not_sent(self, mock_post):
+        mock_post.return_value = (_response({"choices": [{"message": {"content": "{}"}}]}), 5)
+
+        OpenAICompatProvider("http://x", "m", keep_alive="30m").chat([])
+
+        payload = mock_post.call_args.args[1]
+        assert "keep_alive" not in payload
+
+
+class TestStructuredOutput:
+    @patch("llm_api.post_json_with_retries")
+    def test_ollama_sends_format(self, mock_post):
+        mock_post.return_value = (_response({"message": {"content": "{}"}}), 5)
+        schema = {"type": "object"}
+
+        OllamaProvider("http://x", "m").chat([], schema=schema)
+
+        assert mock_post.call_args.args[1]["format"] == schema
+
+    @patch("llm_api.post_json_with_retries")
+    def test_openai_sends_response_format(self, mock_post):
+        mock_post.return_value = (_response({"choices": [{"message": {"content": "{}"}}]}), 5)
+        schema = {"type": "object"}
+
+        OpenAICompatProvider("http://x", "m").chat([], schema=schema)
+
+        response_format = mock_post.call_args.args[1]["response_format"]
+        assert response_format["type"] == "json_schema"
+        assert response_format["json_schema"]["schema"] == schema
+
+
+class TestListModels:
+    @patch("llm_api.requests.get")
+    def test_ollama_lists_installed_models(self, mock_get):
+        mock_get.return_value = _response({"models": [{"name": "llava:7b"}, {"name": "qwen2.5vl"}]})
+
+        assert OllamaProvider("http://x/", "", 10).list_models() == ["llava:7b", "qwen2.5vl"]
+        assert mock_get.call_args.args[0] == "http://x/api/tags"
+
+    @patch("llm_api.requests.get")
+    def test_openai_compat_lists_models_once_under_v1(self, mock_get):
+        mock_get.return_value = _response({"data": [{"id": "local-model"}]})
+
+        assert OpenAICompatProvider("http://x/v1", "", 10).list_models() == ["local-model"]
+        assert mock_get.call_args.args[0] == "http://x/v1/models"
+
+    @patch("llm_api.requests.get")
+    def test_openai_compat_lists_models_from_default_chat_url(self, mock_get):
+        from mcp_host_lmstudio import DEFAULT_LM_URL
+        mock_get.return_value = _response({"data": [{"id": "local-model"}]})
+
+        OpenAICompatProvider(DEFAULT_LM_URL, "", 10).list_models()
+        assert mock_get.call_args.args[0] == "http://localhost:1234/v1/models"
+
+    @patch("llm_api.requests.get", side_effect=OSError("recusado"))
+    def test_connection_error_is_provider_error(self, _get):
+        import pytest
+        from llm_api import LLMProviderError
+        with pytest.raises(LLMProviderError):
+            OllamaProvider("http://x", "", 10).list_models()
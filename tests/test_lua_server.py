@@ -0,0 +1,215 @@
+"""
+Tests for server/dt_mcp_server.lua, run under host/lua-static.
+A mock darktable module (tests/lua/darktable.lua) stands in for the library,
+so the real MCP server is exercised end to end through McpClient.
+"""
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+import pytest
+from common import McpClient, decode_rows, fetch_images, server_stats
+
+ROOT = Path(__file__).parent.parent
+LUA = ROOT / "host" / "lua-static"
+SERVER = ROOT / "server" / "dt_mcp_server.lua"
+MOCK_DIR = Path(__file__).parent / "lua"
+
+pytestmark = pytest.mark.skipif(not os.access(LUA, os.X_OK), reason="host/lua-static indisponível")
+
+CATALOG = [
+    {"path": "/fotos", "filename": "a.jpg", "rating": 1, "labels": [0], "tags": ["praia"],
+     "import_timestamp": 1000, "change_timestamp": 1000},
+    {"path": "/fotos", "filename": "b.jpg", "rating": 2, "import_timestamp": 1000, "change_timestamp": 1300},
+    {"path": "/fotos", "filename": "c.jpg", "rating": 3, "import_timestamp": 1200},
+    {"path": "/raw", "filename": "d.cr2", "rating": 0, "is_raw": True, "import_timestamp": 1100},
+]
+
+
+@pytest.fixture
+def server_env(tmp_path):
+    catalog = tmp_path / "catalog.json"
+    catalog.write_text(json.dumps(CATALOG), encoding="utf-8")
+    env = dict(os.environ)
+    env.update({
+        "HOME": str(tmp_path),
+        "LUA_PATH": f"{MOCK_DIR}/?.lua;;",
+        "DT_MOCK_CATALOG": str(catalog),
+        # Diretório ainda inexistente: o servidor precisa criá-lo ao gravar o último lote
+        "DT_MCP_STATE_DIR": str(tmp_path / "state" / "darktable"),
+        "DT_MCP_LD_REEXEC": "1",
+    })
+    return env
+
+
+def _start(env):
+    client = McpClient([str(LUA), str(SERVER)], "2024-11-05", {"name": "test"}, env=env, response_timeout=10)
+    client.start()
+    client.initialize()
+    return client
+
+
+@pytest.fixture
+def client(server_env):
+    client = _start(server_env)
+    yield client
+    client.close()
+
+
+def _json(result):
+    return next(c["json"] for c in result["content"] if c.get("type") == "json")
+
+
+def _image(client, img_id):
+    dump = decode_rows(_json(client.call_tool("catalog_dump", {"include_exif": False})))
+    return next(row for row in dump if row["id"] == img_id)
+
+
+def _args(**kw):
+    from types import SimpleNamespace
+    base = dict(source="all", min_rating=-2, only_raw=False)
+    base.update(kw)
+    return SimpleNamespace(**base)
+
+
+class TestListing:
+    def test_columnar_lists_decode_to_rows(self, client):
+        assert client.wire_encoding == "columnar"
+        payload = _json(client.call_tool("list_collection", {}))
+        assert payload["encoding"] == "columnar" and payload["count"] == 4
+
+        images = fetch_images(client, _args())
+
+        assert [img["id"] for img in images] == [1, 2, 3, 4]
+        assert images[0] == {"id": 1, "path": "/fotos", "filename": "a.jpg", "rating": 1,
+                             "is_raw": False, "colorlabels": ["red"]}
+
+    def test_changed_since_orders_by_change_and_reports_watermark(self, client):
+        before = int(time.time())
+        images = fetch_images(client, _args(changed_since=1050, changed_after_id=None))
+
+        assert [(img["id"], img["changed_at"]) for img in images] == [(4, 1100), (3, 1200), (2, 1300)]
+        assert before <= images.watermark <= time.time() + 1
+
+        tie = fetch_images(client, _args(changed_since=1100, changed_after_id=4))
+        assert [img["id"] for img in tie] == [3, 2]
+
+    def test_catalog_dump_pages(self, client):
+        first = _json(client.call_tool("catalog_dump", {"limit": 3}))
+        second = _json(client.call_tool("catalog_dump", {"offset": first["next_offset"], "limit": 3}))
+
+        assert (first["count"], first["total"], first["next_offset"]) == (3, 4, 3)
+        assert second["count"] == 1 and "next_offset" not in second
+        rows = decode_rows(first) + decode_rows(second)
+        assert [row["id"] for row in rows] == [1, 2, 3, 4]
+        assert rows[0]["tags"] == ["praia"] and rows[0]["colorlabels"] == 1
+
+
+class TestStartupCache:
+    def test_missing_cli_is_not_cached(self, server_env, tmp_path, monkeypatch):
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir()
+        monkeypatch.chdir(tmp_path)
+        server_env["PATH"] = f"{bin_dir}:{server_env.get('PATH', '')}"
+        server_env.pop("DARKTABLE_CLI_CMD", None)
+        # libdarktable "encontrada" (o módulo darktable continua vindo do mock no LUA_PATH)
+        lib = tmp_path / "lib" / "libdarktable.so"
+        lib.parent.mkdir()
+        lib.write_bytes(b"")
+        server_env["DARKTABLE_LIB_PATH"] = str(lib)
+        cache_file = Path(server_env["DT_MCP_STATE_DIR"]) / "mcp_startup_cache.json"
+
+        def export():
+            client = _start(server_env)
+            try:
+                return client.call_tool("export_collection", {"target_dir": "export", "ids": [1]})
+            finally:
+                client.close()
+
+        assert export()["isError"]
+        assert not cache_file.exists()
+
+        # darktable-cli instalado num diretório que já estava no PATH: mesma chave de cache
+        cli = bin_dir / "darktable-cli"
+        cli.write_text("#!/bin/sh\nexit 0\n")
+        cli.chmod(0o755)
+
+        assert not export()["isError"]
+        assert json.loads(cache_file.read_text())["cli_source"] == "PATH"
+
+
+class TestWriteTransactions:
+    def test_thrown_error_rolls_back_the_batch(self, client):
+        # detach roda antes do attach; o attach de "mock|falha" lança no meio do lote
+        result = client.call_tool("tag_bulk", {"detach": {"praia": [1]}, "attach": {"mock|falha": [2]}})
+
+        assert result["isError"]
+        error = _json(result)
+        assert error["code"] == "batch_rolled_back" and error["changed_ids"] == [1]
+        assert _image(client, 1)["tags"] == ["praia"]
+        assert _json(client.call_tool("undo_last_batch"))["code"] == "nothing_to_undo"
+
+    def test_undo_restores_rating_labels_and_tags(self, client, server_env):
+        plan = client.call_tool("apply_plan", {
+            "ops": [{"id": 1, "rating": 5, "color": "green", "tags": ["casamento"]}],
+            "overwrite_labels": True,
+        })
+        assert _json(plan)["summary"]["ok"] == 1
+        changed = _image(client, 1)
+        assert (changed["rating"], changed["colorlabels"], changed["tags"]) == (5, 4, ["casamento", "praia"])
+        # STATE_DIR ainda não existia: o servidor o cria para gravar o lote desfazível
+        saved = json.loads((Path(server_env["DT_MCP_STATE_DIR"]) / "mcp_last_batch.json").read_text())
+        assert saved["tool"] == "apply_plan" and saved["snapshots"][0]["rating"] == 1
+
+        undo = _json(client.call_tool("undo_last_batch"))
+        restored = _image(client, 1)
+
+        assert (undo["tool"], undo["restored_ids"]) == ("apply_plan", [1])
+        assert (restored["rating"], restored["colorlabels"], restored["tags"]) == (1, 1, ["praia"])
+        assert not (Path(server_env["DT_MCP_STATE_DIR"]) / "mcp_last_batch.json").exists()
+
+
+class TestServerStats:
+    def test_counters_per_tool(self, client):
+        client.call_tool("list_collection", {})
+        client.call_tool("list_collection", {"min_rating": 2})
+        client.call_tool("tag_bulk", {"attach": {"novo": [1, 2]}})
+
+        stats = server_stats(client, reset=True)
+
+        listing = stats["tools"]["list_collection"]
+        assert listing["calls"] == 2 and listing["errors"] == 0
+        assert listing["counters"]["images_scanned"] == 8
+        assert sum(listing["histogram"]) == 2
+        assert stats["tools"]["tag_bulk"]["counters"]["tag_lookups"] == 1
+        assert stats["server_time"] >= int(time.time()) - 5
+        # reset zera o acumulado (a própria chamada de server_stats é contada depois)
+        assert list(server_stats(client)["tools"]) == ["server_stats"]
+
+    def test_subprocess_wait_counts_on_the_wall_clock(self, server_env, tmp_path, monkeypatch):
+        # host/lua-static não traz luasocket: a varredura fica em os.clock (CPU) e a
+        # espera pelo darktable-cli precisa aparecer pelo relógio de parede
+        cli = tmp_path / "fake-cli"
+        cli.write_text("#!/bin/sh\nsleep 1.1\n")
+        cli.chmod(0o755)
+        monkeypatch.chdir(tmp_path)
+        server_env.update({"DARKTABLE_CLI_CMD": str(cli), "DT_MCP_PROFILE": "1"})
+        client = _start(server_env)
+        try:
+            result = client.call_tool("export_collection", {"target_dir": "export", "ids": [1]})
+            stats = server_stats(client)
+        finally:
+            client.close()
+
+        timing = result["_timing"]
+        assert timing["clock"] == "os.clock+os.time"
+        assert timing["counters"]["subprocesses"] == 1
+        assert timing["subprocess_ms"] >= 1000
+        assert timing["total_ms"] >= timing["subprocess_ms"] + timing["scan_ms"]
+        assert stats["clock"] == "os.clock+os.time"
+        assert stats["tools"]["export_collection"]["subprocess_ms"] >= 1000
+        assert stats["uptime_s"] >= 1
@@ -0,0 +1,37 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+from plan_schema import PLAN_SCHEMAS, missing_ids, parse_plan, salvage_json
+
+
+class TestParsePlan:
+    def test_complete_answer_in_markdown(self):
+        plan, complete = parse_plan('```json\n{"edits": [{"id": 1, "rating": 4}]}\n```')
+        assert complete
+        assert plan == {"edits": [{"id": 1, "rating": 4}]}
+
+    def test_truncated_answer_keeps_complete_items(self):
+        plan, complete = parse_plan('```json\n{"notas_gerais": "ok", "edits": [{"id": 1, "rating": 4}, {"id": 2, "ra')
+        assert not complete
+        assert plan == {"notas_gerais": "ok", "edits": [{"id": 1, "rating": 4}]}
+
+    def test_trailing_number_may_be_cut(self):
+        # "12" pode ser o começo de "123": fica de fora
+        assert salvage_json('{"ids_para_exportar": [7, 12') == {"ids_para_exportar": [7]}
+
+    def test_garbage_returns_none(self):
+        assert parse_plan("não sei") == (None, False)
+        assert parse_plan(None) == (None, False)
+
+
+class TestMissingIds:
+    def test_covers_every_plan_shape(self):
+        assert missing_ids({"edits": [{"id": 1}]}, [1, 2]) == [2]
+        assert missing_ids({"tags": [{"tag": "job:x", "ids": [2, 3]}]}, [1, 2, 3]) == [1]
+        assert missing_ids({"ids_para_exportar": [3]}, [3, 4]) == [4]
+        assert missing_ids(None, [5]) == [5]
+
+    def test_schemas_exist_for_every_mode(self):
+        assert set(PLAN_SCHEMAS) == {"rating", "tagging", "export", "tratamento", "triage"}
@@ -0,0 +1,61 @@
+"""
+Tests for prompts.py (cached prompt registry).
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+import pytest
+from prompts import PromptRegistry, REGISTRY
+
+HEADER = "---\nfluxo: {mode}\nvariante: {variant}\nchangelog:\n  - inicial\n---\n"
+
+
+def _write(path, mode, variant, body):
+    path.write_text(HEADER.format(mode=mode, variant=variant) + body, encoding="utf-8")
+
+
+class TestPromptRegistry:
+    def test_basico_falls_back_to_default_variant(self):
+        # Não existe tagging_basico.md nem export_basico.md no repositório
+        assert REGISTRY.get("tagging", "basico").path.name == "tagging_cliente.md"
+        assert REGISTRY.get("export", "basico").path.name == "export_job.md"
+
+    def test_cached_until_file_changes(self, tmp_path):
+        path = tmp_path / "rating_basico.md"
+        _write(path, "rating", "basico", "Avalie as fotos.")
+        registry = PromptRegistry(tmp_path)
+        first = registry.get("rating")
+        assert registry.get("rating") is first
+
+        _write(path, "rating", "basico", "Avalie as fotos com rigor.")
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+        second = registry.get("rating")
+        assert second is not first
+        assert second.sha256 != first.sha256
+
+    def test_finds_by_header_when_name_differs(self, tmp_path):
+        _write(tmp_path / "meu_prompt.md", "tratamento", "avancado", "Texto")
+        assert PromptRegistry(tmp_path).get("tratamento", "avancado").body == "Texto"
+
+    def test_render_substitutes_variables(self, tmp_path):
+        _write(tmp_path / "tagging_basico.md", "tagging", "basico", "Cliente: $cliente. JSON: {\"tags\": []}")
+        prompt = PromptRegistry(tmp_path).get("tagging")
+        assert prompt.render(cliente="ACME") == 'Cliente: ACME. JSON: {"tags": []}'
+        assert prompt.render() == prompt.body
+        assert prompt.cache_key.startswith("tagging:basico:")
+
+    def test_invalid_header_raises(self, tmp_path):
+        (tmp_path / "rating_basico.md").write_text("---\nfluxo: rating\n---\nTexto", encoding="utf-8")
+        registry = PromptRegistry(tmp_path)
+        with pytest.raises(ValueError):
+            registry.get("rating")
+        [(path, ok, msg, _)] = registry.validate_all()
+        assert not ok and "variante" in msg
+
+    def test_missing_prompt_raises(self, tmp_path):
+        with pytest.raises(ValueError):
+            PromptRegistry(tmp_path).get("rating")
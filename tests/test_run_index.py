@@ -0,0 +1,160 @@
+"""
+Tests for run_index.py module.
+Tests the append-only run index, queries, aggregation and retention.
+"""
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+import pytest
+import run_index
+from run_index import INDEX_NAME, entry_from_log, load_entries, prune, query, rebuild, summarize
+
+
+def _write_log(log_dir, name, mode="rating", ids=(1, 2), model="qwen", latency=1000, answer="{}"):
+    data = {
+        "timestamp": name[-20:-5],
+        "mode": mode,
+        "source": "all",
+        "images_sample": [{"id": i, "filename": f"{i}.raw"} for i in ids],
+        "model_answer": answer,
+        "extra": {"llm": {"provider": "ollama", "model": model, "latency_ms": latency, "eval_count": 10}},
+    }
+    path = log_dir / name
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return path, data
+
+
+class TestRunIndex:
+    """Tests for building and querying the index."""
+
+    def test_entry_from_log_summarizes_chunks_and_repair(self, tmp_path):
+        data = {
+            "timestamp": "20251208-120945",
+            "mode": "rating",
+            "source": "tag",
+            "images_sample": [{"id": 7}, {"id": 9}],
+            "model_answer": "{}",
+            "extra": {"run_id": "r1", "llm": [
+                {"provider": "openai-compat", "model": "m", "latency_ms": 100,
+                 "usage": {"prompt_tokens": 50, "completion_tokens": 5}},
+                {"provider": "openai-compat", "model": "m", "latency_ms": 200,
+                 "repair": {"model": "m", "latency_ms": 30}},
+            ]},
+        }
+        entry = entry_from_log(tmp_path / "batch-rating-20251208-120945.json", data)
+        assert entry["ts"] == "2025-12-08T12:09:45"
+        assert entry["ids"] == [7, 9]
+        assert entry["run_id"] == "r1"
+        assert entry["llm_calls"] == 3
+        assert entry["latency_ms"] == 330
+        assert entry["prompt_tokens"] == 50
+        assert entry["ok"] is True
+
+    def test_save_log_appends_to_index(self, tmp_path):
+        import common
+        with patch.object(common, "LOG_DIR", tmp_path):
+            common.save_log("tagging", "all", [{"id": 3}], '{"tags": []}', extra={"llm": {"model": "x"}})
+            common.save_log("tagging", "all", [{"id": 4}], None)
+        entries = load_entries(tmp_path / INDEX_NAME)
+        assert [e["ids"] for e in entries] == [[3], [4]]
+        assert [e["ok"] for e in entries] == [True, False]
+
+    def test_bad_llm_meta_does_not_fail_save_log(self, tmp_path):
+        import common
+        with patch.object(common, "LOG_DIR", tmp_path):
+            log_file = common.save_log("rating", "all", [{"id": 1}], "{}", extra={"llm": ["texto solto"]})
+        assert log_file.exists()
+
+    def test_load_entries_skips_truncated_line(self, tmp_path):
+        index_file = tmp_path / INDEX_NAME
+        index_file.write_text('{"log": "a.json", "ids": [1]}\n{"log": "b.js', encoding="utf-8")
+        assert [e["log"] for e in load_entries(index_file)] == ["a.json"]
+        assert load_entries(tmp_path / "missing.jsonl") == []
+
+    def test_rebuild_ignores_trace_and_export_files(self, tmp_path):
+        _write_log(tmp_path, "batch-rating-20251208-120945.json")
+        _write_log(tmp_path, "batch-export-20251207-100000.json", mode="export")
+        (tmp_path / "batch-rating-20251208-120945.trace.json").write_text("{}", encoding="utf-8")
+        (tmp_path / "batch-export-20251207-100000-export-result.json").write_text("{}", encoding="utf-8")
+
+        assert rebuild(tmp_path) == 2
+        entries = load_entries(tmp_path / INDEX_NAME)
+        assert [e["mode"] for e in entries] == ["export", "rating"]
+
+    def test_rebuild_reads_compact_logs(self, tmp_path):
+        import common
+        with patch.object(common, "LOG_DIR", tmp_path):
+            common.save_log("rating", "all", [{"id": 8}, {"id": 9}], "{}", compact=True)
+        (tmp_path / INDEX_NAME).unlink()
+
+        assert rebuild(tmp_path) == 1
+        assert load_entries(tmp_path / INDEX_NAME)[0]["ids"] == [8, 9]
+
+    def test_query_and_summarize(self):
+        entries = [
+            {"ts": "2025-12-01T10:00:00", "mode": "rating", "model": "a", "ids": [1, 2], "images": 2,
+             "llm_calls": 1, "latency_ms": 1000, "ok": True},
+            {"ts": "2025-12-05T10:00:00", "mode": "tagging", "model": "a", "ids": [2], "images": 1,
+             "llm_calls": 1, "latency_ms": 3000, "ok": False},
+            {"ts": "2025-12-06T10:00:00", "mode": "rating", "model": "b", "ids": [3], "images": 1,
+             "llm_calls": 1, "latency_ms": 500, "ok": True},
+        ]
+        assert [e["model"] for e in query(entries, image_id=2)] == ["a", "a"]
+        assert len(query(entries, since="2025-12-04T00:00:00", mode="rating")) == 1
+
+        rows = {r["model"]: r for r in summarize(entries)}
+        assert rows["a"]["runs"] == 2
+        assert rows["a"]["failed"] == 1
+        assert rows["a"]["latency_ms_avg"] == 2000
+        assert rows["a"]["ms_per_image"] == pytest.approx(4000 / 3, rel=1e-2)
+
+    def test_parse_since(self):
+        assert run_index.parse_since("2025-12-01") == "2025-12-01T00:00:00"
+        assert run_index.parse_since(None) is None
+        with pytest.raises(ValueError):
+            run_index.parse_since("semana passada")
+
+
+class TestRunIndexRetention:
+    """Tests for prune (retention + compaction)."""
+
+    def test_prune_keeps_newest_runs_and_deletes_old_files(self, tmp_path):
+        old, _ = _write_log(tmp_path, "batch-rating-20250101-100000.json")
+        new, _ = _write_log(tmp_path, "batch-rating-20251208-100000.json")
+        trace = old.with_name(f"{old.stem}.trace.json")
+        trace.write_text("{}", encoding="utf-8")
+        export_result = old.with_name(f"{old.stem}-export-result.json")
+        export_result.write_text("{}", encoding="utf-8")
+        rebuild(tmp_path)
+
+        removed = prune(tmp_path / INDEX_NAME, keep_runs=1)
+
+        assert [e["log"] for e in removed] == [old.name]
+        assert not old.exists() and not trace.exists() and not export_result.exists()
+        assert new.exists()
+        assert [e["log"] for e in load_entries(tmp_path / INDEX_NAME)] == [new.name]
+
+    def test_prune_without_limits_only_drops_missing_logs(self, tmp_path):
+        kept, _ = _write_log(tmp_path, "batch-rating-20250101-100000.json")
+        gone, _ = _write_log(tmp_path, "batch-rating-20250102-100000.json")
+        rebuild(tmp_path)
+        gone.unlink()
+
+        assert prune(tmp_path / INDEX_NAME, dry_run=True)[0]["log"] == gone.name
+        assert len(load_entries(tmp_path / INDEX_NAME)) == 2
+        prune(tmp_path / INDEX_NAME)
+        assert [e["log"] for e in load_entries(tmp_path / INDEX_NAME)] == [kept.name]
+
+    def test_cli_query_by_image(self, tmp_path, capsys):
+        _write_log(tmp_path, "batch-rating-20251208-100000.json", ids=(1234,))
+        _write_log(tmp_path, "batch-tagging-20251208-110000.json", mode="tagging", ids=(5,))
+        rebuild(tmp_path)
+
+        assert run_index.main(["--index", str(tmp_path / INDEX_NAME), "query", "--image", "1234"]) == 0
+        out = capsys.readouterr().out
+        assert "batch-rating-20251208-100000.json" in out
+        assert "batch-tagging" not in out
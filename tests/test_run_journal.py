@@ -0,0 +1,91 @@
+"""
+Tests for run_journal.py module.
+Tests checkpoint recording, reload and idempotent apply tracking.
+"""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+import pytest
+from run_journal import (
+    STAGE_APPLY,
+    STAGE_INFER,
+    STAGE_SAMPLE,
+    RunJournal,
+    RunJournalError,
+)
+
+
+class TestRunJournal:
+    """Tests for RunJournal persistence."""
+
+    def test_create_and_resume_roundtrip(self, tmp_path):
+        journal = RunJournal.create(runs_dir=tmp_path)
+        journal.record(STAGE_SAMPLE, "rating", [1, 2, 3])
+        journal.record(STAGE_INFER, "rating", [2, 1], answer='{"edits": []}', meta={"latency_ms": 5})
+        journal.record(STAGE_APPLY, "rating", [1], action="rating")
+
+        resumed = RunJournal.resume(journal.run_id, runs_dir=tmp_path)
+
+        assert resumed.sample_ids("rating") == [1, 2, 3]
+        assert resumed.sample_ids("tagging") is None
+        assert resumed.cached_answer("rating", [1, 2])["answer"] == '{"edits": []}'
+        assert resumed.cached_answer("rating", [3]) is None
+        assert resumed.pending("rating", "rating", [1, 2, 3]) == [2, 3]
+        assert resumed.pending("rating", "tag:x", [1]) == [1]
+
+    def test_resume_unknown_run_raises(self, tmp_path):
+        with pytest.raises(RunJournalError):
+            RunJournal.resume("nao-existe", runs_dir=tmp_path)
+
+    def test_resume_ignores_truncated_last_line(self, tmp_path):
+        journal = RunJournal.create(runs_dir=tmp_path)
+        journal.record(STAGE_APPLY, "export", [7], action="export")
+        with journal.path.open("a", encoding="utf-8") as f:
+            f.write('{"stage": "apply", "mode": "exp')
+
+        resumed = RunJournal.resume(journal.run_id, runs_dir=tmp_path)
+
+        assert resumed.applied_ids("export", "export") == {7}
+
+    def test_last_evaluated_keeps_latest_infer_per_id(self, tmp_path):
+        from run_journal import last_evaluated
+        first = RunJournal.create(runs_dir=tmp_path)
+        first.record(STAGE_INFER, "rating", [1, 2], answer="{}")
+        first.events[-1]["ts"] = "2024-01-01T00:00:00"
+        first.path.write_text("\n".join(json.dumps(e) for e in first.events) + "\n")
+        second = RunJournal.create(runs_dir=tmp_path)
+        second.record(STAGE_INFER, "rating", [2], answer="{}")
+        second.record(STAGE_INFER, "tagging", [3], answer="{}")
+
+        history = last_evaluated("rating", runs_dir=tmp_path)
+        assert history[1] == "2024-01-01T00:00:00"
+        assert history[2] > history[1]
+        assert 3 not in history
+
+
+class TestResumeArgs:
+    """Tests for restoring the journaled args on resume."""
+
+    def test_resume_restores_journaled_args(self, tmp_path):
+        from argparse import Namespace
+        started = Namespace(mode="tagging", sampling="random", seed=7, chunk_size=4, model="big", timeout=60.0)
+        journal = RunJournal.create(started, runs_dir=tmp_path)
+
+        args = Namespace(mode="rating", sampling="first", seed=None, chunk_size=4, model="small", timeout=600.0)
+        changed = RunJournal.resume(journal.run_id, runs_dir=tmp_path).restore_args(args)
+
+        assert (args.mode, args.sampling, args.seed, args.chunk_size) == ("tagging", "random", 7, 4)
+        # Modelo e timeout são da retomada
+        assert (args.model, args.timeout) == ("small", 600.0)
+        assert changed == {"mode": ("rating", "tagging"), "sampling": ("first", "random"), "seed": (None, 7)}
+
+    def test_journal_without_args_changes_nothing(self, tmp_path):
+        from argparse import Namespace
+        journal = RunJournal.create(runs_dir=tmp_path)
+        args = Namespace(mode="rating")
+
+        assert RunJournal.resume(journal.run_id, runs_dir=tmp_path).restore_args(args) == {}
+        assert args.mode == "rating"
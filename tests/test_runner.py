@@ -0,0 +1,169 @@
+"""
+Tests for runner.py module.
+Tests the in-process runner used by the GUI (shared client, output, cancel).
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+import pytest
+import mcp_host_lmstudio
+import mcp_host_ollama
+import runner
+from runner import InProcessRunner, RunCancelled
+
+
+class FakeClient:
+    def __init__(self):
+        self.proc = Mock()
+        self.proc.poll.return_value = None
+        self.started = self.initialized = self.closed = False
+
+    def start(self):
+        self.started = True
+
+    def initialize(self):
+        self.initialized = True
+
+    def close(self):
+        self.closed = True
+
+
+ARGV = ["--mode", "rating", "--source", "all", "--dry-run", "--no-trace"]
+
+
+class TestInProcessRunner:
+    """Tests for InProcessRunner."""
+
+    def test_client_is_started_once_and_reused(self):
+        factory = Mock(side_effect=FakeClient)
+        runner = InProcessRunner(factory)
+        seen = []
+        with patch("runner.run_batch", side_effect=lambda client, *a, **k: seen.append(client)):
+            runner.run(ARGV)
+            runner.run(ARGV)
+        assert factory.call_count == 1
+        assert seen[0] is seen[1]
+        assert seen[0].started and seen[0].initialized
+
+    def test_dead_server_is_restarted(self):
+        runner = InProcessRunner(FakeClient)
+        first = runner.client()
+        first.proc.poll.return_value = 1
+        second = runner.client()
+        assert second is not first
+        assert first.closed
+
+    def test_output_and_progress_are_forwarded(self):
+        runner = InProcessRunner(FakeClient)
+        lines, events = [], []
+
+        def fake_run_batch(client, provider, args, progress=None, stop=None):
+            print("[run] id=abc (retome com --resume abc)")
+            progress({"stage": "sample", "mode": args.mode, "index": 0, "total": 3})
+            print("sem quebra de linha", end="")
+            return "abc"
+
+        with patch("runner.run_batch", side_effect=fake_run_batch):
+            assert runner.run(ARGV, progress=events.append, output=lines.append) == "abc"
+        assert lines == ["[run] id=abc (retome com --resume abc)", "sem quebra de linha"]
+        assert events == [{"stage": "sample", "mode": "rating", "index": 0, "total": 3}]
+
+    def test_cancel_raises_at_next_progress_event(self):
+        runner = InProcessRunner(FakeClient)
+
+        def fake_run_batch(client, provider, args, progress=None, stop=None):
+            runner.cancel()
+            assert stop.is_set()
+            progress({"stage": "infer"})
+
+        with patch("runner.run_batch", side_effect=fake_run_batch):
+            with pytest.raises(RunCancelled):
+                runner.run(ARGV)
+
+    def test_errors_after_cancel_are_reported_as_cancelled(self):
+        runner = InProcessRunner(FakeClient)
+
+        def fake_run_batch(client, provider, args, progress=None, stop=None):
+            runner.cancel()
+            raise RuntimeError("Erro ao aplicar edits")
+
+        with patch("runner.run_batch", side_effect=fake_run_batch):
+            with pytest.raises(RunCancelled):
+                runner.run(ARGV)
+
+    def test_cancel_interrupts_an_inflight_llm_call(self):
+        runner = InProcessRunner(FakeClient)
+        release = threading.Event()
+
+        def slow_post(*args, **kwargs):
+            release.wait(5)
+            return Mock()
+
+        def fake_run_batch(client, provider, args, progress=None, stop=None):
+            threading.Timer(0.1, runner.cancel).start()
+            provider.chat([{"role": "user", "content": "oi"}])
+
+        started = time.monotonic()
+        try:
+            with patch("runner.run_batch", side_effect=fake_run_batch), \
+                    patch("common.requests.post", side_effect=slow_post):
+                with pytest.raises(RunCancelled):
+                    runner.run(ARGV)
+        finally:
+            release.set()
+        assert time.monotonic() - started < 2
+
+    def test_output_of_other_threads_is_not_captured(self, capsys):
+        runner = InProcessRunner(FakeClient)
+        lines = []
+
+        def fake_run_batch(client, provider, args, progress=None, stop=None):
+            other = threading.Thread(target=lambda: print("outra thread"))
+            other.start()
+            other.join()
+            print("lote")
+
+        with patch("runner.run_batch", side_effect=fake_run_batch):
+            runner.run(ARGV, output=lines.append)
+        assert lines == ["lote"]
+        assert "outra thread" in capsys.readouterr().out
+
+    def test_providers_are_reused_per_model(self):
+        runner = InProcessRunner(FakeClient)
+        with patch("runner.run_batch"):
+            runner.run(ARGV)
+            runner.run(ARGV)
+            runner.run(ARGV + ["--model", "outro"])
+        assert len(runner._providers) == 2
+
+
+def test_both_hosts_share_run_batch():
+    """The Ollama and LM Studio CLIs and the GUI runner use the same execution path."""
+    assert mcp_host_ollama.run_batch is runner.run_batch
+    assert mcp_host_lmstudio.run_batch is runner.run_batch
+
+
+class TestBatchArguments:
+    """Both command-line hosts take the batch options from runner.add_batch_arguments."""
+
+    def test_hosts_share_batch_options(self):
+        import argparse
+        shared = argparse.ArgumentParser()
+        runner.add_batch_arguments(shared)
+        expected = vars(shared.parse_args([]))
+
+        for host in (mcp_host_ollama, mcp_host_lmstudio):
+            parsed = vars(host.parse_args(["--mode", "tagging", "--incremental", "--sampling", "time-buckets"]))
+            assert {key: parsed[key] for key in expected} == {
+                **expected, "mode": "tagging", "incremental": True, "sampling": "time-buckets",
+            }
+
+    def test_provider_options_stay_in_each_host(self):
+        assert mcp_host_ollama.parse_args([]).keep_alive == "30m"
+        assert mcp_host_lmstudio.parse_args([]).lm_url == mcp_host_lmstudio.DEFAULT_LM_URL
+        assert not hasattr(mcp_host_lmstudio.parse_args([]), "keep_alive")
@@ -0,0 +1,65 @@
+"""
+Tests for sampling.py strategies.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+import pytest
+from sampling import (
+    FIRST,
+    LEAST_RECENT,
+    RANDOM,
+    STRATIFIED,
+    TIME_BUCKETS,
+    UNRATED_FIRST,
+    round_robin,
+    sample_images,
+)
+
+
+def _img(i, **kw):
+    return {"id": i, **kw}
+
+
+class TestSampleImages:
+    def test_first_keeps_order(self):
+        images = [_img(i) for i in range(5)]
+        assert [i["id"] for i in sample_images(images, 3, FIRST)] == [0, 1, 2]
+
+    def test_unrated_first(self):
+        images = [_img(1, rating=3), _img(2, rating=0), _img(3, rating=-1), _img(4)]
+        assert [i["id"] for i in sample_images(images, 3, UNRATED_FIRST)] == [2, 4, 1]
+
+    def test_stratified_covers_every_film_roll(self):
+        images = [_img(i, path="/a") for i in range(5)] + [_img(10, path="/b"), _img(20, path="/c")]
+        assert [i["id"] for i in sample_images(images, 4, STRATIFIED)] == [0, 10, 20, 1]
+
+    def test_random_is_reproducible_with_seed(self):
+        images = [_img(i) for i in range(50)]
+        a = sample_images(images, 5, RANDOM, seed=42)
+        b = sample_images(images, 5, RANDOM, seed=42)
+        assert a == b and len(a) == 5
+
+    def test_least_recent_prefers_never_evaluated(self):
+        images = [_img(1), _img(2), _img(3), _img(4)]
+        history = {1: "2024-05-02T10:00:00", 2: "2024-05-01T10:00:00"}
+        assert [i["id"] for i in sample_images(images, 3, LEAST_RECENT, history=history)] == [3, 4, 2]
+
+    def test_time_buckets_spread_across_shoot(self):
+        def shot(i, hhmm):
+            return _img(i, exif={"datetime_taken": f"2024:06:01 {hhmm}:00"})
+        # rajada de manhã, poucas fotos à tarde e uma sem EXIF
+        images = [shot(i, f"09:0{i}") for i in range(6)] + [shot(10, "15:00"), shot(11, "15:30"), _img(99)]
+        picked = [i["id"] for i in sample_images(images, 2, TIME_BUCKETS)]
+        assert picked == [0, 10]
+
+    def test_unknown_strategy_raises(self):
+        with pytest.raises(ValueError):
+            sample_images([], 1, "best")
+
+
+class TestRoundRobin:
+    def test_stops_at_limit_and_drains_groups(self):
+        assert round_robin([[1, 2, 3], [4], [5, 6]], 5) == [1, 4, 5, 2, 6]
@@ -0,0 +1,87 @@
+"""
+Tests for thumbnails.py module.
+Tests the thumbnail cache, darktable mipmap lookup and reduced decoding.
+"""
+import hashlib
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+import pytest
+import thumbnails
+from thumbnails import darktable_mipmap, mipmap_dir, thumbnail_for
+
+PIL = pytest.importorskip("PIL.Image")
+
+
+def _jpeg(path, size=(1200, 800)):
+    PIL.new("RGB", size, (200, 40, 40)).save(path, format="JPEG")
+    return path
+
+
+class TestThumbnails:
+    """Tests for thumbnail_for and the on-disk cache."""
+
+    def test_generates_small_cached_copy_once(self, tmp_path):
+        source = _jpeg(tmp_path / "foto.jpg")
+        cache_dir = tmp_path / "thumbs"
+
+        first = thumbnail_for(source, 7, size=128, cache_dir=cache_dir, mipmaps=tmp_path / "mipmaps")
+        assert first.parent == cache_dir
+        with PIL.open(first) as img:
+            assert max(img.size) <= 128
+
+        with patch.object(thumbnails, "_render") as render:
+            assert thumbnail_for(source, 7, size=128, cache_dir=cache_dir, mipmaps=tmp_path / "mipmaps") == first
+        render.assert_not_called()
+
+    def test_changed_file_gets_new_thumbnail(self, tmp_path):
+        source = _jpeg(tmp_path / "foto.jpg")
+        cache_dir = tmp_path / "thumbs"
+        first = thumbnail_for(source, size=64, cache_dir=cache_dir, mipmaps=tmp_path / "mipmaps")
+        _jpeg(source, size=(600, 600))
+        assert thumbnail_for(source, size=64, cache_dir=cache_dir, mipmaps=tmp_path / "mipmaps") != first
+
+    def test_raw_uses_darktable_mipmap(self, tmp_path):
+        raw = tmp_path / "foto.cr3"
+        raw.write_bytes(b"raw")
+        mipmaps = tmp_path / "mipmaps-abc.d"
+        mipmap = _jpeg(self._mipmap_path(mipmaps, 2, 42), size=(720, 450))
+
+        assert darktable_mipmap(42, mipmaps) == mipmap
+        assert thumbnail_for(raw, 42, cache_dir=tmp_path / "thumbs", mipmaps=mipmaps) == mipmap
+        assert thumbnail_for(raw, 43, cache_dir=tmp_path / "thumbs", mipmaps=mipmaps) is None
+
+    def test_jpeg_renders_the_file_even_with_a_mipmap(self, tmp_path):
+        source = _jpeg(tmp_path / "foto.jpg")
+        mipmaps = tmp_path / "mipmaps-abc.d"
+        _jpeg(self._mipmap_path(mipmaps, 1, 7))
+
+        thumb = thumbnail_for(source, 7, size=64, cache_dir=tmp_path / "thumbs", mipmaps=mipmaps)
+
+        assert thumb.parent == tmp_path / "thumbs"
+
+    def test_only_the_server_library_mipmaps_are_used(self, tmp_path, monkeypatch):
+        # Duas bibliotecas com o mesmo id 42; STATE_DIR em outro lugar não muda a busca
+        monkeypatch.setenv("HOME", str(tmp_path))
+        monkeypatch.setenv("DT_MCP_STATE_DIR", str(tmp_path / "state"))
+        cache = tmp_path / ".cache" / "darktable"
+        other = _jpeg(self._mipmap_path(cache / "mipmaps-0000.d", 1, 42))
+        library = str(tmp_path / ".config" / "darktable" / "library.db")
+
+        assert darktable_mipmap(42) is None
+
+        own = _jpeg(self._mipmap_path(mipmap_dir(library, cache), 1, 42))
+        assert darktable_mipmap(42) == own != other
+        assert mipmap_dir().name == f"mipmaps-{hashlib.sha1(library.encode()).hexdigest()}.d"
+
+    @staticmethod
+    def _mipmap_path(mipmaps, level, image_id):
+        path = mipmaps / str(level) / f"{image_id}.jpg"
+        path.parent.mkdir(parents=True)
+        return path
+
+    def test_missing_file_returns_none(self, tmp_path):
+        assert thumbnail_for(tmp_path / "sumiu.jpg", cache_dir=tmp_path, mipmaps=tmp_path / "mipmaps") is None
@@ -0,0 +1,93 @@
+import json
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+import tracing
+from batch_processor import BatchProcessor
+from tracing import Tracer, trace_path_for
+
+
+class TestTracer:
+    def test_disabled_records_nothing(self):
+        tracer = Tracer()
+        with tracer.span("x") as args:
+            args["bytes"] = 10
+        assert tracer.drain()[0] == []
+
+    def test_span_records_args_set_inside_block(self):
+        tracer = Tracer()
+        tracer.enabled = True
+        with tracer.span("tool:list_collection", cat="mcp", bytes_out=5) as args:
+            args["bytes_in"] = 42
+        events, threads, _ = tracer.drain()
+        assert events[0]["name"] == "tool:list_collection"
+        assert events[0]["ph"] == "X" and events[0]["dur"] >= 0
+        assert events[0]["args"] == {"bytes_out": 5, "bytes_in": 42}
+        assert threading.get_ident() in threads
+
+    def test_export_writes_chrome_trace_and_drains(self, tmp_path):
+        tracer = Tracer()
+        tracer.enabled = True
+        with tracer.span("a"):
+            pass
+        path = tracer.export(tmp_path / "t.trace.json", {"mode": "rating"})
+        data = json.loads(path.read_text())
+        assert [e["ph"] for e in data["traceEvents"]] == ["M", "X"]
+        assert data["otherData"]["mode"] == "rating"
+        assert tracer.export(tmp_path / "again.json") is None
+
+    def test_event_limit(self):
+        tracer = Tracer(max_events=1)
+        tracer.enabled = True
+        for _ in range(3):
+            with tracer.span("a"):
+                pass
+        events, _, dropped = tracer.drain()
+        assert (len(events), dropped) == (1, 2)
+        assert tracer.dropped == 0
+
+    def test_each_export_reports_only_its_own_drops(self, tmp_path):
+        import json
+        tracer = Tracer(max_events=1)
+        tracer.enabled = True
+        for _ in range(3):
+            with tracer.span("a"):
+                pass
+        first = json.loads(tracer.export(tmp_path / "first.json").read_text())
+        with tracer.span("b"):
+            pass
+        second = json.loads(tracer.export(tmp_path / "second.json").read_text())
+        assert first["otherData"]["dropped_events"] == 2
+        assert second["otherData"]["dropped_events"] == 0
+
+    def test_trace_path_next_to_batch_log(self):
+        assert trace_path_for(Path("logs/batch-rating-1.json")) == Path("logs/batch-rating-1.trace.json")
+        assert trace_path_for(Path("logs/batch-rating-1.jsonl.gz")) == Path("logs/batch-rating-1.trace.json")
+
+
+class TestRunTrace:
+    @patch.object(BatchProcessor, '_log_metric')
+    @patch('batch_processor.get_prompt', return_value="prompt")
+    @patch('batch_processor.fetch_images', return_value=[{"id": 1}])
+    def test_run_exports_trace_next_to_log(self, _fetch, _prompt, _metric, tmp_path):
+        provider = Mock()
+        provider.__class__.__name__ = "OllamaProvider"
+        provider.model = "m"
+        provider.chat.return_value = ('{"edits": []}', {})
+        log_file = tmp_path / "batch-rating-1.json"
+        args = SimpleNamespace(source="all", limit=10, text_only=True, prompt_variant="basico")
+
+        tracing.enable()
+        try:
+            with patch('batch_processor.save_log', return_value=log_file):
+                BatchProcessor(Mock(), provider, dry_run=True).run("rating", args)
+        finally:
+            tracing.enable(False)
+
+        names = {e["name"] for e in json.loads((tmp_path / "batch-rating-1.trace.json").read_text())["traceEvents"]}
+        assert {"mode:rating", "encode_chunk", "llm:chat", "parse_plan"} <= names
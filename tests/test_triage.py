@@ -0,0 +1,85 @@
+"""
+Tests for triage.py module.
+Tests metadata/EXIF heuristics and small-model decisions of the cascade triage.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+import pytest
+from triage import (
+    AMBIGUOUS,
+    KEEP,
+    REJECT,
+    TriageRules,
+    apply_model_decisions,
+    blur_risk,
+    classify_image,
+    reject_edits,
+    triage_images,
+)
+
+
+class TestBlurRisk:
+    """Tests for the 1/focal shutter heuristic."""
+
+    def test_blur_risk_without_exif(self):
+        assert blur_risk(None) is None
+        assert blur_risk({"exposure": 0.01}) is None
+
+    def test_blur_risk_uses_crop_factor(self):
+        # 1/50s a 50mm em full frame = exatamente no limite
+        assert blur_risk({"exposure": 1 / 50, "focal_length": 50}) == pytest.approx(1.0)
+        assert blur_risk({"exposure": 1 / 50, "focal_length": 50, "crop": 1.5}) == pytest.approx(1.5)
+
+
+class TestClassifyImage:
+    """Tests for per-image triage decisions."""
+
+    def test_rejected_and_red_label_are_rejected(self):
+        rules = TriageRules()
+        assert classify_image({"id": 1, "rating": -1}, rules)[0] == REJECT
+        assert classify_image({"id": 2, "rating": 3, "colorlabels": ["red"]}, rules)[0] == REJECT
+
+    def test_high_rating_and_green_label_are_kept(self):
+        rules = TriageRules(keep_min_rating=4)
+        assert classify_image({"id": 1, "rating": 4}, rules)[0] == KEEP
+        assert classify_image({"id": 2, "rating": 0, "colorlabels": ["green"]}, rules)[0] == KEEP
+
+    def test_long_exposure_at_long_focal_is_rejected(self):
+        img = {"id": 1, "rating": 0, "exif": {"exposure": 0.5, "focal_length": 200}}
+        decision, reason = classify_image(img, TriageRules())
+        assert decision == REJECT
+        assert "tremido" in reason
+
+    def test_fast_shutter_without_labels_is_ambiguous(self):
+        img = {"id": 1, "rating": 1, "exif": {"exposure": 1 / 1000, "focal_length": 50}}
+        assert classify_image(img, TriageRules())[0] == AMBIGUOUS
+
+
+class TestTriageFlow:
+    """Tests for grouping, model decisions and generated edits."""
+
+    def test_triage_images_groups_and_summarizes(self):
+        images = [{"id": 1, "rating": 5}, {"id": 2, "rating": -1}, {"id": 3, "rating": 1}]
+        result = triage_images(images)
+        assert result.summary() == {"keep": 1, "reject": 1, "ambiguous": 1}
+        assert result.reasons[2]["decision"] == REJECT
+
+    def test_apply_model_decisions_ignores_unsure_and_unknown(self):
+        images = [{"id": 1, "rating": 0}, {"id": 2, "rating": 0}, {"id": 3, "rating": 0}]
+        result = triage_images(images)
+        apply_model_decisions(result, [
+            {"id": 1, "decision": "keep"},
+            {"id": 2, "decision": "unsure"},
+            {"id": 3, "decision": "maybe"},
+            {"id": 99, "decision": "reject"},
+        ])
+        assert [img["id"] for img in result.keep] == [1]
+        assert [img["id"] for img in result.ambiguous] == [2, 3]
+        assert result.reasons[1]["reason"] == "modelo de triagem"
+
+    def test_reject_edits_skip_already_rejected(self):
+        images = [{"id": 1, "rating": -1}, {"id": 2, "rating": 2, "colorlabels": ["red"]}]
+        assert reject_edits(triage_images(images)) == [{"id": 2, "rating": -1}]
@@ -0,0 +1,162 @@
+"""
+Tests for watch.py (--watch micro-batching over list_changed_since).
+"""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+from watch import WatchLoop, batch_runner
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _loop(pending_counts, run_batch, clock, limit=3, max_latency=60.0):
+    args = SimpleNamespace(source="all", limit=limit, min_rating=-2, only_raw=False)
+    fetches = iter(pending_counts)
+    patcher = patch("watch.fetch_images", side_effect=lambda client, a: [{}] * next(fetches))
+    patcher.start()
+    loop = WatchLoop(None, args, run_batch, mark={"since": 10, "after_id": None},
+                     interval=30.0, max_latency=max_latency, clock=clock, sleep=clock.sleep)
+    return loop, patcher
+
+
+class TestWatchLoop:
+    def test_full_batch_flushes_immediately(self):
+        clock = FakeClock()
+        calls = []
+        loop, patcher = _loop([3], lambda a, images: calls.append(a) or {"since": 20, "after_id": None}, clock)
+        try:
+            assert loop.step() is True
+        finally:
+            patcher.stop()
+        assert calls[0].changed_since == 10 and calls[0].limit == 3
+        assert loop.mark == {"since": 20, "after_id": None}
+
+    def test_partial_batch_waits_for_max_latency(self):
+        clock = FakeClock()
+        calls = []
+        loop, patcher = _loop([1, 1, 1], lambda a, images: calls.append(a) or {"since": 20, "after_id": None}, clock)
+        try:
+            assert loop.step() is False
+            clock.now = 59
+            assert loop.step() is False
+            clock.now = 61
+            assert loop.step() is True
+        finally:
+            patcher.stop()
+        assert len(calls) == 1
+
+    def test_backlog_skips_sleep_between_batches(self):
+        clock = FakeClock()
+        marks = iter([{"since": 11, "after_id": 3}, {"since": 20, "after_id": None}])
+        seen = []
+        loop, patcher = _loop([5, 2, 0], lambda a, images: next(marks), clock, max_latency=0)
+        loop.on_mark = seen.append
+        try:
+            loop.run(max_cycles=3)
+        finally:
+            patcher.stop()
+        assert seen == [{"since": 11, "after_id": 3}, {"since": 20, "after_id": None}]
+        # só dorme depois que o backlog acabou (2º lote) e no ciclo vazio
+        assert clock.now == 60.0
+
+    def test_missing_mark_keeps_waiting(self):
+        clock = FakeClock()
+        loop, patcher = _loop([3], lambda a, images: None, clock)
+        try:
+            assert loop.step() is False
+        finally:
+            patcher.stop()
+        assert loop.mark == {"since": 10, "after_id": None}
+
+    def test_batch_reuses_the_polled_list(self):
+        clock = FakeClock()
+        seen = []
+        loop, patcher = _loop([3], lambda a, images: seen.append(images) or {"since": 20, "after_id": None}, clock)
+        try:
+            assert loop.step() is True
+        finally:
+            patcher.stop()
+        assert seen == [[{}, {}, {}]]
+
+
+class FakeCatalog:
+    """list_changed_since/apply_plan/server_stats em memória; gravar atualiza changed_at como no darktable."""
+
+    def __init__(self, ids, changed_at=100):
+        self.now = 150
+        self.images = {i: {"id": i, "filename": f"{i}.jpg", "path": "/fotos", "changed_at": changed_at} for i in ids}
+        self.applied = []
+
+    def import_image(self, img_id):
+        self.now += 1
+        self.images[img_id] = {"id": img_id, "filename": f"{img_id}.jpg", "path": "/fotos", "changed_at": self.now}
+
+    def call_tool(self, name, params):
+        if name == "list_changed_since":
+            since, after_id = params["since"], params.get("after_id")
+            rows = sorted(
+                (dict(img) for img in self.images.values()
+                 if img["changed_at"] > since
+                 or (img["changed_at"] == since and (after_id is None or img["id"] > after_id))),
+                key=lambda row: (row["changed_at"], row["id"]),
+            )
+            return {"content": [{"type": "json", "json": rows},
+                                {"type": "json", "json": {"since": since, "watermark": self.now}}]}
+        if name == "apply_plan":
+            self.now += 1
+            for op in params["ops"]:
+                self.images[op["id"]]["changed_at"] = self.now
+                self.applied.append(op["id"])
+            results = [{"id": op["id"], "status": "ok"} for op in params["ops"]]
+            return {"content": [{"type": "text", "text": f"{len(results)} operações"},
+                                {"type": "json", "json": {"results": results}}]}
+        raise AssertionError(f"ferramenta inesperada: {name}")
+
+
+class TestWatchWrites:
+    """Images written by a micro-batch must not come back in the next poll."""
+
+    def test_applied_images_do_not_resurface(self, tmp_path):
+        catalog = FakeCatalog([1, 2])
+        provider = Mock()
+        provider.__class__.__name__ = "OllamaProvider"
+        provider.chat.side_effect = lambda messages, schema=None: (
+            '{"treatments": [%s]}' % ", ".join(
+                '{"id": %d, "rating": 3}' % img_id for img_id in sorted(catalog.images) if img_id not in catalog.applied
+            ), {})
+        args = SimpleNamespace(mode="tratamento", source="all", limit=2, min_rating=-2, only_raw=False,
+                               dry_run=False, text_only=True, prompt_variant="basico", generate_styles=False)
+        clock = FakeClock()
+        with patch("run_journal.RUNS_DIR", tmp_path), \
+                patch("batch_processor.save_log", return_value=tmp_path / "log.json"), \
+                patch("batch_processor.get_prompt", return_value="prompt"), \
+                patch("prompts.get_prompt", return_value="prompt"):
+            loop = WatchLoop(catalog, args, batch_runner(catalog, provider, args),
+                             mark={"since": 90, "after_id": None}, clock=clock, sleep=clock.sleep)
+            assert loop.step() is True
+            assert sorted(catalog.applied) == [1, 2]
+
+            # A escrita atualizou changed_at das duas, mas nada está pendente
+            assert loop.poll() == 0
+            assert loop.step() is False
+
+            # Uma importação nova volta a disparar, só com ela
+            catalog.import_image(3)
+            loop.max_latency = 0
+            assert loop.poll() == 1
+            assert loop.step() is True
+        assert catalog.applied == [1, 2, 3]
+        assert provider.chat.call_count == 2
@@ -0,0 +1,51 @@
+"""
+Tests for watermarks.py (incremental runs over list_changed_since).
+"""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "host"))
+
+from watermarks import WatermarkStore, source_key
+
+
+def _args(**kw):
+    base = dict(source="path", path_contains="2024/casamento", collection=None, tag=None,
+                min_rating=0, only_raw=False)
+    base.update(kw)
+    return SimpleNamespace(**base)
+
+
+class TestSourceKey:
+    def test_includes_mode_and_filter(self):
+        assert source_key("rating", _args()) == "rating|path|2024/casamento|min_rating=0|only_raw=False"
+
+    def test_differs_per_mode_and_filter(self):
+        assert source_key("rating", _args()) != source_key("tagging", _args())
+        assert source_key("rating", _args()) != source_key("rating", _args(path_contains="2025"))
+
+
+class TestWatermarkStore:
+    def test_defaults_to_everything(self, tmp_path):
+        store = WatermarkStore(tmp_path / "marks.json")
+        assert store.get("k") == {"since": 0, "after_id": None}
+
+    def test_roundtrip(self, tmp_path):
+        path = tmp_path / "marks.json"
+        WatermarkStore(path).set("k", {"since": 100, "after_id": 7})
+        assert WatermarkStore(path).get("k") == {"since": 100, "after_id": 7}
+
+    def test_never_moves_back(self, tmp_path):
+        store = WatermarkStore(tmp_path / "marks.json")
+        store.set("k", {"since": 100, "after_id": 7})
+        store.set("k", {"since": 100, "after_id": 3})
+        store.set("k", {"since": 100, "after_id": None})
+        assert store.get("k") == {"since": 100, "after_id": 7}
+        store.set("k", {"since": 101, "after_id": None})
+        assert store.get("k") == {"since": 101, "after_id": None}
+
+    def test_skip_list_roundtrip(self, tmp_path):
+        path = tmp_path / "marks.json"
+        WatermarkStore(path).set("k", {"since": 100, "after_id": None, "skip": [[7, 130]]})
+        assert WatermarkStore(path).get("k") == {"since": 100, "after_id": None, "skip": [[7, 130]]}